@@ -0,0 +1,462 @@
+import argparse
+import logging
+import mmap
+import os
+import random
+import struct
+import tempfile
+import time
+from typing import Dict, List, MutableMapping, Optional
+
+import numpy as np
+
+logger = logging.getLogger("Chatbot")
+
+# Card codes are indexes into CARDS, the unshuffled order of create_deck
+RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+SUITS = ["hearts", "diamonds", "clubs", "spades"]
+CARDS = [f"{rank} of {suit}" for rank in RANKS for suit in SUITS]
+CARD_CODES = {card: code for code, card in enumerate(CARDS)}
+NO_CARD = 255
+
+# Settlement codes, in the order of GameStateType
+SETTLEMENTS = [
+    "player_bust",
+    "dealer_bust",
+    "player_blackjack",
+    "dealer_blackjack",
+    "player_win",
+    "dealer_win",
+    "tie",
+]
+
+# Journal operations
+OP_BET = 1  # A hand is dealt, value is the bet amount
+OP_PLAYER_CARD = 2
+OP_DEALER_CARD = 3
+OP_SETTLE = 4  # card is the settlement code, value is twice the amount
+
+# Fixed-width record: timestamp, session, value, op, card
+RECORD = struct.Struct("<dIiBB")
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("session", "<u4"),
+        ("value", "<i4"),
+        ("op", "u1"),
+        ("card", "u1"),
+    ]
+)
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+JOURNAL_HEADER = b"BJJ1\x00\x00\x00\x00"
+
+# Snapshot: magic, journal records covered, session count; then per session
+# player_id, bet, deck/player/dealer lengths and whether the dealer played,
+# followed by the card codes
+SNAPSHOT_HEADER = struct.Struct("<4sQI")
+SNAPSHOT_MAGIC = b"BJS2"
+SNAPSHOT_SESSION = struct.Struct("<IiBBB?")
+
+
+def encode_cards(cards: List[str]) -> bytes:
+    return bytes(CARD_CODES[card] for card in cards)
+
+
+def decode_cards(codes: bytes) -> List[str]:
+    return [CARDS[code] for code in codes]
+
+
+def encode_snapshot(sessions: MutableMapping, records: int) -> bytes:
+    """
+    Serializes every session as its bet and the card codes of its deck and
+    hands, about 60 bytes per session.
+    """
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, records, len(sessions))]
+    for player_id, game_state in sessions.items():
+        parts.append(
+            SNAPSHOT_SESSION.pack(
+                player_id,
+                game_state["bet_amount"] or 0,
+                len(game_state["deck"]),
+                len(game_state["player_hand"]),
+                len(game_state["dealer_hand"]),
+                game_state["dealer_played"],
+            )
+        )
+        parts.append(encode_cards(game_state["deck"]))
+        parts.append(encode_cards(game_state["player_hand"]))
+        parts.append(encode_cards(game_state["dealer_hand"]))
+    return b"".join(parts)
+
+
+def decode_snapshot(data: bytes):
+    """
+    Returns:
+        tuple: The journal records the snapshot covers and the sessions.
+    """
+    magic, records, count = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a game journal snapshot")
+
+    sessions = {}
+    offset = SNAPSHOT_HEADER.size
+    for _ in range(count):
+        player_id, bet_amount, deck_len, player_len, dealer_len, dealer_played = (
+            SNAPSHOT_SESSION.unpack_from(data, offset)
+        )
+        offset += SNAPSHOT_SESSION.size
+        deck = decode_cards(data[offset : offset + deck_len])
+        offset += deck_len
+        player_hand = decode_cards(data[offset : offset + player_len])
+        offset += player_len
+        dealer_hand = decode_cards(data[offset : offset + dealer_len])
+        offset += dealer_len
+        sessions[player_id] = {
+            "bet_amount": bet_amount,
+            "deck": deck,
+            "player_hand": player_hand,
+            "dealer_hand": dealer_hand,
+            "dealer_played": dealer_played,
+        }
+    return records, sessions
+
+
+class GameJournal:
+    """
+    Append-only journal of every bet, card and payout of the single player
+    games.
+
+    Records are fixed-width and written through a buffered file, so
+    journaling a hit costs one struct pack and a memcpy. Every
+    `snapshot_every` records the sessions are written to a compact snapshot
+    next to the journal, at the start of a hand, which bounds how much of
+    the journal a recovery has to replay. Disabled until `open` is called.
+    """
+
+    def __init__(self, snapshot_every: int = 10_000, buffer_size: int = 1 << 16):
+        self.snapshot_every = snapshot_every
+        self.buffer_size = buffer_size
+        self.path: Optional[str] = None
+        self.sessions: Optional[MutableMapping] = None
+        self.records = 0
+        self.snapshot_records = 0
+        self._file = None
+
+    @property
+    def snapshot_path(self) -> str:
+        return f"{self.path}.snapshot"
+
+    def open(self, path: str, sessions: MutableMapping):
+        """
+        Opens the journal for appending.
+
+        Args:
+            path (str): The journal file, created if missing.
+            sessions (dict): The session store snapshots are taken from.
+        """
+        self.path = path
+        self.sessions = sessions
+        self._file = open(path, "ab", buffering=self.buffer_size)
+        size = self._file.tell()
+        if size == 0:
+            self._file.write(JOURNAL_HEADER)
+            size = len(JOURNAL_HEADER)
+
+        # A torn trailing record from a crash is ignored by readers, and
+        # records appended after it would be misaligned; cut it off
+        torn = (size - len(JOURNAL_HEADER)) % RECORD.size
+        if torn:
+            self._file.truncate(size - torn)
+            size -= torn
+            logger.warning(f"Dropped a torn record at the end of {path}")
+
+        self.records = (size - len(JOURNAL_HEADER)) // RECORD.size
+        self.snapshot_records = self.records
+
+    def append(self, session: int, op: int, card: int = NO_CARD, value: int = 0):
+        if self._file is None:
+            return
+
+        self._file.write(RECORD.pack(time.time(), session, value, op, card))
+        self.records += 1
+
+    def record_bet(self, player_id: int, bet_amount: int):
+        # Snapshot just before a hand is journaled: every earlier operation is
+        # fully journaled, and the replayed bet resets the hand being dealt
+        if self.records - self.snapshot_records >= self.snapshot_every:
+            self.snapshot()
+        self.append(player_id, OP_BET, value=bet_amount or 0)
+
+    def record_card(self, player_id: int, recipient: str, card: str):
+        op = OP_PLAYER_CARD if recipient == "player" else OP_DEALER_CARD
+        self.append(player_id, op, CARD_CODES[card])
+
+    def record_settlement(self, player_id: int, game_state: str, amount: float):
+        self.append(
+            player_id, OP_SETTLE, SETTLEMENTS.index(game_state), round(amount * 2)
+        )
+        # A settled hand reaches the OS before its payout is announced
+        self.flush()
+
+    def flush(self, sync: bool = False):
+        if self._file is None:
+            return
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def snapshot(self):
+        """
+        Atomically writes the sessions and the journal position they cover.
+        """
+        if self._file is None or self.sessions is None:
+            return
+
+        # The snapshot must never be ahead of the durable journal
+        self.flush(sync=True)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".journal-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_snapshot(self.sessions, self.records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.snapshot_records = self.records
+
+    def recover(self):
+        """
+        Rebuilds the sessions of the journal from the last snapshot and the
+        journal. Only those sessions are replaced: with a store shared by
+        several processes, the others' sessions are theirs to recover.
+        """
+        if self.path is None or self.sessions is None:
+            return
+
+        self.flush()
+        reader = JournalReader(self.path)
+        try:
+            sessions = reader.rebuild()
+        finally:
+            reader.close()
+
+        self.sessions.update(sessions)
+        logger.info(f"Recovered {len(sessions)} sessions from {self.path}")
+
+    def close(self):
+        if self._file is None:
+            return
+        self.snapshot()
+        self._file.close()
+        self._file = None
+
+
+def dense_index(session_ids: np.ndarray):
+    """
+    Maps session ids onto 0..n-1.
+
+    Returns:
+        tuple: The distinct session ids, sorted, and the index of each record's
+        session among them.
+    """
+    if not len(session_ids):
+        return session_ids, np.zeros(0, dtype=np.int64)
+
+    # Player ids are small, so a lookup table beats sorting every record
+    largest = int(session_ids.max())
+    if largest >= 1 << 24:
+        return np.unique(session_ids, return_inverse=True)
+
+    present = np.zeros(largest + 1, dtype=bool)
+    present[session_ids] = True
+    ids = np.flatnonzero(present)
+    lookup = np.zeros(largest + 1, dtype=np.int64)
+    lookup[ids] = np.arange(len(ids))
+    return ids, lookup[session_ids]
+
+
+class JournalReader:
+    """
+    Memory-mapped, read-only view of a journal as a numpy record array.
+
+    Nothing is parsed up front: filtering by session or op runs over the
+    mapped columns, and only the records of the sessions being rebuilt or
+    audited are turned into Python objects.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap = None
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > len(JOURNAL_HEADER):
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap is None:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        else:
+            if self._mmap[: len(JOURNAL_HEADER)] != JOURNAL_HEADER:
+                raise ValueError(f"Not a game journal: {path}")
+            self.records = np.frombuffer(
+                self._mmap,
+                dtype=RECORD_DTYPE,
+                count=(size - len(JOURNAL_HEADER)) // RECORD.size,
+                offset=len(JOURNAL_HEADER),
+            )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def close(self):
+        self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def load_snapshot(self):
+        snapshot_path = f"{self.path}.snapshot"
+        if not os.path.exists(snapshot_path):
+            return 0, {}
+        with open(snapshot_path, "rb") as f:
+            return decode_snapshot(f.read())
+
+    def rebuild(self) -> Dict[int, Dict]:
+        """
+        Rebuilds every session from the last snapshot and the records after it.
+
+        Sessions in the snapshot replay their whole tail. Sessions created
+        after it only replay their last hand; their undealt cards are
+        reshuffled, since the order of an unseen deck was never journaled.
+
+        Returns:
+            dict: The game state of every player id.
+        """
+        covered, sessions = self.load_snapshot()
+        tail = self.records[covered:]
+        if not len(tail):
+            return sessions
+
+        # Contiguous copies of the mapped columns are much faster to scan
+        session_ids = np.ascontiguousarray(tail["session"])
+        ops = np.ascontiguousarray(tail["op"])
+        cards = np.ascontiguousarray(tail["card"])
+        ids, index = dense_index(session_ids)
+
+        # Position of the last bet of every session; sessions in the snapshot
+        # replay their whole tail
+        start = np.zeros(len(ids), dtype=np.int64)
+        bets = np.flatnonzero(ops == OP_BET)
+        np.maximum.at(start, index[bets], bets)
+        start[np.isin(ids, list(sessions))] = 0
+        keep = np.flatnonzero(np.arange(len(tail)) >= start[index])
+
+        # Every card dealt from each session's deck, to work out what is left
+        dealt = np.zeros((len(ids), len(CARDS)), dtype=bool)
+        card_events = (ops == OP_PLAYER_CARD) | (ops == OP_DEALER_CARD)
+        dealt[index[card_events], cards[card_events]] = True
+
+        for session, position, op, card, value in zip(
+            session_ids[keep].tolist(),
+            index[keep].tolist(),
+            ops[keep].tolist(),
+            cards[keep].tolist(),
+            tail["value"][keep].tolist(),
+        ):
+            game_state = sessions.get(session)
+            if game_state is None:
+                deck = [CARDS[code] for code in np.flatnonzero(~dealt[position])]
+                random.shuffle(deck)
+                game_state = sessions[session] = {
+                    "bet_amount": value,
+                    "deck": deck,
+                    "player_hand": [],
+                    "dealer_hand": [],
+                    "dealer_played": False,
+                }
+
+            if op == OP_BET:
+                game_state["bet_amount"] = value
+                game_state["player_hand"] = []
+                game_state["dealer_hand"] = []
+                game_state["dealer_played"] = False
+            elif op in (OP_PLAYER_CARD, OP_DEALER_CARD):
+                card = CARDS[card]
+                hand = "player_hand" if op == OP_PLAYER_CARD else "dealer_hand"
+                game_state[hand].append(card)
+                if card in game_state["deck"]:
+                    game_state["deck"].remove(card)
+            elif op == OP_SETTLE and SETTLEMENTS[card] != "player_bust":
+                # Hands are settled once over, and only a bust ends one
+                # before the dealer plays
+                game_state["dealer_played"] = True
+
+        return sessions
+
+    def audit(self, player_id: int, hand: int = -1) -> Dict:
+        """
+        Replays one hand of a player and settles it again.
+
+        Args:
+            player_id (int): The ID of the player.
+            hand (int): Index of the hand among the player's hands, -1 for
+                the last one.
+
+        Returns:
+            dict: The events of the hand, the journaled settlement and the
+            settlement recomputed from the journaled cards.
+        """
+        from apps.blackjack.functions.main import settle_hand
+
+        events = self.records[np.flatnonzero(self.records["session"] == player_id)]
+        starts = np.flatnonzero(events["op"] == OP_BET)
+        if not len(starts):
+            raise ValueError(f"No hands journaled for player_id: {player_id}")
+
+        start = starts[hand]
+        ends = starts[starts > start]
+        events = events[start : ends[0] if len(ends) else len(events)]
+
+        player_hand: List[str] = []
+        dealer_hand: List[str] = []
+        settled = None
+        for event in events.tolist():
+            timestamp, _, value, op, card = event
+            if op == OP_PLAYER_CARD:
+                player_hand.append(CARDS[card])
+            elif op == OP_DEALER_CARD:
+                dealer_hand.append(CARDS[card])
+            elif op == OP_SETTLE:
+                settled = {"game_state": SETTLEMENTS[card], "amount": value / 2}
+
+        bet_amount = int(events[0]["value"])
+        return {
+            "player_id": player_id,
+            "bet_amount": bet_amount,
+            "dealt_at": float(events[0]["timestamp"]),
+            "player_hand": player_hand,
+            "dealer_hand": dealer_hand,
+            "settled": settled,
+            "recomputed": settle_hand(player_hand, dealer_hand, bet_amount),
+        }
+
+
+"""
+Journal of the single player games, enabled by opening it
+"""
+game_journal = GameJournal()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit a hand from a game journal")
+    parser.add_argument("path")
+    parser.add_argument("player_id", type=int)
+    parser.add_argument("--hand", type=int, default=-1)
+    args = parser.parse_args()
+
+    reader = JournalReader(args.path)
+    print(reader.audit(args.player_id, args.hand))
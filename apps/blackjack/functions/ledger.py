@@ -0,0 +1,374 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, TypedDict
+
+import numpy as np
+
+logger = logging.getLogger("Chatbot")
+
+# Posting kinds
+DEPOSIT = 1  # cashier -> player, e.g. the starting balance
+BET = 2  # player -> house, when a hand is dealt
+PAYOUT = 3  # house -> player, when a hand is settled, zero for a loss
+REFUND = 4  # house -> player, when a dealt hand is voided or pushes
+TRANSFER = 5  # player <-> cashier, when the player's room moves to another worker
+
+KINDS = {
+    DEPOSIT: "deposit",
+    BET: "bet",
+    PAYOUT: "payout",
+    REFUND: "refund",
+    TRANSFER: "transfer",
+}
+
+HOUSE = "house"
+CASHIER = "cashier"
+
+POSTING_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("debit", "<u4"),
+        ("credit", "<u4"),
+        ("amount", "<i8"),  # cents
+        ("kind", "u1"),
+    ]
+)
+
+
+def to_cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+class Reconciliation(TypedDict):
+    postings: int
+    totals: Dict[str, float]
+    house_result: float
+    balanced: bool
+    mismatched_accounts: List[Hashable]
+
+
+class Ledger:
+    """
+    Double-entry bankroll ledger of the players and the house.
+
+    Every movement of money is a posting that debits one account and credits
+    another by the same amount, so the balances always sum to zero. Balances
+    live in a numpy array indexed by account, and postings in a growable
+    numpy record array, a few dozen bytes per posting in total.
+
+    When `path` is set, postings are made durable by group commit: `commit`
+    appends every posting since the last commit with one write and one
+    fsync, and `run` commits every `commit_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        starting_balance: float = 1000,
+        commit_interval: float = 1.0,
+    ):
+        self.path = path
+        self.starting_balance = starting_balance
+        self.commit_interval = commit_interval
+        self.accounts: Dict[Hashable, int] = {}
+        self.account_keys: List[Hashable] = []
+        self.balances = np.zeros(64, dtype=np.int64)
+        self.postings = np.zeros(1024, dtype=POSTING_DTYPE)
+        self.count = 0
+        self.committed = 0
+        self.committed_accounts = 0
+        self.open_bets: Dict[Hashable, int] = {}
+        # Names this ledger in the bankrolls it leaves in shared sessions
+        self.owner = uuid.uuid4().hex
+        self.account(HOUSE)
+        self.account(CASHIER)
+
+    def account(self, key: Hashable) -> int:
+        """
+        Returns the index of an account, opening it if needed.
+        """
+        index = self.accounts.get(key)
+        if index is not None:
+            return index
+
+        index = len(self.account_keys)
+        self.accounts[key] = index
+        self.account_keys.append(key)
+        if index >= len(self.balances):
+            self.balances = np.concatenate(
+                [self.balances, np.zeros_like(self.balances)]
+            )
+        return index
+
+    def post(self, debit: Hashable, credit: Hashable, amount: int, kind: int):
+        """
+        Records a posting of `amount` cents from `debit` to `credit`.
+        """
+        debit_index = self.account(debit)
+        credit_index = self.account(credit)
+        if self.count == len(self.postings):
+            self.postings = np.concatenate(
+                [self.postings, np.zeros_like(self.postings)]
+            )
+
+        self.postings[self.count] = (
+            time.time(),
+            debit_index,
+            credit_index,
+            amount,
+            kind,
+        )
+        self.count += 1
+        self.balances[debit_index] -= amount
+        self.balances[credit_index] += amount
+
+    def _player(self, player_id: Hashable) -> int:
+        # Players are credited the starting balance the first time they play
+        if player_id not in self.accounts and self.starting_balance:
+            self.post(CASHIER, player_id, to_cents(self.starting_balance), DEPOSIT)
+        return self.account(player_id)
+
+    def balance(self, player_id: Hashable) -> float:
+        # Opening the account may grow the balances, so index after it
+        index = self._player(player_id)
+        return int(self.balances[index]) / 100
+
+    def check_bets(self, bets: Iterable[Tuple[Hashable, float]]):
+        """
+        Raises if any player's bet is not positive or is over their balance.
+        """
+        for player_id, bet_amount in bets:
+            if bet_amount is None or bet_amount <= 0:
+                raise ValueError(f"Invalid bet amount for player_id: {player_id}")
+            index = self._player(player_id)
+            if to_cents(bet_amount) > self.balances[index]:
+                raise ValueError(
+                    f"Bet of {bet_amount} is over the balance of "
+                    f"{self.balance(player_id)} for player_id: {player_id}"
+                )
+
+    def place_bet(self, player_id: Hashable, bet_amount: float):
+        """
+        Moves a checked bet from the player to the house for the hand being
+        dealt. An unsettled earlier hand of the player is forfeited.
+        """
+        amount = to_cents(bet_amount)
+        self.post(player_id, HOUSE, amount, BET)
+        self.open_bets[player_id] = amount
+
+    def settle(self, player_id: Hashable, amount: float) -> float:
+        """
+        Pays out a settled hand once, however often it is settled.
+
+        Args:
+            player_id: The player's account.
+            amount (float): The amount settle_hand returned: the payout
+                including the stake when positive, zero for a push, and
+                negative for a loss.
+
+        Returns:
+            float: The player's balance after the payout.
+        """
+        open_bet = self.open_bets.pop(player_id, None)
+        if open_bet is not None and amount == 0:
+            # A push returns the stake
+            self.post(HOUSE, player_id, open_bet, REFUND)
+        elif open_bet is not None:
+            # Losses post a zero payout too, closing the bet in the log
+            self.post(HOUSE, player_id, to_cents(max(amount, 0)), PAYOUT)
+        return self.balance(player_id)
+
+    def void(self, player_id: Hashable):
+        """
+        Returns the open bet of a hand that will not be settled.
+        """
+        amount = self.open_bets.pop(player_id, None)
+        if amount:
+            self.post(HOUSE, player_id, amount, REFUND)
+
+    def release(self, player_id: Hashable) -> Tuple[int, Optional[int]]:
+        """
+        Transfers a player's bankroll out, for a room moving to another
+        worker with its own ledger. An open bet is refunded first and placed
+        again by `restore`, so each ledger's log stays complete.
+
+        Returns:
+            tuple: The balance and the open bet, in cents, to `restore`.
+        """
+        open_bet = self.open_bets.get(player_id)
+        self.void(player_id)
+        index = self._player(player_id)
+        balance = int(self.balances[index])
+        if balance:
+            self.post(player_id, CASHIER, balance, TRANSFER)
+        return balance, open_bet
+
+    def bankroll(self, player_id: Hashable) -> Tuple[int, Optional[int]]:
+        """
+        Returns what `release` would, without transferring anything, for a
+        checkpoint of a room that stays on this worker.
+        """
+        open_bet = self.open_bets.get(player_id)
+        index = self._player(player_id)
+        return int(self.balances[index]) + (open_bet or 0), open_bet
+
+    def restore(self, player_id: Hashable, balance: int, open_bet: Optional[int]):
+        """
+        Sets a player's bankroll to one released by another worker.
+
+        The difference is posted rather than the whole balance, so restoring
+        a room from a checkpoint onto a ledger that still holds the player's
+        older bankroll does not count it twice.
+        """
+        self.void(player_id)
+        # Opened without the starting deposit, the bankroll comes with it
+        index = self.account(player_id)
+        difference = balance - int(self.balances[index])
+        if difference > 0:
+            self.post(CASHIER, player_id, difference, TRANSFER)
+        elif difference < 0:
+            self.post(player_id, CASHIER, -difference, TRANSFER)
+        if open_bet:
+            self.place_bet(player_id, open_bet / 100)
+
+    @property
+    def accounts_path(self) -> str:
+        return f"{self.path}.accounts"
+
+    def commit(self):
+        """
+        Appends the postings made since the last commit to `path`, with one
+        write and one fsync for the whole group.
+        """
+        if not self.path or self.committed == self.count:
+            return
+
+        if self.committed_accounts < len(self.account_keys):
+            # Account indexes must be durable before postings reference them
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ledger-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self.account_keys, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.accounts_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self.committed_accounts = len(self.account_keys)
+
+        group = self.postings[self.committed : self.count]
+        with open(self.path, "ab") as f:
+            f.write(group.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.committed = self.count
+
+    def load(self):
+        """
+        Rebuilds the accounts and balances from the committed postings.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.accounts_path) as f:
+            keys = json.load(f)
+        # A torn trailing posting from a crash was never committed
+        size = os.path.getsize(self.path)
+        postings = np.fromfile(
+            self.path, dtype=POSTING_DTYPE, count=size // POSTING_DTYPE.itemsize
+        )
+
+        self.accounts = {}
+        self.account_keys = []
+        for key in keys:
+            self.account(key)
+        self.balances = self._sum_balances(postings, len(self.balances))
+        self.postings = np.zeros(max(1024, 2 * len(postings)), dtype=POSTING_DTYPE)
+        self.postings[: len(postings)] = postings
+        self.count = self.committed = len(postings)
+        self.committed_accounts = len(self.account_keys)
+
+        # A bet is still open when it is the player's last bet-related posting
+        postings = postings[np.isin(postings["kind"], [BET, PAYOUT, REFUND])]
+        players = np.where(
+            postings["kind"] == BET, postings["debit"], postings["credit"]
+        )[::-1]
+        accounts, last = np.unique(players, return_index=True)
+        last = postings[::-1][last]
+        self.open_bets = {
+            self.account_keys[account]: int(posting["amount"])
+            for account, posting in zip(accounts.tolist(), last)
+            if posting["kind"] == BET
+        }
+        logger.info(f"Loaded {self.count} postings from {self.path}")
+
+    async def run(self):
+        """
+        Group commits the postings every `commit_interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(self.commit_interval)
+            self.commit()
+
+    @staticmethod
+    def _sum_balances(postings: np.ndarray, accounts: int) -> np.ndarray:
+        # float64 sums are exact below 2**53 cents
+        amounts = postings["amount"]
+        credits = np.bincount(postings["credit"], weights=amounts, minlength=accounts)
+        debits = np.bincount(postings["debit"], weights=amounts, minlength=accounts)
+        return np.rint(credits - debits).astype(np.int64)[:accounts]
+
+    def reconcile(
+        self, since: Optional[float] = None, until: Optional[float] = None
+    ) -> Reconciliation:
+        """
+        End-of-day report over the postings in [since, until), summed with
+        numpy rather than posting by posting.
+
+        Returns:
+            dict: Totals per posting kind, the house result over the period,
+            whether the ledger balances, and any account whose balance
+            disagrees with the sum of its postings.
+        """
+        postings = self.postings[: self.count]
+        mask = np.ones(len(postings), dtype=bool)
+        if since is not None:
+            mask &= postings["timestamp"] >= since
+        if until is not None:
+            mask &= postings["timestamp"] < until
+        period = postings[mask]
+
+        totals = np.bincount(
+            period["kind"], weights=period["amount"], minlength=max(KINDS) + 1
+        )
+        house = self.accounts[HOUSE]
+        amounts = period["amount"]
+        house_result = (
+            amounts[period["credit"] == house].sum()
+            - amounts[period["debit"] == house].sum()
+        )
+
+        # The balances must both sum to zero and match a replay of every posting
+        replayed = self._sum_balances(postings, len(self.balances))
+        mismatched = np.flatnonzero(replayed != self.balances)
+
+        return {
+            "postings": int(len(period)),
+            "totals": {name: float(totals[kind]) / 100 for kind, name in KINDS.items()},
+            "house_result": int(house_result) / 100,
+            "balanced": bool(self.balances.sum() == 0) and not len(mismatched),
+            "mismatched_accounts": [self.account_keys[i] for i in mismatched],
+        }
+
+
+"""
+Bankroll of every player, in cents
+"""
+ledger = Ledger()
@@ -1,5 +1,8 @@
 import random
-from typing import Dict, List, Literal, TypedDict
+from typing import List, Literal, NotRequired, Optional, Tuple, TypedDict
+
+from apps.blackjack.functions.journal import game_journal
+from apps.shared.shm import SharedMemoryStore
 
 
 class GameState(TypedDict):
@@ -7,12 +10,16 @@ class GameState(TypedDict):
     deck: List[str]
     player_hand: List[str]
     dealer_hand: List[str]
+    dealer_played: bool
+    # With a shared store, the ledger that last moved the player's bankroll
+    # and the bankroll, balance and open bet in cents, it left
+    bankroll: NotRequired[Tuple[str, int, Optional[int]]]
 
 
 """
 Dict to store the game_state of each player id
 """
-game_state_map: Dict[int, GameState] = {}
+game_state_map: SharedMemoryStore[int, GameState] = SharedMemoryStore()
 
 
 # Define the card deck
@@ -53,8 +60,12 @@ def create_game_session_and_deal_initial_cards(player_id: int, bet_amount: int):
             "bet_amount": bet_amount,
             "player_hand": [],
             "dealer_hand": [],
+            "dealer_played": False,
         }
         game_state = game_state_map[player_id]
+    elif bet_amount is not None:
+        # Every hand is played for the bet the player just placed
+        game_state["bet_amount"] = bet_amount
 
     deck = game_state["deck"]
 
@@ -64,12 +75,21 @@ def create_game_session_and_deal_initial_cards(player_id: int, bet_amount: int):
             f"Not enough cards in the deck to deal initial hands for player_id: {player_id}"
         )
 
+    # Journaled first, a bet the journal cannot record deals no cards
+    game_journal.record_bet(player_id, game_state["bet_amount"])
+
     # Deal cards
     player_hand = [deck.pop(), deck.pop()]
     dealer_hand: List[str] = [deck.pop(), deck.pop()]
 
     game_state["player_hand"] = player_hand
     game_state["dealer_hand"] = dealer_hand
+    game_state["dealer_played"] = False
+
+    for card in player_hand:
+        game_journal.record_card(player_id, "player", card)
+    for card in dealer_hand:
+        game_journal.record_card(player_id, "dealer", card)
 
     return {
         "player_hand": player_hand,
@@ -127,6 +147,7 @@ def hit(player_id: int, recipient: RecipientType) -> str:
     else:
         raise ValueError(f"Invalid recipient: {recipient}")
 
+    game_journal.record_card(player_id, recipient, card)
     return card
 
 
@@ -156,10 +177,9 @@ class HandValue(TypedDict):
     soft: bool
 
 
-# Calculate hand value
-def calculate_hand_value(player_id: int, recipient: RecipientType) -> HandValue:
+def hand_value(hand: List[str]) -> HandValue:
     """
-    Calculates the total value of a hand in Blackjack.
+    Calculates the total value of a list of cards.
 
     Args:
         hand (list): List of cards in the hand.
@@ -170,10 +190,6 @@ def calculate_hand_value(player_id: int, recipient: RecipientType) -> HandValue:
     value = 0
     aces = 0
 
-    hand = game_state_map[player_id].get("player_hand")
-    if recipient == "dealer":
-        hand = game_state_map[player_id].get("dealer_hand")
-
     for card in hand:
         rank = card.split(" ")[0]
         if rank in ["J", "Q", "K"]:
@@ -195,6 +211,25 @@ def calculate_hand_value(player_id: int, recipient: RecipientType) -> HandValue:
     }
 
 
+# Calculate hand value
+def calculate_hand_value(player_id: int, recipient: RecipientType) -> HandValue:
+    """
+    Calculates the total value of a hand in Blackjack.
+
+    Args:
+        player_id (int): The ID of the player.
+        recipient (str): Either "player" or "dealer".
+
+    Returns:
+        dict: The total value of the hand and whether it is soft or hard.
+    """
+    hand = game_state_map[player_id].get("player_hand")
+    if recipient == "dealer":
+        hand = game_state_map[player_id].get("dealer_hand")
+
+    return hand_value(hand)
+
+
 tool_calculate_hand_value = {
     "name": "calculate_hand_value",
     "description": "Calculates the total value of a hand in Blackjack, determining whether it is soft or hard.",
@@ -237,8 +272,9 @@ def dealer_turn(player_id: int) -> List[str]:
         hand_value = calculate_hand_value(player_id, "dealer")
         if hand_value["total"] >= 17:  # Dealer stands on 17 or higher
             break
-        dealer_hand.append(hit(player_id, "dealer"))
+        hit(player_id, "dealer")  # hit appends the card to the dealer's hand
 
+    game_state["dealer_played"] = True
     return dealer_hand
 
 
@@ -268,6 +304,25 @@ GameStateType = Literal[
 ]
 
 
+def hand_over(player_id: int) -> bool:
+    """
+    Whether the player's hand is over and can be settled: the player bust,
+    or the dealer has played.
+
+    Args:
+        player_id (int): The ID of the player.
+
+    Returns:
+        bool: True once the hand's outcome can no longer change.
+    """
+    game_state = game_state_map.get(player_id)
+    if not game_state:
+        return False
+    if game_state["dealer_played"]:
+        return True
+    return hand_value(game_state["player_hand"])["total"] > 21
+
+
 # Check game status
 
 
@@ -296,12 +351,27 @@ def check_game_status(player_id: int) -> GameStateResult:
     if not game_state:
         raise ValueError(f"Game state not found for player_id: {player_id}")
 
-    player_hand = game_state["player_hand"]
-    dealer_hand = game_state["dealer_hand"]
-    bet_amount = game_state["bet_amount"]
+    return settle_hand(
+        game_state["player_hand"], game_state["dealer_hand"], game_state["bet_amount"]
+    )
 
-    player_value = calculate_hand_value(player_id, "player")["total"]
-    dealer_value = calculate_hand_value(player_id, "dealer")["total"]
+
+def settle_hand(
+    player_hand: List[str], dealer_hand: List[str], bet_amount: int
+) -> GameStateResult:
+    """
+    Settles a player's hand against the dealer's final hand.
+
+    Args:
+        player_hand (list): The player's cards.
+        dealer_hand (list): The dealer's cards.
+        bet_amount (int): The amount the player bet.
+
+    Returns:
+        dict: The game state and the amount won (positive) or lost (negative).
+    """
+    player_value = hand_value(player_hand)["total"]
+    dealer_value = hand_value(dealer_hand)["total"]
 
     if player_value > 21:
         return {"game_state": "player_bust", "amount": -bet_amount}
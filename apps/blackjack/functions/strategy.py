@@ -0,0 +1,265 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Literal, Tuple, TypedDict
+
+from apps.blackjack.functions.main import game_state_map
+
+"""
+A shoe composition is the count of each card value still unseen, indexed
+by value class: aces, 2 through 9, then every ten-valued card.
+"""
+Composition = Tuple[int, ...]
+
+VALUE_CLASSES = 10
+ACE = 0
+TEN = 9
+
+# Dealer outcomes, in the order of the probability vectors
+DEALER_OUTCOMES = ["17", "18", "19", "20", "21", "blackjack", "bust"]
+BLACKJACK = 5
+BUST = 6
+
+ActionType = Literal["hit", "stand"]
+
+
+def value_class(card: str) -> int:
+    rank = card.split(" ")[0]
+    if rank == "A":
+        return ACE
+    if rank in ["10", "J", "Q", "K"]:
+        return TEN
+    return int(rank) - 1
+
+
+def composition(cards: Iterable[str]) -> Composition:
+    """
+    Counts the cards of each value class.
+
+    Args:
+        cards (list): The unseen cards, e.g. the deck and the dealer's hole card.
+
+    Returns:
+        tuple: The count of each value class.
+    """
+    counts = [0] * VALUE_CLASSES
+    for card in cards:
+        counts[value_class(card)] += 1
+    return tuple(counts)
+
+
+def shoe_composition(decks: int = 1) -> Composition:
+    return tuple(4 * decks if i != TEN else 16 * decks for i in range(VALUE_CLASSES))
+
+
+def best_total(hard: int, ace: bool) -> Tuple[int, bool]:
+    """
+    Returns the best total of a hand and whether it is soft, as hand_value does.
+    """
+    if ace and hard + 10 <= 21:
+        return hard + 10, True
+    return hard, False
+
+
+def _draw(counts: Composition, i: int) -> Composition:
+    return counts[:i] + (counts[i] - 1,) + counts[i + 1 :]
+
+
+@lru_cache(maxsize=1 << 15)
+def dealer_outcomes(
+    hard: int, ace: bool, cards: int, counts: Composition
+) -> Tuple[float, ...]:
+    """
+    Exact probabilities of the dealer's final hand, hitting below 17 as
+    dealer_turn does, with the remaining draws taken from `counts`.
+
+    Args:
+        hard (int): The dealer's total counting aces as 1.
+        ace (bool): Whether the dealer holds an ace.
+        cards (int): Cards in the dealer's hand, 3 meaning three or more.
+        counts (tuple): The composition the dealer draws from.
+
+    Returns:
+        tuple: The probability of each of DEALER_OUTCOMES.
+    """
+    total, _ = best_total(hard, ace)
+    outcome = [0.0] * len(DEALER_OUTCOMES)
+    if hard > 21:
+        outcome[BUST] = 1.0
+        return tuple(outcome)
+    if total >= 17:
+        outcome[BLACKJACK if total == 21 and cards == 2 else total - 17] = 1.0
+        return tuple(outcome)
+
+    remaining = sum(counts)
+    for i, count in enumerate(counts):
+        if not count:
+            continue
+        drawn = dealer_outcomes(
+            hard + i + 1, ace or i == ACE, min(cards + 1, 3), _draw(counts, i)
+        )
+        weight = count / remaining
+        for j, p in enumerate(drawn):
+            outcome[j] += weight * p
+    return tuple(outcome)
+
+
+def dealer_upcard_outcomes(upcard: int, counts: Composition) -> Tuple[float, ...]:
+    """
+    Probabilities of the dealer's final hand for an upcard, the hole card
+    being drawn from `counts` like every later card.
+    """
+    return dealer_outcomes(upcard + 1, upcard == ACE, 1, counts)
+
+
+def stand_ev(total: int, dealer: Tuple[float, ...]) -> float:
+    """
+    Expected value per unit bet of standing on `total` against the dealer's
+    outcome probabilities. Wins count +1, as settle_hand pays them out.
+    """
+    if total > 21:
+        return -1.0
+
+    ev = dealer[BUST] - dealer[BLACKJACK]
+    for outcome in range(BLACKJACK):
+        dealer_total = 17 + outcome
+        if total > dealer_total:
+            ev += dealer[outcome]
+        elif total < dealer_total:
+            ev -= dealer[outcome]
+    return ev
+
+
+@lru_cache(maxsize=4096)
+def ev_table(
+    upcard: int, counts: Composition
+) -> Dict[Tuple[int, bool], Tuple[float, float]]:
+    """
+    Hit and stand EV of every player total against an upcard.
+
+    The dealer's outcomes are exact for the composition. The player's own
+    later hits are drawn from the same composition, which keeps the table
+    to one dealer computation per composition instead of one per sequence
+    of player cards.
+
+    Args:
+        upcard (int): The value class of the dealer's face-up card.
+        counts (tuple): The unseen cards, the dealer's hole card included.
+
+    Returns:
+        dict: (total, soft) -> (stand EV, hit EV), for hard 4-21 and soft 12-21.
+    """
+    dealer = dealer_upcard_outcomes(upcard, counts)
+    remaining = sum(counts)
+    weights = [count / remaining for count in counts]
+
+    # Best EV of every (hard, ace) hand, from the highest totals down since
+    # hitting only ever raises the hard total
+    best: Dict[Tuple[int, bool], float] = {}
+    hit: Dict[Tuple[int, bool], float] = {}
+    for hard in range(21, 1, -1):
+        for ace in (True, False):
+            ev = 0.0
+            for i, weight in enumerate(weights):
+                new_hard = hard + i + 1
+                if new_hard > 21:
+                    ev -= weight
+                else:
+                    ev += weight * best[(new_hard, ace or i == ACE)]
+            hit[(hard, ace)] = ev
+            total, _ = best_total(hard, ace)
+            best[(hard, ace)] = max(ev, stand_ev(total, dealer))
+
+    table = {}
+    for total in range(4, 22):
+        table[(total, False)] = (stand_ev(total, dealer), hit[(total, False)])
+    for total in range(12, 22):
+        # A soft total is an ace counted as 11 plus the rest counted hard
+        table[(total, True)] = (stand_ev(total, dealer), hit[(total - 10, True)])
+    return table
+
+
+class Suggestion(TypedDict):
+    action: ActionType
+    hit_ev: float
+    stand_ev: float
+
+
+def suggest(player_hand: List[str], upcard: str, unseen: Iterable[str]) -> Suggestion:
+    """
+    Suggests hitting or standing from the EV of both.
+
+    Args:
+        player_hand (list): The player's cards.
+        upcard (str): The dealer's face-up card.
+        unseen (list): Every card the player has not seen, including the
+            dealer's hole card.
+
+    Returns:
+        dict: The suggested action and the EV of hitting and of standing.
+    """
+    classes = [value_class(card) for card in player_hand]
+    total, soft = best_total(sum(i + 1 for i in classes), ACE in classes)
+    if total > 21:
+        raise ValueError("The hand is already bust")
+
+    stand, hit = ev_table(value_class(upcard), composition(unseen))[(total, soft)]
+    return {
+        "action": "hit" if hit > stand else "stand",
+        "hit_ev": round(hit, 4),
+        "stand_ev": round(stand, 4),
+    }
+
+
+def basic_strategy(
+    counts: Composition = shoe_composition(6),
+) -> Dict[Tuple[int, bool, int], ActionType]:
+    """
+    The hit/stand decision for every player total and upcard, the strategy
+    input for simulators.
+
+    Returns:
+        dict: (total, soft, upcard value class) -> "hit" or "stand".
+    """
+    strategy = {}
+    for upcard in range(VALUE_CLASSES):
+        if not counts[upcard]:
+            continue
+        for (total, soft), (stand, hit) in ev_table(
+            upcard, _draw(counts, upcard)
+        ).items():
+            strategy[(total, soft, upcard)] = "hit" if hit > stand else "stand"
+    return strategy
+
+
+def suggest_action(player_id: int) -> Suggestion:
+    """
+    Suggests the player's next action in their current hand.
+
+    Args:
+        player_id (int): The ID of the player.
+
+    Returns:
+        dict: The suggested action and the EV of hitting and of standing.
+    """
+    game_state = game_state_map.get(player_id)
+    if not game_state or len(game_state["dealer_hand"]) < 2:
+        raise ValueError(f"No hand in progress for player_id: {player_id}")
+
+    # The hole card is unseen by the player, so it counts as part of the deck
+    hole_card, upcard = game_state["dealer_hand"][:2]
+    return suggest(game_state["player_hand"], upcard, game_state["deck"] + [hole_card])
+
+
+tool_suggest_action = {
+    "name": "suggest_action",
+    "description": "Suggests whether the player should hit or stand in their current hand, from the exact expected value of each given the cards left in the deck.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "player_id": {
+                "type": "INTEGER",
+                "description": "The unique ID of the player asking for advice.",
+            }
+        },
+        "required": ["player_id"],
+    },
+}
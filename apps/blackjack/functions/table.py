@@ -0,0 +1,399 @@
+from typing import Dict, List, Optional, TypedDict
+
+from apps.blackjack.functions.main import (
+    GameStateResult,
+    create_deck,
+    hand_value,
+    settle_hand,
+    shuffle_deck,
+)
+from apps.shared.store import MemoryStore
+
+# Number of decks in a shoe and the share of the shoe dealt before reshuffling
+SHOE_DECKS = 6
+CUT_CARD = 0.75
+
+
+class Seat(TypedDict):
+    player_id: int
+    bet_amount: int
+    hand: List[str]
+    done: bool
+
+
+class TableState(TypedDict):
+    shoe: List[str]
+    dealer_hand: List[str]
+    seats: Dict[int, Seat]
+    turn_order: List[int]
+    turn: int
+    round_open: bool
+    dealer_played: bool
+
+
+"""
+Dict to store the table of each room, one shoe and one dealer hand per table
+"""
+table_map: MemoryStore[str, TableState] = MemoryStore()
+
+
+def create_shoe(decks: int = SHOE_DECKS) -> List[str]:
+    """Creates a shuffled shoe of `decks` standard decks."""
+    shoe = [card for _ in range(decks) for card in create_deck()]
+    shuffle_deck(shoe)
+    return shoe
+
+
+def _get_table(table_id: str) -> TableState:
+    table = table_map.get(table_id)
+    if not table:
+        raise ValueError(f"Table not found for table_id: {table_id}")
+    return table
+
+
+def _current_player(table: TableState) -> Optional[int]:
+    if not table["round_open"] or table["turn"] >= len(table["turn_order"]):
+        return None
+    return table["turn_order"][table["turn"]]
+
+
+def _advance_turn(table: TableState):
+    """Moves the turn to the next seat that still has to play."""
+    order = table["turn_order"]
+    while table["turn"] < len(order) and table["seats"][order[table["turn"]]]["done"]:
+        table["turn"] += 1
+
+
+def join_table(table_id: str, player_id: int, bet_amount: int):
+    """
+    Seats a player at the room's table, or updates their bet for the next round.
+
+    Args:
+        table_id (str): The ID of the table, one per room.
+        player_id (int): The ID of the player.
+        bet_amount (int): The amount the player bets each round.
+
+    Returns:
+        dict: The seated players in turn order.
+    """
+    table = table_map.get(table_id)
+    if not table:
+        table_map[table_id] = {
+            "shoe": create_shoe(),
+            "dealer_hand": [],
+            "seats": {},
+            "turn_order": [],
+            "turn": 0,
+            "round_open": False,
+            "dealer_played": False,
+        }
+        table = table_map[table_id]
+
+    seat = table["seats"].get(player_id)
+    if seat is not None:
+        # The round is settled on the bet the ledger took when it was dealt
+        if table["round_open"] and bet_amount != seat["bet_amount"]:
+            raise ValueError(
+                f"A round is in progress, player_id: {player_id} can change "
+                "their bet for the next one"
+            )
+        seat["bet_amount"] = bet_amount
+    else:
+        if table["round_open"]:
+            raise ValueError(
+                f"A round is in progress, player_id: {player_id} can join the next one"
+            )
+        table["seats"][player_id] = {
+            "player_id": player_id,
+            "bet_amount": bet_amount,
+            "hand": [],
+            "done": False,
+        }
+        table["turn_order"].append(player_id)
+
+    return {"turn_order": table["turn_order"]}
+
+
+tool_join_table = {
+    "name": "join_table",
+    "description": "Seats a player at the shared Blackjack table with their bet amount, or updates the bet of a seated player for the next round.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "player_id": {
+                "type": "INTEGER",
+                "description": "The unique ID of the player taking a seat.",
+            },
+            "bet_amount": {
+                "type": "INTEGER",
+                "description": "The amount the player bets each round.",
+            },
+        },
+        "required": ["player_id", "bet_amount"],
+    },
+}
+
+
+def leave_table(table_id: str, player_id: int):
+    """
+    Removes a player's seat once the current round is over.
+
+    Args:
+        table_id (str): The ID of the table.
+        player_id (int): The ID of the player.
+
+    Returns:
+        dict: The seated players in turn order.
+    """
+    table = _get_table(table_id)
+    if table["round_open"] and player_id in table["seats"]:
+        raise ValueError(f"player_id: {player_id} can leave after the current round")
+
+    table["seats"].pop(player_id, None)
+    if player_id in table["turn_order"]:
+        table["turn_order"].remove(player_id)
+
+    return {"turn_order": table["turn_order"]}
+
+
+tool_leave_table = {
+    "name": "leave_table",
+    "description": "Removes a player from the shared Blackjack table after the current round.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "player_id": {
+                "type": "INTEGER",
+                "description": "The unique ID of the player leaving the table.",
+            }
+        },
+        "required": ["player_id"],
+    },
+}
+
+
+def deal_round(table_id: str):
+    """
+    Starts a round: deals two cards to every seat in turn order and two to
+    the dealer (one face-down) from the table's shoe.
+
+    Args:
+        table_id (str): The ID of the table.
+
+    Returns:
+        dict: Every seat's hand, the dealer's face-up card and whose turn it is.
+    """
+    table = _get_table(table_id)
+    if table["round_open"]:
+        raise ValueError(f"A round is already in progress at table_id: {table_id}")
+    if not table["seats"]:
+        raise ValueError(f"No players are seated at table_id: {table_id}")
+
+    cards_needed = 2 * (len(table["seats"]) + 1)
+    dealt = SHOE_DECKS * 52 - len(table["shoe"])
+    if dealt >= CUT_CARD * SHOE_DECKS * 52 or len(table["shoe"]) < cards_needed * 3:
+        table["shoe"] = create_shoe()
+
+    shoe = table["shoe"]
+    order = table["turn_order"]
+
+    for player_id in order:
+        seat = table["seats"][player_id]
+        seat["hand"] = []
+        seat["done"] = False
+
+    # Deal like a real table: one card to every seat then the dealer, twice
+    dealer_hand: List[str] = []
+    for _ in range(2):
+        for player_id in order:
+            table["seats"][player_id]["hand"].append(shoe.pop())
+        dealer_hand.append(shoe.pop())
+
+    # A natural blackjack has nothing left to play
+    for player_id in order:
+        seat = table["seats"][player_id]
+        seat["done"] = hand_value(seat["hand"])["total"] == 21
+
+    table["dealer_hand"] = dealer_hand
+    table["round_open"] = True
+    table["dealer_played"] = False
+    table["turn"] = 0
+    _advance_turn(table)
+
+    return {
+        "hands": [
+            {"player_id": player_id, "hand": table["seats"][player_id]["hand"]}
+            for player_id in order
+        ],
+        "dealer_face_up": dealer_hand[1],  # Second card is face-up
+        "turn": _current_player(table),
+    }
+
+
+tool_deal_round = {
+    "name": "deal_round",
+    "description": "Starts a round at the shared Blackjack table. Deals two cards to every seated player in turn order and two cards to the dealer (one face-down).",
+}
+
+
+def table_hit(table_id: str, player_id: int):
+    """
+    Draws a card for the player whose turn it is.
+
+    Args:
+        table_id (str): The ID of the table.
+        player_id (int): The ID of the player hitting.
+
+    Returns:
+        dict: The drawn card, the player's hand and total, and whose turn it is.
+    """
+    table = _get_table(table_id)
+    if _current_player(table) != player_id:
+        raise ValueError(
+            f"It is not the turn of player_id: {player_id}, "
+            f"it is the turn of player_id: {_current_player(table)}"
+        )
+
+    seat = table["seats"][player_id]
+    card = table["shoe"].pop()
+    seat["hand"].append(card)
+
+    total = hand_value(seat["hand"])["total"]
+    if total >= 21:
+        seat["done"] = True
+        _advance_turn(table)
+
+    return {
+        "card": card,
+        "hand": seat["hand"],
+        "total": total,
+        "turn": _current_player(table),
+    }
+
+
+tool_table_hit = {
+    "name": "table_hit",
+    "description": "Draws a card for the seated player whose turn it is. The turn passes on automatically when the player busts or reaches 21.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "player_id": {
+                "type": "INTEGER",
+                "description": "The unique ID of the player whose turn it is.",
+            }
+        },
+        "required": ["player_id"],
+    },
+}
+
+
+def table_stand(table_id: str, player_id: int):
+    """
+    Ends the turn of the player whose turn it is.
+
+    Args:
+        table_id (str): The ID of the table.
+        player_id (int): The ID of the player standing.
+
+    Returns:
+        dict: Whose turn it is next, None once every seat has played.
+    """
+    table = _get_table(table_id)
+    if _current_player(table) != player_id:
+        raise ValueError(f"It is not the turn of player_id: {player_id}")
+
+    table["seats"][player_id]["done"] = True
+    _advance_turn(table)
+
+    return {"turn": _current_player(table)}
+
+
+tool_table_stand = {
+    "name": "table_stand",
+    "description": "The seated player whose turn it is stands, passing the turn to the next player or to the dealer.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "player_id": {
+                "type": "INTEGER",
+                "description": "The unique ID of the player whose turn it is.",
+            }
+        },
+        "required": ["player_id"],
+    },
+}
+
+
+def table_dealer_turn(table_id: str) -> List[str]:
+    """
+    Plays the dealer's hand once for the whole table, hitting until 17 or higher.
+
+    Args:
+        table_id (str): The ID of the table.
+
+    Returns:
+        list: Final dealer hand after the turn.
+    """
+    table = _get_table(table_id)
+    if not table["round_open"]:
+        raise ValueError(f"No round is in progress at table_id: {table_id}")
+    if _current_player(table) is not None:
+        raise ValueError(
+            f"player_id: {_current_player(table)} has not finished their turn"
+        )
+
+    dealer_hand = table["dealer_hand"]
+    if not table["dealer_played"]:
+        while hand_value(dealer_hand)["total"] < 17:
+            dealer_hand.append(table["shoe"].pop())
+        table["dealer_played"] = True
+
+    return dealer_hand
+
+
+tool_table_dealer_turn = {
+    "name": "table_dealer_turn",
+    "description": "Executes the dealer's turn once for the whole table after every seated player has played, hitting until the dealer stands (17 or higher).",
+}
+
+
+class SeatResult(GameStateResult):
+    player_id: int
+
+
+def check_table_status(table_id: str) -> List[SeatResult]:
+    """
+    Settles every seat against the dealer in one pass and closes the round.
+
+    Args:
+        table_id (str): The ID of the table.
+
+    Returns:
+        list: The game state and amount of every seat, in turn order.
+    """
+    table = _get_table(table_id)
+    if not table["round_open"]:
+        raise ValueError(f"No round is in progress at table_id: {table_id}")
+
+    seats = [table["seats"][player_id] for player_id in table["turn_order"]]
+    everyone_bust = all(hand_value(seat["hand"])["total"] > 21 for seat in seats)
+    if not table["dealer_played"] and not everyone_bust:
+        raise ValueError(f"The dealer has not played yet at table_id: {table_id}")
+
+    dealer_hand = table["dealer_hand"]
+    results: List[SeatResult] = [
+        {
+            "player_id": seat["player_id"],
+            **settle_hand(seat["hand"], dealer_hand, seat["bet_amount"]),
+        }
+        for seat in seats
+    ]
+
+    table["round_open"] = False
+    return results
+
+
+tool_check_table_status = {
+    "name": "check_table_status",
+    "description": "Settles the round for every seated player at once against the dealer's final hand, returning each player's result (win/loss/tie) and amount.",
+}
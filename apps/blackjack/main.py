@@ -1,15 +1,11 @@
 import asyncio
 import logging
 import os
-from typing import Awaitable, Callable
+import time
+from typing import Awaitable, Callable, Hashable, Optional, Set
 
 from ai01.agent import Agent, AgentOptions, AgentsEvents
 from ai01.providers._api import ToolCallData, ToolResponseData
-from ai01.providers.gemini.gemini_realtime import (
-    GeminiConfig,
-    GeminiOptions,
-    GeminiRealtime,
-)
 from ai01.providers.openai import AudioTrack
 from ai01.rtc import (
     HuddleClientOptions,
@@ -21,21 +17,22 @@ from ai01.rtc import (
 )
 from dotenv import load_dotenv
 
-from apps.blackjack.functions.main import (
-    calculate_hand_value,
-    check_game_status,
-    create_game_session_and_deal_initial_cards,
-    dealer_turn,
-    hit,
-    tool_calculate_hand_value,
-    tool_check_game_status,
-    tool_create_game_session_and_deal_initial_cards,
-    tool_dealer_turn,
-    tool_hit,
-)
-from apps.blackjack.prompt import bot_prompt
-
-# from ai01.providers.openai.realtime import RealTimeModel, RealTimeModelOptions
+from apps.blackjack.functions.journal import game_journal
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.functions.table import table_map
+from apps.blackjack.rooms import configure, resume_summary
+from apps.shared.admission import AdmissionPolicy
+from apps.shared.audio import AudioMixer, HeldTrack
+from apps.shared.http import HttpServer
+from apps.shared.lifecycle import aclose, lifecycle
+from apps.shared.loop import LoopOptions, run
+from apps.shared.metrics import metrics, room_events
+from apps.shared.profiling import memory_profiler
+from apps.shared.ratelimit import tool_call_limiter
+from apps.shared.realtime import LatencySelector, ResumableSession, create_backends
+from apps.shared.recorder import trace_recorder
+from apps.shared.tools import ToolRegistry, tool_call_seconds
 
 load_dotenv()
 
@@ -44,280 +41,368 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("Chatbot")
 
 
-async def main():
-    try:
-        # Huddle01 API Key
-        huddle01_api_key = os.getenv("HUDDLE01_API_KEY")
-
-        # Huddle01 Project ID
-        huddle01_project_id = os.getenv("HUDDLE01_PROJECT_ID")
-
-        # gemini API Key
-        gemini_api_key = os.getenv("GEMINI_API_KEY")
-
-        # OpenAI API Key
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-
-        # Room ID
-        room_id = os.getenv("ROOM_ID")
-
-        if (
-            not huddle01_api_key
-            or not huddle01_project_id
-            or not gemini_api_key
-            or not openai_api_key
-            or not room_id
-        ):
-            raise ValueError("Required Environment Variables are not set")
-
-        # RTCOptions is the configuration for the RTC
-        rtcOptions = RTCOptions(
-            api_key=huddle01_api_key,
-            project_id=huddle01_project_id,
-            room_id=room_id,
-            role=Role.HOST,
-            metadata={"displayName": "BlackJack Dealer: Jack"},
-            huddle_client_options=HuddleClientOptions(
-                autoConsume=False, volatileMessaging=False
-            ),
-        )
-
-        # Agent is the Peer which is going to connect to the Room
-        agent = Agent(
-            options=AgentOptions(rtc_options=rtcOptions, audio_track=AudioTrack()),
+async def open_room(
+    room_id: str,
+    tools: ToolRegistry,
+    instructions: str,
+    players: Optional[Set[Hashable]] = None,
+) -> Callable[[], Awaitable[None]]:
+    """
+    Joins a room as the dealer and connects the realtime model to it.
+
+    Args:
+        room_id (str): The Huddle01 room to join.
+        tools (ToolRegistry): The tools of the game mode.
+        instructions (str): The system prompt of the game mode.
+        players (set): Collects the player_id of every tool call, the
+            sessions that belong to this room.
+
+    Returns:
+        Callable: Leaves the room and closes its connections.
+    """
+    # Huddle01 API Key
+    huddle01_api_key = os.getenv("HUDDLE01_API_KEY")
+
+    # Huddle01 Project ID
+    huddle01_project_id = os.getenv("HUDDLE01_PROJECT_ID")
+
+    # gemini API Key
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+
+    # OpenAI API Key
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    # Realtime provider: gemini, openai, auto (fastest healthy) or fake
+    realtime_provider = os.getenv("REALTIME_PROVIDER", "gemini")
+
+    if not huddle01_api_key or not huddle01_project_id:
+        raise ValueError("Required Environment Variables are not set")
+
+    def seated(peer_id: str) -> bool:
+        # Players with a seat at the room's table, or a game session
+        player_id = admission.peer_sessions.get(peer_id)
+        if player_id is None:
+            return False
+        table = table_map.get(room_id)
+        return player_id in (table["seats"] if table else game_state_map)
+
+    # Decides which audio producers are consumed and streamed to the model,
+    # seated players first
+    admission = AdmissionPolicy(
+        max_tracks=int(os.getenv("MAX_AUDIO_TRACKS", "4")),
+        idle_timeout=float(os.getenv("AUDIO_IDLE_TIMEOUT", "10")),
+        priority=seated,
+    )
+
+    # VAD gates every consumed track and mixes the speakers into one stream
+    mixer = AudioMixer(on_level=admission.observe)
+
+    # Selector choosing the realtime provider for this room
+    selector = LatencySelector(
+        create_backends(
+            realtime_provider,
+            gemini_api_key=gemini_api_key,
+            openai_api_key=openai_api_key,
         )
+    )
+    await selector.probe()
+
+    # RTCOptions is the configuration for the RTC
+    rtcOptions = RTCOptions(
+        api_key=huddle01_api_key,
+        project_id=huddle01_project_id,
+        room_id=room_id,
+        role=Role.HOST,
+        metadata={"displayName": "BlackJack Dealer: Jack"},
+        huddle_client_options=HuddleClientOptions(
+            autoConsume=False, volatileMessaging=False
+        ),
+    )
+
+    # Agent is the Peer which is going to connect to the Room
+    agent = Agent(
+        options=AgentOptions(rtc_options=rtcOptions, audio_track=AudioTrack()),
+    )
+
+    # Reconnects the model when its socket drops, holding the room's audio
+    # and telling the new connection where the game is
+    session = ResumableSession(
+        selector,
+        agent,
+        instructions,
+        tools,
+        HeldTrack(mixer.track, frames=int(os.getenv("RESUME_AUDIO_FRAMES", "250"))),
+        summary=lambda: resume_summary(room_id, players),
+        backoff=float(os.getenv("RESUME_BACKOFF", "0.5")),
+        max_backoff=float(os.getenv("RESUME_MAX_BACKOFF", "10")),
+    )
+
+    # RealTimeModel is the Model which is going to be used by the Agent
+    session.create()
+
+    # Join the dRTC Network, which creates a Room instance for the Agent to Join.
+    room = await agent.join()
+
+    # Room Events
+    @room.on(RoomEvents.RoomJoined)
+    def on_room_joined():
+        logger.info("Room Joined")
+        room_events.labels("room_joined").inc()
+
+    # @room.on(RoomEvents.NewPeerJoined)
+    # def on_new_remote_peer(data: RoomEventsData.NewPeerJoined):
+    #     logger.info(f"New Remote Peer: {data['remote_peer']}")
+
+    # @room.on(RoomEvents.RemotePeerLeft)
+    # def on_peer_left(data: RoomEventsData.RemotePeerLeft):
+    #     logger.info(f"Peer Left: {data['remote_peer_id']}")
+
+    # @room.on(RoomEvents.RoomClosed)
+    # def on_room_closed(data: RoomEventsData.RoomClosed):
+    #     logger.info("Room Closed")
+
+    @room.on(RoomEvents.RemoteProducerAdded)
+    def on_remote_producer_added(data: RoomEventsData.RemoteProducerAdded):
+        logger.info(f"Remote Producer Added: {data['producer_id']}")
+        room_events.labels("remote_producer_added").inc()
+        if not lifecycle.accepting:
+            return
+        if data["label"] == "audio" and admission.should_consume(
+            data["remote_peer_id"], data["producer_id"]
+        ):
+            asyncio.create_task(
+                agent.rtc.consume(
+                    peer_id=data["remote_peer_id"], producer_id=data["producer_id"]
+                )
+            )
 
-        # RealTimeModel is the Model which is going to be used by the Agent
-        # llm = RealTimeModel(
-        #     agent=agent,
-        #     options=RealTimeModelOptions(
-        #         oai_api_key=openai_api_key,
-        #         instructions=bot_prompt,
-        #         function_declaration=[
-        #             tool_hit,
-        #             tool_dealer_turn,
-        #             tool_calculate_hand_value,
-        #             tool_check_game_status,
-        #             tool_create_game_session_and_deal_initial_cards,
-        #         ],
-        #     ),
-        # )
-
-        llm = GeminiRealtime(
-            agent=agent,
-            options=GeminiOptions(
-                gemini_api_key=gemini_api_key,
-                system_instruction=bot_prompt,
-                config=GeminiConfig(
-                    function_declaration=[
-                        tool_hit,
-                        tool_dealer_turn,
-                        tool_calculate_hand_value,
-                        tool_check_game_status,
-                        tool_create_game_session_and_deal_initial_cards,
-                    ],
-                ),
-            ),
+    # @room.on(RoomEvents.RemoteProducerClosed)
+    # def on_remote_producer_closed(data: RoomEventsData.RemoteProducerClosed):
+    #     logger.info(f"Remote Producer Closed: {data['producer_id']}")
+
+    @room.on(RoomEvents.NewConsumerAdded)
+    def on_remote_consumer_added(data: RoomEventsData.NewConsumerAdded):
+        logger.info(f"Remote Consumer Added: {data}")
+        room_events.labels("consumer_added").inc()
+        if not lifecycle.accepting:
+            return
+
+        if data["kind"] == "audio":
+            consumer = data["consumer"]
+            track = consumer.track
+
+            if track is None:
+                logger.error("Consumer Track is None, This should never happen.")
+                return
+
+            admission.admit(
+                data["consumer_id"],
+                admission.peer_for_producer(getattr(consumer, "producerId", None)),
+                consumer,
+            )
+            mixer.add_track(data["consumer_id"], track)
+
+    @room.on(RoomEvents.ConsumerClosed)
+    def on_remote_consumer_closed(data: RoomEventsData.ConsumerClosed):
+        logger.info(f"Remote Consumer Closed: {data['consumer_id']}")
+        room_events.labels("consumer_closed").inc()
+        admission.remove(data["consumer_id"])
+        mixer.remove_track(data["consumer_id"])
+
+    # @room.on(RoomEvents.ConsumerPaused)
+    # def on_remote_consumer_paused(data: RoomEventsData.ConsumerPaused):
+    #     logger.info(f"Remote Consumer Paused: {data['consumer_id']}")
+
+    # @room.on(RoomEvents.ConsumerResumed)
+    # def on_remote_consumer_resumed(data: RoomEventsData.ConsumerResumed):
+    #     logger.info(f"Remote Consumer Resumed: {data['consumer_id']}")
+
+    # # Agent Events
+    @agent.on(AgentsEvents.Connected)
+    def on_agent_connected():
+        logger.info("Agent Connected")
+        room_events.labels("agent_connected").inc()
+        trace_recorder.event(room_id, "agent_connected")
+
+    @agent.on(AgentsEvents.Disconnected)
+    def on_agent_disconnected():
+        logger.info("Agent Disconnected")
+        room_events.labels("agent_disconnected").inc()
+        trace_recorder.event(room_id, "agent_disconnected")
+        if lifecycle.accepting:
+            session.dropped()
+
+    @agent.on(AgentsEvents.Speaking)
+    def on_agent_speaking():
+        logger.info("Agent Speaking")
+        room_events.labels("agent_speaking").inc()
+        trace_recorder.event(room_id, "agent_speaking")
+        session.speaking()
+
+    @agent.on(AgentsEvents.Listening)
+    def on_agent_listening():
+        logger.info("Agent Listening")
+        room_events.labels("agent_listening").inc()
+        trace_recorder.event(room_id, "agent_listening")
+
+    @agent.on(AgentsEvents.Thinking)
+    def on_agent_thinking():
+        logger.info("Agent Thinking")
+        room_events.labels("agent_thinking").inc()
+        trace_recorder.event(room_id, "agent_thinking")
+
+    @agent.on(AgentsEvents.ToolCall)
+    async def on_tool_call(
+        callback: Callable[[ToolResponseData], Awaitable[None]],
+        tool_call: ToolCallData,
+    ):
+        logger.debug(f"Tool Call: {tool_call}")
+
+        start = time.perf_counter()
+
+        # The key the tools store the player under, e.g. 2 for "2"
+        player_id = tools.argument(
+            tool_call.function_name, tool_call.arguments, "player_id"
         )
-
-        # Join the dRTC Network, which creates a Room instance for the Agent to Join.
-        room = await agent.join()
-
-        # Room Events
-        @room.on(RoomEvents.RoomJoined)
-        def on_room_joined():
-            logger.info("Room Joined")
-
-        # @room.on(RoomEvents.NewPeerJoined)
-        # def on_new_remote_peer(data: RoomEventsData.NewPeerJoined):
-        #     logger.info(f"New Remote Peer: {data['remote_peer']}")
-
-        # @room.on(RoomEvents.RemotePeerLeft)
-        # def on_peer_left(data: RoomEventsData.RemotePeerLeft):
-        #     logger.info(f"Peer Left: {data['remote_peer_id']}")
-
-        # @room.on(RoomEvents.RoomClosed)
-        # def on_room_closed(data: RoomEventsData.RoomClosed):
-        #     logger.info("Room Closed")
-
-        @room.on(RoomEvents.RemoteProducerAdded)
-        def on_remote_producer_added(data: RoomEventsData.RemoteProducerAdded):
-            logger.info(f"Remote Producer Added: {data['producer_id']}")
-            if data["label"] == "audio":
-                asyncio.create_task(
-                    agent.rtc.consume(
-                        peer_id=data["remote_peer_id"], producer_id=data["producer_id"]
-                    )
+        if player_id is not None:
+            admission.attribute(player_id)
+            if players is not None:
+                players.add(player_id)
+
+        async with lifecycle.in_flight(), tool_call_limiter.slot(room_id) as result:
+            # A full queue or a call over its rate gets a slow down result
+            result = result or tool_call_limiter.take(room_id, tool_call.function_name)
+            if result is None:
+                result = tools.dispatch(
+                    tool_call.function_name, tool_call.arguments, table_id=room_id
                 )
+            response = ToolResponseData(result=result, end_of_turn=True)
 
-        # @room.on(RoomEvents.RemoteProducerClosed)
-        # def on_remote_producer_closed(data: RoomEventsData.RemoteProducerClosed):
-        #     logger.info(f"Remote Producer Closed: {data['producer_id']}")
-
-        @room.on(RoomEvents.NewConsumerAdded)
-        def on_remote_consumer_added(data: RoomEventsData.NewConsumerAdded):
-            logger.info(f"Remote Consumer Added: {data}")
-
-            if data["kind"] == "audio":
-                track = data["consumer"].track
+            logger.debug(f"Tool Response: {response}")
+            await callback(response)
+            session.responded()
 
-                if track is None:
-                    logger.error("Consumer Track is None, This should never happen.")
-                    return
+        elapsed = time.perf_counter() - start
+        tool_call_seconds.labels(tool_call.function_name).observe(elapsed)
+        trace_recorder.tool_call(
+            room_id, tool_call.function_name, tool_call.arguments, result, elapsed
+        )
 
-                llm.conversation.add_track(data["consumer_id"], track)
+    # Connect to the LLM to the Room, failing over to the next provider. The
+    # model hears a single mixed stream of the speaking participants
+    await session.connect()
 
-        # @room.on(RoomEvents.ConsumerClosed)
-        # def on_remote_consumer_closed(data: RoomEventsData.ConsumerClosed):
-        #     logger.info(f"Remote Consumer Closed: {data['consumer_id']}")
+    # Connect the Agent to the Room
+    await agent.connect()
 
-        # @room.on(RoomEvents.ConsumerPaused)
-        # def on_remote_consumer_paused(data: RoomEventsData.ConsumerPaused):
-        #     logger.info(f"Remote Consumer Paused: {data['consumer_id']}")
+    if agent.audio_track is not None:
+        await agent.rtc.produce(
+            options=ProduceOptions(
+                label="audio",
+                track=agent.audio_track,
+            )
+        )
 
-        # @room.on(RoomEvents.ConsumerResumed)
-        # def on_remote_consumer_resumed(data: RoomEventsData.ConsumerResumed):
-        #     logger.info(f"Remote Consumer Resumed: {data['consumer_id']}")
+    # Rotate live audio slots between speakers
+    admission_task = asyncio.create_task(admission.run())
 
-        # # Agent Events
-        @agent.on(AgentsEvents.Connected)
-        def on_agent_connected():
-            logger.info("Agent Connected")
+    # What the room holds, for memory reports
+    memory_profiler.account(
+        f"room {room_id}",
+        lambda: {
+            "sessions": sum(
+                player_id in game_state_map
+                for player_id in (game_state_map if players is None else players)
+            ),
+            "consumers": len(admission.slots),
+            "audio inputs": len(mixer.inputs),
+            "held frames": len(session.track.frames),
+        },
+    )
 
-        @agent.on(AgentsEvents.Disconnected)
-        def on_agent_disconnected():
-            logger.info("Agent Disconnected")
+    # @agent.on(RoomEvents.NewDataMessage)
+    # def on_new_data_message(data: AgentEvent.NewDataMessage):
+    #     print(f"New Data Message: {data['peer_id']} - {data['message']}")
 
-        @agent.on(AgentsEvents.Speaking)
-        def on_agent_speaking():
-            logger.info("Agent Speaking")
+    async def close():
+        admission_task.cancel()
+        memory_profiler.forget(f"room {room_id}")
+        mixer.stop()
+        logger.info(f"Realtime session: {session.stats()}")
+        await session.close()
+        await aclose(agent)
 
-        @agent.on(AgentsEvents.Listening)
-        def on_agent_listening():
-            logger.info("Agent Listening")
+    return close
 
-        @agent.on(AgentsEvents.Thinking)
-        def on_agent_thinking():
-            logger.info("Agent Thinking")
 
-        @agent.on(AgentsEvents.ToolCall)
-        async def on_tool_call(
-            callback: Callable[[ToolResponseData], Awaitable[None]],
-            tool_call: ToolCallData,
-        ):
-            logger.info(f"Tool Call: {tool_call}")
-
-            name = tool_call.function_name
-            args = tool_call.arguments
-
-            response = ToolResponseData(result={}, end_of_turn=True)
-
-            if name == "create_game_session_and_deal_initial_cards":
-                if not args or "player_id" not in args or "bet_amount" not in args:
-                    logger.error(
-                        "Missing required parameters 'player_id' and 'bet_amount'"
-                    )
-                    response.result = {
-                        "error": "Missing required parameters 'player_id' and 'bet_amount'"
-                    }
-                else:
-                    player_id = args["player_id"]
-                    bet_amount = args["bet_amount"]
-                    initial_state = create_game_session_and_deal_initial_cards(
-                        player_id, bet_amount
-                    )
-                    response.result = initial_state
-
-            elif name == "hit":
-                if not args or "player_id" not in args or "recipient" not in args:
-                    logger.error(
-                        "Missing required parameters 'player_id' and 'recipient'"
-                    )
-                    response.result = {
-                        "error": "Missing required parameters 'player_id' and 'recipient'"
-                    }
-                else:
-                    player_id = args["player_id"]
-                    recipient = args["recipient"]
-                    hit_response = {
-                        "card": hit(player_id, recipient),
-                        "recipient": recipient,
-                    }
-                    response.result = hit_response
-
-            elif name == "calculate_hand_value":
-                if not args or "player_id" not in args or "recipient" not in args:
-                    logger.error(
-                        "Missing required parameters 'player_id' and 'recipient'"
-                    )
-                    response.result = {
-                        "error": "Missing required parameters 'player_id' and 'recipient'"
-                    }
-                else:
-                    player_id = args["player_id"]
-                    recipient = args["recipient"]
-                    hand_value = calculate_hand_value(player_id, recipient)
-                    response.result = {"output": hand_value}
-
-            elif name == "dealer_turn":
-                if not args or "player_id" not in args:
-                    logger.error("Missing required parameter 'player_id'")
-                    response.result = {
-                        "error": "Missing required parameter 'player_id'"
-                    }
-                else:
-                    player_id = args["player_id"]
-                    dealer_hand = {"dealer_hand": dealer_turn(player_id)}
-                    response.result = dealer_hand
-
-            elif name == "check_game_status":
-                if not args or "player_id" not in args:
-                    logger.error("Missing required parameter 'player_id'")
-                    response.result = {
-                        "error": "Missing required parameter 'player_id'"
-                    }
-                else:
-                    player_id = args["player_id"]
-                    game_status = {"game_state": check_game_status(player_id)}
-                    response.result = game_status
-
-            else:
-                logger.error(f"Unknown function name: {name}")
-                response.result = {"error": f"Unknown function name: {name}"}
-
-            logger.info(f"Tool Response: {response}")
-            await callback(response)
-
-        # Connect to the LLM to the Room
-        await llm.connect()
-
-        # Connect the Agent to the Room
-        await agent.connect()
+async def main():
+    try:
+        # Room ID
+        room_id = os.getenv("ROOM_ID")
 
-        if agent.audio_track is not None:
-            await agent.rtc.produce(
-                options=ProduceOptions(
-                    label="audio",
-                    track=agent.audio_track,
-                )
-            )
+        if not room_id:
+            raise ValueError("Required Environment Variables are not set")
 
-        # @agent.on(RoomEvents.NewDataMessage)
-        # def on_new_data_message(data: AgentEvent.NewDataMessage):
-        #     print(f"New Data Message: {data['peer_id']} - {data['message']}")
+        _, tools, instructions, store = configure()
+
+        # Seconds to let in-flight tool calls and hands finish on shutdown
+        lifecycle.drain_timeout = float(os.getenv("DRAIN_TIMEOUT", "30"))
+        lifecycle.install_signal_handlers()
+
+        # Liveness and readiness endpoints polled by the orchestrator, and
+        # the metrics scraped by Prometheus
+        health_server = HttpServer(port=int(os.getenv("HEALTH_PORT", "8080")))
+        lifecycle.register_routes(health_server)
+        metrics.register_routes(health_server)
+
+        # Memory reports on /debug/memory and SIGUSR1: off, on, or trace to
+        # also attribute allocations from startup
+        memory_profile = os.getenv("MEMORY_PROFILE", "off")
+        if memory_profile != "off":
+            memory_profiler.register_routes(health_server)
+            memory_profiler.install_signal_handler()
+        if memory_profile == "trace":
+            memory_profiler.start(int(os.getenv("MEMORY_PROFILE_FRAMES", "1")))
+
+        await health_server.start()
+
+        close_room = await open_room(room_id, tools, instructions)
+        ledger_task = asyncio.create_task(ledger.run())
+        monitor_task = asyncio.create_task(metrics.monitor())
+
+        # Shutdown order: flush state, then close the LLM, RTC and health server
+        lifecycle.on_shutdown(monitor_task.cancel)
+        lifecycle.on_shutdown(ledger_task.cancel)
+        lifecycle.on_shutdown(ledger.commit)
+        lifecycle.on_shutdown(store.flush)
+        lifecycle.on_shutdown(game_journal.close)
+        lifecycle.on_shutdown(close_room)
+        lifecycle.on_shutdown(trace_recorder.stop)
+        lifecycle.on_shutdown(health_server.close)
+        lifecycle.on_shutdown(lambda: logger.info(f"Tool cache: {tools.cache_stats()}"))
+        lifecycle.on_shutdown(
+            lambda: logger.info(f"Tool calls: {tool_call_limiter.stats()}")
+        )
+        lifecycle.mark_ready()
 
-        # Force the program to run indefinitely
-        try:
-            await asyncio.Future()
-        except KeyboardInterrupt:
-            logger.info("Exiting...")
+        # Run until SIGTERM/SIGINT, then drain in-flight work and shut down
+        await lifecycle.run_until_stopped()
 
     except KeyboardInterrupt:
         print("Exiting...")
 
     except Exception as e:
-        print(e)
+        logger.exception(e)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Event loop: asyncio or uvloop, threads of the default executor (0 for
+    # asyncio's default), and eager task starts on Python 3.12+
+    run(
+        main(),
+        LoopOptions(
+            loop=os.getenv("EVENT_LOOP", "asyncio"),
+            executor_workers=int(os.getenv("EXECUTOR_WORKERS", "0")) or None,
+            eager_tasks=os.getenv("EAGER_TASKS") == "1",
+        ),
+    )
@@ -0,0 +1,339 @@
+import asyncio
+import os
+import pickle
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from apps.blackjack.functions.journal import game_journal
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import game_state_map, hand_value
+from apps.blackjack.functions.table import table_map
+from apps.blackjack.prompt import bot_prompt, table_prompt
+from apps.blackjack.tools import enable_suggest_action, registry, table_registry
+from apps.shared.metrics import Family, gauge, metrics
+from apps.shared.profiling import memory_profiler
+from apps.shared.ratelimit import tool_call_limiter
+from apps.shared.recorder import trace_recorder
+from apps.shared.store import MemoryStore
+from apps.shared.tools import ToolRegistry
+
+
+def state_path(variable: str, worker: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the path in an environment variable, suffixed with the worker's
+    name when rooms are sharded, so workers never share a file.
+    """
+    path = os.getenv(variable)
+    if path and worker:
+        return f"{path}.{worker}"
+    return path
+
+
+def configure(
+    worker: Optional[str] = None,
+) -> Tuple[str, ToolRegistry, str, MemoryStore]:
+    """
+    Sets up the state every room of the process shares: the game mode, its
+    tools and session store, the journal and the ledger.
+
+    Args:
+        worker (str): The worker's name when rooms are sharded.
+
+    Returns:
+        tuple: The game mode, tool registry, instructions and session store.
+    """
+    # Game mode: single (one hand per player) or table (shared shoe and dealer)
+    blackjack_mode = os.getenv("BLACKJACK_MODE", "single")
+
+    if blackjack_mode == "table":
+        tools, instructions, store = table_registry, table_prompt, table_map
+    elif blackjack_mode == "single":
+        tools, instructions, store = registry, bot_prompt, game_state_map
+    else:
+        raise ValueError(f"Unknown BLACKJACK_MODE: {blackjack_mode}")
+
+    # Lets players ask the dealer whether to hit or stand
+    if blackjack_mode == "single" and os.getenv("SUGGEST_ACTION") == "1":
+        enable_suggest_action()
+
+    # Tool response schema: full, or compact to trim redundant nesting
+    tools.compact = os.getenv("TOOL_RESPONSE_SCHEMA", "full") == "compact"
+
+    # Tool calls per second and burst, per room and per tool of a room, and
+    # calls queued per room, beyond which the model is told to slow down
+    tool_call_limiter.rate = float(os.getenv("TOOL_CALL_RATE", "5"))
+    tool_call_limiter.burst = float(os.getenv("TOOL_CALL_BURST", "10"))
+    tool_call_limiter.tool_rate = float(os.getenv("TOOL_CALL_RATE_PER_TOOL", "2"))
+    tool_call_limiter.tool_burst = float(os.getenv("TOOL_CALL_BURST_PER_TOOL", "5"))
+    tool_call_limiter.max_pending = int(os.getenv("TOOL_CALL_QUEUE", "4"))
+
+    # State survives a restart when a store path is configured
+    store.path = state_path("SESSION_STORE_PATH", worker)
+    store.load()
+
+    # Journal of every deal, hit and payout, for disputes and for
+    # rebuilding the hands in play after a crash
+    journal_path = state_path("GAME_JOURNAL_PATH", worker)
+    if journal_path and blackjack_mode == "single":
+        game_journal.open(journal_path, game_state_map)
+        game_journal.recover()
+
+    # Sessions shared by the agent processes of the host, so a player
+    # reconnecting through another process continues their hand
+    shared_store = os.getenv("SHARED_SESSION_STORE")
+    if shared_store and blackjack_mode == "single":
+        game_state_map.share(
+            shared_store,
+            slots=int(os.getenv("SHARED_STORE_SLOTS", "65536")),
+            slot_size=int(os.getenv("SHARED_STORE_SLOT_SIZE", "2048")),
+        )
+        tools.store = game_state_map
+
+    # Player balances, group committed to disk when a path is configured
+    ledger.path = state_path("LEDGER_PATH", worker)
+    ledger.starting_balance = float(os.getenv("STARTING_BALANCE", "1000"))
+    ledger.load()
+
+    # Every tool call and agent event, for quality review and replay in the
+    # offline harness, in segments rotated by compressed size and age
+    trace_dir = os.getenv("TRACE_DIR")
+    if trace_dir:
+        trace_recorder.segment_bytes = int(os.getenv("TRACE_SEGMENT_MB", "64")) << 20
+        trace_recorder.segment_seconds = float(
+            os.getenv("TRACE_SEGMENT_SECONDS", "3600")
+        )
+        trace_recorder.start(trace_dir, prefix=worker or "blackjack")
+
+    # Served on /metrics, read from the stores and counters on each scrape
+    metrics.collector(
+        lambda: [
+            gauge("agent_sessions", "Single player game sessions", len(game_state_map)),
+            gauge("agent_tables", "Shared blackjack tables", len(table_map)),
+        ]
+    )
+    metrics.collector(tools.collect)
+    metrics.collector(tool_call_limiter.collect)
+    metrics.collector(trace_recorder.collect)
+
+    # What the process holds across rooms, for memory reports
+    memory_profiler.account(
+        "stores",
+        lambda: {
+            "sessions": len(game_state_map),
+            "cards in decks": sum(
+                len(game_state["deck"]) for game_state in game_state_map.values()
+            ),
+            "tables": len(table_map),
+            "tool cache sessions": tools.cache_stats()["sessions"],
+            "rate limited rooms": len(tool_call_limiter.rooms),
+            "ledger accounts": len(ledger.accounts),
+            "ledger postings": ledger.count,
+        },
+    )
+
+    return blackjack_mode, tools, instructions, store
+
+
+def resume_summary(room_id: str, players: Optional[Set[Hashable]] = None) -> str:
+    """
+    Describes the hands in play in a room, for a realtime model resuming a
+    dropped session to carry on from.
+
+    Args:
+        room_id (str): The room, whose table is described in table mode.
+        players (set): The players of the room in single mode, every player
+            with a session when the process hosts a single room.
+
+    Returns:
+        str: One line per hand, or an empty string when nothing is in play.
+    """
+    table = table_map.get(room_id)
+    if table:
+        lines = []
+        order = table["turn_order"]
+        for player_id in order:
+            seat = table["seats"][player_id]
+            lines.append(
+                f"- Player {player_id}: bet {seat['bet_amount']}, "
+                f"{_hand(seat['hand'])}" + (", done" if seat["done"] else "")
+            )
+        if table["round_open"] and table["turn"] < len(order):
+            lines.append(
+                f"- Dealer shows {table['dealer_hand'][1]}; "
+                f"player {order[table['turn']]} to act"
+            )
+        elif table["round_open"]:
+            lines.append(f"- Dealer shows {table['dealer_hand'][1]}; dealer to play")
+        else:
+            lines.append("- No round in progress")
+        return "\n".join(lines)
+
+    lines = []
+    for player_id in game_state_map if players is None else players:
+        game_state = game_state_map.get(player_id)
+        if not game_state or not game_state["player_hand"]:
+            continue
+        if ledger.open_bets.get(player_id) is None:
+            stage = "hand settled, waiting for the next bet"
+        elif hand_value(game_state["player_hand"])["total"] > 21:
+            stage = "player bust, to be settled"
+        else:
+            stage = "player to hit or stand"
+        lines.append(
+            f"- Player {player_id}: balance {ledger.balance(player_id)}, bet "
+            f"{game_state['bet_amount']}, {_hand(game_state['player_hand'])}, "
+            f"dealer shows {game_state['dealer_hand'][1]}; {stage}"
+        )
+    return "\n".join(lines)
+
+
+def _hand(cards: List[str]) -> str:
+    if not cards:
+        return "no cards"
+    return f"hand {', '.join(cards)} ({hand_value(cards)['total']})"
+
+
+class Rooms:
+    """
+    Room host of a sharded deployment, one per worker process, e.g.
+
+        python -m apps.shared.sharding apps.blackjack.rooms:Rooms
+
+    A room's state is its table in table mode, or the sessions of the
+    players seen in its tool calls in single mode, along with their
+    bankrolls. `close` hands the state to the coordinator and drops it from
+    this worker, and `open` restores it on the room's next worker.
+    """
+
+    def __init__(self, worker: str):
+        self.worker = worker
+        self.closers: Dict[str, Callable[[], Awaitable[None]]] = {}
+        self.players: Dict[str, Set[Hashable]] = {}
+        self.ledger_task: Optional[asyncio.Task] = None
+        self.monitor_task: Optional[asyncio.Task] = None
+        self.memory_profile = "off"
+
+    async def start(self):
+        self.mode, self.tools, self.instructions, self.store = configure(self.worker)
+        self.ledger_task = asyncio.create_task(ledger.run())
+        self.monitor_task = asyncio.create_task(metrics.monitor())
+
+        # Memory reports on the coordinator's /debug/memory?worker= and on
+        # SIGUSR1 to the worker: off, on, or trace from startup
+        self.memory_profile = os.getenv("MEMORY_PROFILE", "off")
+        if self.memory_profile != "off":
+            memory_profiler.install_signal_handler()
+        if self.memory_profile == "trace":
+            memory_profiler.start(int(os.getenv("MEMORY_PROFILE_FRAMES", "1")))
+        metrics.collector(
+            lambda: [gauge("agent_rooms", "Rooms hosted", len(self.closers))]
+        )
+
+    async def connect(
+        self, room_id: str, players: Set[Hashable]
+    ) -> Callable[[], Awaitable[None]]:
+        # Imported here so the offline harness can host rooms without the SDK
+        from apps.blackjack.main import open_room
+
+        return await open_room(room_id, self.tools, self.instructions, players)
+
+    def _players(self, room_id: str) -> Set[Hashable]:
+        players = self.players[room_id]
+        table = table_map.get(room_id)
+        if table:
+            players.update(table["seats"])
+        return players
+
+    def _state(self, room_id: str, bankrolls: Dict) -> bytes:
+        players = self._players(room_id)
+        return pickle.dumps(
+            {
+                "table": table_map.get(room_id),
+                "sessions": {
+                    player_id: game_state_map[player_id]
+                    for player_id in players
+                    if player_id in game_state_map
+                },
+                "bankrolls": bankrolls,
+            },
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+    async def open(self, room_id: str, snapshot: Optional[bytes]):
+        players = self.players[room_id] = set()
+        if snapshot is not None:
+            state = pickle.loads(snapshot)
+            if state["table"] is not None:
+                table_map[room_id] = state["table"]
+            game_state_map.update(state["sessions"])
+            for player_id, (balance, open_bet) in state["bankrolls"].items():
+                ledger.restore(player_id, balance, open_bet)
+            players.update(state["bankrolls"])
+
+        self.closers[room_id] = await self.connect(room_id, players)
+
+    def snapshot(self, room_id: str) -> bytes:
+        bankrolls = {
+            player_id: ledger.bankroll(player_id)
+            for player_id in self._players(room_id)
+        }
+        return self._state(room_id, bankrolls)
+
+    async def close(self, room_id: str) -> bytes:
+        await self.closers.pop(room_id)()
+
+        players = self._players(room_id)
+        bankrolls: Dict[Hashable, Tuple[int, Optional[int]]] = {
+            player_id: ledger.release(player_id) for player_id in players
+        }
+        state = self._state(room_id, bankrolls)
+
+        # The room's next worker owns its state now, stale copies must not
+        # be served from this worker's stores or read cache
+        table_map.pop(room_id, None)
+        tool_call_limiter.forget(room_id)
+        self.tools.invalidate(room_id)
+        for player_id in players:
+            game_state_map.pop(player_id, None)
+            self.tools.invalidate(player_id)
+        del self.players[room_id]
+        ledger.commit()
+        return state
+
+    def control(self, room_id: str, message: str):
+        if message == "players":
+            return sorted(self._players(room_id))
+        if message == "checkpoint":
+            ledger.commit()
+            self.store.flush()
+            return "ok"
+        raise ValueError(f"Unknown control message: {message}")
+
+    def stats(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "rooms": sorted(self.closers),
+            "players": sum(len(players) for players in self.players.values()),
+            "tool_cache": self.tools.cache_stats(),
+            "tool_calls": tool_call_limiter.stats(),
+        }
+
+    def metrics(self) -> List[Family]:
+        return metrics.collect()
+
+    async def memory(self, query: Dict[str, str]) -> str:
+        if self.memory_profile == "off":
+            raise ValueError("Memory profiling is off, set MEMORY_PROFILE")
+        return await memory_profiler.query(query)
+
+    async def stop(self):
+        for room_id in list(self.closers):
+            await self.closers.pop(room_id)()
+        if self.ledger_task is not None:
+            self.ledger_task.cancel()
+        if self.monitor_task is not None:
+            self.monitor_task.cancel()
+        ledger.commit()
+        self.store.flush()
+        game_state_map.close()
+        game_journal.close()
+        trace_recorder.stop()
@@ -0,0 +1,212 @@
+import functools
+from typing import Any, Callable
+
+from apps.blackjack.functions.journal import game_journal
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import (
+    GameStateResult,
+    RecipientType,
+    calculate_hand_value,
+    check_game_status,
+    create_game_session_and_deal_initial_cards,
+    dealer_turn,
+    game_state_map,
+    hand_over,
+    hit,
+    tool_calculate_hand_value,
+    tool_check_game_status,
+    tool_create_game_session_and_deal_initial_cards,
+    tool_dealer_turn,
+    tool_hit,
+)
+from apps.blackjack.functions.strategy import suggest_action, tool_suggest_action
+from apps.blackjack.functions.table import (
+    check_table_status,
+    deal_round,
+    join_table,
+    leave_table,
+    table_dealer_turn,
+    table_hit,
+    table_map,
+    table_stand,
+    tool_check_table_status,
+    tool_deal_round,
+    tool_join_table,
+    tool_leave_table,
+    tool_table_dealer_turn,
+    tool_table_hit,
+    tool_table_stand,
+)
+from apps.shared.lifecycle import lifecycle
+from apps.shared.tools import ToolRegistry
+
+"""
+Tools exposed to the realtime model, whichever provider serves the room
+"""
+registry = ToolRegistry(session="player_id")
+
+
+def bankrolled(handler: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Carries the player's bankroll in their session when sessions are shared
+    between processes, each with its own ledger.
+
+    Before the handler runs, a bankroll another process's ledger left in the
+    session is restored into this one, so a player continuing their hand
+    here keeps their balance and open bet instead of being dealt a fresh
+    bankroll. After it runs, the bankroll this ledger holds is left in the
+    session, which the registry then publishes.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(player_id: int, **kwargs):
+        if not game_state_map.shared:
+            return handler(player_id, **kwargs)
+
+        game_state = game_state_map.get(player_id)
+        bankroll = game_state.get("bankroll") if game_state else None
+        if bankroll is not None and bankroll[0] != ledger.owner:
+            ledger.restore(player_id, bankroll[1], bankroll[2])
+        try:
+            return handler(player_id, **kwargs)
+        finally:
+            game_state = game_state_map.get(player_id)
+            if game_state is not None:
+                game_state["bankroll"] = (ledger.owner, *ledger.bankroll(player_id))
+
+    return wrapper
+
+
+def settle(player_id: int, game_status: GameStateResult) -> float:
+    """
+    Pays out the player's hand and ends it once it is over, the player bust
+    or the dealer played. A status checked mid-hand is only reported.
+
+    Returns:
+        float: The player's balance.
+    """
+    if hand_over(player_id):
+        if player_id in ledger.open_bets:
+            # Journaled once, when the bet is paid out
+            game_journal.record_settlement(
+                player_id, game_status["game_state"], game_status["amount"]
+            )
+        ledger.settle(player_id, game_status["amount"])
+        lifecycle.end(("hand", player_id))
+    return ledger.balance(player_id)
+
+
+@registry.tool(tool_hit)
+@bankrolled
+def _hit(player_id: int, recipient: RecipientType):
+    card = hit(player_id, recipient)
+    # A bust ends the hand, whether or not the model asks for the status
+    if recipient == "player" and hand_over(player_id):
+        settle(player_id, check_game_status(player_id))
+    return {"card": card, "recipient": recipient}
+
+
+@registry.tool(tool_dealer_turn)
+@bankrolled
+def _dealer_turn(player_id: int):
+    dealer_hand = dealer_turn(player_id)
+    # The dealer's turn is the last of the hand
+    settle(player_id, check_game_status(player_id))
+    return {"dealer_hand": dealer_hand}
+
+
+@registry.tool(tool_calculate_hand_value, read_only=True)
+def _calculate_hand_value(player_id: int, recipient: RecipientType):
+    return {"output": calculate_hand_value(player_id, recipient)}
+
+
+# Settling writes to the ledger, so the status is never served from the cache
+@registry.tool(tool_check_game_status)
+@bankrolled
+def _check_game_status(player_id: int):
+    game_status = check_game_status(player_id)
+    return {"game_state": game_status, "balance": settle(player_id, game_status)}
+
+
+@registry.tool(
+    tool_create_game_session_and_deal_initial_cards,
+    required=["player_id", "bet_amount"],
+)
+@bankrolled
+def _create_game_session_and_deal_initial_cards(player_id: int, bet_amount: int):
+    ledger.check_bets([(player_id, bet_amount)])
+    initial_state = create_game_session_and_deal_initial_cards(player_id, bet_amount)
+    ledger.place_bet(player_id, game_state_map[player_id]["bet_amount"])
+    # The hand stays open, and holds back shutdown, until it is settled
+    lifecycle.begin(("hand", player_id))
+    return {**initial_state, "balance": ledger.balance(player_id)}
+
+
+def _suggest_action(player_id: int):
+    return suggest_action(player_id)
+
+
+def enable_suggest_action():
+    """
+    Adds the optional suggest_action tool, for rooms where the dealer may
+    advise players.
+    """
+    registry.register(tool_suggest_action, _suggest_action, read_only=True)
+
+
+"""
+Tools for a shared table, the room's table_id is bound by the agent
+"""
+table_registry = ToolRegistry(session="table_id")
+
+
+@table_registry.tool(tool_join_table, bound=["table_id"])
+def _join_table(table_id: str, player_id: int, bet_amount: int):
+    ledger.check_bets([(player_id, bet_amount)])
+    return join_table(table_id, player_id, bet_amount)
+
+
+@table_registry.tool(tool_leave_table, bound=["table_id"])
+def _leave_table(table_id: str, player_id: int):
+    return leave_table(table_id, player_id)
+
+
+@table_registry.tool(tool_deal_round, bound=["table_id"])
+def _deal_round(table_id: str):
+    table = table_map.get(table_id)
+    bets = [
+        (player_id, seat["bet_amount"])
+        for player_id, seat in (table["seats"].items() if table else ())
+    ]
+    # Every seat must cover its bet before any card is dealt
+    ledger.check_bets(bets)
+    round_state = deal_round(table_id)
+    for player_id, bet_amount in bets:
+        ledger.place_bet(player_id, bet_amount)
+    # The round stays open, and holds back shutdown, until it is settled
+    lifecycle.begin(("round", table_id))
+    return round_state
+
+
+@table_registry.tool(tool_table_hit, bound=["table_id"])
+def _table_hit(table_id: str, player_id: int):
+    return table_hit(table_id, player_id)
+
+
+@table_registry.tool(tool_table_stand, bound=["table_id"])
+def _table_stand(table_id: str, player_id: int):
+    return table_stand(table_id, player_id)
+
+
+@table_registry.tool(tool_table_dealer_turn, bound=["table_id"])
+def _table_dealer_turn(table_id: str):
+    return {"dealer_hand": table_dealer_turn(table_id)}
+
+
+@table_registry.tool(tool_check_table_status, bound=["table_id"])
+def _check_table_status(table_id: str):
+    results = check_table_status(table_id)
+    for result in results:
+        result["balance"] = ledger.settle(result["player_id"], result["amount"])
+    lifecycle.end(("round", table_id))
+    return {"results": results}
@@ -0,0 +1,143 @@
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from web3 import AsyncWeb3
+from web3.types import BlockData
+
+from apps.shared.store import MemoryStore
+
+logger = logging.getLogger("Chatbot")
+
+# Blocks on top of a block before its deposits are credited
+CONFIRMATIONS = 12
+
+# Blocks fetched per batched request when catching up
+CATCH_UP_BATCH = 50
+
+# Scanned blocks between checkpoints
+CHECKPOINT_EVERY = 10
+
+# A scanned block's number, hash and the deposits credited from it
+ScannedBlock = Tuple[int, str, Dict[str, int]]
+
+
+class DepositIndexer:
+    """
+    Local index of the Ether deposited to the wallets we created.
+
+    Every block is scanned once, `confirmations` blocks behind the head, for
+    transactions to a watched address, and their value is credited to that
+    address, so a balance check is a dict lookup rather than an RPC.
+
+    The last block scanned, the balances and the recent blocks are
+    checkpointed to `path`, so a restart resumes after the last checkpoint
+    instead of rescanning. If a scanned block turns out to be reorged away,
+    its credits are undone and the new chain is scanned instead.
+    """
+
+    def __init__(
+        self,
+        w3: AsyncWeb3,
+        path: Optional[str] = None,
+        confirmations: int = CONFIRMATIONS,
+    ):
+        self.w3 = w3
+        self.confirmations = confirmations
+        self.checkpoint = MemoryStore(path=path)
+        self.balances: Dict[str, int] = {}
+        self.block_number: Optional[int] = None
+        self.recent: Deque[ScannedBlock] = deque(maxlen=confirmations)
+        self.scanned = 0
+
+    def watch(self, *addresses: str):
+        """
+        Starts crediting deposits to `addresses`.
+        """
+        for address in addresses:
+            self.balances.setdefault(address.lower(), 0)
+        # Wallets are rare, and a deposit to one missing on restart is lost
+        self.flush()
+
+    def balance(self, address: str) -> int:
+        """
+        Returns the confirmed deposits to `address`, in wei.
+        """
+        return self.balances.get(address.lower(), 0)
+
+    async def start(self):
+        """
+        Resumes from the checkpoint and scans up to the confirmed head.
+        """
+        self.checkpoint.load()
+        if self.checkpoint:
+            self.block_number = self.checkpoint["block_number"]
+            self.recent.extend(self.checkpoint["recent"])
+            self.balances.update(self.checkpoint["balances"])
+
+        head = await self.w3.eth.get_block("latest")
+        if self.block_number is None:
+            # Wallets are new, so there is no history to scan
+            self.block_number = head["number"] - self.confirmations
+        await self.on_head(head)
+
+    async def on_head(self, head: BlockData):
+        """
+        Scans every block that `head` confirmed.
+        """
+        while self.block_number < head["number"] - self.confirmations:
+            start = self.block_number + 1
+            end = min(head["number"] - self.confirmations, start + CATCH_UP_BATCH - 1)
+            await self.scan(await self.fetch(range(start, end + 1)))
+
+    async def fetch(self, numbers: Iterable[int]) -> List[BlockData]:
+        numbers = list(numbers)
+        if len(numbers) == 1:
+            return [await self.w3.eth.get_block(numbers[0], True)]
+
+        async with self.w3.batch_requests() as batch:
+            for number in numbers:
+                batch.add(self.w3.eth.get_block(number, True))
+            return list(await batch.async_execute())
+
+    async def scan(self, blocks: List[BlockData]):
+        for block in blocks:
+            if self.recent and block["parentHash"].hex() != self.recent[-1][1]:
+                self.rollback()
+                return
+
+            credits: Dict[str, int] = {}
+            for tx in block["transactions"]:
+                to = tx.get("to")
+                if to is None or not tx["value"]:
+                    continue
+                to = to.lower()
+                if to in self.balances:
+                    credits[to] = credits.get(to, 0) + tx["value"]
+
+            for address, amount in credits.items():
+                self.balances[address] += amount
+                logger.info(f"Deposit of {amount} wei to {address}")
+            self.recent.append((block["number"], block["hash"].hex(), credits))
+            self.block_number = block["number"]
+            self.scanned += 1
+            if self.scanned % CHECKPOINT_EVERY == 0:
+                self.flush()
+
+    def rollback(self):
+        """
+        Undoes the last scanned block, which is no longer on the chain.
+        """
+        number, block_hash, credits = self.recent.pop()
+        for address, amount in credits.items():
+            self.balances[address] -= amount
+        self.block_number = number - 1
+        logger.warning(f"Block {number} ({block_hash}) was reorged, rescanning")
+
+    def flush(self):
+        self.checkpoint.update(
+            block_number=self.block_number,
+            balances=self.balances,
+            recent=list(self.recent),
+        )
+        self.checkpoint.flush()
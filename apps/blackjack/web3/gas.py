@@ -0,0 +1,117 @@
+import logging
+import time
+from collections import deque
+from statistics import median
+from typing import Deque, Dict, List, Optional
+
+from web3 import AsyncWeb3
+from web3.types import BlockData, TxParams
+
+logger = logging.getLogger("Chatbot")
+
+# Percentile of the priority fees paid in a block used as its tip
+PRIORITY_PERCENTILE = 50
+
+# Blocks of tips the priority fee is the median of
+HISTORY_BLOCKS = 20
+
+# Seconds without a new head after which the cached fees are refetched
+MAX_AGE = 60
+
+
+class FeeOracle:
+    """
+    EIP-1559 fee fields for transactions, refreshed once per block.
+
+    Each new head passed to `refresh` updates the cache with one
+    eth_feeHistory call, so `fees` costs no RPC on the send path.
+    Chains without a base fee get a legacy gasPrice instead.
+    """
+
+    def __init__(
+        self,
+        w3: AsyncWeb3,
+        history_blocks: int = HISTORY_BLOCKS,
+        percentile: float = PRIORITY_PERCENTILE,
+        max_age: float = MAX_AGE,
+    ):
+        self.w3 = w3
+        self.percentile = percentile
+        self.max_age = max_age
+        self.tips: Deque[int] = deque(maxlen=history_blocks)
+        self.fields: Optional[Dict[str, int]] = None
+        self.block_number: Optional[int] = None
+        self.refreshed_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    async def start(self):
+        await self.refresh(await self.w3.eth.get_block("latest"))
+
+    async def refresh(self, block: BlockData):
+        """
+        Caches the fee fields for the block after `block`.
+        """
+        if block.get("baseFeePerGas") is None:
+            self.fields = {"gasPrice": await self.w3.eth.gas_price}
+        else:
+            # The whole window on the first block, only the new one after
+            count = 1 if self.tips else self.tips.maxlen
+            history = await self.w3.eth.fee_history(
+                count, block["number"], [self.percentile]
+            )
+            self.tips.extend(reward[0] for reward in history["reward"])
+            tip = int(median(self.tips)) if self.tips else 0
+            # The last base fee is the next block's, doubled to stay valid
+            # through several full blocks
+            base_fee = history["baseFeePerGas"][-1]
+            self.fields = {
+                "maxPriorityFeePerGas": tip,
+                "maxFeePerGas": 2 * base_fee + tip,
+            }
+        self.block_number = block["number"]
+        self.refreshed_at = time.monotonic()
+
+    async def fees(self) -> Dict[str, int]:
+        """
+        Returns the fee fields for a transaction, from the cache unless no
+        head has refreshed it in `max_age` seconds.
+
+        Returns:
+            dict: maxFeePerGas and maxPriorityFeePerGas, or gasPrice.
+        """
+        if self.fields is None or time.monotonic() - self.refreshed_at > self.max_age:
+            self.misses += 1
+            await self.refresh(await self.w3.eth.get_block("latest"))
+        else:
+            self.hits += 1
+        return dict(self.fields)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "block_number": self.block_number,
+        }
+
+
+async def estimate_gas(w3: AsyncWeb3, transactions: List[TxParams]) -> List[int]:
+    """
+    Estimates the gas of several transactions in one batched request.
+
+    Args:
+        w3 (AsyncWeb3): The connected client.
+        transactions (list): The transactions, e.g. a batch of payouts.
+
+    Returns:
+        list: The gas estimate of each transaction, in order.
+    """
+    if not transactions:
+        return []
+
+    async with w3.batch_requests() as batch:
+        for transaction in transactions:
+            batch.add(w3.eth.estimate_gas(transaction))
+        return list(await batch.async_execute())
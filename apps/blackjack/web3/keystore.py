@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from eth_account import Account
+from eth_account.signers.local import LocalAccount
+
+logger = logging.getLogger("Chatbot")
+
+# Seconds an unlocked key stays in memory after its last use
+KEY_TTL = 300
+
+# Unlocked keys kept in memory at most
+MAX_UNLOCKED = 1024
+
+
+def _encrypt(private_key: bytes, password: str, kdf: str, iterations: Optional[int]):
+    return Account.encrypt(private_key, password, kdf=kdf, iterations=iterations)
+
+
+def _decrypt(keyfile: Dict, password: str) -> bytes:
+    return bytes(Account.decrypt(keyfile, password))
+
+
+class Keystore:
+    """
+    Wallets encrypted at rest in the standard JSON keystore format, one file
+    per address in `directory`.
+
+    Key derivation (scrypt by default) takes most of a second by design, so
+    it runs in a process pool off the event loop, and unlocked keys are kept
+    in a bounded LRU cache for `ttl` seconds after their last use. A batch of
+    payouts from the same wallets pays the KDF once per wallet, not once per
+    signature.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        password: str,
+        ttl: float = KEY_TTL,
+        max_unlocked: int = MAX_UNLOCKED,
+        workers: Optional[int] = None,
+        kdf: str = "scrypt",
+        iterations: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.password = password
+        self.ttl = ttl
+        self.max_unlocked = max_unlocked
+        self.kdf = kdf
+        self.iterations = iterations
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.unlocked: OrderedDict[str, Tuple[LocalAccount, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, address: str) -> str:
+        return os.path.join(self.directory, f"{address.lower()}.json")
+
+    def addresses(self) -> List[str]:
+        return [
+            name.removesuffix(".json")
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+
+    async def create(self) -> str:
+        """
+        Creates a wallet and stores it encrypted.
+
+        Returns:
+            str: The address of the wallet, its key staying in the keystore.
+        """
+        account = Account.create()
+        keyfile = await asyncio.get_running_loop().run_in_executor(
+            self.pool,
+            _encrypt,
+            bytes(account.key),
+            self.password,
+            self.kdf,
+            self.iterations,
+        )
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".keystore-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(keyfile, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path(account.address))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self._cache(account.address, account)
+        return account.address
+
+    def _cache(self, address: str, account: LocalAccount):
+        self.unlocked[address.lower()] = (account, time.monotonic() + self.ttl)
+        self.unlocked.move_to_end(address.lower())
+        while len(self.unlocked) > self.max_unlocked:
+            self.unlocked.popitem(last=False)
+
+    def _cached(self, address: str) -> Optional[LocalAccount]:
+        entry = self.unlocked.get(address.lower())
+        if entry is None:
+            return None
+        account, expires = entry
+        if expires < time.monotonic():
+            del self.unlocked[address.lower()]
+            return None
+        self._cache(address, account)
+        return account
+
+    async def unlock(self, addresses: Iterable[str]) -> Dict[str, LocalAccount]:
+        """
+        Returns the signing accounts of `addresses`, deriving the keys of
+        those not in the cache in parallel in the process pool.
+
+        Args:
+            addresses (list): Addresses of wallets in the keystore.
+
+        Returns:
+            dict: The unlocked account of each address.
+        """
+        accounts: Dict[str, LocalAccount] = {}
+        locked = []
+        for address in dict.fromkeys(addresses):
+            account = self._cached(address)
+            if account is None:
+                self.misses += 1
+                locked.append(address)
+            else:
+                self.hits += 1
+                accounts[address] = account
+
+        if locked:
+            loop = asyncio.get_running_loop()
+            keyfiles = []
+            for address in locked:
+                with open(self.path(address)) as f:
+                    keyfiles.append(json.load(f))
+            keys = await asyncio.gather(
+                *(
+                    loop.run_in_executor(self.pool, _decrypt, keyfile, self.password)
+                    for keyfile in keyfiles
+                )
+            )
+            for address, key in zip(locked, keys):
+                account = Account.from_key(key)
+                self._cache(address, account)
+                accounts[address] = account
+
+        return accounts
+
+    def lock(self, address: Optional[str] = None):
+        """
+        Drops one unlocked key from memory, or all of them.
+        """
+        if address is None:
+            self.unlocked.clear()
+        else:
+            self.unlocked.pop(address.lower(), None)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "unlocked": len(self.unlocked),
+        }
+
+    def close(self):
+        self.lock()
+        self.pool.shutdown()
@@ -1,16 +1,47 @@
 import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
 
-from eth_account import Account
 from web3 import AsyncWeb3, WebSocketProvider
 
+from apps.blackjack.web3.deposits import DepositIndexer
+from apps.blackjack.web3.gas import FeeOracle, estimate_gas
+from apps.blackjack.web3.keystore import Keystore
+
+logger = logging.getLogger("Chatbot")
+
 
 class Web3WalletHandler:
-    def __init__(self):
+    def __init__(
+        self, keystore_path: str = "keystore", checkpoint_path: str | None = None
+    ):
         """
         Initializes the Web3 Wallet Handler with a WebSocket provider.
+
+        Args:
+            keystore_path (str): Directory of the encrypted wallets, unlocked
+                with the KEYSTORE_PASSWORD environment variable.
+            checkpoint_path (str): Where the deposit indexer checkpoints.
+
+        Raises:
+            ValueError: When KEYSTORE_PASSWORD is not set.
         """
         self.websocket_url = "wss://huddle-testnet.rpc.caldera.xyz/ws"
+        self.checkpoint_path = checkpoint_path
+        password = os.getenv("KEYSTORE_PASSWORD")
+        if not password:
+            raise ValueError(
+                "KEYSTORE_PASSWORD is not set, it is needed to unlock the wallets "
+                f"in {keystore_path}"
+            )
+        self.keystore = Keystore(keystore_path, password)
         self.w3: AsyncWeb3 | None = None
+        self.fee_oracle: FeeOracle | None = None
+        self.deposits: DepositIndexer | None = None
+        self.chain_id: int | None = None
+        self.subscription: str | None = None
+        self.heads_task: asyncio.Task | None = None
 
     async def start(self):
         self.w3 = AsyncWeb3(WebSocketProvider(self.websocket_url))
@@ -28,18 +59,52 @@ class Web3WalletHandler:
             )
         print("Connected to Ethereum WebSocket provider.")
 
-    def create_wallet(self):
+        self.chain_id = await self.w3.eth.chain_id
+        self.fee_oracle = FeeOracle(self.w3)
+        await self.fee_oracle.start()
+        self.deposits = DepositIndexer(self.w3, self.checkpoint_path)
+        self.deposits.watch(*self.keystore.addresses())
+        await self.deposits.start()
+
+        # One subscription feeds every consumer of new heads
+        self.subscription = await self.w3.eth.subscribe("newHeads")
+        self.heads_task = asyncio.create_task(self.follow_heads())
+
+    async def follow_heads(self):
+        async for message in self.w3.socket.process_subscriptions():
+            if message.get("subscription") != self.subscription:
+                continue
+            head = message["result"]
+            for on_head in (self.fee_oracle.refresh, self.deposits.on_head):
+                try:
+                    await on_head(head)
+                except Exception as e:
+                    # Each consumer catches up on the next head
+                    logger.error(f"Failed to process block {head['number']}: {e}")
+
+    async def stop(self):
+        if self.heads_task is not None:
+            self.heads_task.cancel()
+            self.heads_task = None
+            await self.w3.eth.unsubscribe(self.subscription)
+        if self.deposits is not None:
+            self.deposits.flush()
+        if self.fee_oracle is not None:
+            logger.info(f"Gas fee cache: {self.fee_oracle.stats()}")
+        logger.info(f"Unlocked key cache: {self.keystore.stats()}")
+        self.keystore.close()
+
+    async def create_wallet(self):
         """
-        Creates a new Ethereum wallet.
+        Creates a new Ethereum wallet, its private key encrypted in the
+        keystore.
 
         Returns:
-            dict: A dictionary containing the address and private key.
+            dict: A dictionary containing the address.
         """
-        account = Account.create()
-        wallet = {
-            "address": account.address,
-            "private_key": account.key.hex(),
-        }
+        wallet = {"address": await self.keystore.create()}
+        if self.deposits is not None:
+            self.deposits.watch(wallet["address"])
         print(f"New wallet created: {wallet['address']}")
         return wallet
 
@@ -58,53 +123,109 @@ class Web3WalletHandler:
                 "Failed to connect to the Ethereum WebSocket provider."
             )
         balance_wei = await self.w3.eth.get_balance(address)
+        balance_eth = float(self.w3.from_wei(balance_wei, "ether"))
         print(f"Balance for {address}: {balance_eth} ETH")
         return balance_eth
 
+    def get_deposits(self, address: str) -> float:
+        """
+        Gets the confirmed Ether deposited to one of our wallets, from the
+        local deposit index rather than the node.
+
+        Args:
+            address (str): The wallet address.
+
+        Returns:
+            float: The deposits in Ether.
+        """
+        if self.deposits is None:
+            raise ConnectionError(
+                "Failed to connect to the Ethereum WebSocket provider."
+            )
+        return float(self.w3.from_wei(self.deposits.balance(address), "ether"))
+
     async def send_transaction(
         self,
-        private_key: str,
+        from_address: str,
         to_address: str,
         value_eth: float,
-        gas: int = 21000,
-        gas_price_gwei: int = 50,
+        gas: Optional[int] = None,
     ):
         """
         Sends a transaction from one address to another.
 
         Args:
-            private_key (str): The private key of the sender's wallet.
+            from_address (str): The sender's wallet in the keystore.
             to_address (str): The recipient's Ethereum address.
             value_eth (float): The amount to send in Ether.
-            gas (int): The gas limit for the transaction.
-            gas_price_gwei (int): The gas price in Gwei.
+            gas (int): The gas limit for the transaction, estimated if omitted.
 
         Returns:
             str: The transaction hash.
         """
-        if self.w3 is None:
+        (tx_hash,) = await self.send_transactions(
+            from_address, [(to_address, value_eth)], gas
+        )
+        return tx_hash
+
+    async def send_transactions(
+        self,
+        from_address: str,
+        payouts: List[Tuple[str, float]],
+        gas: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Sends a batch of transactions from one address, e.g. payouts, with
+        consecutive nonces, one batched gas estimate and the cached fees.
+
+        Args:
+            from_address (str): The sender's wallet in the keystore.
+            payouts (list): The recipient address and amount in Ether of
+                each transaction.
+            gas (int): The gas limit for every transaction, estimated if
+                omitted.
+
+        Returns:
+            list: The transaction hashes, in order.
+        """
+        if self.w3 is None or self.fee_oracle is None:
             raise ConnectionError(
                 "Failed to connect to the Ethereum WebSocket provider."
             )
-        from_account = Account.from_key(private_key)
+        # The key is derived once and cached, not per transaction
+        (from_account,) = (await self.keystore.unlock([from_address])).values()
         nonce = await self.w3.eth.get_transaction_count(from_account.address)
+        fees = await self.fee_oracle.fees()
 
-        # Prepare transaction
-        tx = {
-            "nonce": nonce,
-            "to": to_address,
-            "value": self.w3.toWei(value_eth, "ether"),
-            "gas": gas,
-            "gasPrice": self.w3.toWei(gas_price_gwei, "gwei"),
-        }
+        # Prepare transactions
+        txs = [
+            {
+                "from": from_account.address,
+                "nonce": nonce + i,
+                "to": to_address,
+                "value": self.w3.to_wei(value_eth, "ether"),
+                "chainId": self.chain_id,
+                **fees,
+            }
+            for i, (to_address, value_eth) in enumerate(payouts)
+        ]
+        limits = (
+            [gas] * len(txs) if gas is not None else await estimate_gas(self.w3, txs)
+        )
 
-        # Sign transaction
-        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key)
+        tx_hashes = []
+        for tx, limit in zip(txs, limits):
+            del tx["from"]
+            tx["gas"] = limit
 
-        # Send transaction
-        tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        print(f"Transaction sent with hash: {tx_hash.hex()}")
-        return tx_hash.hex()
+            # Sign transaction
+            signed_tx = from_account.sign_transaction(tx)
+
+            # Send transaction
+            tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            print(f"Transaction sent with hash: {tx_hash.hex()}")
+            tx_hashes.append(tx_hash.hex())
+        return tx_hashes
 
     async def get_transaction_receipt(self, tx_hash: str):
         """
@@ -132,14 +253,16 @@ async def main():
     await wallet_handler.start()
 
     # Create a new wallet
-    wallet = wallet_handler.create_wallet()
+    wallet = await wallet_handler.create_wallet()
 
     # Check the balance of the wallet
     await wallet_handler.get_balance(wallet["address"])
 
     # Send a transaction (example, replace with actual values)
     # Replace `TO_ADDRESS` with the recipient's address
-    # await wallet_handler.send_transaction(wallet["private_key"], "TO_ADDRESS", 0.01)
+    # await wallet_handler.send_transaction(wallet["address"], "TO_ADDRESS", 0.01)
+
+    await wallet_handler.stop()
 
 
 if __name__ == "__main__":
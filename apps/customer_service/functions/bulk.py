@@ -0,0 +1,248 @@
+import argparse
+import csv
+import io
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple, TypedDict
+
+from apps.customer_service.functions.main import (
+    ComplaintType,
+    complaint_book,
+    random_resolution_period,
+)
+from apps.customer_service.functions.triage import complaint_triage
+from apps.shared.encoding import dumps, loads
+
+logger = logging.getLogger("Chatbot")
+
+FormatType = Literal["jsonl", "csv"]
+
+CSV_FIELDS = ["name", "complaint", "resolution_period"]
+
+RESOLUTION_PERIOD = re.compile(r"^\d+ (hour|day)s?$")
+
+
+@lru_cache(maxsize=1024)
+def valid_resolution_period(resolution_period: str) -> bool:
+    # Imports repeat a handful of periods, so the regex runs once per value
+    return RESOLUTION_PERIOD.match(resolution_period) is not None
+
+
+class LoadReport(TypedDict):
+    loaded: int
+    rejected: int
+    errors: List[str]
+    incidents: int
+
+
+def detect_format(path: str) -> FormatType:
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Unknown complaint file format: {path}")
+
+
+def validate(row: Dict) -> Tuple[str, ComplaintType]:
+    """
+    Checks a row against ComplaintType.
+
+    Args:
+        row (dict): A record with name, complaint and an optional
+            resolution_period.
+
+    Returns:
+        tuple: The name and the complaint, resolution_period being None when
+        the row has none.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object")
+
+    name = row.get("name")
+    complaint = row.get("complaint")
+    resolution_period = row.get("resolution_period") or None
+    if not isinstance(name, str) or not name:
+        raise ValueError("Missing name")
+    if not isinstance(complaint, str) or not complaint:
+        raise ValueError(f"Missing complaint for {name}")
+    if resolution_period is not None and (
+        not isinstance(resolution_period, str)
+        or not valid_resolution_period(resolution_period)
+    ):
+        raise ValueError(f"Invalid resolution_period for {name}: {resolution_period}")
+
+    return name, {"complaint": complaint, "resolution_period": resolution_period}
+
+
+def read_jsonl(lines: Iterable[bytes]) -> Iterator[Tuple[int, Optional[Dict], str]]:
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, loads(line), ""
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict], str]]:
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    missing = {"name", "complaint"} - set(header)
+    if missing:
+        raise ValueError(f"CSV header is missing {', '.join(sorted(missing))}")
+
+    for line_number, values in enumerate(reader, 2):
+        if values:
+            yield line_number, dict(zip(header, values)), ""
+
+
+def _commit(batch: Dict[str, ComplaintType]):
+    """
+    Applies a validated batch to the complaint book in one update.
+
+    Periods missing from the rows keep the period already in the book, and
+    only complaints new to the book get a random one, as add_complaint does.
+    """
+    for name, complaint in batch.items():
+        if complaint["resolution_period"] is None:
+            existing = complaint_book.get(name)
+            complaint["resolution_period"] = (
+                existing["resolution_period"]
+                if existing
+                else random_resolution_period()
+            )
+    complaint_book.update(batch)
+
+
+def load(
+    path: str,
+    format: Optional[FormatType] = None,
+    batch_size: int = 10_000,
+    max_errors: int = 100,
+) -> LoadReport:
+    """
+    Streams complaints from a JSONL or CSV file into the complaint book.
+
+    The file is read line by line and written in batches of `batch_size`
+    rows, so memory stays bounded whatever the file size. Invalid rows are
+    rejected and reported, and they never stop the load. The book is then
+    triaged again, so imported complaints are filed under incidents like
+    those add_complaint files.
+
+    Args:
+        path (str): The file to import.
+        format (str): "jsonl" or "csv", detected from the extension if omitted.
+        batch_size (int): Rows per batch written to the complaint book.
+        max_errors (int): How many rejection reasons to keep in the report.
+
+    Returns:
+        dict: How many rows were loaded and rejected, and why, and how many
+        incidents the book has.
+    """
+    format = format or detect_format(path)
+    report: LoadReport = {"loaded": 0, "rejected": 0, "errors": [], "incidents": 0}
+    batch: Dict[str, ComplaintType] = {}
+
+    if format == "jsonl":
+        f = open(path, "rb", buffering=1 << 20)
+        rows = read_jsonl(f)
+    else:
+        f = open(path, "r", newline="", encoding="utf-8", buffering=1 << 20)
+        rows = read_csv(f)
+
+    with f:
+        for line_number, row, error in rows:
+            if not error:
+                try:
+                    name, complaint = validate(row)
+                    batch[name] = complaint
+                    report["loaded"] += 1
+                    if len(batch) >= batch_size:
+                        _commit(batch)
+                        batch = {}
+                    continue
+                except ValueError as e:
+                    error = str(e)
+
+            report["rejected"] += 1
+            if len(report["errors"]) < max_errors:
+                report["errors"].append(f"line {line_number}: {error}")
+
+    if batch:
+        _commit(batch)
+    report["incidents"] = complaint_triage.rebuild(complaint_book)["incidents"]
+
+    logger.info(
+        f"Loaded {report['loaded']} complaints from {path}, "
+        f"rejected {report['rejected']}"
+    )
+    return report
+
+
+def export(format: FormatType = "jsonl", batch_size: int = 10_000) -> Iterator[bytes]:
+    """
+    Streams the complaint book as JSONL or CSV.
+
+    Yields:
+        bytes: Encoded chunks of up to `batch_size` records, the CSV header
+        first, ready to be written to a file or a response.
+    """
+    names = list(complaint_book)
+
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(CSV_FIELDS)
+        for start in range(0, len(names), batch_size):
+            for name in names[start : start + batch_size]:
+                complaint = complaint_book.get(name)
+                if complaint is not None:
+                    writer.writerow(
+                        (name, complaint["complaint"], complaint["resolution_period"])
+                    )
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if not names:
+            yield buffer.getvalue().encode()
+        return
+
+    for start in range(0, len(names), batch_size):
+        lines = []
+        for name in names[start : start + batch_size]:
+            complaint = complaint_book.get(name)
+            if complaint is not None:
+                lines.append(
+                    dumps(
+                        {
+                            "name": name,
+                            "complaint": complaint["complaint"],
+                            "resolution_period": complaint["resolution_period"],
+                        }
+                    )
+                )
+        lines.append(b"")
+        yield b"\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import or export the complaint book")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path")
+    parser.add_argument(
+        "--store", required=True, help="Complaint book snapshot to read and update"
+    )
+    args = parser.parse_args()
+
+    complaint_book.path = args.store
+    complaint_book.load()
+
+    if args.command == "import":
+        print(load(args.path))
+        complaint_book.flush()
+    else:
+        with open(args.path, "wb") as f:
+            f.writelines(export(detect_format(args.path)))
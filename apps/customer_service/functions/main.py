@@ -1,19 +1,28 @@
 import random
-from typing import Dict, TypedDict
+from typing import Dict, NotRequired, TypedDict
+
+from apps.customer_service.functions.triage import complaint_triage, new_complaint_id
+from apps.shared.shm import SharedMemoryStore
 
 
 class ComplaintType(TypedDict):
     complaint: str
     resolution_period: str
+    # The complaint's id, and that of the complaint that first reported the
+    # incident, see functions.triage
+    id: NotRequired[str]
+    incident: NotRequired[str]
 
 
-complaint_book: dict[str, ComplaintType] = {
-    "Arush": {
-        "complaint": "chat in the app is not working",
-        "resolution_period": "3 hours",
-    },
-    "Om": {"complaint": "I am not able to login", "resolution_period": "2 days"},
-}
+complaint_book: SharedMemoryStore[str, ComplaintType] = SharedMemoryStore(
+    {
+        "Arush": {
+            "complaint": "chat in the app is not working",
+            "resolution_period": "3 hours",
+        },
+        "Om": {"complaint": "I am not able to login", "resolution_period": "2 days"},
+    }
+)
 
 
 def check_for_complaint(name: str) -> bool:
@@ -44,21 +53,40 @@ check_for_complaint_tool: Dict = {
 }
 
 
+# Days and hours are equally likely, as are the 1-7 days and the 1-24 hours:
+# 24 entries per day count and 7 per hour count, so a single draw picks one
+RESOLUTION_PERIODS = [f"{days} days" for days in range(1, 8) for _ in range(24)] + [
+    f"{hours} hours" for hours in range(1, 25) for _ in range(7)
+]
+
+
+def random_resolution_period() -> str:
+    """Generate a random resolution period for a complaint in days or hours."""
+    return random.choice(RESOLUTION_PERIODS)
+
+
 def add_complaint(name: str, complaint: str) -> None:
     """Store the name and complaint of a person in the complaint book.
 
+    A complaint about an incident already reported gets the resolution period
+    of the incident, and a new incident a random one.
+
     Args:
         name: Name of the person.
         complaint: Complaint of the person.
     """
-    # Generate a random resolution period for the complaint in days or hours
-    if random.choice([True, False]):
-        resolution_period = f"{random.randint(1, 7)} days"
-    else:
-        resolution_period = f"{random.randint(1, 24)} hours"
+    # Complaints other agent processes filed in a shared book come first
+    complaint_triage.follow(complaint_book)
+    complaint_id = new_complaint_id()
+    incident, resolution_period = complaint_triage.triage(
+        name, complaint_id, complaint, random_resolution_period()
+    )
 
     complaint_book[name] = ComplaintType(
-        complaint=complaint, resolution_period=resolution_period
+        complaint=complaint,
+        resolution_period=resolution_period,
+        id=complaint_id,
+        incident=incident,
     )
     print(
         f"Stored the complaint of {name} as '{complaint}' with a resolution period of {resolution_period}"
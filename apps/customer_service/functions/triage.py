@@ -0,0 +1,638 @@
+import argparse
+import itertools
+import logging
+import re
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple, TypedDict
+
+import numpy as np
+
+from apps.shared.metrics import Family, counter, gauge
+from apps.shared.store import MemoryStore
+
+logger = logging.getLogger("Chatbot")
+
+# Character trigrams are hashed into 2^18 buckets
+NGRAM = 3
+BUCKET_BITS = 18
+BUCKETS = 1 << BUCKET_BITS
+
+# MinHash signatures of the n-gram sets, cut into bands of ROWS hashes: two
+# complaints with a Jaccard similarity j share a band with a probability of
+# 1 - (1 - j^ROWS)^BANDS, 0.98 for j = 0.4 and 0.58 for j = 0.2
+BANDS = 32
+ROWS = 3
+_MULTIPLIERS = np.random.default_rng(0).integers(
+    1, 1 << 63, BANDS * ROWS, np.uint64, endpoint=True
+) | np.uint64(1)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+# Bands shared by more incidents than this say little about a complaint
+MAX_POSTINGS = 64
+
+# Incidents compared with a complaint at most, those sharing most bands
+MAX_CANDIDATES = 32
+
+# Cosine similarity from which a complaint joins an incident
+THRESHOLD = 0.72
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+class TriageReport(TypedDict):
+    complaints: int
+    incidents: int
+    relabeled: int
+
+
+def new_complaint_id() -> str:
+    """
+    Returns a unique id for a filed complaint, which names the incident it
+    opens. A person filing again gets a new one, so the incident their first
+    complaint opened keeps its name.
+    """
+    return uuid.uuid4().hex
+
+
+def normalize(text: str) -> bytes:
+    """
+    Lower cases a complaint and collapses punctuation and whitespace, padded
+    with spaces so the first and last words get n-grams of their own.
+    """
+    return f" {_SEPARATORS.sub(' ', text.lower()).strip()} ".encode()
+
+
+def _hash(data: np.ndarray) -> np.ndarray:
+    # Fibonacci hashing of the 24 bit trigram codes, the same in every process
+    codes = (
+        (data[:-2].astype(np.uint32) << 16)
+        | (data[1:-1].astype(np.uint32) << 8)
+        | data[2:]
+    )
+    return (codes * np.uint32(2654435761)) >> np.uint32(32 - BUCKET_BITS)
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenates the ranges [start, start + length).
+
+    Returns:
+        tuple: The range each position belongs to, and the positions.
+    """
+    owners = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths - starts, lengths
+    )
+    return owners, positions
+
+
+def ngrams(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the sorted n-gram buckets of a complaint and their counts.
+    """
+    buckets, counts = np.unique(
+        _hash(np.frombuffer(normalize(text), np.uint8)), return_counts=True
+    )
+    return buckets.astype(np.int32), counts
+
+
+def _minhash(buckets: np.ndarray) -> np.ndarray:
+    # Each n-gram hashed BANDS * ROWS times, by multiply-shift hashing, a row
+    # per hash function so the minimums are taken along contiguous memory
+    return (
+        _MULTIPLIERS[:, None] * (buckets.astype(np.uint64) + np.uint64(1))
+    ) >> np.uint64(32)
+
+
+def _bands(minimums: np.ndarray) -> np.ndarray:
+    keys = np.zeros(minimums.shape[:-1] + (BANDS,), np.uint64)
+    bands = minimums.reshape(keys.shape + (ROWS,))
+    for row in range(ROWS):
+        keys = keys * _MIX + bands[..., row]
+    keys = keys * _MIX + np.arange(BANDS, dtype=np.uint64)
+    return keys.view(np.int64)
+
+
+def signature(buckets: np.ndarray) -> List[int]:
+    """
+    Returns the band keys of a complaint's n-grams, the same for the same
+    n-grams in every process, or none when it has no n-grams.
+    """
+    if not len(buckets):
+        return []
+    return _bands(_minhash(buckets).min(axis=1)).tolist()
+
+
+def signatures(
+    indptr: np.ndarray, buckets: np.ndarray, batch_size: int = 1 << 20
+) -> np.ndarray:
+    """
+    Returns the band keys of each CSR row, those of `signature`, hashing
+    about `batch_size` n-grams at a time.
+    """
+    rows = len(indptr) - 1
+    minimums = np.full((rows, BANDS * ROWS), np.iinfo(np.uint64).max, np.uint64)
+    filled = np.flatnonzero(np.diff(indptr))
+    start = 0
+    while start < len(filled):
+        end = int(
+            np.searchsorted(
+                indptr[filled + 1], indptr[filled[start]] + batch_size, "right"
+            )
+        )
+        batch = filled[start : max(end, start + 1)]
+        first, last = indptr[batch[0]], indptr[batch[-1] + 1]
+        minimums[batch] = np.minimum.reduceat(
+            _minhash(buckets[first:last]), indptr[batch] - first, axis=1
+        ).T
+        start += len(batch)
+    return _bands(minimums)
+
+
+def vectorize(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Hashes the n-grams of many complaints at once.
+
+    Returns:
+        tuple: A CSR matrix of n-gram counts, a row per complaint: the row
+        offsets, the buckets, sorted within each row, and their counts.
+    """
+    encoded = [normalize(text) for text in texts]
+    lengths = np.fromiter(map(len, encoded), np.int64, len(encoded))
+    hashed = _hash(np.frombuffer(b"".join(encoded), np.uint8))
+    # The n-grams spanning two complaints are skipped
+    rows, positions = _ranges(np.cumsum(lengths) - lengths, lengths - NGRAM + 1)
+    keys, counts = np.unique(rows * BUCKETS + hashed[positions], return_counts=True)
+    indptr = np.zeros(len(texts) + 1, np.int64)
+    np.cumsum(np.bincount(keys // BUCKETS, minlength=len(texts)), out=indptr[1:])
+    return indptr, (keys % BUCKETS).astype(np.int32), counts
+
+
+def _similarities(
+    indptr: np.ndarray,
+    buckets: np.ndarray,
+    weights: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+) -> np.ndarray:
+    """
+    Returns the dot products of the CSR rows `a` and `b`, pair by pair.
+    """
+    owners_a, positions_a = _ranges(indptr[a], indptr[a + 1] - indptr[a])
+    owners_b, positions_b = _ranges(indptr[b], indptr[b + 1] - indptr[b])
+    # Both sorted, as rows are sorted by bucket, so a stable sort merges them
+    # in linear time, the n-grams the pairs share side by side
+    keys = np.concatenate(
+        [
+            owners_a * BUCKETS + buckets[positions_a],
+            owners_b * BUCKETS + buckets[positions_b],
+        ]
+    )
+    merged = np.argsort(keys, kind="stable")
+    shared = np.flatnonzero(keys[merged[1:]] == keys[merged[:-1]])
+    in_a, in_b = merged[shared], merged[shared + 1] - len(positions_a)
+    return np.bincount(
+        owners_a[in_a],
+        weights[positions_a[in_a]] * weights[positions_b[in_b]],
+        minlength=len(a),
+    )
+
+
+def _best(
+    a: np.ndarray, b: np.ndarray, similarities: np.ndarray, threshold: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the rows of `a` with a pair at least `threshold` similar, and
+    the most similar `b` of each.
+    """
+    similar = similarities >= threshold
+    a, b, similarities = a[similar], b[similar], similarities[similar]
+    ranked = np.lexsort((-similarities, a))
+    first = np.ones(len(ranked), bool)
+    first[1:] = a[ranked[1:]] != a[ranked[:-1]]
+    return a[ranked[first]], b[ranked[first]]
+
+
+class TriageIndex:
+    """
+    Groups complaints about the same incident, so people reporting it get
+    the resolution period it was given the first time.
+
+    Complaints are vectors of hashed character trigrams, which tolerate
+    rewording and typos, weighted by log term frequency. Trigrams are not
+    weighted up for being rare: the rarest of a complaint are mostly its
+    typos and the greeting around it, and IDF weighting split incidents
+    three times as often (see apps.harness.triage).
+
+    Incidents are named after the id of the complaint that opened them,
+    which another complaint of the same person does not reuse. Each
+    incident keeps the vector of that complaint, and is indexed under the
+    MinHash bands of its n-grams, a locality sensitive hash: a new
+    complaint is compared only
+    with the incidents sharing one of its bands, found in BANDS dict
+    lookups whatever the size of the book. It joins the most similar of
+    them when their cosine similarity reaches `threshold`, and opens a new
+    incident otherwise.
+
+    `rebuild` clusters a whole complaint book as a batched NumPy job, e.g.
+    at startup or after a bulk import. Each process keeps its own index, and
+    `follow` adds the complaints other processes filed in a shared book.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD):
+        self.threshold = threshold
+        self.clear()
+
+    def clear(self):
+        # Incidents: the complaint that opened each one, its period and size
+        self.ids: List[str] = []
+        self.periods: List[str] = []
+        self.sizes: List[int] = []
+        self.incidents: Dict[str, int] = {}
+        # The book's write log position followed, and complaints filed since
+        self.position: Optional[int] = None
+        self._filed: Set[str] = set()
+        self.postings: Dict[int, List[int]] = {}
+        self.linked = 0
+        self.opened = 0
+        # The incidents' vectors, appended to shared arrays
+        self._starts = np.zeros(1024, np.int64)
+        self._lengths = np.zeros(1024, np.int64)
+        self._buckets = np.zeros(1 << 16, np.int32)
+        self._weights = np.zeros(1 << 16, np.float32)
+        self._used = 0
+        self._scratch = np.zeros(BUCKETS, np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _vector(counts: np.ndarray) -> np.ndarray:
+        weights = (1 + np.log(counts)).astype(np.float32)
+        norm = np.sqrt(weights @ weights)
+        return weights / norm if norm else weights
+
+    def _nearest(
+        self, buckets: np.ndarray, weights: np.ndarray, keys: List[int]
+    ) -> Tuple[int, float]:
+        """
+        Returns the incident most similar to a complaint vector, and their
+        similarity, or -1 when no incident shares its bands.
+        """
+        lists = []
+        for key in keys:
+            incidents = self.postings.get(key)
+            if incidents and len(incidents) <= MAX_POSTINGS:
+                lists.append(incidents)
+        candidates = set().union(*lists)
+        if not candidates:
+            return -1, 0.0
+        if len(candidates) > MAX_CANDIDATES:
+            hits = Counter(itertools.chain.from_iterable(lists))
+            candidates = [incident for incident, _ in hits.most_common(MAX_CANDIDATES)]
+        candidates = np.fromiter(candidates, np.int64, len(candidates))
+
+        owners, positions = _ranges(self._starts[candidates], self._lengths[candidates])
+        scratch = self._scratch
+        scratch[buckets] = weights
+        similarities = np.bincount(
+            owners,
+            scratch[self._buckets[positions]] * self._weights[positions],
+            minlength=len(candidates),
+        )
+        scratch[buckets] = 0
+        best = int(similarities.argmax())
+        return int(candidates[best]), float(similarities[best])
+
+    def _reserve(self, incidents: int, entries: int):
+        if incidents > len(self._starts):
+            size = max(incidents, 2 * len(self._starts))
+            self._starts = np.resize(self._starts, size)
+            self._lengths = np.resize(self._lengths, size)
+        if entries > len(self._buckets):
+            size = max(entries, 2 * len(self._buckets))
+            self._buckets = np.resize(self._buckets, size)
+            self._weights = np.resize(self._weights, size)
+
+    def _open(
+        self,
+        incident_id: str,
+        period: str,
+        buckets: np.ndarray,
+        weights: np.ndarray,
+        keys: List[int],
+    ):
+        incident = len(self.ids)
+        self._reserve(incident + 1, self._used + len(buckets))
+        self._starts[incident] = self._used
+        self._lengths[incident] = len(buckets)
+        self._buckets[self._used : self._used + len(buckets)] = buckets
+        self._weights[self._used : self._used + len(buckets)] = weights
+        self._used += len(buckets)
+        for key in keys:
+            self.postings.setdefault(key, []).append(incident)
+        self.incidents[incident_id] = incident
+        self.ids.append(incident_id)
+        self.periods.append(period)
+        self.sizes.append(1)
+
+    def triage(
+        self, name: str, complaint_id: str, complaint: str, period: str
+    ) -> Tuple[str, str]:
+        """
+        Files a new complaint under its incident.
+
+        Args:
+            name (str): Name of the person complaining, the complaint's key
+                in the book.
+            complaint_id (str): The complaint's id, see `new_complaint_id`.
+            complaint (str): Their complaint.
+            period (str): The resolution period of the complaint if it opens
+                a new incident.
+
+        Returns:
+            tuple: The incident, the id of the complaint that opened it, and
+            its resolution period.
+        """
+        self._filed.add(name)
+        buckets, counts = ngrams(complaint)
+        weights = self._vector(counts)
+        keys = signature(buckets)
+
+        incident, similarity = self._nearest(buckets, weights, keys)
+        if similarity >= self.threshold:
+            self.sizes[incident] += 1
+            self.linked += 1
+            return self.ids[incident], self.periods[incident]
+
+        self._open(complaint_id, period, buckets, weights, keys)
+        self.opened += 1
+        return complaint_id, period
+
+    def follow(self, book: MemoryStore):
+        """
+        Indexes the complaints other processes filed in a shared book since
+        the index last looked, so whichever process takes a call files it
+        under the same incident with the same resolution period.
+        """
+        position, names = book.changes(self.position)
+        if names is None:
+            logger.warning("Complaints were filed faster than followed, rereading")
+            names = list(book)
+        filed, self._filed = self._filed, set()
+        self.position = position
+        for name in names:
+            entry = book.get(name) if name not in filed else None
+            if entry is not None:
+                self._index(name, entry)
+
+    def _index(self, name: str, entry: Dict):
+        """
+        Counts a complaint filed elsewhere under its incident, opening the
+        incident here if it is new to this index.
+        """
+        incident = entry.get("incident", entry.get("id", name))
+        known = self.incidents.get(incident)
+        if known is not None:
+            self.sizes[known] += 1
+            return
+        # Usually the complaint that opened it, unless that was never seen
+        buckets, counts = ngrams(entry["complaint"])
+        self._open(
+            incident,
+            entry["resolution_period"],
+            buckets,
+            self._vector(counts),
+            signature(buckets),
+        )
+
+    def _cluster(
+        self,
+        indptr: np.ndarray,
+        buckets: np.ndarray,
+        weights: np.ndarray,
+        batch_size: int = 8192,
+    ) -> Tuple[np.ndarray, Dict[int, List[int]]]:
+        """
+        Clusters CSR rows the way `triage` files complaints one by one, in
+        batches: a row joins the most similar leading row sharing a band
+        with it, or leads a new cluster.
+
+        Each batch is compared with the leading rows so far. The rows left
+        are paired with the first row of the batch sharing each of their
+        bands: rows similar to none of them lead, rows similar to one that
+        leads join it, and the others, similar only to rows that joined
+        another cluster, go again with the next batch.
+
+        Returns:
+            tuple: The leading row of each row, and the leading rows under
+            each band.
+        """
+        keys = signatures(indptr, buckets)
+        leaders = np.full(len(keys), -1, np.int64)
+        postings: Dict[int, List[int]] = {}
+        pending = np.arange(len(keys))
+        while len(pending):
+            batch, pending = pending[:batch_size], pending[batch_size:]
+
+            a, b = [], []
+            for row, row_keys in zip(batch.tolist(), keys[batch].tolist()):
+                for key in row_keys:
+                    rows = postings.get(key)
+                    if rows and len(rows) <= MAX_POSTINGS:
+                        a.extend([row] * len(rows))
+                        b.extend(rows)
+            # The MAX_CANDIDATES leading rows sharing most bands with each row
+            pairs, hits = np.unique(
+                np.array(a, np.int64) * len(keys) + np.array(b, np.int64),
+                return_counts=True,
+            )
+            a, b = pairs // len(keys), pairs % len(keys)
+            ranked = np.lexsort((-hits, a))
+            starts = np.searchsorted(a[ranked], a[ranked], "left")
+            kept = ranked[np.arange(len(ranked)) - starts < MAX_CANDIDATES]
+            a, b = a[kept], b[kept]
+            joined, leading = _best(
+                a, b, _similarities(indptr, buckets, weights, a, b), self.threshold
+            )
+            leaders[joined] = leading
+
+            rest = batch[leaders[batch] < 0]
+            band_rows = np.repeat(rest, BANDS)
+            band_keys = keys[rest].ravel()
+            grouped = np.lexsort((band_rows, band_keys))
+            first = np.ones(len(grouped), bool)
+            first[1:] = band_keys[grouped[1:]] != band_keys[grouped[:-1]]
+            heads = band_rows[grouped[first]][np.cumsum(first) - 1]
+            pairs = np.unique(band_rows[grouped] * len(keys) + heads)
+            a, b = pairs // len(keys), pairs % len(keys)
+            a, b = a[a != b], b[a != b]
+            similarities = _similarities(indptr, buckets, weights, a, b)
+            follows = np.zeros(len(keys), bool)
+            follows[a[similarities >= self.threshold]] = True
+            new = rest[~follows[rest]]
+            leaders[new] = new
+            joined, leading = _best(
+                a, b, np.where(leaders[b] == b, similarities, 0), self.threshold
+            )
+            leaders[joined] = leading
+            pending = np.concatenate([rest[leaders[rest] < 0], pending])
+
+            for row, row_keys in zip(new.tolist(), keys[new].tolist()):
+                for key in row_keys:
+                    postings.setdefault(key, []).append(row)
+        return leaders, postings
+
+    def rebuild(self, book: MemoryStore, batch_size: int = 100_000) -> TriageReport:
+        """
+        Clusters every complaint of a book into incidents and indexes them,
+        labelling each complaint with its incident.
+
+        Identical complaints are vectorized once. The n-grams of the
+        remaining texts are hashed `batch_size` at a time, and each text is
+        compared with the most reported text sharing each of its bands.
+        Similar pairs join, and each resulting incident is named after the
+        first complaint of its most reported text. Complaints keep the
+        resolution periods they were given, and those filed without an id
+        are given one.
+
+        Returns:
+            dict: How many complaints and incidents there are, and how many
+            complaints changed incident.
+        """
+        position, _ = book.changes()
+        items = list(book.items())
+        texts: Dict[str, int] = {}
+        text_ids = np.fromiter(
+            (texts.setdefault(entry["complaint"], len(texts)) for _, entry in items),
+            np.int64,
+            len(items),
+        )
+        self.clear()
+        self.position = position
+        if not items:
+            return {"complaints": 0, "incidents": 0, "relabeled": 0}
+
+        # Rows in order of how often their text was reported
+        reports = np.bincount(text_ids)
+        _, first = np.unique(text_ids, return_index=True)
+        order = np.argsort(-reports, kind="stable")
+        unique = list(texts)
+        indptr, buckets, counts = [np.zeros(1, np.int64)], [], []
+        for start in range(0, len(order), batch_size):
+            batch = vectorize([unique[i] for i in order[start : start + batch_size]])
+            indptr.append(batch[0][1:] + indptr[-1][-1])
+            buckets.append(batch[1])
+            counts.append(batch[2])
+        indptr = np.concatenate(indptr)
+        buckets = np.concatenate(buckets)
+        counts = np.concatenate(counts)
+        rows = np.repeat(np.arange(len(order)), np.diff(indptr))
+
+        weights = 1 + np.log(counts)
+        norms = np.sqrt(np.bincount(rows, weights * weights, minlength=len(order)))
+        weights = (weights / norms[rows]).astype(np.float32)
+
+        leaders, postings = self._cluster(indptr, buckets, weights)
+
+        # Incidents, in order of their leading row
+        roots, incident_of_row = np.unique(leaders, return_inverse=True)
+        lengths = indptr[roots + 1] - indptr[roots]
+        _, positions = _ranges(indptr[roots], lengths)
+        self._reserve(len(roots), len(positions))
+        self._starts[: len(roots)] = np.cumsum(lengths) - lengths
+        self._lengths[: len(roots)] = lengths
+        self._buckets[: len(positions)] = buckets[positions]
+        self._weights[: len(positions)] = weights[positions]
+        self._used = len(positions)
+        ids = [entry.get("id") or new_complaint_id() for _, entry in items]
+        for root in roots.tolist():
+            item = first[order[root]]
+            self.incidents[ids[item]] = len(self.ids)
+            self.ids.append(ids[item])
+            self.periods.append(items[item][1]["resolution_period"])
+        self.sizes = (
+            np.bincount(incident_of_row, reports[order], minlength=len(roots))
+            .astype(np.int64)
+            .tolist()
+        )
+
+        incident_of_root = dict(zip(roots.tolist(), range(len(roots))))
+        self.postings = {
+            key: [incident_of_root[row] for row in rows]
+            for key, rows in postings.items()
+        }
+
+        # Label the complaints whose incident changed
+        incident_of_text = np.empty(len(order), np.int64)
+        incident_of_text[order] = incident_of_row
+        labels = [self.ids[i] for i in incident_of_text[text_ids].tolist()]
+        relabeled = 0
+        updates = {}
+        for (name, entry), complaint_id, incident in zip(items, ids, labels):
+            if entry.get("incident") != incident or entry.get("id") != complaint_id:
+                updates[name] = {**entry, "id": complaint_id, "incident": incident}
+                if len(updates) >= batch_size:
+                    book.update(updates)
+                    relabeled += len(updates)
+                    updates = {}
+        book.update(updates)
+        relabeled += len(updates)
+        # The relabels need not be followed; complaints filed elsewhere
+        # meanwhile are missed, as rebuilds run before calls are taken
+        self.position, _ = book.changes()
+
+        logger.info(
+            f"Triaged {len(items)} complaints into {len(self)} incidents, "
+            f"{relabeled} relabeled"
+        )
+        return {
+            "complaints": len(items),
+            "incidents": len(self),
+            "relabeled": relabeled,
+        }
+
+    def collect(self) -> List[Family]:
+        """
+        Returns the incident count and triage outcomes as metric families,
+        for `metrics.collector`.
+        """
+        return [
+            gauge(
+                "agent_complaint_incidents",
+                "Incidents complaints are filed under",
+                len(self),
+            ),
+            counter(
+                "agent_complaints_triaged_total",
+                "New complaints by whether they joined a known incident",
+                {"linked": self.linked, "opened": self.opened},
+                "outcome",
+            ),
+        ]
+
+
+"""
+Incidents of the complaint book
+"""
+complaint_triage = TriageIndex()
+
+
+if __name__ == "__main__":
+    from apps.customer_service.functions.main import complaint_book
+
+    parser = argparse.ArgumentParser(
+        description="Clusters the complaint book into incidents"
+    )
+    parser.add_argument(
+        "--store", required=True, help="Complaint book snapshot to update"
+    )
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    complaint_book.path = args.store
+    complaint_book.load()
+    complaint_triage.threshold = args.threshold
+    print(complaint_triage.rebuild(complaint_book))
+    complaint_book.flush()
@@ -1,14 +1,10 @@
 import asyncio
 import logging
 import os
+import time
 from typing import Callable
 
 from ai01.agent import Agent, AgentOptions, AgentsEvents
-from ai01.providers.gemini.gemini_realtime import (
-    GeminiConfig,
-    GeminiOptions,
-    GeminiRealtime,
-)
 from ai01.providers.openai import AudioTrack
 from ai01.rtc import (
     HuddleClientOptions,
@@ -21,14 +17,21 @@ from ai01.rtc import (
 from dotenv import load_dotenv
 from google.genai import types
 
-from apps.customer_service.functions.main import (
-    add_complaint,
-    add_complaint_tool,
-    check_for_complaint,
-    check_for_complaint_tool,
-    get_complaint_details,
-    get_complaint_details_tool,
-)
+from apps.customer_service.functions.main import complaint_book
+from apps.customer_service.functions.triage import complaint_triage
+from apps.customer_service.prompt import bot_prompt
+from apps.customer_service.tools import registry
+from apps.shared.admission import AdmissionPolicy
+from apps.shared.audio import AudioMixer
+from apps.shared.http import HttpServer
+from apps.shared.lifecycle import aclose, lifecycle
+from apps.shared.loop import LoopOptions, run
+from apps.shared.metrics import gauge, metrics, room_events
+from apps.shared.profiling import memory_profiler
+from apps.shared.ratelimit import tool_call_limiter
+from apps.shared.realtime import GeminiBackend
+from apps.shared.recorder import trace_recorder
+from apps.shared.tools import tool_call_seconds
 
 load_dotenv()
 
@@ -51,15 +54,117 @@ async def main():
         if not huddle01_api_key or not huddle01_project_id or not gemini_api_key:
             raise ValueError("Required Environment Variables are not set")
 
+        # Tool response schema: full, or compact to trim redundant nesting
+        registry.compact = os.getenv("TOOL_RESPONSE_SCHEMA", "full") == "compact"
+
+        # Tool calls per second and burst, per room and per tool of a room, and
+        # calls queued per room, beyond which the model is told to slow down
+        tool_call_limiter.rate = float(os.getenv("TOOL_CALL_RATE", "5"))
+        tool_call_limiter.burst = float(os.getenv("TOOL_CALL_BURST", "10"))
+        tool_call_limiter.tool_rate = float(os.getenv("TOOL_CALL_RATE_PER_TOOL", "2"))
+        tool_call_limiter.tool_burst = float(os.getenv("TOOL_CALL_BURST_PER_TOOL", "5"))
+        tool_call_limiter.max_pending = int(os.getenv("TOOL_CALL_QUEUE", "4"))
+
+        # Seconds to let in-flight tool calls finish on shutdown
+        lifecycle.drain_timeout = float(os.getenv("DRAIN_TIMEOUT", "30"))
+        lifecycle.install_signal_handlers()
+
+        # Liveness and readiness endpoints polled by the orchestrator, and
+        # the metrics scraped by Prometheus
+        health_server = HttpServer(port=int(os.getenv("HEALTH_PORT", "8080")))
+        lifecycle.register_routes(health_server)
+        metrics.register_routes(health_server)
+
+        # Memory reports on /debug/memory and SIGUSR1: off, on, or trace to
+        # also attribute allocations from startup
+        memory_profile = os.getenv("MEMORY_PROFILE", "off")
+        if memory_profile != "off":
+            memory_profiler.register_routes(health_server)
+            memory_profiler.install_signal_handler()
+        if memory_profile == "trace":
+            memory_profiler.start(int(os.getenv("MEMORY_PROFILE_FRAMES", "1")))
+
+        await health_server.start()
+
+        def on_file(peer_id: str) -> bool:
+            # Callers identified by name with a complaint in the book
+            name = admission.peer_sessions.get(peer_id)
+            return name is not None and name in complaint_book
+
+        # Decides which audio producers are consumed and streamed to the
+        # model, callers being served first
+        admission = AdmissionPolicy(
+            max_tracks=int(os.getenv("MAX_AUDIO_TRACKS", "4")),
+            idle_timeout=float(os.getenv("AUDIO_IDLE_TIMEOUT", "10")),
+            priority=on_file,
+        )
+
+        # VAD gates every consumed track and mixes the speakers into one stream
+        mixer = AudioMixer(on_level=admission.observe)
+
+        # State survives a restart when a store path is configured
+        complaint_book.path = os.getenv("COMPLAINT_STORE_PATH")
+        complaint_book.load()
+
+        # Complaints shared by the agent processes of the host
+        shared_store = os.getenv("SHARED_COMPLAINT_STORE")
+        if shared_store:
+            complaint_book.share(
+                shared_store,
+                slots=int(os.getenv("SHARED_STORE_SLOTS", "65536")),
+                slot_size=int(os.getenv("SHARED_STORE_SLOT_SIZE", "2048")),
+            )
+            registry.store = complaint_book
+
+        # Complaints about one incident share its resolution period, matched
+        # by the cosine similarity of their n-gram vectors
+        complaint_triage.threshold = float(os.getenv("TRIAGE_THRESHOLD", "0.72"))
+        complaint_triage.rebuild(complaint_book)
+
+        # Served on /metrics, read from the stores and counters on each scrape
+        metrics.collector(
+            lambda: [gauge("agent_complaints", "Complaints filed", len(complaint_book))]
+        )
+        metrics.collector(registry.collect)
+        metrics.collector(complaint_triage.collect)
+        metrics.collector(tool_call_limiter.collect)
+        metrics.collector(trace_recorder.collect)
+
+        # What the agent holds, for memory reports
+        memory_profiler.account(
+            "stores",
+            lambda: {
+                "complaints": len(complaint_book),
+                "complaint incidents": len(complaint_triage),
+                "tool cache sessions": registry.cache_stats()["sessions"],
+                "rate limited rooms": len(tool_call_limiter.rooms),
+            },
+        )
+
+        # Room ID
+        room_id = "DAAO"
+
+        # Every tool call and agent event, for quality review and replay in
+        # the offline harness, in segments rotated by compressed size and age
+        trace_dir = os.getenv("TRACE_DIR")
+        if trace_dir:
+            trace_recorder.segment_bytes = (
+                int(os.getenv("TRACE_SEGMENT_MB", "64")) << 20
+            )
+            trace_recorder.segment_seconds = float(
+                os.getenv("TRACE_SEGMENT_SECONDS", "3600")
+            )
+            trace_recorder.start(trace_dir, prefix="customer_service")
+
         # RTCOptions is the configuration for the RTC
         rtcOptions = RTCOptions(
             api_key=huddle01_api_key,
             project_id=huddle01_project_id,
-            room_id="DAAO",
+            room_id=room_id,
             role=Role.HOST,
             metadata={"displayName": "Agent"},
             huddle_client_options=HuddleClientOptions(
-                autoConsume=True, volatileMessaging=False
+                autoConsume=False, volatileMessaging=False
             ),
         )
 
@@ -69,24 +174,9 @@ async def main():
         )
 
         # RealTimeModel is the Model which is going to be used by the Agent
-        llm = GeminiRealtime(
-            agent=agent,
-            options=GeminiOptions(
-                gemini_api_key=gemini_api_key,
-                system_instruction="""### Role
-                You are an AI Customer Support Agent named Sophie, Your role is to register customer complaints.
-                There are three things the customer can do:
-                    1. Register a complaint: if they want to register a complaint. ask for their name and complaint.
-                    2. Check for a complaint: if they want to check if their complaint is already registered. ask for their name.
-                    3. Get complaint details: if they want to get the details of their complaint. ask for their name.""",
-                config=GeminiConfig(
-                    function_declaration=[
-                        add_complaint_tool,
-                        check_for_complaint_tool,
-                        get_complaint_details_tool,
-                    ],
-                ),
-            ),
+        # Tool calls are handled as Gemini `LiveServerToolCall`s below
+        llm = GeminiBackend(gemini_api_key).create(
+            agent, instructions=bot_prompt, registry=registry
         )
 
         # Join the dRTC Network, which creates a Room instance for the Agent to Join.
@@ -96,6 +186,7 @@ async def main():
         @room.on(RoomEvents.RoomJoined)
         def on_room_joined():
             logger.info("Room Joined")
+            room_events.labels("room_joined").inc()
 
         # @room.on(RoomEvents.NewPeerJoined)
         # def on_new_remote_peer(data: RoomEventsData.NewPeerJoined):
@@ -109,9 +200,20 @@ async def main():
         # def on_room_closed(data: RoomEventsData.RoomClosed):
         #     logger.info("Room Closed")
 
-        # @room.on(RoomEvents.RemoteProducerAdded)
-        # def on_remote_producer_added(data: RoomEventsData.RemoteProducerAdded):
-        #     logger.info(f"Remote Producer Added: {data['producer_id']}")
+        @room.on(RoomEvents.RemoteProducerAdded)
+        def on_remote_producer_added(data: RoomEventsData.RemoteProducerAdded):
+            logger.info(f"Remote Producer Added: {data['producer_id']}")
+            room_events.labels("remote_producer_added").inc()
+            if not lifecycle.accepting:
+                return
+            if data["label"] == "audio" and admission.should_consume(
+                data["remote_peer_id"], data["producer_id"]
+            ):
+                asyncio.create_task(
+                    agent.rtc.consume(
+                        peer_id=data["remote_peer_id"], producer_id=data["producer_id"]
+                    )
+                )
 
         # @room.on(RoomEvents.RemoteProducerClosed)
         # def on_remote_producer_closed(data: RoomEventsData.RemoteProducerClosed):
@@ -120,19 +222,31 @@ async def main():
         @room.on(RoomEvents.NewConsumerAdded)
         def on_remote_consumer_added(data: RoomEventsData.NewConsumerAdded):
             logger.info(f"Remote Consumer Added: {data}")
+            room_events.labels("consumer_added").inc()
+            if not lifecycle.accepting:
+                return
 
             if data["kind"] == "audio":
-                track = data["consumer"].track
+                consumer = data["consumer"]
+                track = consumer.track
 
                 if track is None:
                     logger.error("Consumer Track is None, This should never happen.")
                     return
 
-                llm.conversation.add_track(data["consumer_id"], track)
+                admission.admit(
+                    data["consumer_id"],
+                    admission.peer_for_producer(getattr(consumer, "producerId", None)),
+                    consumer,
+                )
+                mixer.add_track(data["consumer_id"], track)
 
-        # @room.on(RoomEvents.ConsumerClosed)
-        # def on_remote_consumer_closed(data: RoomEventsData.ConsumerClosed):
-        #     logger.info(f"Remote Consumer Closed: {data['consumer_id']}")
+        @room.on(RoomEvents.ConsumerClosed)
+        def on_remote_consumer_closed(data: RoomEventsData.ConsumerClosed):
+            logger.info(f"Remote Consumer Closed: {data['consumer_id']}")
+            room_events.labels("consumer_closed").inc()
+            admission.remove(data["consumer_id"])
+            mixer.remove_track(data["consumer_id"])
 
         # @room.on(RoomEvents.ConsumerPaused)
         # def on_remote_consumer_paused(data: RoomEventsData.ConsumerPaused):
@@ -146,98 +260,86 @@ async def main():
         @agent.on(AgentsEvents.Connected)
         def on_agent_connected():
             logger.info("Agent Connected")
+            room_events.labels("agent_connected").inc()
+            trace_recorder.event(room_id, "agent_connected")
 
         @agent.on(AgentsEvents.Disconnected)
         def on_agent_disconnected():
             logger.info("Agent Disconnected")
+            room_events.labels("agent_disconnected").inc()
+            trace_recorder.event(room_id, "agent_disconnected")
 
         @agent.on(AgentsEvents.Speaking)
         def on_agent_speaking():
             logger.info("Agent Speaking")
+            room_events.labels("agent_speaking").inc()
+            trace_recorder.event(room_id, "agent_speaking")
 
         @agent.on(AgentsEvents.Listening)
         def on_agent_listening():
             logger.info("Agent Listening")
+            room_events.labels("agent_listening").inc()
+            trace_recorder.event(room_id, "agent_listening")
 
         @agent.on(AgentsEvents.Thinking)
         def on_agent_thinking():
             logger.info("Agent Thinking")
+            room_events.labels("agent_thinking").inc()
+            trace_recorder.event(room_id, "agent_thinking")
 
         @agent.on(AgentsEvents.ToolCall)
         async def on_tool_call(callback: Callable, tool_call: types.LiveServerToolCall):
-            logger.info(f"Tool Call: {tool_call}")
-            function_responses = []
-
-            if tool_call.function_calls:
-                for function_call in tool_call.function_calls:
-                    name = function_call.name
-                    args = function_call.args
-                    # Extract the numeric part from Gemini's function call ID
-                    call_id = function_call.id
-                    if name == "check_for_complaint":
-                        if not args:
-                            print("Missing required parameter 'name'")
-                            continue
-                        argname = args["name"]
-                        boolean = check_for_complaint(argname)
-                        function_responses.append(
-                            {
-                                "name": "check_for_complaint",
-                                "response": {"exists": boolean},
-                                "id": call_id,
-                            }
+            logger.debug(f"Tool Call: {tool_call}")
+            start = time.perf_counter()
+            async with lifecycle.in_flight(), tool_call_limiter.slot(room_id) as queued:
+                function_responses = []
+
+                if tool_call.function_calls:
+                    for function_call in tool_call.function_calls:
+                        # The key the tools file the caller under
+                        name = registry.argument(
+                            function_call.name, function_call.args, "name"
                         )
-                    elif name == "add_complaint":
-                        if not args:
-                            print("Missing required parameters 'name' and 'complaint'")
-                            continue
-                        argname = args["name"]
-                        argcomplaint = args["complaint"]
-
-                        add_complaint(argname, argcomplaint)
-                        response = (
-                            f"Stored the complaint of {argname} as {argcomplaint}"
+                        if name is not None:
+                            admission.attribute(name)
+                        # A full queue or a call over its rate gets a slow
+                        # down result
+                        response = queued or tool_call_limiter.take(
+                            room_id, function_call.name
                         )
+                        if response is None:
+                            response = registry.dispatch(
+                                function_call.name, function_call.args
+                            )
                         function_responses.append(
                             {
-                                "name": "add_complaint",
-                                "response": {"response": response},
-                                "id": call_id,
-                            }
-                        )
-                    elif name == "get_complaint_details":
-                        if not args:
-                            print("Missing required parameter 'name'")
-                            continue
-                        argname = args["name"]
-
-                        response = {
-                            "error": "Name not found in the complaint book",
-                        }
-
-                        details = get_complaint_details(argname)
-
-                        if details is not None:
-                            response = {
-                                "complaint": details.get("complaint"),
-                                "resolution_period": details.get("resolution_period"),
-                            }
-
-                        function_responses.append(
-                            {
-                                "name": "get_complaint_details",
+                                "name": function_call.name,
                                 "response": response,
-                                "id": call_id,
+                                "id": function_call.id,
                             }
                         )
-                    else:
-                        print(f"Unknown function name: {function_call.name}")
 
-            await callback(function_responses)
+                await callback(function_responses)
+
+            elapsed = time.perf_counter() - start
+            for function_call, function_response in zip(
+                tool_call.function_calls or (), function_responses
+            ):
+                tool_call_seconds.labels(function_call.name).observe(elapsed)
+                trace_recorder.tool_call(
+                    room_id,
+                    function_call.name,
+                    function_call.args,
+                    function_response["response"],
+                    elapsed,
+                )
 
         # Connect to the LLM to the Room
         await llm.connect()
 
+        # The model hears a single mixed stream of the speaking participants
+        llm.conversation.add_track("mixer", mixer.track)
+
         # Connect the Agent to the Room
         await agent.connect()
 
@@ -249,22 +351,58 @@ async def main():
                 )
             )
 
+        # Rotate live audio slots between speakers
+        admission_task = asyncio.create_task(admission.run())
+        monitor_task = asyncio.create_task(metrics.monitor())
+
+        memory_profiler.account(
+            f"room {room_id}",
+            lambda: {
+                "consumers": len(admission.slots),
+                "audio inputs": len(mixer.inputs),
+            },
+        )
+
         # @agent.on(RoomEvents.NewDataMessage)
         # def on_new_data_message(data: AgentEvent.NewDataMessage):
         #     print(f"New Data Message: {data['peer_id']} - {data['message']}")
 
-        # Force the program to run indefinitely
-        try:
-            await asyncio.Future()
-        except KeyboardInterrupt:
-            logger.info("Exiting...")
+        # Shutdown order: flush state, then close the LLM, RTC and health server
+        lifecycle.on_shutdown(admission_task.cancel)
+        lifecycle.on_shutdown(monitor_task.cancel)
+        lifecycle.on_shutdown(mixer.stop)
+        lifecycle.on_shutdown(complaint_book.flush)
+        lifecycle.on_shutdown(complaint_book.close)
+        lifecycle.on_shutdown(lambda: aclose(llm))
+        lifecycle.on_shutdown(lambda: aclose(agent))
+        lifecycle.on_shutdown(trace_recorder.stop)
+        lifecycle.on_shutdown(health_server.close)
+        lifecycle.on_shutdown(
+            lambda: logger.info(f"Tool cache: {registry.cache_stats()}")
+        )
+        lifecycle.on_shutdown(
+            lambda: logger.info(f"Tool calls: {tool_call_limiter.stats()}")
+        )
+        lifecycle.mark_ready()
+
+        # Run until SIGTERM/SIGINT, then drain in-flight work and shut down
+        await lifecycle.run_until_stopped()
 
     except KeyboardInterrupt:
         print("Exiting...")
 
     except Exception as e:
-        print(e)
+        logger.exception(e)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Event loop: asyncio or uvloop, threads of the default executor (0 for
+    # asyncio's default), and eager task starts on Python 3.12+
+    run(
+        main(),
+        LoopOptions(
+            loop=os.getenv("EVENT_LOOP", "asyncio"),
+            executor_workers=int(os.getenv("EXECUTOR_WORKERS", "0")) or None,
+            eager_tasks=os.getenv("EAGER_TASKS") == "1",
+        ),
+    )
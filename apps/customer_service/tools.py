@@ -0,0 +1,38 @@
+from apps.customer_service.functions.main import (
+    add_complaint,
+    add_complaint_tool,
+    check_for_complaint,
+    check_for_complaint_tool,
+    get_complaint_details,
+    get_complaint_details_tool,
+)
+from apps.shared.tools import ToolRegistry
+
+"""
+Tools exposed to the realtime model, whichever provider serves the room
+"""
+registry = ToolRegistry(session="name")
+
+
+@registry.tool(add_complaint_tool)
+def _add_complaint(name: str, complaint: str):
+    add_complaint(name, complaint)
+    return {"response": f"Stored the complaint of {name} as {complaint}"}
+
+
+@registry.tool(check_for_complaint_tool, read_only=True)
+def _check_for_complaint(name: str):
+    return {"exists": check_for_complaint(name)}
+
+
+@registry.tool(get_complaint_details_tool, read_only=True)
+def _get_complaint_details(name: str):
+    details = get_complaint_details(name)
+
+    if details is None:
+        return {"error": "Name not found in the complaint book"}
+
+    return {
+        "complaint": details.get("complaint"),
+        "resolution_period": details.get("resolution_period"),
+    }
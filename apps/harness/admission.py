@@ -0,0 +1,115 @@
+import argparse
+import io
+import time
+
+import numpy as np
+
+from apps.harness.rooms import FRAME_MS, frame_pool, participants
+from apps.shared.admission import AdmissionPolicy
+from apps.shared.audio import EnergyVad
+
+
+class FakeConsumer:
+    def __init__(self):
+        self.paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--participants", type=int, default=12)
+    parser.add_argument("--active", type=int, default=3)
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--max-tracks", type=int, default=4)
+    parser.add_argument("--idle-timeout", type=float, default=10.0)
+
+
+def simulate(args: argparse.Namespace, admission: bool) -> dict:
+    """
+    Streams every participant's audio for `seconds` and measures the cost of
+    receiving, decoding and forwarding it to the model.
+    """
+    voiced, silent = frame_pool()
+    payloads = (
+        [frame.tobytes() for frame in voiced],
+        [frame.tobytes() for frame in silent],
+    )
+    room = participants(args.participants, args.active)
+    upstream = io.BytesIO()
+
+    # Every participant is consumed; only the first `max_tracks` start live
+    policy = AdmissionPolicy(
+        max_tracks=args.max_tracks if admission else args.participants,
+        max_consumers=args.participants,
+        idle_timeout=args.idle_timeout,
+    )
+    consumers = {}
+    for participant in room:
+        consumers[participant.peer_id] = FakeConsumer()
+        policy.should_consume(participant.peer_id, participant.peer_id)
+        policy.admit(
+            participant.peer_id,
+            participant.peer_id,
+            consumers[participant.peer_id],
+            now=0.0,
+        )
+
+    meter = EnergyVad()
+    ticks = args.seconds * 1000 // FRAME_MS
+    forwarded = voiced_frames = missed_voiced = 0
+
+    start = time.process_time()
+    for tick in range(ticks):
+        now = tick * FRAME_MS / 1000
+        for participant in room:
+            talking = participant.step()
+            voiced_frames += talking
+
+            if consumers[participant.peer_id].paused:
+                missed_voiced += talking
+                continue
+
+            payload = payloads[0 if talking else 1][tick % len(payloads[0])]
+            samples = np.frombuffer(payload, dtype=np.int16)
+            policy.observe(participant.peer_id, meter.level(samples), now=now)
+            upstream.write(payload)
+            forwarded += 1
+
+        if upstream.tell() > 1 << 24:
+            upstream.seek(0)
+        if tick % (1000 // FRAME_MS) == 0:
+            policy.rebalance(now=now)
+    cpu = time.process_time() - start
+
+    return {
+        "frames": forwarded,
+        "bytes": forwarded * len(payloads[0][0]),
+        "cpu": cpu,
+        "missed_voiced": missed_voiced / max(voiced_frames, 1),
+        "resumes": policy.resumes,
+    }
+
+
+def run(args: argparse.Namespace):
+    baseline = simulate(args, admission=False)
+    gated = simulate(args, admission=True)
+
+    print(
+        f"{args.participants} participants ({args.active} active), "
+        f"{args.seconds}s, max_tracks={args.max_tracks}"
+    )
+    print(f"{'':>12} {'frames':>10} {'MB':>8} {'cpu s':>8} {'missed voice':>13}")
+    for name, result in (("all tracks", baseline), ("admission", gated)):
+        print(
+            f"{name:>12} {result['frames']:>10} {result['bytes'] / 1e6:>8.1f} "
+            f"{result['cpu']:>8.2f} {result['missed_voiced']:>12.1%}"
+        )
+    print(
+        f"savings: {1 - gated['bytes'] / baseline['bytes']:.1%} bandwidth, "
+        f"{1 - gated['cpu'] / baseline['cpu']:.1%} cpu, "
+        f"{gated['resumes']} slot rotations"
+    )
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.tools import registry
+from apps.shared.ratelimit import ToolCallLimiter
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    # Tool call events per second fired by the runaway model
+    parser.add_argument("--runaway-rate", type=float, default=5000)
+
+
+async def tool_call(limiter: ToolCallLimiter, room: str, name: str, args: dict):
+    """
+    What the agents do on a ToolCall event: wait for the room's turn, take
+    a token, dispatch, and send the result back.
+    """
+    async with limiter.slot(room) as result:
+        result = result or limiter.take(room, name)
+        if result is None:
+            result = registry.dispatch(name, args)
+        # Sending the response to the model socket
+        json.dumps(result)
+        await asyncio.sleep(0)
+    return result
+
+
+async def player(limiter: ToolCallLimiter, room: int, latencies: list, until: float):
+    """
+    A well behaved room: a hand of a few tool calls every couple of seconds,
+    the pace of a player talking to the dealer.
+    """
+    player_id = room
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        game_state_map.pop(player_id, None)
+        for name, args in (
+            ("create_game_session_and_deal_initial_cards", {"bet_amount": 10}),
+            ("calculate_hand_value", {"recipient": "player"}),
+            ("dealer_turn", {}),
+            ("check_game_status", {}),
+        ):
+            await tool_call(
+                limiter, f"room-{room}", name, {"player_id": player_id, **args}
+            )
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(2.0)
+
+
+async def runaway(limiter: ToolCallLimiter, rate: float, until: float) -> int:
+    """
+    A model stuck in a loop checking its hand, each event handled in a new
+    task like the SDK does, never waiting for the results.
+    """
+    tasks = set()
+    fired = 0
+    player_id = -1
+    registry.dispatch(
+        "create_game_session_and_deal_initial_cards",
+        {"player_id": player_id, "bet_amount": 10},
+    )
+    # Events arrive in batches, one per 10ms of the socket's reads
+    burst = max(1, int(rate / 100))
+    while time.perf_counter() < until:
+        for _ in range(burst):
+            task = asyncio.create_task(
+                tool_call(
+                    limiter,
+                    "runaway",
+                    "calculate_hand_value",
+                    {"player_id": player_id, "recipient": "player"},
+                )
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        fired += burst
+        await asyncio.sleep(0.01)
+    for task in tasks:
+        task.cancel()
+    return fired
+
+
+async def simulate(args: argparse.Namespace, limiter: ToolCallLimiter) -> dict:
+    latencies: list = []
+    until = time.perf_counter() + args.seconds
+    await asyncio.gather(
+        runaway(limiter, args.runaway_rate, until),
+        *(player(limiter, room, latencies, until) for room in range(args.rooms)),
+    )
+    game_state_map.clear()
+    return {
+        "hands": len(latencies),
+        "p50": np.percentile(latencies, 50) * 1e3,
+        "p99": np.percentile(latencies, 99) * 1e3,
+        "stats": limiter.stats(),
+    }
+
+
+def run(args: argparse.Namespace):
+    # A warning per turned away call would dominate the limited run
+    logging.getLogger("Chatbot").setLevel(logging.ERROR)
+    variants = {
+        # Limits no room ever reaches, only the per room turn taking remains
+        "unlimited": ToolCallLimiter(
+            rate=1e9, burst=1e9, tool_rate=1e9, tool_burst=1e9, max_pending=10**9
+        ),
+        "limited": ToolCallLimiter(),
+    }
+    print(f"{args.rooms} rooms playing, 1 runaway room, {args.seconds:.0f}s")
+    print(
+        f"{'':>10} {'hands':>6} {'hand p50 ms':>12} {'hand p99 ms':>12} "
+        f"{'calls run':>10} {'turned away':>12} {'queue peak':>11}"
+    )
+    for name, limiter in variants.items():
+        result = asyncio.run(simulate(args, limiter))
+        stats = result["stats"]
+        print(
+            f"{name:>10} {result['hands']:>6} {result['p50']:>12.1f} "
+            f"{result['p99']:>12.1f} {stats['admitted']:>10} "
+            f"{sum(stats['rejected'].values()):>12} {stats['pending_peak']:>11}"
+        )
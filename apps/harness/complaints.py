@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from apps.customer_service.functions.bulk import export, load
+from apps.customer_service.functions.main import complaint_book
+from apps.shared.encoding import dumps
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--records", type=int, default=1_000_000)
+
+
+def write_tickets(path: str, records: int, format: str):
+    """
+    Writes `records` historical tickets, a third of them without a
+    resolution period and one in a thousand invalid.
+    """
+    rng = random.Random(1)
+    with open(path, "wb") as f:
+        if format == "csv":
+            f.write(b"name,complaint,resolution_period\n")
+        for i in range(records):
+            period = rng.choice(["", f"{rng.randint(1, 7)} days", "12 hours"])
+            complaint = "" if i % 1000 == 999 else f"ticket {i}: app keeps crashing"
+            if format == "csv":
+                f.write(f"customer-{i},{complaint},{period}\n".encode())
+            else:
+                row = {"name": f"customer-{i}", "complaint": complaint}
+                if period:
+                    row["resolution_period"] = period
+                f.write(dumps(row) + b"\n")
+
+
+def run(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as directory:
+        for format in ("jsonl", "csv"):
+            path = os.path.join(directory, f"tickets.{format}")
+            write_tickets(path, args.records, format)
+            complaint_book.clear()
+
+            start = time.perf_counter()
+            report = load(path)
+            loaded = time.perf_counter() - start
+
+            start = time.perf_counter()
+            exported = sum(len(chunk) for chunk in export(format))
+            exporting = time.perf_counter() - start
+
+            print(
+                f"{format:>5}: import {args.records / loaded / 1e3:.0f}k records/s "
+                f"({report['loaded']} loaded, {report['rejected']} rejected, "
+                f"{report['incidents']} incidents), "
+                f"export {len(complaint_book) / exporting / 1e3:.0f}k records/s "
+                f"({exported / 1e6:.0f}MB)"
+            )
@@ -0,0 +1,58 @@
+import argparse
+import json
+import time
+
+from apps.shared.encoding import compact, dumps, orjson
+
+"""
+A hand's worth of tool results, in the shapes the blackjack tools return
+"""
+RESULTS = [
+    {
+        "player_hand": ["10 of hearts", "6 of spades"],
+        "dealer_face_up": "9 of clubs",
+        "balance": 990.0,
+    },
+    {"output": {"total": 16, "soft": False}},
+    {"card": "4 of diamonds", "recipient": "player"},
+    {"output": {"total": 20, "soft": False}},
+    {"dealer_hand": ["7 of hearts", "9 of clubs", "2 of spades"]},
+    {"output": {"total": 18, "soft": False}},
+    {"game_state": {"game_state": "player_win", "amount": 20}, "balance": 1010.0},
+]
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--calls", type=int, default=200_000)
+
+
+def measure(encode, results, calls: int) -> dict:
+    encoded = [encode(result) for result in results]
+    start = time.perf_counter()
+    for i in range(calls):
+        encode(results[i % len(results)])
+    elapsed = time.perf_counter() - start
+    return {
+        "bytes": sum(len(payload) for payload in encoded) / len(encoded),
+        "us": elapsed / calls * 1e6,
+    }
+
+
+def run(args: argparse.Namespace):
+    compacted = [compact(result) for result in RESULTS]
+    variants = {
+        # What the SDK does with the full schema: json.dumps with defaults
+        "json, full": (lambda result: json.dumps(result).encode(), RESULTS),
+        "json, compact": (
+            lambda result: json.dumps(result, separators=(",", ":")).encode(),
+            compacted,
+        ),
+        "dumps, full": (dumps, RESULTS),
+        "dumps, compact": (dumps, compacted),
+    }
+
+    print(f"encoder: {'orjson' if orjson is not None else 'json (orjson missing)'}")
+    print(f"{'':>16} {'bytes/call':>11} {'encode us':>10}")
+    for name, (encode, results) in variants.items():
+        result = measure(encode, results, args.calls)
+        print(f"{name:>16} {result['bytes']:>11.1f} {result['us']:>10.2f}")
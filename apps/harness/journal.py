@@ -0,0 +1,103 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from apps.blackjack.functions.journal import (
+    JOURNAL_HEADER,
+    OP_BET,
+    OP_DEALER_CARD,
+    OP_PLAYER_CARD,
+    OP_SETTLE,
+    RECORD_DTYPE,
+    GameJournal,
+    JournalReader,
+    encode_snapshot,
+)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--events", type=int, default=20_000_000)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--appends", type=int, default=1_000_000)
+
+
+def synthetic_journal(path: str, events: int, players: int, seed: int = 1):
+    """
+    Writes a journal of `events` records as hands of bet, four cards, one
+    hit and a settlement, spread over `players` sessions.
+    """
+    rng = np.random.default_rng(seed)
+    hand_ops = np.array(
+        [OP_BET]
+        + [OP_PLAYER_CARD] * 2
+        + [OP_DEALER_CARD] * 2
+        + [OP_PLAYER_CARD, OP_SETTLE],
+        dtype=np.uint8,
+    )
+    hands = events // len(hand_ops)
+
+    records = np.zeros(hands * len(hand_ops), dtype=RECORD_DTYPE)
+    records["timestamp"] = time.time() + np.arange(len(records)) * 1e-3
+    records["session"] = np.repeat(rng.integers(0, players, hands), len(hand_ops))
+    records["op"] = np.tile(hand_ops, hands)
+    records["card"] = rng.integers(0, 52, len(records))
+    records["value"] = np.where(records["op"] == OP_BET, 10, 0)
+    records["card"][records["op"] == OP_SETTLE] = 5
+    records["value"][records["op"] == OP_SETTLE] = -20
+
+    with open(path, "wb") as f:
+        f.write(JOURNAL_HEADER)
+        records.tofile(f)
+
+
+def run(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "journal")
+
+        # Append cost through the buffered writer
+        journal = GameJournal(snapshot_every=args.appends + 1)
+        journal.open(path, {})
+        start = time.perf_counter()
+        for i in range(args.appends):
+            journal.record_card(i % args.players, "player", "A of spades")
+        journal.flush()
+        append = time.perf_counter() - start
+        journal.close()
+        print(
+            f"append: {args.appends} records in {append:.2f}s, "
+            f"{append / args.appends * 1e6:.2f}us per record"
+        )
+
+        synthetic_journal(path, args.events, args.players)
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        reader = JournalReader(path)
+        opened = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sessions = reader.rebuild()
+        rebuild = time.perf_counter() - start
+
+        # A snapshot as the writer leaves it, at most `snapshot_every` behind
+        covered = len(reader) - GameJournal().snapshot_every
+        with open(f"{path}.snapshot", "wb") as f:
+            f.write(encode_snapshot(sessions, covered))
+        start = time.perf_counter()
+        reader.rebuild()
+        rebuild_snapshot = time.perf_counter() - start
+
+        start = time.perf_counter()
+        audit = reader.audit(0)
+        audited = time.perf_counter() - start
+        reader.close()
+
+        print(f"journal: {len(sessions)} sessions, {size / 1e6:.0f}MB")
+        print(f"open (mmap): {opened * 1e3:.2f}ms")
+        print(f"rebuild all sessions, no snapshot: {rebuild * 1e3:.0f}ms")
+        print(f"rebuild all sessions from a snapshot: {rebuild_snapshot * 1e3:.0f}ms")
+        print(f"audit last hand of one player: {audited * 1e3:.0f}ms")
+        print(f"  {audit['player_hand']} vs {audit['dealer_hand']}")
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from apps.blackjack.web3.keystore import Keystore
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--wallets", type=int, default=4)
+    parser.add_argument("--payouts", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--kdf", choices=["scrypt", "pbkdf2"], default="scrypt")
+    parser.add_argument("--iterations", type=int, default=None)
+
+
+def payout(nonce: int) -> dict:
+    return {
+        "nonce": nonce,
+        "to": "0x" + "11" * 20,
+        "value": 10**15,
+        "gas": 21000,
+        "maxFeePerGas": 2 * 10**9,
+        "maxPriorityFeePerGas": 10**8,
+        "chainId": 1,
+    }
+
+
+async def sign_payouts(keystore: Keystore, addresses: list, payouts: int) -> float:
+    """
+    Signs `payouts` transactions round robin from `addresses`, unlocking
+    each batch's wallet through the keystore, and returns signatures/s.
+    """
+    start = time.perf_counter()
+    for nonce in range(payouts):
+        address = addresses[nonce % len(addresses)]
+        (account,) = (await keystore.unlock([address])).values()
+        account.sign_transaction(payout(nonce))
+    return payouts / (time.perf_counter() - start)
+
+
+async def measure(args: argparse.Namespace, directory: str):
+    keystore = Keystore(
+        directory,
+        "harness",
+        workers=args.workers,
+        kdf=args.kdf,
+        iterations=args.iterations,
+    )
+    start = time.perf_counter()
+    addresses = await asyncio.gather(*(keystore.create() for _ in range(args.wallets)))
+    created = time.perf_counter() - start
+
+    keystore.lock()
+    start = time.perf_counter()
+    await keystore.unlock(addresses[:1])
+    kdf = time.perf_counter() - start
+
+    keystore.lock()
+    start = time.perf_counter()
+    await keystore.unlock(addresses)
+    parallel = time.perf_counter() - start
+
+    keystore.lock()
+    cold = await sign_payouts(keystore, addresses, args.payouts)
+    warm = await sign_payouts(keystore, addresses, args.payouts)
+    stats = keystore.stats()
+    keystore.close()
+
+    print(f"kdf: {args.kdf}, {args.workers or os.cpu_count()} workers")
+    print(f"created {args.wallets} wallets in {created:.2f}s")
+    print(f"unlock: {kdf * 1e3:.0f}ms one key, {parallel * 1e3:.0f}ms all keys")
+    print(f"signing without a cache (KDF per payout): {1 / kdf:.1f}/s")
+    print(f"signing, cold cache: {cold:.0f}/s")
+    print(f"signing, warm cache: {warm:.0f}/s")
+    print(f"unlocked key cache: {stats}")
+
+
+def run(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(measure(args, directory))
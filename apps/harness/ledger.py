@@ -0,0 +1,61 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from apps.blackjack.functions.ledger import Ledger
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--hands", type=int, default=1_000_000)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--group", type=int, default=500)
+
+
+def run(args: argparse.Namespace):
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = Ledger(path=os.path.join(directory, "ledger"))
+
+        # One bet and one payout posting per hand, committed every `group`
+        # hands like the agent's periodic group commit
+        commits = 0
+        commit_time = 0.0
+        start = time.perf_counter()
+        for hand in range(args.hands):
+            player_id = rng.randrange(args.players)
+            ledger.check_bets([(player_id, 10)])
+            ledger.place_bet(player_id, 10)
+            ledger.settle(player_id, rng.choice([-10, 0, 20, 20, 25]))
+            if hand % args.group == args.group - 1:
+                commit_start = time.perf_counter()
+                ledger.commit()
+                commit_time += time.perf_counter() - commit_start
+                commits += 1
+        ledger.commit()
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        report = ledger.reconcile()
+        reconcile = time.perf_counter() - start
+
+        start = time.perf_counter()
+        recovered = Ledger(path=ledger.path)
+        recovered.load()
+        load = time.perf_counter() - start
+
+        print(
+            f"{args.hands} hands, {ledger.count} postings: "
+            f"{ledger.count / elapsed / 1e3:.0f}k postings/s including commits"
+        )
+        print(
+            f"group commit: {commits} commits of {2 * args.group} postings, "
+            f"{commit_time / max(commits, 1) * 1e3:.2f}ms each"
+        )
+        print(f"reconcile: {reconcile * 1e3:.0f}ms, balanced={report['balanced']}")
+        print(f"  totals: {report['totals']}, house {report['house_result']}")
+        print(f"load from disk: {load * 1e3:.0f}ms")
+        print(
+            f"memory: {(ledger.postings.nbytes + ledger.balances.nbytes) / 1e6:.0f}MB"
+        )
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import logging
+import struct
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.tools import registry
+from apps.harness.rooms import FRAME_MS, FRAME_SAMPLES
+from apps.shared.loop import LoopOptions
+from apps.shared.loop import run as run_loop
+
+FRAME_BYTES = FRAME_SAMPLES * 2
+
+# Cents a player is topped up to before each hand
+BANKROLL = 100_000_00
+
+# A hand as the model plays it, reading the hand twice like models do
+HAND = (
+    ("create_game_session_and_deal_initial_cards", {"bet_amount": 10}),
+    ("calculate_hand_value", {"recipient": "player"}),
+    ("calculate_hand_value", {"recipient": "player"}),
+    ("dealer_turn", {}),
+    ("check_game_status", {}),
+)
+
+# Seconds between the tool calls of a room, a hand every couple of seconds
+CALL_INTERVAL = 0.4
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--calls", type=int, default=5000)
+    # Seconds each room count runs for while searching for the capacity
+    parser.add_argument("--seconds", type=float, default=3.0)
+    # Event loop lag p99 a room tolerates, one audio frame
+    parser.add_argument("--max-lag", type=float, default=FRAME_MS / 1000)
+    parser.add_argument("--executor-workers", type=int)
+
+
+def pack(kind: bytes, payload: bytes) -> bytes:
+    return kind + struct.pack("!I", len(payload)) + payload
+
+
+async def read(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    header = await reader.readexactly(5)
+    return header[:1], await reader.readexactly(struct.unpack("!I", header[1:])[0])
+
+
+async def agent(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, player_id: int
+):
+    """
+    The agent's end of a model socket: each audio frame from the model is
+    checked for speech and forwarded to the room, and each tool call event
+    is dispatched in its own task, like the SDK's event emitter does.
+    """
+    tasks = set()
+
+    async def tool_call(event: bytes):
+        call = json.loads(event)
+        result = registry.dispatch(
+            call["name"], {**call["arguments"], "player_id": player_id}
+        )
+        writer.write(pack(b"R", json.dumps(result).encode()))
+
+    while True:
+        kind, payload = await read(reader)
+        if kind == b"A":
+            frame = np.frombuffer(payload, np.int16)
+            if np.abs(frame).max() > 500:
+                writer.write(pack(b"A", payload))
+        else:
+            task = asyncio.create_task(tool_call(payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+
+class Room:
+    """
+    The model's end of a room's socket.
+    """
+
+    def __init__(self, player_id: int):
+        self.player_id = player_id
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.response: Optional[asyncio.Future] = None
+        self.frames = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def connect(self, port: int):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writer.write(struct.pack("!I", self.player_id))
+        self.task = asyncio.create_task(self.receive())
+
+    async def receive(self):
+        while True:
+            kind, payload = await read(self.reader)
+            if kind == b"A":
+                self.frames += 1
+            elif self.response is not None:
+                self.response.set_result(payload)
+
+    async def call(self, name: str, arguments: dict) -> float:
+        """
+        Sends a tool call event and returns the seconds until its result.
+        """
+        if name == HAND[0][0]:
+            game_state_map.pop(self.player_id, None)
+            ledger.restore(self.player_id, BANKROLL, None)
+        self.response = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        self.writer.write(
+            pack(b"T", json.dumps({"name": name, "arguments": arguments}).encode())
+        )
+        await self.response
+        return time.perf_counter() - start
+
+    async def stream(self, frame: bytes, until: float):
+        """
+        Plays the model's side of a conversation: an audio frame every 20ms
+        and a tool call every CALL_INTERVAL.
+        """
+        interval = FRAME_MS / 1000
+        frames_per_call = int(CALL_INTERVAL / interval)
+        start = time.perf_counter()
+        tick = 0
+        calls = set()
+        while time.perf_counter() < until:
+            self.writer.write(pack(b"A", frame))
+            if tick % frames_per_call == 0:
+                name, arguments = HAND[tick // frames_per_call % len(HAND)]
+                call = asyncio.create_task(self.call(name, arguments))
+                calls.add(call)
+                call.add_done_callback(calls.discard)
+            tick += 1
+            await asyncio.sleep(max(0.0, start + tick * interval - time.perf_counter()))
+        await asyncio.gather(*calls)
+
+    async def close(self):
+        self.task.cancel()
+        self.writer.close()
+
+
+class Agents:
+    """
+    A server accepting a model socket per room, each served by `agent`.
+    """
+
+    def __init__(self):
+        self.server: Optional[asyncio.Server] = None
+        self.handlers: List[asyncio.Task] = []
+
+    async def accept(self, reader, writer):
+        self.handlers.append(asyncio.current_task())
+        (player_id,) = struct.unpack("!I", await reader.readexactly(4))
+        try:
+            await agent(reader, writer, player_id)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def open(self, count: int) -> List[Room]:
+        self.server = await asyncio.start_server(self.accept, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        rooms = [Room(player_id) for player_id in range(count)]
+        for room in rooms:
+            await room.connect(port)
+        return rooms
+
+    async def close(self, rooms: List[Room]):
+        for room in rooms:
+            await room.close()
+        # The agents see their sockets close and return
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        self.server.close()
+        game_state_map.clear()
+
+
+async def turnaround(calls: int) -> List[float]:
+    """
+    Tool call round trips of a room that only makes tool calls.
+    """
+    agents = Agents()
+    (room,) = await agents.open(1)
+    latencies = []
+    for i in range(calls):
+        name, arguments = HAND[i % len(HAND)]
+        latencies.append(await room.call(name, arguments))
+    await agents.close([room])
+    return latencies
+
+
+async def rooms_trial(count: int, seconds: float) -> float:
+    """
+    Runs `count` rooms for `seconds`, returning the p99 event loop lag.
+    """
+    agents = Agents()
+    rooms = await agents.open(count)
+    frame = (np.ones(FRAME_SAMPLES) * 6000).astype(np.int16).tobytes()
+    until = time.perf_counter() + seconds
+    lags = []
+
+    async def monitor(interval: float = 0.005):
+        while time.perf_counter() < until:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    await asyncio.gather(monitor(), *(room.stream(frame, until) for room in rooms))
+    await agents.close(rooms)
+    return float(np.percentile(lags, 99))
+
+
+def capacity(options: LoopOptions, args: argparse.Namespace) -> int:
+    """
+    The most rooms one loop serves with a p99 lag under `max_lag`: doubles
+    the room count until the lag is exceeded, then bisects.
+    """
+    low, high = 0, 25
+    while run_loop(rooms_trial(high, args.seconds), options) <= args.max_lag:
+        low, high = high, high * 2
+    while high - low > max(5, low // 20):
+        middle = (low + high) // 2
+        if run_loop(rooms_trial(middle, args.seconds), options) <= args.max_lag:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def configurations(executor_workers: Optional[int]) -> List[LoopOptions]:
+    """
+    The loop setups this interpreter can run.
+    """
+    loops = ["asyncio"]
+    try:
+        import uvloop  # noqa: F401
+
+        loops.append("uvloop")
+    except ImportError:
+        print("uvloop is not installed, skipping it")
+    eager = [False]
+    if hasattr(asyncio, "eager_task_factory"):
+        eager.append(True)
+    else:
+        print("eager tasks need Python 3.12, skipping them")
+    return [
+        LoopOptions(loop, executor_workers, eager_tasks)
+        for loop in loops
+        for eager_tasks in eager
+    ]
+
+
+def run(args: argparse.Namespace):
+    logging.getLogger("Chatbot").setLevel(logging.ERROR)
+    setups = configurations(args.executor_workers)
+    print(
+        f"{args.calls} tool calls, rooms streaming {1000 // FRAME_MS} frames/s each "
+        f"way and a tool call every {CALL_INTERVAL:.1f}s, p99 loop lag under "
+        f"{args.max_lag * 1e3:.0f}ms"
+    )
+    print(f"{'':>14} {'call p50 us':>12} {'call p99 us':>12} {'rooms per core':>15}")
+    for options in setups:
+        latencies = np.array(run_loop(turnaround(args.calls), options)) * 1e6
+        rooms = capacity(options, args)
+        name = options.loop + (" eager" if options.eager_tasks else "")
+        print(
+            f"{name:>14} {np.percentile(latencies, 50):>12.0f} "
+            f"{np.percentile(latencies, 99):>12.0f} {rooms:>15}"
+        )
@@ -0,0 +1,46 @@
+import argparse
+import importlib
+
+"""
+Offline scenarios, each a module in apps/harness exposing
+`add_arguments(parser)` and `run(args)`
+"""
+SCENARIOS = {
+    "admission": "Audio admission control in a crowded room",
+    "mixing": "VAD gating and mixing of a table's audio",
+    "journal": "Game journal append, rebuild and audit at scale",
+    "strategy": "Hit/stand EV tables played against the dealer",
+    "encoding": "Tool response bytes and encode time per call",
+    "complaints": "Bulk complaint book import and export throughput",
+    "ledger": "Bankroll postings, group commit and reconciliation",
+    "keystore": "Payout signing with a cold and a warm unlocked key cache",
+    "sharding": "Room capacity per worker process, and worker failover",
+    "backpressure": "Tool call latency of rooms sharing a loop with a runaway room",
+    "resume": "Time to the model's first audio after its socket drops",
+    "metrics": "Cost of a metric update and of a scrape",
+    "memory": "Memory reports pointing at a growing session store",
+    "loops": "Tool call turnaround and rooms per core for each event loop setup",
+    "traces": "Cost of recording tool calls, and replay of recorded traces",
+    "sharedstore": "Sessions and complaints shared by processes, and read cost",
+    "triage": "Complaint clustering into incidents, and add_complaint latency",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline load harness for the agents, no RTC or model needed"
+    )
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    for name, description in SCENARIOS.items():
+        module = importlib.import_module(f"apps.harness.{name}")
+        subparser = subparsers.add_parser(name, help=description)
+        module.add_arguments(subparser)
+        subparser.set_defaults(run=module.run)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
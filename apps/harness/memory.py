@@ -0,0 +1,47 @@
+import argparse
+import time
+
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.tools import registry
+from apps.shared.profiling import MemoryProfiler
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    # New players dealt a hand between two reports
+    parser.add_argument("--players", type=int, default=20_000)
+    parser.add_argument("--top", type=int, default=5)
+
+
+def deal(first: int, count: int):
+    for player_id in range(first, first + count):
+        registry.dispatch(
+            "create_game_session_and_deal_initial_cards",
+            {"player_id": player_id, "bet_amount": 10},
+        )
+
+
+def run(args: argparse.Namespace):
+    """
+    Plays hands for players who never come back, whose sessions nothing
+    removes, and checks that two reports point at the leak.
+    """
+    profiler = MemoryProfiler(top=args.top)
+    profiler.account(
+        "stores",
+        lambda: {
+            "sessions": len(game_state_map),
+            "tool cache sessions": registry.cache_stats()["sessions"],
+        },
+    )
+    profiler.start()
+    deal(0, args.players)
+    profiler.report()
+
+    deal(args.players, args.players)
+    start = time.perf_counter()
+    report = profiler.report()
+    elapsed = time.perf_counter() - start
+    print(report)
+    print(f"report took {elapsed * 1e3:.0f}ms")
+    profiler.stop()
+    game_state_map.clear()
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import time
+import timeit
+
+from apps.blackjack.tools import registry
+from apps.shared.http import HttpServer
+from apps.shared.metrics import MetricsRegistry, render
+from apps.shared.tools import tool_call_seconds, tool_calls
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--updates", type=int, default=1_000_000)
+    # Label values per metric, e.g. tools or events
+    parser.add_argument("--series", type=int, default=20)
+
+
+def per_update_ns(statement, updates: int) -> float:
+    """
+    Returns the cost of calling `statement`, less the cost of calling a
+    function that does nothing.
+    """
+    baseline = min(timeit.repeat(lambda: None, number=updates, repeat=3))
+    elapsed = min(timeit.repeat(statement, number=updates, repeat=3))
+    return (elapsed - baseline) / updates * 1e9
+
+
+async def scrape(server: HttpServer) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def serve(metrics: MetricsRegistry) -> float:
+    server = HttpServer(host="127.0.0.1", port=0)
+    metrics.register_routes(server)
+    await server.start()
+    server.port = server._server.sockets[0].getsockname()[1]
+    start = time.perf_counter()
+    for _ in range(100):
+        response = await scrape(server)
+    elapsed = (time.perf_counter() - start) / 100
+    await server.close()
+    assert response.startswith(b"HTTP/1.1 200"), response[:100]
+    return elapsed
+
+
+def run(args: argparse.Namespace):
+    metrics = MetricsRegistry()
+    counter = metrics.counter("counter_total", "", ["tool"])
+    histogram = metrics.histogram("latency_seconds", "", ["tool"])
+    for i in range(args.series):
+        counter.labels(f"tool_{i}").inc()
+        histogram.labels(f"tool_{i}").observe(0.01)
+    series = counter.labels("tool_0")
+    buckets = histogram.labels("tool_0")
+
+    print(f"{'update':>36} {'ns':>6}")
+    for name, statement in (
+        ("counter series inc", lambda: series.inc()),
+        ("counter labels(...).inc", lambda: counter.labels("tool_0").inc()),
+        ("histogram series observe", lambda: buckets.observe(0.012)),
+        (
+            "histogram labels(...).observe",
+            lambda: histogram.labels("tool_0").observe(0.012),
+        ),
+    ):
+        print(f"{name:>36} {per_update_ns(statement, args.updates):>6.0f}")
+
+    # A tool call as the agents dispatch it, with and without its metrics
+    args_ = {"player_id": 1, "recipient": "player"}
+    registry.dispatch(
+        "create_game_session_and_deal_initial_cards",
+        {"player_id": 1, "bet_amount": 10},
+    )
+    dispatch = per_update_ns(
+        lambda: registry.dispatch("calculate_hand_value", args_), args.updates // 10
+    )
+
+    def update():
+        tool_calls.labels("calculate_hand_value").inc()
+        tool_call_seconds.labels("calculate_hand_value").observe(0.001)
+
+    updates = per_update_ns(update, args.updates // 10)
+    print(f"{'cached tool dispatch':>36} {dispatch:>6.0f}")
+    print(f"{'its metric updates':>36} {updates:>6.0f}")
+
+    start = time.perf_counter()
+    text = render(metrics.collect())
+    render_ms = (time.perf_counter() - start) * 1e3
+    scrape_ms = asyncio.run(serve(metrics)) * 1e3
+    print(
+        f"{args.series} series per metric: render {render_ms:.2f}ms, "
+        f"{len(text)} bytes, scrape over HTTP {scrape_ms:.2f}ms"
+    )
@@ -0,0 +1,86 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from apps.harness.rooms import FRAME_MS, frame_pool, participants
+from apps.shared.audio import FRAME_SIZE, AudioMixer
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--active", type=int, default=6)
+    parser.add_argument("--seconds", type=int, default=120)
+
+
+def stereo(frames):
+    # The mixer takes aiortc's interleaved stereo frames
+    return [np.repeat(frame, 2).tobytes() for frame in frames]
+
+
+def simulate(args: argparse.Namespace, mixing: bool) -> dict:
+    """
+    Streams a table's audio for `seconds` and measures what reaches the model.
+
+    Forwarding copies each frame into a fixed upstream buffer, standing in
+    for the model socket without buffering the whole run in memory.
+    """
+    voiced, silent = frame_pool()
+    payloads = stereo(voiced), stereo(silent)
+    table = participants(args.players, args.active)
+    upstream = bytearray(FRAME_SIZE * 2)
+
+    mixer = AudioMixer()
+    for player in table:
+        mixer.add_input(player.peer_id)
+
+    ticks = args.seconds * 1000 // FRAME_MS
+    frames_out = 0
+
+    tracemalloc.start()
+    start = time.process_time()
+    for tick in range(ticks):
+        if tick == 100:
+            # Measure steady state allocations only
+            tracemalloc.reset_peak()
+            baseline_memory = tracemalloc.get_traced_memory()[0]
+
+        for player in table:
+            payload = payloads[0 if player.step() else 1][tick % len(payloads[0])]
+            samples = np.frombuffer(payload, dtype=np.int16)
+            if mixing:
+                mixer.process(player.peer_id, samples)
+            else:
+                upstream[:] = payload
+                frames_out += 1
+
+        if mixing:
+            mixed = mixer.mix()
+            if mixed is not None:
+                upstream[:] = mixed.data
+                frames_out += 1
+    cpu = time.process_time() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline_memory
+    tracemalloc.stop()
+
+    return {
+        "frames": frames_out,
+        "bytes": frames_out * FRAME_SIZE * 2,
+        "cpu": cpu,
+        "peak_alloc": peak,
+    }
+
+
+def run(args: argparse.Namespace):
+    baseline = simulate(args, mixing=False)
+    mixed = simulate(args, mixing=True)
+
+    print(f"{args.players} players ({args.active} talkative), {args.seconds}s")
+    print(f"{'':>14} {'frames':>8} {'MB':>8} {'cpu s':>7} {'peak alloc':>11}")
+    for name, result in (("track per peer", baseline), ("vad + mixer", mixed)):
+        print(
+            f"{name:>14} {result['frames']:>8} {result['bytes'] / 1e6:>8.1f} "
+            f"{result['cpu']:>7.2f} {result['peak_alloc']:>10}B"
+        )
+    print(f"upstream bytes saved: {1 - mixed['bytes'] / baseline['bytes']:.1%}")
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import logging
+
+import numpy as np
+
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.rooms import resume_summary
+from apps.blackjack.tools import registry
+from apps.harness.rooms import FRAME_MS, frame_pool
+from apps.shared.audio import AudioMixer, HeldTrack
+from apps.shared.realtime import (
+    FakeBackend,
+    FakeConversation,
+    FakeRealtime,
+    LatencySelector,
+    ResumableSession,
+)
+
+PLAYER_ID = 7
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--drops", type=int, default=5)
+    # Seconds to set up a model connection, and failed attempts per resume
+    parser.add_argument("--setup", type=float, default=0.8)
+    parser.add_argument("--failures", type=int, default=1)
+    # Seconds of the question a player asks as the connection drops
+    parser.add_argument("--question", type=float, default=1.0)
+    # Seconds of silence after which the player asks again
+    parser.add_argument("--repeat-after", type=float, default=3.0)
+
+
+class ListeningConversation(FakeConversation):
+    def __init__(self, model: "ListeningRealtime"):
+        super().__init__()
+        self.model = model
+
+    def add_track(self, track_id: str, track):
+        super().add_track(track_id, track)
+        self.model.listen(track)
+
+
+class ListeningRealtime(FakeRealtime):
+    """
+    A fake model that reads its audio track and starts speaking once it has
+    heard a whole question.
+    """
+
+    def __init__(self, backend: "ListeningBackend", healthy: bool):
+        super().__init__(registry, setup_delay=backend.setup_delay, healthy=healthy)
+        self.backend = backend
+        self.conversation = ListeningConversation(self)
+        self.heard = 0
+        self.task = None
+
+    def listen(self, track):
+        self.task = asyncio.create_task(self._listen(track))
+
+    async def _listen(self, track):
+        while True:
+            await track.recv()
+            self.heard += 1
+            if self.heard == self.backend.question:
+                self.backend.on_speak()
+
+    async def close(self):
+        await super().close()
+        if self.task is not None:
+            self.task.cancel()
+
+
+class ListeningBackend(FakeBackend):
+    def __init__(self, setup_delay: float, question: int):
+        super().__init__(setup_delay=setup_delay)
+        self.question = question
+        self.failures = 0
+        self.instructions = ""
+        self.on_speak = lambda: None
+
+    def create(self, agent, instructions: str, registry):
+        self.instructions = instructions
+        self.failures -= 1
+        return ListeningRealtime(self, healthy=self.failures < 0)
+
+
+class PassThroughTrack(HeldTrack):
+    """
+    The track as it was before resumption: nothing reads the mixer while
+    the model is away, so only its short input ring survives.
+    """
+
+    def hold(self):
+        pass
+
+
+async def speak(mixer: AudioMixer, frames: list, count: int):
+    for i in range(count):
+        mixer.process("player", frames[i % len(frames)])
+        await asyncio.sleep(FRAME_MS / 1000)
+
+
+async def trial(args: argparse.Namespace, track_type: type, frames: list):
+    question = int(args.question * 1000 / FRAME_MS)
+    backend = ListeningBackend(args.setup, question)
+    mixer = AudioMixer()
+    mixer.add_input("player")
+    session = ResumableSession(
+        LatencySelector([backend]),
+        None,
+        "You are a Blackjack dealer.",
+        registry,
+        track_type(mixer.track),
+        summary=lambda: resume_summary("room", {PLAYER_ID}),
+        backoff=0.25,
+    )
+    answered = asyncio.Event()
+
+    def on_speak():
+        session.speaking()
+        answered.set()
+
+    backend.on_speak = on_speak
+    session.create()
+    await session.connect()
+
+    # The socket drops as the player starts asking a question
+    backend.failures = args.failures
+    await session.llm.close()
+    session.dropped()
+    await speak(mixer, frames, question)
+
+    repeats = 0
+    while not answered.is_set():
+        try:
+            await asyncio.wait_for(answered.wait(), args.repeat_after)
+        except asyncio.TimeoutError:
+            repeats += 1
+            await speak(mixer, frames, question)
+
+    stats = session.stats()
+    await session.close()
+    mixer.stop()
+    return session.reconnect[0], session.first_audio[0], repeats, stats, backend
+
+
+def run(args: argparse.Namespace):
+    logging.getLogger("Chatbot").setLevel(logging.CRITICAL)
+
+    # A hand in play for the summary the resumed model is given
+    registry.dispatch(
+        "create_game_session_and_deal_initial_cards",
+        {"player_id": PLAYER_ID, "bet_amount": 10},
+    )
+    voiced, _ = frame_pool()
+    frames = [np.repeat(frame, 2) for frame in voiced]
+
+    print(
+        f"question {args.question:.1f}s, setup {args.setup:.1f}s, "
+        f"{args.failures} failed attempts per resume, {args.drops} drops"
+    )
+    print(
+        f"{'':>10} {'reconnect ms':>13} {'first audio ms':>15} "
+        f"{'repeats':>8} {'frames held':>12}"
+    )
+    for name, track_type in (("no hold", PassThroughTrack), ("held", HeldTrack)):
+        results = [
+            asyncio.run(trial(args, track_type, frames)) for _ in range(args.drops)
+        ]
+        reconnect, first_audio, repeats, stats, backend = zip(*results)
+        print(
+            f"{name:>10} {np.median(reconnect) * 1e3:>13.0f} "
+            f"{np.median(first_audio) * 1e3:>15.0f} {np.mean(repeats):>8.1f} "
+            f"{stats[-1]['frames_held']:>12}"
+        )
+
+    summary = backend[-1].instructions.split("# Resumed Session\n")[1]
+    print(f"state summary given to the resumed model, {len(summary)} chars:")
+    print(summary)
+    game_state_map.clear()
@@ -0,0 +1,73 @@
+import random
+from typing import List, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 48000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def voiced_frame(rng: np.random.Generator, amplitude: int = 6000) -> np.ndarray:
+    """
+    Returns a 20ms int16 frame of speech-like audio (a tone with noise).
+    """
+    t = np.arange(FRAME_SAMPLES) / SAMPLE_RATE
+    tone = amplitude * np.sin(2 * np.pi * rng.uniform(120, 300) * t)
+    noise = rng.normal(0, amplitude / 10, FRAME_SAMPLES)
+    return (tone + noise).astype(np.int16)
+
+
+def silent_frame(rng: np.random.Generator, amplitude: int = 60) -> np.ndarray:
+    """
+    Returns a 20ms int16 frame of background noise.
+    """
+    return rng.normal(0, amplitude, FRAME_SAMPLES).astype(np.int16)
+
+
+class Participant:
+    """
+    A simulated room participant alternating between talk spurts and silence.
+    """
+
+    def __init__(self, peer_id: str, talkativeness: float, rng: random.Random):
+        self.peer_id = peer_id
+        self.talkativeness = talkativeness
+        self.rng = rng
+        self.talking = False
+
+    def step(self) -> bool:
+        """
+        Advances one frame and returns whether the participant is talking.
+        """
+        if self.talking:
+            # Talk spurts last ~1.5s on average
+            if self.rng.random() < 1 / 75:
+                self.talking = False
+        elif self.rng.random() < self.talkativeness / 75:
+            self.talking = True
+        return self.talking
+
+
+def participants(count: int, active: int, seed: int = 1) -> List[Participant]:
+    """
+    Creates `count` participants of which `active` talk frequently and the
+    rest only occasionally.
+    """
+    rng = random.Random(seed)
+    return [
+        Participant(f"peer-{i}", 0.5 if i < active else 0.02, rng) for i in range(count)
+    ]
+
+
+def frame_pool(
+    size: int = 64, seed: int = 1
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Returns pregenerated voiced and silent frames, so generating audio does
+    not show up in the measured cost.
+    """
+    rng = np.random.default_rng(seed)
+    voiced = [voiced_frame(rng) for _ in range(size)]
+    silent = [silent_frame(rng) for _ in range(size)]
+    return voiced, silent
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import os
+import signal
+import time
+import zlib
+from typing import Awaitable, Callable, Hashable, Set
+
+import numpy as np
+
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.rooms import Rooms
+from apps.harness.rooms import FRAME_MS, frame_pool, participants
+from apps.shared.audio import AudioMixer
+from apps.shared.sharding import Coordinator
+
+# A room keeps up when it processes this many frames per second
+FRAMES_PER_SECOND = 1000 // FRAME_MS
+
+# Frames between two hands dealt in a room
+FRAMES_PER_HAND = 50
+
+PLAYERS_PER_ROOM = 4
+
+
+class SimulatedRooms(Rooms):
+    """
+    Rooms of the real blackjack host whose RTC and model connections are
+    replaced by a loop mixing the players' audio and dealing them hands
+    through the tool registry, as fast as the worker allows.
+    """
+
+    async def start(self):
+        await super().start()
+        self.frames = 0
+        self.hands = 0
+        # The mixer takes aiortc's interleaved stereo frames
+        self.payloads = tuple(
+            [np.repeat(frame, 2) for frame in frames] for frames in frame_pool()
+        )
+
+    async def connect(
+        self, room_id: str, players: Set[Hashable]
+    ) -> Callable[[], Awaitable[None]]:
+        task = asyncio.create_task(self.play(room_id, players))
+
+        async def close():
+            task.cancel()
+
+        return close
+
+    async def play(self, room_id: str, players: Set[Hashable]):
+        base = zlib.crc32(room_id.encode()) * PLAYERS_PER_ROOM
+        player_ids = [base + seat for seat in range(PLAYERS_PER_ROOM)]
+        table = participants(PLAYERS_PER_ROOM, PLAYERS_PER_ROOM, seed=base)
+        mixer = AudioMixer()
+        for participant in table:
+            mixer.add_input(participant.peer_id)
+
+        tick = 0
+        while True:
+            for participant in table:
+                frames = self.payloads[0 if participant.step() else 1]
+                mixer.process(participant.peer_id, frames[tick % len(frames)])
+            mixer.mix()
+
+            if tick % FRAMES_PER_HAND == 0:
+                player_id = player_ids[tick // FRAMES_PER_HAND % PLAYERS_PER_ROOM]
+                players.add(player_id)
+                self.deal(player_id)
+
+            tick += 1
+            self.frames += 1
+            await asyncio.sleep(0)
+
+    def deal(self, player_id: int):
+        # A fresh deck once the current one runs low
+        game_state = game_state_map.get(player_id)
+        if game_state and len(game_state["deck"]) < 15:
+            del game_state_map[player_id]
+        self.tools.dispatch(
+            "create_game_session_and_deal_initial_cards",
+            {"player_id": player_id, "bet_amount": 10},
+        )
+        self.tools.dispatch("dealer_turn", {"player_id": player_id})
+        self.tools.dispatch("check_game_status", {"player_id": player_id})
+        self.hands += 1
+
+    def control(self, room_id: str, message: str):
+        if message == "sessions":
+            return {
+                player_id: (
+                    len(game_state_map[player_id]["deck"]),
+                    ledger.bankroll(player_id)[0],
+                )
+                for player_id in self._players(room_id)
+                if player_id in game_state_map
+            }
+        return super().control(room_id, message)
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "frames": self.frames,
+            "hands": self.hands,
+            "balanced": ledger.reconcile()["balanced"],
+        }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--workers", type=int, default=max(os.cpu_count() or 1, 2))
+    parser.add_argument("--rooms", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=3.0)
+
+
+async def frames(coordinator: Coordinator) -> int:
+    stats = await coordinator.stats()
+    return sum(worker.get("frames", 0) for worker in stats["workers"].values())
+
+
+async def capacity(workers: int, args: argparse.Namespace) -> float:
+    """
+    Runs `rooms` rooms flat out on `workers` workers and returns how many
+    rooms their frame throughput could keep up in real time.
+    """
+    coordinator = Coordinator(
+        "apps.harness.sharding:SimulatedRooms", workers=workers, respawn=False
+    )
+    await coordinator.start()
+    for room in range(args.rooms):
+        await coordinator.assign(f"room-{room}")
+
+    await asyncio.sleep(1.0)
+    before = await frames(coordinator)
+    start = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    throughput = (await frames(coordinator) - before) / (time.perf_counter() - start)
+
+    await coordinator.stop()
+    return throughput / FRAMES_PER_SECOND
+
+
+async def failover(args: argparse.Namespace):
+    """
+    Kills a worker and checks that its rooms reopen elsewhere from their
+    checkpoint, then move back to its respawned replacement.
+    """
+    coordinator = Coordinator(
+        "apps.harness.sharding:SimulatedRooms", workers=args.workers
+    )
+    await coordinator.start()
+    rooms = [f"room-{room}" for room in range(args.rooms)]
+    for room_id in rooms:
+        await coordinator.assign(room_id)
+
+    await asyncio.sleep(1.0)
+    await coordinator.checkpoint()
+    victim = coordinator.workers["worker-0"]
+    moved = sorted(victim.rooms)
+    before = {
+        room_id: await coordinator.control(room_id, "sessions") for room_id in moved
+    }
+
+    start = time.perf_counter()
+    os.kill(victim.process.pid, signal.SIGKILL)
+    while not (
+        coordinator.workers.get("worker-0") not in (None, victim)
+        and not coordinator.lock.locked()
+        and len(coordinator.owners) == len(rooms)
+    ):
+        await asyncio.sleep(0.01)
+    recovered = time.perf_counter() - start
+
+    stats = await coordinator.stats()
+    back = sum(stats["rooms"][room_id] == "worker-0" for room_id in moved)
+    restored = 0
+    for room_id in moved:
+        after = await coordinator.control(room_id, "sessions")
+        restored += bool(before[room_id]) and set(after) >= set(before[room_id])
+    balanced = all(worker.get("balanced") for worker in stats["workers"].values())
+    await coordinator.stop()
+
+    print(
+        f"killed worker-0 hosting {len(moved)} rooms: all {len(rooms)} rooms "
+        f"hosted again after {recovered * 1e3:.0f}ms, {back} back on the "
+        f"respawned worker-0, {restored} with their sessions, "
+        f"{stats['migrations']} migrations, ledgers balanced: {balanced}"
+    )
+
+
+async def measure(args: argparse.Namespace):
+    print(f"{os.cpu_count()} cores, {args.rooms} rooms, {FRAMES_PER_SECOND} frames/s")
+    print(f"{'workers':>8} {'rooms kept up':>14} {'vs linear':>10}")
+    single = None
+    for workers in range(1, args.workers + 1):
+        rooms = await capacity(workers, args)
+        single = single or rooms
+        print(f"{workers:>8} {rooms:>14.0f} {rooms / (single * workers):>10.0%}")
+
+    await failover(args)
+
+
+def run(args: argparse.Namespace):
+    asyncio.run(measure(args))
@@ -0,0 +1,163 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from typing import Callable
+
+import numpy as np
+
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.tools import registry
+from apps.customer_service.functions.main import complaint_book
+from apps.customer_service.tools import registry as complaint_registry
+from apps.shared.shm import SharedMemoryStore
+
+# Cents a player is topped up to before a hand
+BANKROLL = 100_000_00
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--reads", type=int, default=100_000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--slots", type=int, default=65536)
+
+
+def attach(sessions: str, complaints: str):
+    game_state_map.share(sessions)
+    registry.store = game_state_map
+    complaint_book.share(complaints)
+    complaint_registry.store = complaint_book
+
+
+def other_process(sessions: str, complaints: str, player_id: int):
+    """
+    Another agent process: continues the player's hand and files a complaint.
+    """
+    logging.getLogger("Chatbot").setLevel(logging.ERROR)
+    attach(sessions, complaints)
+    ledger.restore(player_id, BANKROLL, None)
+    registry.dispatch("hit", {"player_id": player_id, "recipient": "player"})
+    complaint_registry.dispatch(
+        "add_complaint", {"name": "Moved", "complaint": "my call dropped"}
+    )
+    game_state_map.close()
+    complaint_book.close()
+
+
+def writer_process(name: str, keys: int, seconds: float):
+    """
+    Rewrites entries of the store as fast as it can, racing the readers.
+    """
+    store = SharedMemoryStore()
+    store.share(name)
+    until = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < until:
+        store[i % keys] = {"hand": ["A of hearts"] * (i % 5 + 1), "n": i}
+        i += 1
+    store.close()
+
+
+def handover(context, sessions: str, complaints: str) -> bool:
+    """
+    Deals a hand here, lets another process hit and file a complaint, and
+    checks this process sees both through its cached tool results.
+    """
+    player_id = 1
+    ledger.restore(player_id, BANKROLL, None)
+    registry.dispatch(
+        "create_game_session_and_deal_initial_cards",
+        {"player_id": player_id, "bet_amount": 10},
+    )
+    before = registry.dispatch(
+        "calculate_hand_value", {"player_id": player_id, "recipient": "player"}
+    )
+    filed = complaint_registry.dispatch("check_for_complaint", {"name": "Moved"})
+
+    process = context.Process(
+        target=other_process, args=(sessions, complaints, player_id)
+    )
+    process.start()
+    process.join()
+
+    after = registry.dispatch(
+        "calculate_hand_value", {"player_id": player_id, "recipient": "player"}
+    )
+    cards = len(game_state_map[player_id]["player_hand"])
+    now_filed = complaint_registry.dispatch("check_for_complaint", {"name": "Moved"})
+    print(
+        f"hand dealt here, hit in pid {process.pid}: {cards} cards, total "
+        f"{before['output']['total']} -> {after['output']['total']}; "
+        f"complaint filed there visible here: {filed['exists']} -> "
+        f"{now_filed['exists']}"
+    )
+    return cards == 3 and now_filed["exists"]
+
+
+def per_call(calls: int, call: Callable[[int], object]) -> np.ndarray:
+    costs = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        call(i)
+        costs[i] = time.perf_counter() - start
+    return costs * 1e6
+
+
+def run(args: argparse.Namespace):
+    logging.getLogger("Chatbot").setLevel(logging.ERROR)
+    context = multiprocessing.get_context("spawn")
+    pid = os.getpid()
+    sessions, complaints, racing = (
+        f"harness-sessions-{pid}",
+        f"harness-complaints-{pid}",
+        f"harness-racing-{pid}",
+    )
+
+    attach(sessions, complaints)
+    try:
+        ok = handover(context, sessions, complaints)
+    finally:
+        game_state_map.close(unlink=True)
+        complaint_book.close(unlink=True)
+    if not ok:
+        raise SystemExit("the other process' changes were not seen")
+
+    local = SharedMemoryStore()
+    shared = SharedMemoryStore()
+    shared.share(racing, slots=args.slots)
+    hand = {"hand": ["A of hearts", "10 of spades"], "n": 0}
+    for store in (local, shared):
+        for key in range(args.sessions):
+            store[key] = dict(hand)
+
+    keys = args.sessions
+    print(f"{args.sessions} sessions in {args.slots} slots")
+    print(f"{'per call':>24} {'mean us':>8} {'p99 us':>8}")
+    results = [
+        ("dict get", per_call(args.reads, lambda i: local.get(i % keys))),
+        ("shared get", per_call(args.reads, lambda i: shared.get(i % keys))),
+        ("dict set", per_call(args.reads, lambda i: local.__setitem__(i % keys, hand))),
+        (
+            "shared set",
+            per_call(args.reads, lambda i: shared.__setitem__(i % keys, hand)),
+        ),
+    ]
+
+    writer = context.Process(
+        target=writer_process, args=(racing, min(keys, 64), args.seconds)
+    )
+    writer.start()
+    # Wait for the writer to attach before timing the reads it races
+    while writer.is_alive() and not shared.get(0)["n"]:
+        time.sleep(0.01)
+    shared.retries = 0
+    racing_reads = per_call(args.reads, lambda i: shared.get(i % 64))
+    writer.join()
+    results.append(("shared get, racing writer", racing_reads))
+    for name, costs in results:
+        print(f"{name:>24} {costs.mean():>8.2f} {np.percentile(costs, 99):>8.2f}")
+    print(f"seqlock retries while racing: {shared.retries}")
+    shared.close(unlink=True)
@@ -0,0 +1,106 @@
+import argparse
+import random
+import time
+
+from apps.blackjack.functions.main import (
+    check_game_status,
+    create_game_session_and_deal_initial_cards,
+    dealer_turn,
+    game_state_map,
+    hand_value,
+    hit,
+)
+from apps.blackjack.functions.strategy import (
+    basic_strategy,
+    dealer_outcomes,
+    ev_table,
+    suggest_action,
+    value_class,
+)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--hands", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def mimic_dealer(player_id: int, strategy) -> str:
+    game_state = game_state_map[player_id]
+    return "hit" if hand_value(game_state["player_hand"])["total"] < 17 else "stand"
+
+
+def basic(player_id: int, strategy) -> str:
+    game_state = game_state_map[player_id]
+    value = hand_value(game_state["player_hand"])
+    upcard = value_class(game_state["dealer_hand"][1])
+    return strategy[(value["total"], value["soft"], upcard)]
+
+
+def composition_dependent(player_id: int, strategy) -> str:
+    return suggest_action(player_id)["action"]
+
+
+POLICIES = {
+    "mimic dealer": mimic_dealer,
+    "basic strategy": basic,
+    "suggest_action": composition_dependent,
+}
+
+
+def play(hands: int, policy, strategy, seed: int) -> dict:
+    """
+    Plays `hands` hands through the game functions, the player choosing with
+    `policy`, and returns the net result per unit bet.
+    """
+    random.seed(seed)
+    player_id = 1
+    net = 0.0
+    decisions = 0
+    decision_time = 0.0
+
+    for _ in range(hands):
+        # A fresh deck once the current one runs low
+        game_state = game_state_map.get(player_id)
+        if game_state and len(game_state["deck"]) < 15:
+            del game_state_map[player_id]
+        create_game_session_and_deal_initial_cards(player_id, 1)
+
+        while hand_value(game_state_map[player_id]["player_hand"])["total"] < 21:
+            start = time.perf_counter()
+            action = policy(player_id, strategy)
+            decision_time += time.perf_counter() - start
+            decisions += 1
+            if action != "hit":
+                break
+            hit(player_id, "player")
+
+        if hand_value(game_state_map[player_id]["player_hand"])["total"] <= 21:
+            dealer_turn(player_id)
+
+        # settle_hand pays wins out with the stake, e.g. 2x the bet
+        amount = check_game_status(player_id)["amount"]
+        net += amount - 1 if amount > 0 else amount
+
+    game_state_map.clear()
+    return {
+        "ev": net / hands,
+        "decision_us": decision_time / max(decisions, 1) * 1e6,
+    }
+
+
+def run(args: argparse.Namespace):
+    start = time.perf_counter()
+    strategy = basic_strategy()
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ev_table(5, (24, 24, 24, 24, 24, 23, 24, 24, 24, 96))
+    warm = time.perf_counter() - start
+
+    print(f"basic strategy tables, 6 decks: {cold * 1e3:.1f}ms cold")
+    print(f"cached EV table lookup: {warm * 1e6:.1f}us")
+    print(f"{'':>16} {'EV/hand':>9} {'decision us':>12}")
+    for name, policy in POLICIES.items():
+        result = play(args.hands, policy, strategy, args.seed)
+        print(f"{name:>16} {result['ev']:>+9.4f} {result['decision_us']:>12.1f}")
+    print(f"dealer table cache: {dealer_outcomes.cache_info()}")
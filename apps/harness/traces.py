@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Iterable
+
+import numpy as np
+
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import game_state_map
+from apps.shared.recorder import TraceRecorder, read_traces, segments
+from apps.shared.tools import ToolRegistry
+
+# Cents a player is topped up to before each recorded hand
+BANKROLL = 100_000_00
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    # Replays these traces, or records a synthetic session when not given
+    parser.add_argument("--traces")
+    parser.add_argument(
+        "--app", choices=["blackjack", "customer_service"], default="blackjack"
+    )
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    # Replay speed: 1 keeps the recorded timing, 0 replays as fast as possible
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--calls", type=int, default=20_000)
+
+
+def fresh_hand(name: str, arguments: Dict):
+    """
+    Starts every recorded deal from a full deck and bankroll, so recording
+    and replaying long sessions never runs out of cards or chips.
+    """
+    if name == "create_game_session_and_deal_initial_cards":
+        game_state_map.pop(arguments["player_id"], None)
+        ledger.restore(arguments["player_id"], BANKROLL, None)
+
+
+def load_registry(app: str) -> ToolRegistry:
+    if app == "customer_service":
+        from apps.customer_service.tools import registry
+    else:
+        from apps.blackjack.tools import registry
+    return registry
+
+
+def inline_logging_cost(path: str, calls: int) -> np.ndarray:
+    """
+    Seconds per tool call of logging it the way the agents used to, a line
+    for the call and one for the response, through a file handler.
+    """
+    logger = logging.getLogger("traces.inline")
+    logger.propagate = False
+    handler = logging.FileHandler(path)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    tool_call = {"function_name": "hit", "arguments": {"player_id": 7}}
+    response = {"result": {"card": "A of hearts", "recipient": "player"}}
+    costs = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        logger.info(f"Tool Call: {tool_call}")
+        logger.info(f"Tool Response: {response}")
+        costs[i] = time.perf_counter() - start
+    logger.removeHandler(handler)
+    handler.close()
+    return costs
+
+
+def recorder_cost(directory: str, calls: int) -> np.ndarray:
+    """
+    Seconds per tool call of recording it, with the writer thread running.
+    """
+    recorder = TraceRecorder(flush_interval=0.05)
+    recorder.start(directory, prefix="cost")
+    arguments = {"player_id": 7, "recipient": "player"}
+    result = {"card": "A of hearts", "recipient": "player"}
+    costs = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        recorder.tool_call("room", "hit", arguments, result, 0.0012)
+        costs[i] = time.perf_counter() - start
+    recorder.stop()
+    return costs
+
+
+async def record_session(recorder: TraceRecorder, rooms: int, seconds: float):
+    """
+    Records rooms playing scripted hands, each tool call handled and
+    recorded the way the agents do.
+    """
+    registry = load_registry("blackjack")
+    until = time.perf_counter() + seconds
+
+    async def call(room: str, name: str, arguments: Dict):
+        fresh_hand(name, arguments)
+        start = time.perf_counter()
+        result = registry.dispatch(name, arguments)
+        recorder.tool_call(room, name, arguments, result, time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+        return result
+
+    async def play(player_id: int):
+        room = f"room-{player_id}"
+        recorder.event(room, "agent_connected")
+        while time.perf_counter() < until:
+            await call(
+                room,
+                "create_game_session_and_deal_initial_cards",
+                {"player_id": player_id, "bet_amount": 10},
+            )
+            recorder.event(room, "agent_speaking")
+            value = {"total": 0}
+            while value["total"] < 17:
+                value = await call(
+                    room,
+                    "calculate_hand_value",
+                    {"player_id": player_id, "recipient": "player"},
+                )
+                value = value["output"]
+                if value["total"] < 17:
+                    await call(
+                        room, "hit", {"player_id": player_id, "recipient": "player"}
+                    )
+            await call(room, "dealer_turn", {"player_id": player_id})
+            await call(room, "check_game_status", {"player_id": player_id})
+            recorder.event(room, "agent_listening")
+
+    await asyncio.gather(*(play(player_id) for player_id in range(rooms)))
+    game_state_map.clear()
+
+
+async def replay(records: Iterable[Dict], registry: ToolRegistry, speed: float):
+    """
+    Dispatches the recorded tool calls at their recorded times, divided by
+    `speed`, each room's calls in order as the agents serialize them.
+
+    Returns:
+        tuple: Per call seconds from the recorded time to the result, the
+        calls that returned an error, and the wall time.
+    """
+    queues: Dict[str, asyncio.Queue] = {}
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    first = None
+
+    async def room(queue: asyncio.Queue):
+        nonlocal errors
+        while True:
+            due, name, arguments = await queue.get()
+            fresh_hand(name, arguments)
+            result = registry.dispatch(name, arguments)
+            latencies.append(time.perf_counter() - due)
+            if isinstance(result, dict) and "error" in result:
+                errors += 1
+            queue.task_done()
+
+    tasks = []
+    for record in records:
+        if record["kind"] != "tool_call":
+            continue
+        if first is None:
+            first = record["t"]
+        due = start + (record["t"] - first) / speed if speed else time.perf_counter()
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        queue = queues.get(record["room"])
+        if queue is None:
+            queue = queues[record["room"]] = asyncio.Queue()
+            tasks.append(asyncio.create_task(room(queue)))
+        queue.put_nowait((due, record["name"], record["arguments"]))
+        if not speed:
+            # Let the rooms keep up instead of queueing the whole trace
+            await asyncio.sleep(0)
+
+    for queue in queues.values():
+        await queue.join()
+    for task in tasks:
+        task.cancel()
+    game_state_map.clear()
+    return np.array(latencies), errors, time.perf_counter() - start
+
+
+def run(args: argparse.Namespace):
+    logging.getLogger("Chatbot").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as directory:
+        inline = inline_logging_cost(os.path.join(directory, "agent.log"), args.calls)
+        recorded = recorder_cost(os.path.join(directory, "cost"), args.calls)
+        print(f"{'per tool call':>16} {'mean us':>8} {'p99 us':>8} {'max us':>8}")
+        for name, costs in (("logger.info", inline), ("recorder", recorded)):
+            costs = costs * 1e6
+            print(
+                f"{name:>16} {costs.mean():>8.1f} {np.percentile(costs, 99):>8.1f} "
+                f"{costs.max():>8.0f}"
+            )
+
+        traces = args.traces
+        if traces is None:
+            traces = os.path.join(directory, "session")
+            recorder = TraceRecorder(segment_bytes=32 << 10)
+            recorder.start(traces, prefix="harness")
+            asyncio.run(record_session(recorder, args.rooms, args.seconds))
+            recorder.stop()
+            files = [path for recording in segments(traces) for path in recording]
+            size = sum(os.path.getsize(path) for path in files)
+            print(
+                f"recorded {args.rooms} rooms for {args.seconds:.0f}s: "
+                f"{recorder.stats()['written']} records in {len(files)} segments, "
+                f"{size / 1024:.0f} KiB"
+            )
+
+        latencies, errors, elapsed = asyncio.run(
+            replay(read_traces(traces), load_registry(args.app), args.speed)
+        )
+        latencies = latencies * 1e3
+        print(
+            f"replayed {len(latencies)} tool calls at speed {args.speed:g} in "
+            f"{elapsed:.1f}s ({len(latencies) / elapsed:.0f}/s), {errors} errors, "
+            f"behind the recorded time p50 {np.percentile(latencies, 50):.2f}ms "
+            f"p99 {np.percentile(latencies, 99):.2f}ms"
+        )
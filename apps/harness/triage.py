@@ -0,0 +1,167 @@
+import argparse
+import contextlib
+import io
+import itertools
+import logging
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from apps.customer_service.functions.main import add_complaint, complaint_book
+from apps.customer_service.functions.triage import THRESHOLD, complaint_triage
+
+FEATURES = [
+    "chat in the app",
+    "login page",
+    "payment screen",
+    "video call",
+    "voice call",
+    "order history",
+    "profile picture upload",
+    "password reset email",
+    "search bar",
+    "notification settings",
+    "refund request form",
+    "delivery tracking",
+    "shopping cart",
+    "dark mode",
+    "invoice download",
+    "two factor code",
+    "account deletion",
+    "subscription renewal",
+    "gift card balance",
+    "address book",
+    "customer support chat",
+    "loyalty points",
+    "app update",
+    "screen sharing",
+    "file attachment",
+    "calendar sync",
+    "wishlist",
+    "promo code field",
+    "language settings",
+    "checkout button",
+]
+SYMPTOMS = [
+    "is not working",
+    "keeps crashing",
+    "shows a blank screen",
+    "is very slow",
+    "logs me out",
+    "shows an error code 500",
+    "never finishes loading",
+    "charges me twice",
+    "freezes my phone",
+    "does not open",
+    "shows someone else's data",
+    "times out",
+    "says my session expired",
+    "is missing since the update",
+    "gives a network error",
+    "does nothing when I tap it",
+    "shows the wrong currency",
+    "sends duplicate messages",
+    "drains my battery",
+    "looks broken",
+]
+PREFIXES = ["", "", "", "hi, ", "hello ", "please help: ", "urgent: ", "again, "]
+SUFFIXES = ["", "", "", " since this morning", " again", "!!", " for two days"]
+
+INCIDENTS = [
+    f"{feature} {symptom}" for feature, symptom in itertools.product(FEATURES, SYMPTOMS)
+]
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--complaints", type=int, default=1_000_000)
+    parser.add_argument("--calls", type=int, default=10_000)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+
+
+def reword(rng: random.Random, incident: str) -> str:
+    """
+    The way a caller reports an incident: with a greeting, a remark and,
+    one time in five, a typo.
+    """
+    text = rng.choice(PREFIXES) + incident + rng.choice(SUFFIXES)
+    if rng.random() < 0.2:
+        i = rng.randrange(len(text) - 1)
+        text = text[:i] + text[i + 1] + text[i] + text[i + 2 :]
+    return text
+
+
+def complaints(rng: random.Random, count: int) -> Tuple[List[str], List[int]]:
+    """
+    Complaints about incidents a few of which most people report.
+    """
+    weights = 1 / np.arange(1, len(INCIDENTS) + 1)
+    incidents = rng.choices(range(len(INCIDENTS)), weights, k=count)
+    return [reword(rng, INCIDENTS[i]) for i in incidents], incidents
+
+
+def purity(labels: List[str], truth: List[int]) -> float:
+    """
+    The share of complaints filed under an incident whose most common
+    actual incident is their own.
+    """
+    counts = Counter(zip(labels, truth))
+    majority: Dict[str, int] = {}
+    for (label, _), count in counts.items():
+        majority[label] = max(majority.get(label, 0), count)
+    return sum(majority.values()) / len(labels)
+
+
+def run(args: argparse.Namespace):
+    logging.getLogger("Chatbot").setLevel(logging.ERROR)
+    rng = random.Random(1)
+    complaint_triage.threshold = args.threshold
+    texts, truth = complaints(rng, args.complaints)
+    complaint_book.clear()
+    complaint_book.update(
+        (f"customer-{i}", {"complaint": text, "resolution_period": "1 days"})
+        for i, text in enumerate(texts)
+    )
+
+    start = time.perf_counter()
+    report = complaint_triage.rebuild(complaint_book)
+    elapsed = time.perf_counter() - start
+    labels = [complaint_book[f"customer-{i}"]["incident"] for i in range(len(texts))]
+    print(
+        f"rebuild: {report['complaints']} complaints ({len(set(texts))} distinct) "
+        f"into {report['incidents']} incidents of {len(set(truth))} reported, "
+        f"{elapsed:.1f}s, purity {purity(labels, truth):.3f}"
+    )
+
+    calls, called = complaints(rng, args.calls)
+    # One call in ten reports something never seen before
+    novel = [rng.random() < 0.1 for _ in range(args.calls)]
+    calls = [
+        f"my {rng.choice(FEATURES)} ticket {i} is about something else" if new else text
+        for i, (text, new) in enumerate(zip(calls, novel))
+    ]
+    latencies = np.empty(args.calls)
+    linked = complaint_triage.linked
+    # add_complaint prints each complaint it stores
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, text in enumerate(calls):
+            start = time.perf_counter()
+            add_complaint(f"caller-{i}", text)
+            latencies[i] = time.perf_counter() - start
+    linked = complaint_triage.linked - linked
+    joined = sum(
+        complaint_book[f"caller-{i}"]["incident"] != complaint_book[f"caller-{i}"]["id"]
+        for i in range(args.calls)
+        if not novel[i]
+    )
+    latencies *= 1e6
+    print(
+        f"add_complaint at {len(complaint_book) - args.calls} complaints: "
+        f"p50 {np.percentile(latencies, 50):.0f}us p99 "
+        f"{np.percentile(latencies, 99):.0f}us max {latencies.max():.0f}us; "
+        f"{linked} of {args.calls} linked, {joined} of "
+        f"{args.calls - sum(novel)} repeat reports joined an incident"
+    )
+    complaint_book.clear()
@@ -0,0 +1,205 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger("Chatbot")
+
+
+def _call(consumer, method: str):
+    """
+    Calls pause()/resume() on a consumer, scheduling it if it is a coroutine.
+    """
+    action = getattr(consumer, method, None)
+    if action is None:
+        return
+    result = action()
+    if inspect.isawaitable(result):
+        asyncio.ensure_future(result)
+
+
+class ConsumerSlot:
+    def __init__(self, consumer_id: str, peer_id: str, consumer, now: float):
+        self.consumer_id = consumer_id
+        self.peer_id = peer_id
+        self.consumer = consumer
+        self.live = False
+        self.last_voice = now
+        self.parked_at = now
+        self.frames = 0
+        self.voiced_frames = 0
+
+    @property
+    def activity(self) -> float:
+        # Smoothed share of voiced frames; untried consumers start at 0.5
+        return (self.voiced_frames + 1) / (self.frames + 2)
+
+
+class AdmissionPolicy:
+    """
+    Decides which remote audio producers are consumed and which consumers
+    stream to the realtime model.
+
+    Priority peers (e.g. seated players) are always consumed; other peers are
+    consumed while fewer than `max_consumers` are open. At most `max_tracks`
+    consumers are live at a time, the rest are paused at the SFU so their
+    audio is neither received, decoded nor forwarded. A live consumer that
+    has been silent for `idle_timeout` seconds is paused to give its slot to
+    the waiting consumer that has talked the most.
+
+    The model hears a mix of the live speakers, so which peer a session
+    (e.g. a player_id) belongs to is learned with `attribute`: the session
+    of a tool call is the one of the peer heard last. `priority` is usually
+    backed by `peer_sessions`.
+    """
+
+    def __init__(
+        self,
+        max_tracks: int = 4,
+        max_consumers: Optional[int] = None,
+        idle_timeout: float = 10.0,
+        voice_threshold: float = 500.0,
+        priority: Optional[Callable[[str], bool]] = None,
+    ):
+        self.max_tracks = max_tracks
+        self.max_consumers = max_consumers or max_tracks * 2
+        self.idle_timeout = idle_timeout
+        self.voice_threshold = voice_threshold
+        self.priority = priority or (lambda peer_id: False)
+        self.slots: Dict[str, ConsumerSlot] = {}
+        self.producer_peers: Dict[str, str] = {}
+        self.peer_sessions: Dict[str, Hashable] = {}
+        self.rejected_producers = 0
+        self.pauses = 0
+        self.resumes = 0
+
+    @property
+    def live_count(self) -> int:
+        return sum(1 for slot in self.slots.values() if slot.live)
+
+    def should_consume(self, peer_id: str, producer_id: str) -> bool:
+        """
+        Called on `RemoteProducerAdded` for audio producers.
+        """
+        if self.priority(peer_id) or len(self.producer_peers) < self.max_consumers:
+            self.producer_peers[producer_id] = peer_id
+            return True
+
+        self.rejected_producers += 1
+        logger.info(f"Admission: not consuming producer {producer_id} of {peer_id}")
+        return False
+
+    def peer_for_producer(self, producer_id: Optional[str]) -> str:
+        return self.producer_peers.get(producer_id or "", "")
+
+    def admit(
+        self,
+        consumer_id: str,
+        peer_id: str,
+        consumer,
+        now: Optional[float] = None,
+    ) -> ConsumerSlot:
+        """
+        Called on `NewConsumerAdded`; the consumer goes live if a slot is
+        free and is paused otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        slot = ConsumerSlot(consumer_id, peer_id, consumer, now)
+        self.slots[consumer_id] = slot
+
+        if self.live_count < self.max_tracks:
+            slot.live = True
+        else:
+            self._pause(slot, now)
+
+        return slot
+
+    def remove(self, consumer_id: str):
+        slot = self.slots.pop(consumer_id, None)
+        if slot is not None:
+            self.producer_peers = {
+                producer_id: peer_id
+                for producer_id, peer_id in self.producer_peers.items()
+                if peer_id != slot.peer_id
+            }
+            self.peer_sessions.pop(slot.peer_id, None)
+
+    def observe(self, consumer_id: str, level: float, now: Optional[float] = None):
+        """
+        Records the level of a frame received on a live consumer; wired to
+        the audio mixer's level callback.
+        """
+        slot = self.slots.get(consumer_id)
+        if slot is None:
+            return
+        slot.frames += 1
+        if level >= self.voice_threshold:
+            slot.voiced_frames += 1
+            slot.last_voice = time.monotonic() if now is None else now
+
+    def attribute(self, session: Hashable):
+        """
+        Records the session of a tool call as the one of the live peer whose
+        voice was heard last, the speaker the model is most likely answering.
+        """
+        speakers = [slot for slot in self.slots.values() if slot.live]
+        if speakers:
+            speaker = max(speakers, key=lambda slot: slot.last_voice)
+            self.peer_sessions[speaker.peer_id] = session
+
+    def _pause(self, slot: ConsumerSlot, now: float):
+        slot.live = False
+        slot.parked_at = now
+        self.pauses += 1
+        _call(slot.consumer, "pause")
+
+    def _resume(self, slot: ConsumerSlot, now: float):
+        slot.live = True
+        slot.last_voice = now
+        self.resumes += 1
+        _call(slot.consumer, "resume")
+
+    def rebalance(self, now: Optional[float] = None):
+        """
+        Pauses idle live consumers when others are waiting and fills free live
+        slots: priority peers first, then the most talkative consumer, then
+        the longest waiting one.
+        """
+        now = time.monotonic() if now is None else now
+
+        waiting = sorted(
+            (slot for slot in self.slots.values() if not slot.live),
+            key=lambda slot: (
+                not self.priority(slot.peer_id),
+                -slot.activity,
+                slot.parked_at,
+            ),
+        )
+        if not waiting:
+            return
+
+        idle = sorted(
+            (
+                slot
+                for slot in self.slots.values()
+                if slot.live
+                and now - slot.last_voice >= self.idle_timeout
+                and not self.priority(slot.peer_id)
+            ),
+            key=lambda slot: slot.last_voice,
+        )
+        for slot in idle[: len(waiting)]:
+            self._pause(slot, now)
+
+        free = self.max_tracks - self.live_count
+        for slot in waiting[:free]:
+            self._resume(slot, now)
+
+    async def run(self, interval: float = 1.0):
+        """
+        Rebalances the live consumers every `interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.rebalance()
@@ -0,0 +1,337 @@
+import asyncio
+import fractions
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+import numpy as np
+from aiortc import MediaStreamTrack
+from av import AudioFrame
+
+logger = logging.getLogger("Chatbot")
+
+# aiortc decodes Opus to 20ms of 48kHz interleaved stereo s16
+SAMPLE_RATE = 48000
+CHANNELS = 2
+FRAME_SAMPLES = 960
+FRAME_SIZE = FRAME_SAMPLES * CHANNELS
+
+_INT16_MAX = np.int32(32767)
+_INT16_MIN = np.int32(-32768)
+
+
+class RingBuffer:
+    """
+    Fixed capacity FIFO of PCM frames backed by one preallocated int16 array.
+
+    Pushing copies into the next slot and popping adds the oldest slot into a
+    caller owned accumulator, so neither allocates. When full, the oldest
+    frame is overwritten.
+    """
+
+    def __init__(self, frames: int = 16, frame_size: int = FRAME_SIZE):
+        self.buffer = np.zeros((frames, frame_size), dtype=np.int16)
+        self.capacity = frames
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def push(self, samples: np.ndarray):
+        if self.count == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.dropped += 1
+        np.copyto(self.buffer[(self.head + self.count) % self.capacity], samples)
+        self.count += 1
+
+    def pop_into(self, accumulator: np.ndarray):
+        np.add(accumulator, self.buffer[self.head], out=accumulator)
+        self.head = (self.head + 1) % self.capacity
+        self.count -= 1
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+
+class EnergyVad:
+    """
+    Energy based voice activity detector for one track.
+
+    A frame is voiced when its RMS level exceeds both `threshold` and
+    `noise_ratio` times the adaptive noise floor. Frames within `hangover`
+    frames after speech stay voiced so word endings are not clipped and the
+    model's own turn detection still sees trailing silence.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 500.0,
+        noise_ratio: float = 3.0,
+        hangover: int = 25,
+        frame_size: int = FRAME_SIZE,
+    ):
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.hangover = hangover
+        self.noise_floor = threshold / noise_ratio
+        self.remaining = 0
+        self._scratch = np.zeros(frame_size, dtype=np.float32)
+
+    def level(self, samples: np.ndarray) -> float:
+        """
+        Returns the RMS level of a frame, using a preallocated scratch buffer.
+        """
+        scratch = self._scratch[: samples.size]
+        np.copyto(scratch, samples, casting="unsafe")
+        return float(np.sqrt(np.dot(scratch, scratch) / max(samples.size, 1)))
+
+    def update(self, level: float) -> bool:
+        """
+        Feeds the level of the next frame and returns whether it is voiced.
+        """
+        if level >= max(self.threshold, self.noise_floor * self.noise_ratio):
+            self.remaining = self.hangover
+            return True
+
+        self.noise_floor = 0.95 * self.noise_floor + 0.05 * level
+        if self.remaining > 0:
+            self.remaining -= 1
+            return True
+        return False
+
+
+class TrackInput:
+    def __init__(self, vad: EnergyVad, ring: RingBuffer):
+        self.vad = vad
+        self.ring = ring
+        self.task: Optional[asyncio.Task] = None
+
+
+class AudioMixer:
+    """
+    Pipeline stage between the consumed tracks and the realtime model.
+
+    Every input frame is level metered and VAD gated; voiced frames are
+    queued in the track's ring buffer and concurrent speakers are summed into
+    a single output stream. Silence is never forwarded, so an idle table
+    sends nothing upstream and a busy one sends one stream instead of one
+    per player.
+    """
+
+    def __init__(
+        self,
+        on_level: Optional[Callable[[str, float], None]] = None,
+        threshold: float = 500.0,
+        hangover: int = 25,
+        ring_frames: int = 16,
+    ):
+        self.on_level = on_level
+        self.threshold = threshold
+        self.hangover = hangover
+        self.ring_frames = ring_frames
+        self.inputs: Dict[str, TrackInput] = {}
+        self._accumulator = np.zeros(FRAME_SIZE, dtype=np.int32)
+        self._output = np.zeros(FRAME_SIZE, dtype=np.int16)
+        self._ready = asyncio.Event()
+        self.frames_in = 0
+        self.frames_voiced = 0
+        self.frames_out = 0
+        self.frames_skipped = 0
+        self._track = None
+
+    @property
+    def track(self):
+        """
+        The mixed audio track to add to the realtime model's conversation.
+        """
+        if self._track is None:
+            self._track = MixedTrack(self)
+        return self._track
+
+    @property
+    def bytes_in(self) -> int:
+        return self.frames_in * FRAME_SIZE * 2
+
+    @property
+    def bytes_out(self) -> int:
+        return self.frames_out * FRAME_SIZE * 2
+
+    def add_input(self, input_id: str) -> TrackInput:
+        track_input = TrackInput(
+            EnergyVad(threshold=self.threshold, hangover=self.hangover),
+            RingBuffer(self.ring_frames),
+        )
+        self.inputs[input_id] = track_input
+        return track_input
+
+    def add_track(self, input_id: str, track):
+        """
+        Starts pulling frames from a consumer's audio track.
+        """
+        track_input = self.add_input(input_id)
+        track_input.task = asyncio.create_task(self._pull(input_id, track))
+
+    def remove_track(self, input_id: str):
+        track_input = self.inputs.pop(input_id, None)
+        if track_input is not None and track_input.task is not None:
+            track_input.task.cancel()
+
+    async def _pull(self, input_id: str, track):
+        while True:
+            try:
+                frame = await track.recv()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info(f"Audio input {input_id} ended: {e}")
+                self.inputs.pop(input_id, None)
+                return
+
+            if (
+                frame.format.name != "s16"
+                or frame.samples != FRAME_SAMPLES
+                or len(frame.layout.channels) != CHANNELS
+            ):
+                self.frames_skipped += 1
+                continue
+
+            # Zero copy view of the decoded PCM
+            samples = np.frombuffer(frame.planes[0], dtype=np.int16, count=FRAME_SIZE)
+            self.process(input_id, samples)
+
+    def process(self, input_id: str, samples: np.ndarray) -> bool:
+        """
+        Meters, gates and queues one input frame; returns whether it was voiced.
+        """
+        track_input = self.inputs.get(input_id)
+        if track_input is None or samples.size != FRAME_SIZE:
+            return False
+
+        self.frames_in += 1
+        level = track_input.vad.level(samples)
+        if self.on_level is not None:
+            self.on_level(input_id, level)
+
+        if not track_input.vad.update(level):
+            return False
+
+        self.frames_voiced += 1
+        track_input.ring.push(samples)
+        self._ready.set()
+        return True
+
+    def mix(self) -> Optional[np.ndarray]:
+        """
+        Sums the oldest queued frame of every speaking input.
+
+        Returns:
+            np.ndarray | None: The mixer's reusable output buffer, or None if
+            no input has a voiced frame queued.
+        """
+        self._accumulator.fill(0)
+        mixed = 0
+        for track_input in self.inputs.values():
+            if track_input.ring.count:
+                track_input.ring.pop_into(self._accumulator)
+                mixed += 1
+
+        if not mixed:
+            return None
+
+        if mixed > 1:
+            # Saturate the sum of concurrent speakers to the int16 range
+            np.minimum(self._accumulator, _INT16_MAX, out=self._accumulator)
+            np.maximum(self._accumulator, _INT16_MIN, out=self._accumulator)
+        np.copyto(self._output, self._accumulator, casting="unsafe")
+        self.frames_out += 1
+        return self._output
+
+    async def next_frame(self) -> np.ndarray:
+        while True:
+            samples = self.mix()
+            if samples is not None:
+                return samples
+            self._ready.clear()
+            await self._ready.wait()
+
+    def stop(self):
+        for input_id in list(self.inputs):
+            self.remove_track(input_id)
+
+
+class MixedTrack(MediaStreamTrack):
+    """
+    Audio track carrying the mixer output, one 20ms frame per mixed block.
+    """
+
+    kind = "audio"
+
+    def __init__(self, mixer: AudioMixer):
+        super().__init__()
+        self.mixer = mixer
+        self.pts = 0
+        self.time_base = fractions.Fraction(1, SAMPLE_RATE)
+
+    async def recv(self):
+        samples = await self.mixer.next_frame()
+
+        # The frame is handed to the model, so it is the one allocation per
+        # output block; the mix itself runs in the mixer's buffers
+        frame = AudioFrame(format="s16", layout="stereo", samples=FRAME_SAMPLES)
+        frame.planes[0].update(samples)
+        frame.sample_rate = SAMPLE_RATE
+        frame.pts = self.pts
+        frame.time_base = self.time_base
+        self.pts += FRAME_SAMPLES
+        return frame
+
+
+class HeldTrack(MediaStreamTrack):
+    """
+    Passes a track through to the realtime model, and holds its frames while
+    the model reconnects.
+
+    Between `hold` and `release` the source is read into a bounded FIFO, so
+    what players say while the model is away is replayed to the new
+    connection ahead of live audio instead of piling up, and being dropped,
+    in the mixer. When full, the oldest frame is dropped.
+    """
+
+    kind = "audio"
+
+    def __init__(self, source: MediaStreamTrack, frames: int = 250):
+        super().__init__()
+        self.source = source
+        self.frames: Deque[AudioFrame] = deque(maxlen=frames)
+        self.held = 0
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def hold(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._hold())
+
+    async def _hold(self):
+        while True:
+            frame = await self.source.recv()
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+            self.held += 1
+
+    def release(self):
+        """
+        Stops holding; the held frames are the next ones `recv` returns.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def recv(self):
+        if self.frames:
+            return self.frames.popleft()
+        return await self.source.recv()
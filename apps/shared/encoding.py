@@ -0,0 +1,62 @@
+import json
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializes a record to compact JSON, with orjson when it is installed.
+
+    Args:
+        obj: The record, e.g. a traced tool call or an exported complaint.
+
+    Returns:
+        bytes: UTF-8 JSON without whitespace.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data: bytes | str) -> Any:
+    """
+    Parses JSON, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def compact(result: Any) -> Any:
+    """
+    Trims wrapper nesting the model does not need, e.g.
+    {"game_state": {"game_state": "player_win", "amount": 20}} becomes
+    {"game_state": "player_win", "amount": 20}.
+
+    Only single-key dicts wrapping another dict are unwrapped, so labels on
+    scalars and lists, like {"dealer_hand": [...]}, are kept. A dict that
+    repeats the key it is nested under is spliced into its parent, so
+    {"game_state": {"game_state": "player_win", ...}, "balance": 1010}
+    becomes {"game_state": "player_win", ..., "balance": 1010}.
+    """
+    while isinstance(result, dict) and len(result) == 1:
+        (value,) = result.values()
+        if not isinstance(value, dict):
+            break
+        result = value
+
+    if isinstance(result, dict) and any(
+        isinstance(value, dict) and key in value for key, value in result.items()
+    ):
+        spliced: Dict[str, Any] = {}
+        for key, value in result.items():
+            if isinstance(value, dict) and key in value:
+                spliced.update(value)
+            else:
+                spliced[key] = value
+        result = spliced
+    return result
@@ -0,0 +1,93 @@
+import asyncio
+import inspect
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger("Chatbot")
+
+Response = Tuple[int, str, Union[str, bytes]]
+
+Handler = Callable[[Dict[str, str]], Union[Response, Awaitable[Response]]]
+
+_REASONS = {
+    200: "OK",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HttpServer:
+    """
+    Minimal HTTP/1.1 server for operational endpoints (health, metrics, debug).
+
+    Handlers receive the parsed query string and return a
+    `(status, content_type, body)` tuple, either directly or from a coroutine.
+    Every response closes the connection.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 8080):
+        self.host = host
+        self.port = port
+        self.routes: Dict[str, Handler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, path: str, handler: Handler):
+        self.routes[path] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+
+            method, target = parts[0], parts[1]
+            url = urlsplit(target)
+            handler = self.routes.get(url.path)
+
+            if handler is None:
+                response: Response = (404, "text/plain", "not found\n")
+            elif method not in ("GET", "HEAD"):
+                response = (405, "text/plain", "method not allowed\n")
+            else:
+                try:
+                    response = handler(dict(parse_qsl(url.query)))
+                    if inspect.isawaitable(response):
+                        response = await response
+                except Exception as e:
+                    logger.exception(f"HTTP handler for {url.path} failed")
+                    response = (500, "text/plain", f"{e}\n")
+
+            status, content_type, body = response
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+
+            head = (
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            writer.write(head if method == "HEAD" else head + body)
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"HTTP request failed: {e}")
+        finally:
+            writer.close()
@@ -0,0 +1,177 @@
+import asyncio
+import inspect
+import logging
+import signal
+import time
+from typing import Any, Callable, Hashable, List, Set
+
+from apps.shared.http import HttpServer
+
+logger = logging.getLogger("Chatbot")
+
+
+async def aclose(resource: Any):
+    """
+    Closes an SDK object with whichever of close/disconnect/leave it exposes.
+
+    Args:
+        resource: The realtime model, agent or server to close.
+    """
+    for method in ("close", "disconnect", "leave"):
+        closer = getattr(resource, method, None)
+        if closer is None:
+            continue
+        try:
+            result = closer()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error(f"Failed to {method} {type(resource).__name__}: {e}")
+        return
+
+
+class _InFlight:
+    def __init__(self, lifecycle: "Lifecycle"):
+        self.lifecycle = lifecycle
+
+    async def __aenter__(self):
+        self.lifecycle.in_flight_count += 1
+
+    async def __aexit__(self, *exc):
+        self.lifecycle.in_flight_count -= 1
+        self.lifecycle._notify()
+
+
+class Lifecycle:
+    """
+    Signal aware lifecycle of an agent process.
+
+    On SIGTERM or SIGINT the agent stops admitting new consumers, waits up to
+    `drain_timeout` seconds for in-flight tool calls and open activities (such
+    as a hand being played) to finish, then runs the shutdown callbacks in
+    registration order: flush the session stores, then close the RTC and LLM
+    connections.
+    """
+
+    def __init__(self, drain_timeout: float = 30.0):
+        self.drain_timeout = drain_timeout
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.accepting = True
+        self.in_flight_count = 0
+        self.activities: Set[Hashable] = set()
+        self._shutdown_callbacks: List[Callable[[], Any]] = []
+        self._stopping = asyncio.Event()
+        self._changed = asyncio.Event()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    @property
+    def busy(self) -> bool:
+        return self.in_flight_count > 0 or bool(self.activities)
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+    def mark_ready(self):
+        self.ready = True
+
+    def stop(self):
+        """
+        Starts draining: the agent reports not ready and stops admitting work.
+        """
+        if self.stopping:
+            return
+        logger.info("Shutdown requested, draining...")
+        self.ready = False
+        self.accepting = False
+        self._stopping.set()
+
+    def in_flight(self) -> _InFlight:
+        """
+        Async context manager tracking a tool call until its callback returns.
+        """
+        return _InFlight(self)
+
+    def begin(self, activity: Hashable):
+        """
+        Marks a long running activity, e.g. `("hand", player_id)`, as open.
+        """
+        self.activities.add(activity)
+
+    def end(self, activity: Hashable):
+        self.activities.discard(activity)
+        self._notify()
+
+    def on_shutdown(self, callback: Callable[[], Any]):
+        """
+        Registers a sync or async callback to run after draining.
+        """
+        self._shutdown_callbacks.append(callback)
+
+    def _notify(self):
+        self._changed.set()
+
+    async def drain(self):
+        deadline = time.monotonic() + self.drain_timeout
+
+        while self.busy:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(
+                    f"Drain deadline reached with {self.in_flight_count} tool calls "
+                    f"and {len(self.activities)} activities open"
+                )
+                return
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        logger.info("Drained all in-flight work")
+
+    async def run_until_stopped(self):
+        """
+        Runs until a stop signal arrives, then drains and shuts down.
+        """
+        await self._stopping.wait()
+        await self.drain()
+
+        for callback in self._shutdown_callbacks:
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Shutdown callback failed: {e}")
+
+        logger.info("Exiting...")
+
+    def register_routes(self, server: HttpServer):
+        """
+        Serves `/healthz` (liveness) and `/readyz` (readiness) on a server.
+        """
+
+        def healthz(query):
+            uptime = time.monotonic() - self.started_at
+            return 200, "text/plain", f"ok uptime={uptime:.0f}s\n"
+
+        def readyz(query):
+            if self.ready and self.accepting:
+                return 200, "text/plain", "ready\n"
+            state = "draining" if self.stopping else "starting"
+            return 503, "text/plain", f"{state}\n"
+
+        server.route("/healthz", healthz)
+        server.route("/readyz", readyz)
+
+
+"""
+Lifecycle of the agent process
+"""
+lifecycle = Lifecycle()
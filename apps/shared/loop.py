@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Literal, NamedTuple, Optional, TypeVar
+
+logger = logging.getLogger("Chatbot")
+
+T = TypeVar("T")
+
+LoopType = Literal["asyncio", "uvloop"]
+
+
+class LoopOptions(NamedTuple):
+    """
+    How the event loop of an agent process is set up.
+
+    Attributes:
+        loop (str): "asyncio", or "uvloop" when it is installed; the RTC
+            signaling and model websockets spend most of their time in the
+            loop's socket handling, which uvloop runs in C.
+        executor_workers (int): Threads of the default executor, which runs
+            `asyncio.to_thread` and `run_in_executor(None, ...)`, like
+            memory reports, keystore reads and DNS lookups. None keeps
+            asyncio's min(32, cpus + 4).
+        eager_tasks (bool): Starts a task's coroutine inside
+            `create_task` (Python 3.12+), so an event handler that never
+            suspends, like a cached tool call, finishes without a trip
+            through the scheduler.
+    """
+
+    loop: LoopType = "asyncio"
+    executor_workers: Optional[int] = None
+    eager_tasks: bool = False
+
+
+def loop_factory(loop: LoopType) -> Callable[[], asyncio.AbstractEventLoop]:
+    """
+    Returns the constructor of an event loop type, falling back to asyncio's
+    when uvloop is not installed.
+    """
+    if loop == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("uvloop is not installed, running on the asyncio loop")
+        else:
+            return uvloop.new_event_loop
+    elif loop != "asyncio":
+        raise ValueError(f"Unknown event loop: {loop}")
+    return asyncio.new_event_loop
+
+
+def configure(loop: asyncio.AbstractEventLoop, options: LoopOptions):
+    """
+    Sets the default executor and task factory of a loop.
+    """
+    if options.executor_workers:
+        loop.set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=options.executor_workers, thread_name_prefix="asyncio"
+            )
+        )
+    if options.eager_tasks:
+        eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+        if eager_task_factory is None:
+            logger.warning("Eager tasks need Python 3.12, starting tasks lazily")
+        else:
+            loop.set_task_factory(eager_task_factory)
+
+
+def run(main: Coroutine[Any, Any, T], options: LoopOptions = LoopOptions()) -> T:
+    """
+    `asyncio.run`, on a loop set up by `options`.
+    """
+    with asyncio.Runner(loop_factory=loop_factory(options.loop)) as runner:
+        configure(runner.get_loop(), options)
+        logger.info(f"Event loop: {type(runner.get_loop()).__module__}, {options}")
+        return runner.run(main)
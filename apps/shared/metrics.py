@@ -0,0 +1,370 @@
+import asyncio
+import bisect
+import logging
+import math
+import os
+import resource
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from apps.shared.http import HttpServer
+
+logger = logging.getLogger("Chatbot")
+
+# Latency buckets in seconds, from a cached tool call to a slow provider
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Sample(NamedTuple):
+    suffix: str
+    labels: Dict[str, str]
+    value: float
+
+
+class Family(NamedTuple):
+    name: str
+    type: str
+    help: str
+    samples: List[Sample]
+
+
+class _Value:
+    """
+    One labelled series of a counter or gauge. Updates are plain attribute
+    writes: the agents update metrics from a single event loop thread, and
+    a worker process has its own registry, so nothing is locked.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _Buckets:
+    """
+    One labelled series of a histogram, counting each observation in the
+    first bucket it fits; the counts are made cumulative on collection.
+    """
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """
+    A metric family and its series, one per combination of label values.
+
+    Hot paths should resolve `labels(...)` once and keep the series, whose
+    update is a single attribute write.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.series: Dict[Tuple[str, ...], object] = {}
+        if not self.label_names:
+            self.series[()] = self._series()
+
+    def _series(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        """
+        Returns the series for a combination of label values.
+        """
+        try:
+            return self.series[values]
+        except KeyError:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            series = self.series[values] = self._series()
+            return series
+
+    def _labels(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, values))
+
+    def collect(self) -> Family:
+        return Family(
+            self.name,
+            self.type,
+            self.help,
+            [
+                Sample("", self._labels(values), series.value)
+                for values, series in self.series.items()
+            ],
+        )
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1):
+        self.series[()].value += amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float):
+        self.series[()].value = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _series(self):
+        return _Buckets(self.bounds)
+
+    def observe(self, value: float):
+        self.series[()].observe(value)
+
+    def collect(self) -> Family:
+        samples = []
+        for values, series in self.series.items():
+            labels = self._labels(values)
+            total = 0
+            for bound, count in zip(self.bounds + (math.inf,), series.counts):
+                total += count
+                samples.append(Sample("_bucket", {**labels, "le": bound}, total))
+            samples.append(Sample("_sum", labels, series.sum))
+            samples.append(Sample("_count", labels, total))
+        return Family(self.name, self.type, self.help, samples)
+
+
+class MetricsRegistry:
+    """
+    In-process metrics, served in the Prometheus text exposition format.
+
+    Counters and histograms are updated where things happen, at the cost of
+    an attribute write. Values other code already keeps, like the size of a
+    session store or the tool cache counters, are read by collectors when
+    the metrics are scraped instead, and cost nothing in between.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric):
+                raise ValueError(f"Metric {metric.name} is already a {existing.type}")
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def collector(self, callback: Callable[[], Iterable[Family]]):
+        """
+        Registers a callback returning families, called on every scrape.
+        """
+        self.collectors.append(callback)
+
+    def collect(self) -> List[Family]:
+        families = [metric.collect() for metric in self.metrics.values()]
+        for callback in self.collectors:
+            try:
+                families.extend(callback())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        return families
+
+    def register_routes(self, server: HttpServer):
+        """
+        Serves `/metrics` on a server.
+        """
+
+        def scrape(query):
+            return 200, CONTENT_TYPE, render(self.collect())
+
+        server.route("/metrics", scrape)
+
+    async def monitor(self, interval: float = 0.5):
+        """
+        Samples the event loop lag: how late a sleep of `interval` wakes up,
+        which is how long a ready callback waited for the loop.
+        """
+        lag = self.histogram(
+            "agent_event_loop_lag_seconds", "Event loop scheduling delay"
+        )
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+def gauge(name: str, help: str, value: float, **labels: str) -> Family:
+    """
+    A single series gauge family, for collectors.
+    """
+    return Family(name, "gauge", help, [Sample("", labels, value)])
+
+
+def counter(name: str, help: str, values: Dict[str, float], label: str) -> Family:
+    """
+    A counter family with one series per value of `label`, for collectors
+    reading counts kept elsewhere.
+    """
+    return Family(
+        name,
+        "counter",
+        help,
+        [Sample("", {label: key}, value) for key, value in values.items()],
+    )
+
+
+def merge(families: Iterable[Family], **labels: str) -> List[Family]:
+    """
+    Merges families of the same name, e.g. collected from several worker
+    processes, adding `labels` to every sample of this batch.
+    """
+    merged: Dict[str, Family] = {}
+    for family in families:
+        samples = [
+            Sample(sample.suffix, {**labels, **sample.labels}, sample.value)
+            for sample in family.samples
+        ]
+        existing = merged.get(family.name)
+        if existing is None:
+            merged[family.name] = family._replace(samples=samples)
+        else:
+            existing.samples.extend(samples)
+    return list(merged.values())
+
+
+def _escape(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def render(families: Iterable[Family]) -> str:
+    """
+    Formats families in the Prometheus text exposition format.
+    """
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for sample in family.samples:
+            if sample.labels:
+                labels = ",".join(
+                    f'{key}="{_escape(value)}"' for key, value in sample.labels.items()
+                )
+                lines.append(
+                    f"{family.name}{sample.suffix}{{{labels}}} {_number(sample.value)}"
+                )
+            else:
+                lines.append(f"{family.name}{sample.suffix} {_number(sample.value)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+
+def _process() -> List[Family]:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss = _rss()
+    if rss is None:
+        # The peak where the current size is not available, bytes on macOS
+        rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return [
+        gauge("process_resident_memory_bytes", "Resident memory size in bytes", rss),
+        Family(
+            "process_cpu_seconds_total",
+            "counter",
+            "User and system CPU time spent in seconds",
+            [Sample("", {}, usage.ru_utime + usage.ru_stime)],
+        ),
+    ]
+
+
+"""
+Metrics of the agent process
+"""
+metrics = MetricsRegistry()
+metrics.collector(_process)
+
+"""
+Room and agent events handled by the process, by event
+"""
+room_events = metrics.counter(
+    "agent_room_events_total", "Room and agent events handled", ["event"]
+)
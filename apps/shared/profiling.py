@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import gc
+import logging
+import signal
+import tracemalloc
+import urllib.request
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from apps.shared.http import HttpServer
+
+logger = logging.getLogger("Chatbot")
+
+# Allocations inside these modules are the profiler's own
+_IGNORED = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+
+class MemoryProfiler:
+    """
+    Opt-in memory profiling of a running agent.
+
+    `report` describes what grew since the previous report: the top
+    allocating source lines from tracemalloc snapshots (while tracing is
+    on), the live objects by type, which catches SDK and C extension objects
+    tracemalloc does not attribute, and the counts of the accounts the
+    agent registers, e.g. the sessions and tracks of each room. Each report
+    becomes the baseline of the next one, so two reports taken a few minutes
+    apart show what leaked in between.
+
+    Reports are served on `/debug/memory` and logged on SIGUSR1.
+    """
+
+    def __init__(self, frames: int = 1, top: int = 20):
+        self.frames = frames
+        self.top = top
+        self.accounts: Dict[str, Callable[[], Dict[str, int]]] = {}
+        self._stats: Optional[Dict[tracemalloc.Traceback, Tuple[int, int]]] = None
+        self._objects: Counter = Counter()
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self, frames: Optional[int] = None):
+        """
+        Starts tracing allocations, keeping `frames` frames of traceback.
+        Only allocations made from then on are attributed.
+        """
+        if tracemalloc.is_tracing():
+            return
+        tracemalloc.start(frames or self.frames)
+        self._stats = None
+        logger.info("Tracing memory allocations")
+
+    def stop(self):
+        tracemalloc.stop()
+        self._stats = None
+
+    def account(self, name: str, counts: Callable[[], Dict[str, int]]):
+        """
+        Registers the object counts of a part of the agent, e.g. a room.
+
+        Args:
+            name (str): Shown in reports, e.g. "room DAAO".
+            counts (callable): Returns the current count of each kind of
+                object the part holds, e.g. {"sessions": 12}.
+        """
+        self.accounts[name] = counts
+
+    def forget(self, name: str):
+        self.accounts.pop(name, None)
+        self._counts.pop(name, None)
+
+    def allocations(self, group: str = "lineno") -> List[str]:
+        """
+        Returns the top allocators since the previous call, by source line
+        ("lineno"), file ("filename") or call stack ("traceback").
+        """
+        if not tracemalloc.is_tracing():
+            return ["tracemalloc is off, start it with /debug/memory?trace=start"]
+
+        # Grouping a snapshot is the slow part, each one is grouped once and
+        # only its statistics are kept for the next diff
+        stats = [
+            stat
+            for stat in tracemalloc.take_snapshot().statistics(group)
+            if stat.traceback[0].filename not in _IGNORED
+        ]
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB"]
+        if self._stats is None:
+            lines.append("top allocators since tracing started:")
+            lines.extend(f"  {stat}" for stat in stats[: self.top])
+        else:
+            diffs = []
+            for stat in stats:
+                size, count = self._stats.get(stat.traceback, (0, 0))
+                if stat.size > size:
+                    diffs.append(
+                        tracemalloc.StatisticDiff(
+                            stat.traceback,
+                            stat.size,
+                            stat.size - size,
+                            stat.count,
+                            stat.count - count,
+                        )
+                    )
+            diffs.sort(key=lambda diff: diff.size_diff, reverse=True)
+            lines.append("top growth since the previous report:")
+            lines.extend(f"  {diff}" for diff in diffs[: self.top])
+        self._stats = {stat.traceback: (stat.size, stat.count) for stat in stats}
+        return lines
+
+    def objects(self) -> List[str]:
+        """
+        Returns the live object types that grew most since the previous
+        call.
+        """
+        gc.collect()
+        counts = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+        growth = counts.copy()
+        growth.subtract(self._objects)
+        self._objects = counts
+        lines = ["live objects, growth since the previous report:"]
+        for name, diff in growth.most_common(self.top):
+            if diff <= 0:
+                break
+            lines.append(f"  {name}: {counts[name]} (+{diff})")
+        return lines
+
+    def counts(self) -> List[str]:
+        lines = ["accounts:"]
+        for name, counts in list(self.accounts.items()):
+            try:
+                current = counts()
+            except Exception as e:
+                lines.append(f"  {name}: {e}")
+                continue
+            previous = self._counts.get(name, {})
+            self._counts[name] = current
+            values = ", ".join(
+                f"{key} {value} ({value - previous.get(key, 0):+d})"
+                for key, value in current.items()
+            )
+            lines.append(f"  {name}: {values}")
+        return lines
+
+    def report(self, group: str = "lineno") -> str:
+        return "\n".join(
+            self.counts() + self.objects() + self.allocations(group) + [""]
+        )
+
+    async def areport(self, group: str = "lineno") -> str:
+        """
+        `report`, walking the heap and the traces in a thread so the event
+        loop keeps serving the rooms meanwhile. The accounts are read on the
+        loop, which owns the objects they count.
+        """
+        counts = self.counts()
+        rest = await asyncio.to_thread(lambda: self.objects() + self.allocations(group))
+        return "\n".join(counts + rest + [""])
+
+    def install_signal_handler(self, signum: int = signal.SIGUSR1):
+        """
+        Logs a report whenever the process receives `signum`.
+        """
+
+        async def log():
+            logger.info(f"Memory:\n{await self.areport()}")
+
+        def handler():
+            task = asyncio.create_task(log())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        asyncio.get_running_loop().add_signal_handler(signum, handler)
+
+    async def query(self, query: Dict[str, str]) -> str:
+        """
+        Returns a report, after starting or stopping tracing with
+        `trace=start|stop`, grouped by `group=lineno|filename|traceback`.
+        """
+        trace = query.get("trace")
+        if trace == "start":
+            self.start(int(query.get("frames", self.frames)))
+        elif trace == "stop":
+            self.stop()
+        if "top" in query:
+            self.top = int(query["top"])
+        return await self.areport(query.get("group", "lineno"))
+
+    def register_routes(self, server: HttpServer):
+        """
+        Serves `/debug/memory`, see `query`.
+        """
+
+        async def memory(query):
+            return 200, "text/plain", await self.query(query)
+
+        server.route("/debug/memory", memory)
+
+
+"""
+Memory profiler of the agent process
+"""
+memory_profiler = MemoryProfiler()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prints the memory report of a running agent"
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8080/debug/memory")
+    parser.add_argument("--trace", choices=["start", "stop"])
+    parser.add_argument("--group", default="lineno")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    query = f"group={args.group}&top={args.top}"
+    if args.trace:
+        query += f"&trace={args.trace}"
+    with urllib.request.urlopen(f"{args.url}?{query}") as response:
+        print(response.read().decode())
+
+
+if __name__ == "__main__":
+    main()
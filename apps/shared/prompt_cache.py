@@ -0,0 +1,116 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Sequence, Tuple
+
+
+class CachedDeclarations(NamedTuple):
+    key: str
+    declarations: List[Dict]
+    serialized: bytes
+
+
+def _canonical(payload: Any) -> bytes:
+    return json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+
+class SessionConfigCache:
+    """
+    Process wide cache of the tool declaration payloads a realtime session is
+    built from.
+
+    Every room builds its model from the same `tool_*` dicts, so the canonical
+    serialization, the content hash and the finalized `GeminiConfig` are
+    computed once per distinct set of declarations and shared by every
+    session in the process. System prompts are passed to the SDK as they
+    are, since it takes the string and does nothing a cache could save.
+
+    Lookups are keyed by the identity of the declaration dicts, so a hit
+    hashes no payload. Each cache keeps the `max_entries` most recently used
+    entries.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._declarations: OrderedDict[Tuple[int, ...], CachedDeclarations] = (
+            OrderedDict()
+        )
+        self._gemini_configs: OrderedDict[str, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, cache: OrderedDict, key: Hashable) -> Any:
+        value = cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            cache.move_to_end(key)
+        return value
+
+    def _put(self, cache: OrderedDict, key: Hashable, value: Any):
+        cache[key] = value
+        if len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def declarations(self, tools: Sequence[Dict]) -> CachedDeclarations:
+        """
+        Returns the cached, serialized form of a list of tool declarations.
+
+        Declarations are module level dicts that are never mutated, so they
+        are looked up by identity; the cached entry holds them, so their ids
+        are not reused while it is cached.
+
+        Args:
+            tools (list): Function declarations in the Gemini dict format.
+
+        Returns:
+            CachedDeclarations: The shared declaration list, its content key
+            and its canonical JSON payload.
+        """
+        identity = tuple(map(id, tools))
+        with self._lock:
+            cached = self._get(self._declarations, identity)
+            if cached is None:
+                serialized = _canonical(list(tools))
+                cached = CachedDeclarations(
+                    key=hashlib.sha256(serialized).hexdigest(),
+                    declarations=list(tools),
+                    serialized=serialized,
+                )
+                self._put(self._declarations, identity, cached)
+            return cached
+
+    def gemini_config(self, tools: Sequence[Dict]):
+        """
+        Returns a finalized `GeminiConfig` shared by every session declaring
+        the same tools.
+
+        Args:
+            tools (list): Function declarations in the Gemini dict format.
+
+        Returns:
+            GeminiConfig: The config to pass into `GeminiOptions`.
+        """
+        from ai01.providers.gemini.gemini_realtime import GeminiConfig
+
+        cached = self.declarations(tools)
+
+        with self._lock:
+            config = self._gemini_configs.get(cached.key)
+            if config is None:
+                config = GeminiConfig(function_declaration=cached.declarations)
+                self._put(self._gemini_configs, cached.key, config)
+            else:
+                self._gemini_configs.move_to_end(cached.key)
+            return config
+
+
+"""
+Cache shared by every session in the process
+"""
+session_config_cache = SessionConfigCache()
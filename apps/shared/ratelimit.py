@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from apps.shared.metrics import Family, Sample, counter, gauge
+
+logger = logging.getLogger("Chatbot")
+
+
+class TokenBucket:
+    """
+    Allows `rate` events per second on average and bursts of up to `burst`.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> float:
+        """
+        Returns the tokens available at `now`.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def wait(self) -> float:
+        """
+        Returns the seconds until a token is available, after a refill.
+        """
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def slow_down(limit: str, retry_after: float) -> Dict:
+    """
+    The result sent to the model instead of running a limited tool call.
+    """
+    return {
+        "error": "Too many tool calls, slow down and retry later",
+        "limit": limit,
+        "retry_after_seconds": round(retry_after, 2),
+    }
+
+
+class _Slot:
+    def __init__(self, limiter: "ToolCallLimiter", room: Hashable):
+        self.limiter = limiter
+        self.room = room
+        self.lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> Optional[Dict]:
+        limiter = self.limiter
+        waiting = limiter.waiting.get(self.room, 0)
+        if waiting >= limiter.max_pending:
+            limiter._reject("queue", None)
+            return slow_down("queue", 1 / limiter.rate)
+
+        # The room is back before its last calls finished
+        limiter.forgotten.discard(self.room)
+        limiter.waiting[self.room] = waiting + 1
+        limiter.pending += 1
+        limiter.pending_peak = max(limiter.pending_peak, limiter.pending)
+        self.lock = limiter.locks.setdefault(self.room, asyncio.Lock())
+        start = time.perf_counter()
+        try:
+            await self.lock.acquire()
+        finally:
+            limiter.waiting[self.room] -= 1
+            limiter.pending -= 1
+        wait = time.perf_counter() - start
+        limiter.wait_total += wait
+        limiter.wait_peak = max(limiter.wait_peak, wait)
+        limiter.slots += 1
+        return None
+
+    async def __aexit__(self, *exc):
+        if self.lock is not None:
+            self.lock.release()
+            if self.room in self.limiter.forgotten:
+                self.limiter.forget(self.room)
+
+
+class ToolCallLimiter:
+    """
+    Backpressure on the tool calls of each room.
+
+    A room's calls run one at a time, and at most `max_pending` wait behind
+    the running one; a call arriving to a full queue is not queued. Calls
+    then draw from a token bucket per room (`rate` calls/s, bursts of
+    `burst`) and one per room and tool (`tool_rate`, `tool_burst`, or an
+    entry of `tool_limits`). Over either limit, the model gets a
+    `slow_down` result to act on instead of the tool running, so a runaway
+    loop of calls never blocks the event loop the other rooms share.
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: float = 10,
+        tool_rate: float = 2.0,
+        tool_burst: float = 5,
+        max_pending: int = 4,
+        tool_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.tool_rate = tool_rate
+        self.tool_burst = tool_burst
+        self.max_pending = max_pending
+        self.tool_limits = tool_limits or {}
+        self.rooms: Dict[Hashable, TokenBucket] = {}
+        self.tools: Dict[Tuple[Hashable, str], TokenBucket] = {}
+        self.locks: Dict[Hashable, asyncio.Lock] = {}
+        self.waiting: Dict[Hashable, int] = {}
+        # Rooms forgotten while calls held or waited for their turn
+        self.forgotten: Set[Hashable] = set()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"room": 0, "tool": 0, "queue": 0}
+        self.rejected_by_tool: Dict[str, int] = {}
+        self.pending = 0
+        self.pending_peak = 0
+        self.slots = 0
+        self.wait_total = 0.0
+        self.wait_peak = 0.0
+
+    def slot(self, room: Hashable) -> _Slot:
+        """
+        Async context manager holding the room's turn to run a tool call.
+        It yields a `slow_down` result when the room's queue is full, and
+        None once the call may run.
+        """
+        return _Slot(self, room)
+
+    def take(self, room: Hashable, tool: str) -> Optional[Dict]:
+        """
+        Takes a token for a call of `tool` in `room`.
+
+        Returns:
+            dict: A `slow_down` result if the room or the tool is over its
+            rate, None if the call may run.
+        """
+        now = time.monotonic()
+        room_bucket = self.rooms.get(room)
+        if room_bucket is None:
+            room_bucket = self.rooms[room] = TokenBucket(self.rate, self.burst)
+        tool_bucket = self.tools.get((room, tool))
+        if tool_bucket is None:
+            rate, burst = self.tool_limits.get(tool, (self.tool_rate, self.tool_burst))
+            tool_bucket = self.tools[(room, tool)] = TokenBucket(rate, burst)
+
+        # Neither token is spent unless both are available
+        if tool_bucket.refill(now) < 1:
+            self._reject("tool", tool)
+            return slow_down("tool", tool_bucket.wait())
+        if room_bucket.refill(now) < 1:
+            self._reject("room", tool)
+            return slow_down("room", room_bucket.wait())
+
+        tool_bucket.tokens -= 1
+        room_bucket.tokens -= 1
+        self.admitted += 1
+        return None
+
+    def _reject(self, limit: str, tool: Optional[str]):
+        self.rejected[limit] += 1
+        if tool is not None:
+            self.rejected_by_tool[tool] = self.rejected_by_tool.get(tool, 0) + 1
+        logger.warning(f"Tool call over the {limit} limit: {tool or 'queue full'}")
+
+    def forget(self, room: Hashable):
+        """
+        Drops a room's buckets, e.g. when it moves to another worker.
+
+        The room's turn is only dropped once no call holds or waits for it,
+        since a call arriving meanwhile would get a new lock and run
+        alongside them; until then the last call out drops it.
+        """
+        self.rooms.pop(room, None)
+        for key in [key for key in self.tools if key[0] == room]:
+            del self.tools[key]
+
+        lock = self.locks.get(room)
+        if lock is not None and (lock.locked() or self.waiting.get(room)):
+            self.forgotten.add(room)
+            return
+        self.forgotten.discard(room)
+        self.locks.pop(room, None)
+        self.waiting.pop(room, None)
+
+    def stats(self) -> Dict:
+        """
+        Returns the saturation counters: how often calls were turned away and
+        by which limit, and how long and how many calls queued.
+        """
+        calls = self.admitted + sum(self.rejected.values())
+        return {
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "rejected_by_tool": dict(self.rejected_by_tool),
+            "rejection_rate": 1 - self.admitted / calls if calls else 0.0,
+            "pending": self.pending,
+            "pending_peak": self.pending_peak,
+            "wait_ms_avg": self.wait_total / self.slots * 1e3 if self.slots else 0.0,
+            "wait_ms_peak": self.wait_peak * 1e3,
+        }
+
+    def collect(self) -> List[Family]:
+        """
+        Returns the saturation counters as metric families, for
+        `metrics.collector`.
+        """
+        return [
+            counter(
+                "agent_tool_calls_limited_total",
+                "Tool calls turned away with a slow down result",
+                self.rejected,
+                "limit",
+            ),
+            gauge(
+                "agent_tool_calls_pending",
+                "Tool calls waiting for their room's turn",
+                self.pending,
+            ),
+            Family(
+                "agent_tool_call_wait_seconds_total",
+                "counter",
+                "Time tool calls waited for their room's turn",
+                [Sample("", {}, self.wait_total)],
+            ),
+        ]
+
+
+"""
+Tool call limits of every room in the process
+"""
+tool_call_limiter = ToolCallLimiter()
@@ -0,0 +1,553 @@
+import abc
+import asyncio
+import logging
+import random
+import ssl
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from apps.shared.audio import HeldTrack
+from apps.shared.lifecycle import aclose
+from apps.shared.metrics import metrics
+from apps.shared.prompt_cache import session_config_cache
+from apps.shared.tools import ToolRegistry
+
+logger = logging.getLogger("Chatbot")
+
+"""
+Realtime model connections dropped, and the time from a drop to the
+model's first audio on the resumed connection
+"""
+realtime_drops = metrics.counter(
+    "agent_realtime_drops_total", "Realtime model connections dropped"
+)
+realtime_first_audio_seconds = metrics.histogram(
+    "agent_realtime_first_audio_seconds",
+    "Time from a realtime model drop to its first audio",
+    buckets=(0.5, 1, 2, 3, 5, 10, 20, 30),
+)
+
+
+class RealtimeBackend(abc.ABC):
+    """
+    A realtime model provider the agent can talk to.
+
+    Backends build the provider's model object from the shared prompt and
+    tool registry, so switching providers never touches the tool handlers or
+    the room and agent event handlers.
+    """
+
+    name: str = ""
+
+    # Host probed to measure connection setup time
+    host: str = ""
+
+    @abc.abstractmethod
+    def create(self, agent, instructions: str, registry: ToolRegistry):
+        """
+        Creates the provider's realtime model for an agent.
+
+        Args:
+            agent (Agent): The agent the model is attached to.
+            instructions (str): The system prompt.
+            registry (ToolRegistry): The tools exposed to the model.
+
+        Returns:
+            The realtime model, exposing `connect()` and `conversation`.
+        """
+
+    async def probe(self) -> float:
+        """
+        Measures the connection setup time to the provider.
+
+        Returns:
+            float: Seconds taken to open a TLS connection to the provider.
+        """
+        start = time.perf_counter()
+        _, writer = await asyncio.open_connection(
+            self.host, 443, ssl=ssl.create_default_context()
+        )
+        elapsed = time.perf_counter() - start
+        writer.close()
+        await writer.wait_closed()
+        return elapsed
+
+
+class GeminiBackend(RealtimeBackend):
+    name = "gemini"
+    host = "generativelanguage.googleapis.com"
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def create(self, agent, instructions: str, registry: ToolRegistry):
+        from ai01.providers.gemini.gemini_realtime import GeminiOptions, GeminiRealtime
+
+        return GeminiRealtime(
+            agent=agent,
+            options=GeminiOptions(
+                gemini_api_key=self.api_key,
+                system_instruction=instructions,
+                config=session_config_cache.gemini_config(registry.declarations),
+            ),
+        )
+
+
+class OpenAIBackend(RealtimeBackend):
+    name = "openai"
+    host = "api.openai.com"
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def create(self, agent, instructions: str, registry: ToolRegistry):
+        from ai01.providers.openai.realtime import RealTimeModel, RealTimeModelOptions
+
+        return RealTimeModel(
+            agent=agent,
+            options=RealTimeModelOptions(
+                oai_api_key=self.api_key,
+                instructions=instructions,
+                function_declaration=session_config_cache.declarations(
+                    registry.declarations
+                ).declarations,
+            ),
+        )
+
+
+class FakeConversation:
+    def __init__(self):
+        self.tracks: Dict[str, Any] = {}
+
+    def add_track(self, track_id: str, track):
+        self.tracks[track_id] = track
+
+    def remove_track(self, track_id: str):
+        self.tracks.pop(track_id, None)
+
+
+class FakeRealtime:
+    """
+    In-process stand-in for a realtime model, used by the offline harness.
+
+    Tool calls are answered through the same registry the real providers use,
+    after a configurable turnaround delay.
+    """
+
+    def __init__(
+        self,
+        registry: ToolRegistry,
+        setup_delay: float = 0.0,
+        tool_delay: float = 0.0,
+        healthy: bool = True,
+    ):
+        self.registry = registry
+        self.setup_delay = setup_delay
+        self.tool_delay = tool_delay
+        self.healthy = healthy
+        self.connected = False
+        self.conversation = FakeConversation()
+
+    async def connect(self):
+        await asyncio.sleep(self.setup_delay)
+        if not self.healthy:
+            raise ConnectionError("Fake realtime provider is unavailable")
+        self.connected = True
+
+    async def call_tool(self, name: str, args: Optional[Dict]) -> Any:
+        """
+        Simulates the model issuing a tool call and waiting for the result.
+        """
+        if not self.connected:
+            raise ConnectionError("Fake realtime provider is not connected")
+        await asyncio.sleep(self.tool_delay)
+        return self.registry.dispatch(name, args)
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeBackend(RealtimeBackend):
+    name = "fake"
+
+    def __init__(
+        self,
+        name: str = "fake",
+        setup_delay: float = 0.0,
+        tool_delay: float = 0.0,
+        healthy: bool = True,
+    ):
+        self.name = name
+        self.setup_delay = setup_delay
+        self.tool_delay = tool_delay
+        self.healthy = healthy
+
+    def create(self, agent, instructions: str, registry: ToolRegistry):
+        return FakeRealtime(
+            registry,
+            setup_delay=self.setup_delay,
+            tool_delay=self.tool_delay,
+            healthy=self.healthy,
+        )
+
+    async def probe(self) -> float:
+        await asyncio.sleep(self.setup_delay)
+        if not self.healthy:
+            raise ConnectionError(f"Fake provider {self.name} is unavailable")
+        return self.setup_delay
+
+
+def create_backends(
+    provider: str,
+    gemini_api_key: Optional[str] = None,
+    openai_api_key: Optional[str] = None,
+) -> List[RealtimeBackend]:
+    """
+    Builds the candidate backends for a `REALTIME_PROVIDER` setting.
+
+    Args:
+        provider (str): "gemini", "openai", "auto" (every provider with a key)
+            or "fake".
+        gemini_api_key (str): Gemini API key.
+        openai_api_key (str): OpenAI API key.
+
+    Returns:
+        list: The backends the selector may choose from.
+    """
+    backends: List[RealtimeBackend] = []
+
+    if provider in ("gemini", "auto") and gemini_api_key:
+        backends.append(GeminiBackend(gemini_api_key))
+    if provider in ("openai", "auto") and openai_api_key:
+        backends.append(OpenAIBackend(openai_api_key))
+    if provider == "fake":
+        backends.append(FakeBackend())
+
+    if not backends:
+        raise ValueError(f"No API key is set for realtime provider: {provider}")
+
+    return backends
+
+
+class ProviderStats:
+    def __init__(self):
+        self.setup: Optional[float] = None
+        # Time from a tool result being sent to the model's audio answering it
+        self.response: Optional[float] = None
+        self.failures = 0
+        self.unhealthy_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+
+class LatencySelector:
+    """
+    Picks the fastest healthy realtime provider for a room.
+
+    Connection setup time is probed for every provider before the model is
+    created, and response latency, the time a provider takes to answer a tool
+    result with audio, is observed for whichever provider served the room.
+    Both are smoothed into a per provider score; a provider that has not
+    served yet is scored with the average response latency of those that
+    have, so serving a room never counts against a provider. A provider that
+    fails to connect is benched for `cooldown` seconds and the next best one
+    is used instead.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[RealtimeBackend],
+        alpha: float = 0.3,
+        probe_timeout: float = 5.0,
+        connect_timeout: float = 15.0,
+        cooldown: float = 60.0,
+    ):
+        if not backends:
+            raise ValueError("LatencySelector needs at least one backend")
+
+        self.backends = list(backends)
+        self.alpha = alpha
+        self.probe_timeout = probe_timeout
+        self.connect_timeout = connect_timeout
+        self.cooldown = cooldown
+        self.stats: Dict[str, ProviderStats] = {
+            backend.name: ProviderStats() for backend in self.backends
+        }
+        self.current: RealtimeBackend = self.backends[0]
+
+    def _smooth(self, previous: Optional[float], sample: float) -> float:
+        if previous is None:
+            return sample
+        return (1 - self.alpha) * previous + self.alpha * sample
+
+    def observe_setup(self, name: str, seconds: float):
+        stats = self.stats[name]
+        stats.setup = self._smooth(stats.setup, seconds)
+
+    def observe_response(self, name: str, seconds: float):
+        """
+        Records how long a provider took to answer a tool result with audio.
+        """
+        stats = self.stats[name]
+        stats.response = self._smooth(stats.response, seconds)
+
+    def score(self, name: str) -> float:
+        """
+        Returns a provider's expected latency: its setup time plus its
+        response latency, or the average of the measured ones until it has
+        served a room.
+        """
+        stats = self.stats[name]
+        response = stats.response
+        if response is None:
+            measured = [
+                other.response
+                for other in self.stats.values()
+                if other.response is not None
+            ]
+            response = sum(measured) / len(measured) if measured else 0.0
+        return (stats.setup or 0.0) + response
+
+    def mark_failed(self, name: str):
+        stats = self.stats[name]
+        stats.failures += 1
+        stats.unhealthy_until = time.monotonic() + self.cooldown
+        logger.warning(f"Realtime provider {name} marked unhealthy")
+
+    async def probe(self):
+        """
+        Probes every backend concurrently and records its setup time.
+        """
+
+        async def _probe(backend: RealtimeBackend):
+            try:
+                seconds = await asyncio.wait_for(backend.probe(), self.probe_timeout)
+                self.observe_setup(backend.name, seconds)
+            except Exception as e:
+                logger.warning(
+                    f"Probe for realtime provider {backend.name} failed: {e}"
+                )
+                self.mark_failed(backend.name)
+
+        await asyncio.gather(*(_probe(backend) for backend in self.backends))
+
+    def best(self) -> RealtimeBackend:
+        """
+        Returns the healthy backend with the lowest latency score.
+        """
+        healthy = [b for b in self.backends if self.stats[b.name].healthy]
+        if not healthy:
+            raise ConnectionError("No healthy realtime provider is available")
+        return min(healthy, key=lambda b: self.score(b.name))
+
+    def create(self, agent, instructions: str, registry: ToolRegistry):
+        """
+        Creates the realtime model of the best backend.
+        """
+        self.current = self.best()
+        logger.info(f"Using realtime provider: {self.current.name}")
+        return self.current.create(agent, instructions, registry)
+
+    async def connect(self, llm, agent, instructions: str, registry: ToolRegistry):
+        """
+        Connects a model created by `create`, failing over to the next
+        healthy backend until one connects.
+
+        Returns:
+            The connected realtime model.
+        """
+        while True:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(llm.connect(), self.connect_timeout)
+                self.observe_setup(self.current.name, time.perf_counter() - start)
+                return llm
+            except Exception as e:
+                logger.error(f"Realtime provider {self.current.name} failed: {e}")
+                self.mark_failed(self.current.name)
+                # A half open session would keep its socket and tasks alive
+                await aclose(llm)
+                llm = self.create(agent, instructions, registry)
+
+
+class ResumableSession:
+    """
+    Keeps a room's realtime model connected across dropped sockets.
+
+    When the model's connection drops (`dropped`), a new one is opened in
+    the background, retrying with exponential backoff and jitter and failing
+    over like the first connection. The new model is given the
+    instructions plus `summary()`, a compact description of the game in
+    play, so it picks up the hand where it stopped instead of asking the
+    players to explain it again. Audio arriving meanwhile is held by the
+    `HeldTrack` and replayed to the new connection. The time from a drop to
+    the model's first audio (`speaking`) is recorded, and so is the time
+    from a tool result being sent (`responded`) to the audio answering it,
+    as the serving provider's response latency.
+    """
+
+    def __init__(
+        self,
+        selector: LatencySelector,
+        agent,
+        instructions: str,
+        registry: ToolRegistry,
+        track: HeldTrack,
+        summary: Optional[Callable[[], str]] = None,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+    ):
+        self.selector = selector
+        self.agent = agent
+        self.instructions = instructions
+        self.registry = registry
+        self.track = track
+        self.summary = summary
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.llm = None
+        self.closed = False
+        self.dropped_at: Optional[float] = None
+        self.responded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.drops = 0
+        self.attempts = 0
+        self.reconnect: List[float] = []
+        self.first_audio: List[float] = []
+
+    def create(self):
+        """
+        Creates the first model, before the agent joins the room.
+        """
+        self.llm = self.selector.create(self.agent, self.instructions, self.registry)
+        return self.llm
+
+    async def connect(self):
+        """
+        Connects the first model and streams the track to it.
+        """
+        self.llm = await self.selector.connect(
+            self.llm, self.agent, instructions=self.instructions, registry=self.registry
+        )
+        self.llm.conversation.add_track("mixer", self.track)
+        return self.llm
+
+    def dropped(self):
+        """
+        Called when the model's connection drops; resumes in the background.
+        """
+        if self.closed or self._task is not None:
+            return
+        self.drops += 1
+        realtime_drops.inc()
+        self.dropped_at = time.perf_counter()
+        # The dropped connection will never answer
+        self.responded_at = None
+        logger.warning("Realtime model disconnected, resuming")
+        self.track.hold()
+        self._task = asyncio.create_task(self._resume())
+
+    def responded(self):
+        """
+        Called when a tool result was sent to the model.
+        """
+        if self.responded_at is None:
+            self.responded_at = time.perf_counter()
+
+    def speaking(self):
+        """
+        Called when the model starts speaking.
+        """
+        if self.responded_at is not None:
+            if self._task is None:
+                self.selector.observe_response(
+                    self.selector.current.name,
+                    time.perf_counter() - self.responded_at,
+                )
+            self.responded_at = None
+        if self.dropped_at is not None and self._task is None:
+            self.first_audio.append(time.perf_counter() - self.dropped_at)
+            realtime_first_audio_seconds.observe(self.first_audio[-1])
+            self.dropped_at = None
+            logger.info(
+                f"Realtime model speaking {self.first_audio[-1] * 1e3:.0f}ms "
+                "after the drop"
+            )
+
+    def resume_instructions(self) -> str:
+        summary = self.summary() if self.summary is not None else ""
+        if not summary:
+            return self.instructions
+        return (
+            f"{self.instructions}\n\n# Resumed Session\n"
+            "The connection to the players dropped for a moment and is back. "
+            "Carry on from the state below without asking the players to "
+            f"repeat themselves.\n{summary}"
+        )
+
+    async def _resume(self):
+        await aclose(self.llm)
+        instructions = self.resume_instructions()
+        delay = self.backoff
+        while not self.closed:
+            self.attempts += 1
+            start = time.perf_counter()
+            try:
+                try:
+                    backend = self.selector.best()
+                except ConnectionError:
+                    # Every provider is benched, waiting out the cooldown
+                    # would only keep the players waiting longer
+                    backend = self.selector.current
+                self.selector.current = backend
+                self.llm = backend.create(self.agent, instructions, self.registry)
+                await asyncio.wait_for(
+                    self.llm.connect(), self.selector.connect_timeout
+                )
+                self.selector.observe_setup(backend.name, time.perf_counter() - start)
+                break
+            except Exception as e:
+                logger.error(f"Resuming on realtime provider {backend.name}: {e}")
+                self.selector.mark_failed(backend.name)
+                await aclose(self.llm)
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                delay = min(delay * 2, self.max_backoff)
+
+        if self.closed:
+            return
+        self.llm.conversation.add_track("mixer", self.track)
+        self.track.release()
+        self.reconnect.append(time.perf_counter() - self.dropped_at)
+        self._task = None
+        logger.info(
+            f"Realtime model resumed on {self.selector.current.name} after "
+            f"{self.reconnect[-1] * 1e3:.0f}ms, replaying {len(self.track.frames)} "
+            "held audio frames"
+        )
+
+    async def close(self):
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+        self.track.release()
+        await aclose(self.llm)
+
+    def stats(self) -> Dict:
+        """
+        Returns the drops, connection attempts, and the average time to
+        reconnect and to the model's first audio after a drop.
+        """
+        return {
+            "drops": self.drops,
+            "attempts": self.attempts,
+            "reconnect_ms_avg": _average_ms(self.reconnect),
+            "first_audio_ms_avg": _average_ms(self.first_audio),
+            "frames_held": self.track.held,
+            "frames_dropped": self.track.dropped,
+        }
+
+
+def _average_ms(samples: List[float]) -> float:
+    return sum(samples) / len(samples) * 1e3 if samples else 0.0
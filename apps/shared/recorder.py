@@ -0,0 +1,299 @@
+import argparse
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+from apps.shared.encoding import dumps, loads
+from apps.shared.metrics import Family, Sample, gauge
+
+logger = logging.getLogger("Chatbot")
+
+# Segment files: {prefix}-{started}-{pid}-{sequence}.jsonl.gz
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+
+def _encode(record: Dict) -> bytes:
+    try:
+        return dumps(record)
+    except TypeError:
+        # Tool results may hold values JSON has no type for
+        return json.dumps(record, default=repr, separators=(",", ":")).encode()
+
+
+class TraceRecorder:
+    """
+    Records the tool calls and conversation events of every room, for
+    quality review and for replaying real workloads in the offline harness.
+
+    `record` only encodes a JSON line and appends it to a deque: appends and
+    pops at opposite ends of a deque are atomic, so the event loop never
+    waits on a lock or on the disk. A writer thread drains the deque in
+    batches every `flush_interval`, into gzip compressed JSONL segments,
+    and starts a new segment when the current one exceeds `segment_bytes`
+    compressed or is `segment_seconds` old. Each batch is sync flushed, so
+    a crash loses at most the records still queued, and the current segment
+    can be read while it grows.
+
+    When the writer falls behind by `max_pending` records, new records are
+    counted as dropped rather than queued, and records of a failed write
+    as failed. Disabled until `start` is called.
+    """
+
+    def __init__(
+        self,
+        segment_bytes: int = 64 << 20,
+        segment_seconds: float = 3600,
+        flush_interval: float = 0.5,
+        batch_size: int = 4096,
+        max_pending: int = 100_000,
+    ):
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.directory: Optional[str] = None
+        self.prefix = "trace"
+        self.queue: Deque[bytes] = deque()
+        self.records = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.segments = 0
+        self._started = ""
+        self._sequence = itertools.count()
+        self._file = None
+        self._raw = None
+        self._opened = 0.0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def start(self, directory: str, prefix: str = "trace"):
+        """
+        Starts the writer thread.
+
+        Args:
+            directory (str): Where segments are written, created if missing.
+            prefix (str): Starts segment names, e.g. the worker's name, so
+                processes sharing a directory never share a segment.
+        """
+        if self.enabled:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self._started = time.strftime("%Y%m%dT%H%M%S")
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="trace-recorder", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Recording traces to {directory}")
+
+    def record(self, room: str, kind: str, **fields: Any):
+        """
+        Queues a record, e.g. `record(room_id, "event", event="speaking")`.
+        """
+        if self._thread is None:
+            return
+        if len(self.queue) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.queue.append(
+            _encode({"t": time.time(), "room": room, "kind": kind, **fields})
+        )
+        self.records += 1
+
+    def tool_call(
+        self,
+        room: str,
+        name: str,
+        arguments: Optional[Dict],
+        result: Any,
+        seconds: float,
+    ):
+        self.record(
+            room,
+            "tool_call",
+            name=name,
+            arguments=arguments,
+            result=result,
+            ms=round(seconds * 1e3, 3),
+        )
+
+    def event(self, room: str, event: str):
+        self.record(room, "event", event=event)
+
+    def _open(self):
+        path = os.path.join(
+            self.directory,
+            f"{self.prefix}-{self._started}-{os.getpid()}-"
+            f"{next(self._sequence):06d}{SEGMENT_SUFFIX}",
+        )
+        self._raw = open(path, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+        self._opened = time.monotonic()
+        self.segments += 1
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+            self._file = self._raw = None
+
+    def _write(self, batch: List[bytes]):
+        if self._file is not None and (
+            self._raw.tell() >= self.segment_bytes
+            or time.monotonic() - self._opened >= self.segment_seconds
+        ):
+            self._close()
+        if self._file is None:
+            self._open()
+        self._file.write(b"\n".join(batch) + b"\n")
+        self._file.flush()
+        self.written += len(batch)
+
+    def _drain(self):
+        while self.queue:
+            batch = []
+            try:
+                for _ in range(self.batch_size):
+                    batch.append(self.queue.popleft())
+            except IndexError:
+                pass
+            try:
+                self._write(batch)
+            except OSError as e:
+                self.failed += len(batch)
+                logger.error(f"Trace segment write failed: {e}")
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self._drain()
+        self._drain()
+        self._close()
+
+    def stop(self):
+        """
+        Writes the queued records and closes the current segment.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def stats(self) -> Dict:
+        return {
+            "records": self.records,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": len(self.queue),
+            "segments": self.segments,
+        }
+
+    def collect(self) -> List[Family]:
+        """
+        Returns the recorder's counters as metric families, for
+        `metrics.collector`.
+        """
+        return [
+            Family(
+                "agent_trace_records_total",
+                "counter",
+                "Trace records by outcome",
+                [
+                    Sample("", {"outcome": "written"}, self.written),
+                    Sample("", {"outcome": "dropped"}, self.dropped),
+                    Sample("", {"outcome": "failed"}, self.failed),
+                ],
+            ),
+            gauge(
+                "agent_trace_records_pending",
+                "Trace records waiting for the writer thread",
+                len(self.queue),
+            ),
+        ]
+
+
+"""
+Trace recorder of the agent process
+"""
+trace_recorder = TraceRecorder()
+
+
+def segments(path: str) -> List[List[str]]:
+    """
+    Returns the segments in a directory (or a single segment file), one
+    list per recording process, each in the order it was written.
+    """
+    if not os.path.isdir(path):
+        return [[path]]
+    recordings: Dict[str, List[str]] = {}
+    for name in sorted(os.listdir(path)):
+        if name.endswith(SEGMENT_SUFFIX):
+            # Everything up to the sequence number names the recording
+            recording = name[: -len(SEGMENT_SUFFIX)].rsplit("-", 1)[0]
+            recordings.setdefault(recording, []).append(os.path.join(path, name))
+    return list(recordings.values())
+
+
+def read_segment(path: str) -> Iterator[Dict]:
+    """
+    Streams the records of a segment, stopping at the end of what was
+    flushed when the segment is still being written or was cut by a crash.
+    """
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield loads(line)
+        except EOFError:
+            pass
+
+
+def _read_all(paths: Iterable[str]) -> Iterator[Dict]:
+    for path in paths:
+        yield from read_segment(path)
+
+
+def read_traces(path: str) -> Iterator[Dict]:
+    """
+    Streams the records of a trace directory in time order, merging the
+    recordings of several processes, without loading the segments.
+    """
+    return heapq.merge(
+        *(_read_all(recording) for recording in segments(path)),
+        key=lambda record: record["t"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prints recorded traces as JSONL")
+    parser.add_argument("path", help="A trace directory or segment")
+    parser.add_argument("--room", help="Only this room's records")
+    parser.add_argument("--kind", choices=["tool_call", "event"])
+    args = parser.parse_args()
+
+    for record in read_traces(args.path):
+        if args.room and record["room"] != args.room:
+            continue
+        if args.kind and record["kind"] != args.kind:
+            continue
+        print(json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import importlib
+import inspect
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from apps.shared.http import HttpServer
+from apps.shared.lifecycle import lifecycle
+from apps.shared.loop import LoopOptions, run
+from apps.shared.metrics import CONTENT_TYPE, Family, merge, metrics, render
+
+logger = logging.getLogger("Chatbot")
+
+# Points per worker on the hash ring, more points spread rooms more evenly
+REPLICAS = 64
+
+# Operations a coordinator may call on a worker's room host
+OPERATIONS = {"open", "close", "snapshot", "control", "stats", "metrics", "memory"}
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping rooms to workers.
+
+    Adding or removing a worker only moves the rooms on its arcs of the
+    ring, about 1/N of them, instead of reshuffling every room.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = REPLICAS):
+        self.replicas = replicas
+        self.points: List[int] = []
+        self.owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+                self.owners[point] = node
+
+    def remove(self, node: str):
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            if self.owners.get(point) == node:
+                del self.owners[point]
+                self.points.remove(point)
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, _hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def load_host(path: str):
+    """
+    Imports a room host class from a "module:attribute" path.
+    """
+    module, attribute = path.split(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def worker_main(
+    name: str, host: str, conn: Connection, loop: LoopOptions = LoopOptions()
+):
+    """
+    Entry point of a worker process, serving the coordinator's requests on
+    `conn` until it is told to stop or the coordinator goes away.
+    """
+    logging.basicConfig(level=logging.INFO)
+    # Ctrl-C reaches the whole process group, the coordinator drives shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run(_serve(name, load_host(host)(name), conn), loop)
+
+
+async def _serve(name: str, rooms: Any, conn: Connection):
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+
+    def receive():
+        try:
+            inbox.put_nowait(conn.recv())
+        except (EOFError, OSError):
+            # The coordinator is gone, nothing will close the rooms
+            loop.remove_reader(conn.fileno())
+            inbox.put_nowait((None, "stop", ()))
+
+    async def handle(request_id: int, operation: str, args: tuple):
+        try:
+            result = getattr(rooms, operation)(*args)
+            if inspect.isawaitable(result):
+                result = await result
+            reply = (request_id, True, result)
+        except Exception as e:
+            logger.exception(f"{name} failed to {operation} {args[:1]}")
+            reply = (request_id, False, f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+    await rooms.start()
+    loop.add_reader(conn.fileno(), receive)
+    tasks: Set[asyncio.Task] = set()
+
+    while True:
+        request_id, operation, args = await inbox.get()
+        if operation == "stop":
+            break
+        if operation not in OPERATIONS:
+            conn.send((request_id, False, f"Unknown operation: {operation}"))
+            continue
+        task = asyncio.create_task(handle(request_id, operation, args))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await rooms.stop()
+    if request_id is not None:
+        conn.send((request_id, True, None))
+
+
+class Worker:
+    """
+    The coordinator's handle on a worker process and its control channel.
+    """
+
+    def __init__(self, name: str, process: multiprocessing.Process, conn: Connection):
+        self.name = name
+        self.process = process
+        self.conn = conn
+        self.rooms: Set[str] = set()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.alive = True
+
+
+class Coordinator:
+    """
+    Assigns rooms to `workers` worker processes by consistent hashing.
+
+    Each worker runs its own event loop, so a deployment uses as many cores
+    as it has workers. A worker hosts its rooms through a room host class,
+    given as "module:attribute", with this interface:
+
+        Host(worker_name)
+        async start() / async stop()
+        async open(room_id, snapshot)   # snapshot is None for a new room
+        async close(room_id) -> bytes   # leaves the room, returns its state
+        snapshot(room_id) -> bytes      # state of a room that stays open
+        control(room_id, message)       # an operator message for a room
+        stats() -> dict
+
+    Control messages travel over a local pipe per worker. When a room moves
+    (a worker joins, leaves or dies), it is closed on its old worker and
+    opened on its new one from the snapshot returned by the close. A dead
+    worker cannot close its rooms, so they reopen elsewhere from the last
+    checkpoint, taken every `checkpoint_interval` seconds, and the worker is
+    respawned under the same name, moving its rooms back.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        workers: int = os.cpu_count() or 1,
+        checkpoint_interval: float = 30.0,
+        respawn: bool = True,
+        loop: LoopOptions = LoopOptions(),
+    ):
+        self.host = host
+        self.loop = loop
+        self.worker_count = workers
+        self.checkpoint_interval = checkpoint_interval
+        self.respawn = respawn
+        self.context = multiprocessing.get_context("spawn")
+        self.ring = HashRing()
+        self.workers: Dict[str, Worker] = {}
+        self.owners: Dict[str, str] = {}
+        self.rooms: Set[str] = set()
+        self.snapshots: Dict[str, bytes] = {}
+        self.request_ids = itertools.count()
+        self.lock = asyncio.Lock()
+        self.migrations = 0
+        self.deaths = 0
+
+    async def start(self):
+        for index in range(self.worker_count):
+            self.spawn(f"worker-{index}")
+
+    def spawn(self, name: str):
+        parent, child = self.context.Pipe()
+        process = self.context.Process(
+            target=worker_main,
+            args=(name, self.host, child, self.loop),
+            name=name,
+            daemon=True,
+        )
+        process.start()
+        child.close()
+
+        worker = Worker(name, process, parent)
+        self.workers[name] = worker
+        self.ring.add(name)
+
+        loop = asyncio.get_running_loop()
+        loop.add_reader(parent.fileno(), self._receive, worker)
+        loop.add_reader(process.sentinel, self._exited, worker)
+        logger.info(f"Spawned {name} (pid {process.pid})")
+
+    def _receive(self, worker: Worker):
+        try:
+            request_id, ok, result = worker.conn.recv()
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+            return
+        future = worker.pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(f"{worker.name}: {result}"))
+
+    def _exited(self, worker: Worker):
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(worker.process.sentinel)
+        if not worker.alive:
+            return
+        worker.alive = False
+        self.deaths += 1
+        # Reaps the process, its sentinel being ready means it has exited
+        worker.process.join(1)
+        logger.error(
+            f"{worker.name} exited with code {worker.process.exitcode}, "
+            f"moving {len(worker.rooms)} rooms"
+        )
+        # Fail its requests first, a rebalance holding the lock may be waiting
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"{worker.name} died"))
+        asyncio.create_task(self._replace(worker))
+
+    async def _replace(self, worker: Worker):
+        async with self.lock:
+            self._forget(worker)
+            for room_id in worker.rooms:
+                self.owners.pop(room_id, None)
+            await self._rebalance()
+
+            if self.respawn and not lifecycle.stopping:
+                self.spawn(worker.name)
+                await self._rebalance()
+
+    def _forget(self, worker: Worker):
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(worker.conn.fileno())
+        self.ring.remove(worker.name)
+        if self.workers.get(worker.name) is worker:
+            del self.workers[worker.name]
+
+    async def call(self, worker: Worker, operation: str, *args) -> Any:
+        """
+        Sends a request to a worker and waits for its reply.
+        """
+        if not worker.alive:
+            raise ConnectionError(f"{worker.name} is not running")
+        request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        worker.pending[request_id] = future
+        worker.conn.send((request_id, operation, args))
+        return await future
+
+    async def _open(self, room_id: str, worker: Worker):
+        await self.call(worker, "open", room_id, self.snapshots.get(room_id))
+        worker.rooms.add(room_id)
+        self.owners[room_id] = worker.name
+
+    async def _close(self, room_id: str) -> Optional[Worker]:
+        worker = self.workers.get(self.owners.pop(room_id, ""))
+        if worker is None:
+            return None
+        worker.rooms.discard(room_id)
+        self.snapshots[room_id] = await self.call(worker, "close", room_id)
+        return worker
+
+    async def _rebalance(self):
+        """
+        Moves every room whose worker on the ring is not its current one.
+        """
+        if not self.ring.points:
+            logger.error(f"No workers left for {len(self.rooms)} rooms")
+            return
+
+        moves = [
+            room_id
+            for room_id in self.rooms
+            if self.owners.get(room_id) != self.ring.node_for(room_id)
+        ]
+        for room_id in moves:
+            target = self.workers[self.ring.node_for(room_id)]
+            try:
+                if await self._close(room_id) is not None:
+                    self.migrations += 1
+                await self._open(room_id, target)
+            except Exception as e:
+                logger.error(f"Failed to move room {room_id}: {e}")
+
+    async def assign(self, room_id: str) -> str:
+        """
+        Opens a room on its worker.
+
+        Returns:
+            str: The name of the worker hosting the room.
+        """
+        async with self.lock:
+            self.rooms.add(room_id)
+            if room_id not in self.owners:
+                await self._open(room_id, self.workers[self.ring.node_for(room_id)])
+            return self.owners[room_id]
+
+    async def release(self, room_id: str):
+        """
+        Closes a room, keeping its snapshot in case it is assigned again.
+        """
+        async with self.lock:
+            self.rooms.discard(room_id)
+            await self._close(room_id)
+
+    async def control(self, room_id: str, message: Any) -> Any:
+        """
+        Routes an operator message to the worker hosting a room.
+        """
+        worker = self.workers.get(self.owners.get(room_id, ""))
+        if worker is None:
+            raise KeyError(f"Room {room_id} is not assigned")
+        return await self.call(worker, "control", room_id, message)
+
+    async def checkpoint(self):
+        """
+        Snapshots every open room, for rooms of a worker that dies.
+        """
+        for room_id, name in list(self.owners.items()):
+            worker = self.workers.get(name)
+            if worker is None:
+                continue
+            try:
+                self.snapshots[room_id] = await self.call(worker, "snapshot", room_id)
+            except Exception as e:
+                logger.warning(f"Failed to checkpoint room {room_id}: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.checkpoint()
+
+    async def stats(self) -> Dict:
+        workers = {}
+        for name, worker in self.workers.items():
+            try:
+                workers[name] = await self.call(worker, "stats")
+            except Exception as e:
+                workers[name] = {"error": str(e)}
+        return {
+            "rooms": dict(self.owners),
+            "workers": workers,
+            "migrations": self.migrations,
+            "deaths": self.deaths,
+        }
+
+    async def metrics(self) -> List[Family]:
+        """
+        Collects the metrics of every worker whose host exposes them, and
+        the coordinator's own, each series labelled with its process.
+        """
+        batches = [merge(metrics.collect(), worker="coordinator")]
+        for name, worker in self.workers.items():
+            try:
+                batches.append(merge(await self.call(worker, "metrics"), worker=name))
+            except Exception as e:
+                logger.warning(f"No metrics from {name}: {e}")
+        return merge(family for batch in batches for family in batch)
+
+    async def stop(self):
+        """
+        Closes every room, then stops the workers.
+        """
+        self.respawn = False
+        async with self.lock:
+            for room_id in list(self.owners):
+                try:
+                    await self._close(room_id)
+                except Exception as e:
+                    logger.error(f"Failed to close room {room_id}: {e}")
+
+            for worker in list(self.workers.values()):
+                try:
+                    await asyncio.wait_for(self.call(worker, "stop"), 10)
+                except Exception as e:
+                    logger.error(f"Failed to stop {worker.name}: {e}")
+                worker.alive = False
+                self._forget(worker)
+                worker.process.join(5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+
+    def register_routes(self, server: HttpServer):
+        """
+        Serves the room assignment, room operations, metrics and the memory
+        reports of a worker on a server.
+        """
+
+        async def rooms(query):
+            return 200, "application/json", json.dumps(await self.stats())
+
+        async def open_room(query):
+            worker = await self.assign(query["room_id"])
+            return 200, "text/plain", f"{worker}\n"
+
+        async def close_room(query):
+            await self.release(query["room_id"])
+            return 200, "text/plain", "closed\n"
+
+        async def control(query):
+            result = await self.control(query["room_id"], query.get("message", ""))
+            return 200, "application/json", json.dumps(result)
+
+        server.route("/rooms", rooms)
+        server.route("/rooms/open", open_room)
+        server.route("/rooms/close", close_room)
+        server.route("/rooms/control", control)
+
+        async def scrape(query):
+            return 200, CONTENT_TYPE, render(await self.metrics())
+
+        server.route("/metrics", scrape)
+
+        async def memory(query):
+            worker = self.workers[query.pop("worker")]
+            return 200, "text/plain", await self.call(worker, "memory", query)
+
+        server.route("/debug/memory", memory)
+
+
+async def main(args: argparse.Namespace):
+    lifecycle.drain_timeout = float(os.getenv("DRAIN_TIMEOUT", "30"))
+    lifecycle.install_signal_handlers()
+
+    coordinator = Coordinator(
+        args.host,
+        workers=args.workers,
+        checkpoint_interval=args.checkpoint_interval,
+        loop=LoopOptions(args.loop, args.executor_workers, args.eager_tasks),
+    )
+    await coordinator.start()
+
+    # Health and room assignment endpoints
+    server = HttpServer(port=int(os.getenv("HEALTH_PORT", "8080")))
+    lifecycle.register_routes(server)
+    coordinator.register_routes(server)
+    await server.start()
+
+    for room_id in args.rooms:
+        await coordinator.assign(room_id)
+    checkpoint_task = asyncio.create_task(coordinator.run())
+
+    lifecycle.on_shutdown(checkpoint_task.cancel)
+    lifecycle.on_shutdown(coordinator.stop)
+    lifecycle.on_shutdown(server.close)
+    lifecycle.mark_ready()
+
+    await lifecycle.run_until_stopped()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Run rooms across worker processes")
+    parser.add_argument(
+        "host", help='Room host class, e.g. "apps.blackjack.rooms:Rooms"'
+    )
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("SHARD_WORKERS", os.cpu_count()))
+    )
+    parser.add_argument(
+        "--rooms",
+        type=lambda value: [room for room in value.split(",") if room],
+        default=os.getenv("ROOM_IDS", ""),
+    )
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0)
+    # Event loop of the coordinator and the workers, see LoopOptions
+    parser.add_argument(
+        "--loop",
+        choices=["asyncio", "uvloop"],
+        default=os.getenv("EVENT_LOOP", "asyncio"),
+    )
+    parser.add_argument(
+        "--executor-workers",
+        type=int,
+        default=int(os.getenv("EXECUTOR_WORKERS", "0")) or None,
+    )
+    parser.add_argument(
+        "--eager-tasks", action="store_true", default=os.getenv("EAGER_TASKS") == "1"
+    )
+    args = parser.parse_args()
+    run(main(args), LoopOptions(args.loop, args.executor_workers, args.eager_tasks))
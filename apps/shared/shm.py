@@ -0,0 +1,553 @@
+import argparse
+import fcntl
+import logging
+import os
+import pickle
+import struct
+import tempfile
+import zlib
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+from apps.shared.store import K, MemoryStore, V
+
+logger = logging.getLogger("Chatbot")
+
+# Segment: header, then `slots` fixed-size slots from SLOTS_OFFSET, then
+# the write log, the slot of each of the last `slots` writes
+HEADER = struct.Struct("<4sIII")  # magic, slots, slot size, entries
+MAGIC = b"SHS2"
+SLOTS_OFFSET = 64
+
+# Writes logged so far, the log entry of write n is at n % slots
+LOG_POSITION = struct.Struct("<Q")
+LOG_POSITION_OFFSET = 16
+LOG_ENTRY = struct.Struct("<I")
+
+# Slot: sequence, state, key hash, key length, value length, then the key
+# and the pickled value. The sequence is odd while the slot is written.
+SLOT = struct.Struct("<IBIHI")
+SEQUENCE = struct.Struct("<I")
+EMPTY, USED, DELETED = 0, 1, 2
+
+# Spins on an odd sequence before suspecting a writer died mid-write
+MAX_SPINS = 10_000
+
+_MISSING = object()
+
+
+def encode_key(key: Hashable) -> bytes:
+    """
+    Encodes a session or complaint key the same way in every process,
+    unlike `hash`, which is salted per process for strings.
+    """
+    if isinstance(key, str):
+        return b"s" + key.encode()
+    if isinstance(key, int):
+        return b"i" + key.to_bytes(8, "little", signed=True)
+    raise TypeError(f"Shared stores take str and int keys, not {type(key)}")
+
+
+def decode_key(data: bytes) -> Hashable:
+    if data[:1] == b"s":
+        return data[1:].decode()
+    return int.from_bytes(data[1:], "little", signed=True)
+
+
+class SharedMemoryStore(MemoryStore[K, V]):
+    """
+    A session store the agent processes of a host share through a shared
+    memory segment, once `share` is called; until then a plain MemoryStore.
+
+    The segment is a hash table of fixed-size slots, probed linearly from
+    the key's crc32. Each slot is guarded by a seqlock: a writer makes the
+    slot's sequence odd, writes the entry and makes it even again, and a
+    reader copies the slot and retries if the sequence changed meanwhile.
+    Reads therefore need no lock, syscall or round trip to another process.
+    Writers serialize on a file lock next to the segment.
+
+    Entries are decoded into a process-local cache, which is this dict, and
+    kept until their slot's sequence moves, so code can keep mutating the
+    objects it reads like it does with a MemoryStore. Those in-place changes
+    reach the other processes when `sync(key)` publishes the entry, which
+    the tool registry does after every mutating tool call. Concurrent
+    writes to one key from two processes are last-writer-wins.
+
+    Every write also appends its slot to a ring log, so `changes` can tell
+    a process which keys the others wrote without scanning the slots.
+
+    The seqlock relies on stores being seen in program order, which x86
+    guarantees; iteration and `snapshot` scan every slot.
+    """
+
+    def __init__(self, *args, path: Optional[str] = None, **kwargs):
+        super().__init__(*args, path=path, **kwargs)
+        self.name: Optional[str] = None
+        self.slots = 0
+        self.slot_size = 0
+        self.retries = 0
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._buf: Optional[memoryview] = None
+        self._lock_fd: Optional[int] = None
+        self._lock_depth = 0
+        self._versions: Dict[Hashable, Tuple[int, int]] = {}
+
+    @property
+    def shared(self) -> bool:
+        return self._shm is not None
+
+    def share(
+        self,
+        name: str,
+        slots: int = 65536,
+        slot_size: int = 2048,
+        create: bool = True,
+    ):
+        """
+        Moves the store into the shared memory segment `name`, creating it if
+        no process on the host has yet. Entries already in the store, e.g.
+        loaded from `path`, are published unless the segment already holds
+        their key, so the snapshots of several processes merge.
+
+        Args:
+            name (str): The segment, the same in every process sharing it.
+            slots (int): Entries the segment holds at most.
+            slot_size (int): Bytes per entry, including its key and a
+                15 byte header.
+            create (bool): Whether to create the segment if it is missing.
+        """
+        self.name = name
+        self._lock_fd = os.open(self._lock_path(), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._locked():
+                created = self._attach(name, slots, slot_size, create)
+        except BaseException:
+            if self._shm is not None:
+                self.close()
+            else:
+                self._detach_lock()
+            raise
+
+        logger.info(
+            f"{'Created' if created else 'Attached'} shared store {name}, "
+            f"{len(self)} of {self.slots} slots used"
+        )
+
+    def _attach(self, name: str, slots: int, slot_size: int, create: bool) -> bool:
+        """
+        Maps the segment and publishes the local entries; the caller holds
+        the lock. Returns whether the segment was created.
+        """
+        try:
+            shm = shared_memory.SharedMemory(
+                name,
+                create=create,
+                size=SLOTS_OFFSET + slots * (slot_size + LOG_ENTRY.size),
+            )
+            created = create
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name)
+            created = False
+        # The segment outlives this process, the resource tracker would
+        # unlink it when the process that created it exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+
+        if created:
+            HEADER.pack_into(shm.buf, 0, MAGIC, slots, slot_size, 0)
+        magic, slots, slot_size, _ = HEADER.unpack_from(shm.buf)
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f"{name} is not a shared store segment")
+
+        entries = dict(self)
+        dict.clear(self)
+        self.slots = slots
+        self.slot_size = slot_size
+        self._shm = shm
+        self._buf = shm.buf
+        for key, value in entries.items():
+            if created or key not in self:
+                self._write(key, value)
+        return created
+
+    def close(self, unlink: bool = False):
+        """
+        Detaches from the segment, keeping the cached entries locally, and
+        removes it from the host with `unlink`.
+        """
+        if self._shm is None:
+            return
+        self._buf.release()
+        self._buf = None
+        self._shm.close()
+        if unlink:
+            # unlink unregisters the segment, which share already did
+            resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+            os.unlink(self._lock_path())
+        self._shm = None
+        self._versions.clear()
+        self._detach_lock()
+
+    def _detach_lock(self):
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    def _lock_path(self) -> str:
+        return os.path.join(tempfile.gettempdir(), f"{self.name}.lock")
+
+    @contextmanager
+    def _locked(self):
+        # Reentrant, a repair may happen while writing
+        if self._lock_depth == 0:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _offset(self, index: int) -> int:
+        return SLOTS_OFFSET + index * self.slot_size
+
+    def _log_offset(self, position: int) -> int:
+        return self._offset(self.slots) + (position % self.slots) * LOG_ENTRY.size
+
+    def _read_slot(self, index: int, data: bool) -> Tuple[int, int, int, bytes, bytes]:
+        """
+        Returns a consistent copy of a slot: its sequence, state, hash, key
+        and, with `data`, pickled value.
+        """
+        buf = self._buf
+        offset = self._offset(index)
+        spins = 0
+        while True:
+            sequence, state, hashed, key_len, value_len = SLOT.unpack_from(buf, offset)
+            if not sequence & 1:
+                start = offset + SLOT.size
+                key = bytes(buf[start : start + key_len])
+                value = (
+                    bytes(buf[start + key_len : start + key_len + value_len])
+                    if data
+                    else b""
+                )
+                if SEQUENCE.unpack_from(buf, offset)[0] == sequence:
+                    return sequence, state, hashed, key, value
+            self.retries += 1
+            spins += 1
+            if spins >= MAX_SPINS:
+                self._repair(index, sequence)
+                spins = 0
+
+    def _repair(self, index: int, sequence: int):
+        """
+        Deletes a slot left odd by a writer that died mid-write: its writer
+        held the lock, so the slot is torn if it is still odd once the lock
+        is ours.
+        """
+        with self._locked():
+            offset = self._offset(index)
+            if SEQUENCE.unpack_from(self._buf, offset)[0] == sequence:
+                SLOT.pack_into(self._buf, offset, sequence + 1, DELETED, 0, 0, 0)
+                self._count(-1)
+                logger.warning(
+                    f"Dropped an entry torn by a crashed writer in {self.name}"
+                )
+
+    def _find(self, key: bytes, hashed: int) -> Tuple[int, int, int]:
+        """
+        Probes for a key.
+
+        Returns:
+            tuple: The slot holding the key, or -1, its sequence, and the
+            first free slot seen, or -1.
+        """
+        index = hashed % self.slots
+        free = -1
+        for _ in range(self.slots):
+            sequence, state, slot_hash, slot_key, _ = self._read_slot(index, False)
+            if state == EMPTY:
+                return -1, 0, index if free < 0 else free
+            if state == DELETED:
+                if free < 0:
+                    free = index
+            elif slot_hash == hashed and slot_key == key:
+                return index, sequence, free
+            index = (index + 1) % self.slots
+        return -1, 0, free
+
+    def _count(self, delta: int):
+        offset = HEADER.size - 4
+        (count,) = SEQUENCE.unpack_from(self._buf, offset)
+        SEQUENCE.pack_into(self._buf, offset, count + delta)
+
+    def _write(self, key: K, value: V):
+        """
+        Writes an entry into its slot; the caller holds the lock.
+        """
+        encoded = encode_key(key)
+        hashed = zlib.crc32(encoded)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if SLOT.size + len(encoded) + len(data) > self.slot_size:
+            raise ValueError(
+                f"Entry {key!r} of {len(data)} bytes does not fit the "
+                f"{self.slot_size} byte slots of {self.name}"
+            )
+
+        index, sequence, free = self._find(encoded, hashed)
+        if index < 0:
+            if free < 0:
+                raise ValueError(f"Shared store {self.name} is full")
+            index = free
+            sequence = SEQUENCE.unpack_from(self._buf, self._offset(index))[0]
+            self._count(1)
+
+        offset = self._offset(index)
+        SEQUENCE.pack_into(self._buf, offset, sequence + 1)
+        start = offset + SLOT.size
+        self._buf[start : start + len(encoded)] = encoded
+        self._buf[start + len(encoded) : start + len(encoded) + len(data)] = data
+        SLOT.pack_into(
+            self._buf, offset, sequence + 1, USED, hashed, len(encoded), len(data)
+        )
+        SEQUENCE.pack_into(self._buf, offset, sequence + 2)
+
+        # Logged once written, readers only look at positions before the count
+        (position,) = LOG_POSITION.unpack_from(self._buf, LOG_POSITION_OFFSET)
+        LOG_ENTRY.pack_into(self._buf, self._log_offset(position), index)
+        LOG_POSITION.pack_into(self._buf, LOG_POSITION_OFFSET, position + 1)
+
+        dict.__setitem__(self, key, value)
+        self._versions[key] = (index, sequence + 2)
+
+    def _delete(self, key: K) -> bool:
+        """
+        Deletes an entry; the caller holds the lock.
+        """
+        dict.pop(self, key, None)
+        self._versions.pop(key, None)
+        encoded = encode_key(key)
+        index, sequence, _ = self._find(encoded, zlib.crc32(encoded))
+        if index < 0:
+            return False
+        offset = self._offset(index)
+        SEQUENCE.pack_into(self._buf, offset, sequence + 1)
+        SLOT.pack_into(self._buf, offset, sequence + 1, DELETED, 0, 0, 0)
+        SEQUENCE.pack_into(self._buf, offset, sequence + 2)
+        self._count(-1)
+        return True
+
+    def _lookup(self, key: K):
+        """
+        Returns the current value of a key, from the local cache while its
+        slot has not been written since it was decoded.
+        """
+        encoded = encode_key(key)
+        index, sequence, _ = self._find(encoded, zlib.crc32(encoded))
+        if index < 0:
+            dict.pop(self, key, None)
+            self._versions.pop(key, None)
+            return _MISSING
+        if self._versions.get(key) == (index, sequence):
+            return dict.__getitem__(self, key)
+
+        sequence, state, _, slot_key, data = self._read_slot(index, True)
+        if state != USED or slot_key != encoded:
+            # Rewritten for another key between the probe and the read
+            return self._lookup(key)
+        value = pickle.loads(data)
+        dict.__setitem__(self, key, value)
+        self._versions[key] = (index, sequence)
+        return value
+
+    def version(self, key: K) -> Optional[Tuple[int, int]]:
+        """
+        Returns the slot and sequence of a key's entry, which change
+        whenever any process writes it.
+        """
+        if self._shm is None:
+            return None
+        encoded = encode_key(key)
+        index, sequence, _ = self._find(encoded, zlib.crc32(encoded))
+        return (index, sequence) if index >= 0 else None
+
+    def changes(self, since: Optional[int] = None) -> Tuple[int, Optional[List[K]]]:
+        if self._shm is None:
+            return 0, []
+        (position,) = LOG_POSITION.unpack_from(self._buf, LOG_POSITION_OFFSET)
+        if since is None:
+            return position, []
+        if position - since > self.slots:
+            return position, None
+
+        indexes = [
+            LOG_ENTRY.unpack_from(self._buf, self._log_offset(written))[0]
+            for written in range(since, position)
+        ]
+        # Entries read while writers lapped them may be of later writes
+        (now,) = LOG_POSITION.unpack_from(self._buf, LOG_POSITION_OFFSET)
+        if now - since > self.slots:
+            return now, None
+
+        keys = []
+        for index in dict.fromkeys(indexes):
+            _, state, _, key, _ = self._read_slot(index, False)
+            if state == USED:
+                keys.append(decode_key(key))
+        return position, keys
+
+    def sync(self, key: K):
+        if self._shm is None or not dict.__contains__(self, key):
+            return
+        with self._locked():
+            self._write(key, dict.__getitem__(self, key))
+
+    def __getitem__(self, key: K) -> V:
+        if self._shm is None:
+            return dict.__getitem__(self, key)
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: K, default=None):
+        if self._shm is None:
+            return dict.get(self, key, default)
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key) -> bool:
+        if self._shm is None:
+            return dict.__contains__(self, key)
+        encoded = encode_key(key)
+        return self._find(encoded, zlib.crc32(encoded))[0] >= 0
+
+    def __setitem__(self, key: K, value: V):
+        if self._shm is None:
+            return dict.__setitem__(self, key, value)
+        with self._locked():
+            self._write(key, value)
+
+    def __delitem__(self, key: K):
+        if self._shm is None:
+            return dict.__delitem__(self, key)
+        with self._locked():
+            if not self._delete(key):
+                raise KeyError(key)
+
+    def pop(self, key: K, default=_MISSING):
+        if self._shm is None:
+            if default is _MISSING:
+                return dict.pop(self, key)
+            return dict.pop(self, key, default)
+        with self._locked():
+            value = self._lookup(key)
+            if value is _MISSING:
+                if default is _MISSING:
+                    raise KeyError(key)
+                return default
+            self._delete(key)
+            return value
+
+    def setdefault(self, key: K, default=None):
+        if self._shm is None:
+            return dict.setdefault(self, key, default)
+        with self._locked():
+            value = self._lookup(key)
+            if value is _MISSING:
+                self._write(key, default)
+                value = default
+            return value
+
+    def update(self, *args, **kwargs):
+        if self._shm is None:
+            return dict.update(self, *args, **kwargs)
+        with self._locked():
+            for key, value in dict(*args, **kwargs).items():
+                self._write(key, value)
+
+    def clear(self):
+        dict.clear(self)
+        if self._shm is None:
+            return
+        with self._locked():
+            for index in range(self.slots):
+                offset = self._offset(index)
+                sequence, state, _, _, _ = SLOT.unpack_from(self._buf, offset)
+                if state != EMPTY:
+                    SEQUENCE.pack_into(self._buf, offset, sequence + 1)
+                    SLOT.pack_into(self._buf, offset, sequence + 1, EMPTY, 0, 0, 0)
+                    SEQUENCE.pack_into(self._buf, offset, sequence + 2)
+            self._count(-len(self))
+        self._versions.clear()
+
+    def __len__(self) -> int:
+        if self._shm is None:
+            return dict.__len__(self)
+        return HEADER.unpack_from(self._buf)[3]
+
+    def __iter__(self) -> Iterator[K]:
+        if self._shm is None:
+            return dict.__iter__(self)
+        return self._keys()
+
+    def _keys(self) -> Iterator[K]:
+        for index in range(self.slots):
+            _, state, _, key, _ = self._read_slot(index, False)
+            if state == USED:
+                yield decode_key(key)
+
+    def keys(self):
+        if self._shm is None:
+            return dict.keys(self)
+        return list(self._keys())
+
+    def values(self):
+        if self._shm is None:
+            return dict.values(self)
+        return [value for _, value in self.items()]
+
+    def items(self):
+        if self._shm is None:
+            return dict.items(self)
+        items = []
+        for key in self._keys():
+            value = self._lookup(key)
+            if value is not _MISSING:
+                items.append((key, value))
+        return items
+
+    def copy(self) -> Dict[K, V]:
+        return dict(self.items())
+
+    def popitem(self):
+        if self._shm is None:
+            return dict.popitem(self)
+        for key in self._keys():
+            return key, self.pop(key)
+        raise KeyError("popitem(): shared store is empty")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspects or removes a shared store")
+    parser.add_argument("name")
+    parser.add_argument("--unlink", action="store_true")
+    args = parser.parse_args()
+
+    store = SharedMemoryStore()
+    try:
+        store.share(args.name, create=False)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+    print(
+        f"{args.name}: {len(store)} of {store.slots} slots used, "
+        f"{store.slot_size} bytes per slot"
+    )
+    store.close(unlink=args.unlink)
+
+
+if __name__ == "__main__":
+    main()
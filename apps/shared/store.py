@@ -0,0 +1,93 @@
+import logging
+import os
+import pickle
+import tempfile
+from typing import Dict, Hashable, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger("Chatbot")
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class MemoryStore(Dict[K, V]):
+    """
+    In-process session store.
+
+    A plain dict to the code reading and writing sessions, plus the
+    snapshot, restore and flush operations the agent lifecycle relies on.
+    When `path` is set, `flush` persists a snapshot there and `load` reads it
+    back on startup.
+    """
+
+    def __init__(self, *args, path: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path
+
+    def sync(self, key: K):
+        """
+        Publishes in-place changes to an entry to the other processes sharing
+        the store. Entries of an in-process store are always current.
+        """
+
+    def version(self, key: K) -> Optional[Hashable]:
+        """
+        Returns a token that changes whenever another process writes the
+        entry, None for an in-process store.
+        """
+        return None
+
+    def changes(self, since: Optional[int] = None) -> Tuple[int, Optional[List[K]]]:
+        """
+        Returns the position of the store's write log, and the keys written
+        since position `since`, or None when the log no longer reaches back
+        that far. An in-process store has no other writers to follow.
+        """
+        return 0, []
+
+    def snapshot(self) -> bytes:
+        """
+        Returns a compact serialized copy of every entry in the store.
+        """
+        return pickle.dumps(dict(self), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, data: bytes):
+        """
+        Replaces the contents of the store with a snapshot.
+        """
+        entries = pickle.loads(data)
+        self.clear()
+        self.update(entries)
+
+    def flush(self):
+        """
+        Atomically writes a snapshot to `path`, if one is configured.
+        """
+        if not self.path:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".store-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.snapshot())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        logger.info(f"Flushed {len(self)} entries to {self.path}")
+
+    def load(self):
+        """
+        Restores the snapshot at `path`, if one exists.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as f:
+            self.restore(f.read())
+
+        logger.info(f"Loaded {len(self)} entries from {self.path}")
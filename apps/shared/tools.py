@@ -0,0 +1,358 @@
+import logging
+import struct
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence
+
+from apps.shared.encoding import compact
+from apps.shared.metrics import Family, Sample, counter, metrics
+from apps.shared.store import MemoryStore
+
+logger = logging.getLogger("Chatbot")
+
+"""
+Tool calls dispatched and failed, and their turnaround, by tool
+"""
+tool_calls = metrics.counter(
+    "agent_tool_calls_total", "Tool calls dispatched", ["tool"]
+)
+tool_errors = metrics.counter(
+    "agent_tool_errors_total", "Tool calls answered with an error", ["tool"]
+)
+tool_call_seconds = metrics.histogram(
+    "agent_tool_call_seconds",
+    "Time from a tool call to its response being sent",
+    ["tool"],
+)
+
+
+class Tool(NamedTuple):
+    name: str
+    declaration: Dict
+    handler: Callable[..., Any]
+    required: Sequence[str]
+    parameters: Sequence[str]
+    bound: Sequence[str]
+    read_only: bool
+    # Declared INTEGER, NUMBER and STRING parameters, coerced before the
+    # handler runs
+    types: Dict[str, type]
+    # The tool's series of tool_calls and tool_errors
+    calls: Any
+    errors: Any
+
+
+def missing_parameters_message(required: Sequence[str]) -> str:
+    """
+    Formats the error returned to the model when required arguments are missing.
+
+    Args:
+        required (list): Names of the required parameters.
+
+    Returns:
+        str: e.g. "Missing required parameters 'player_id' and 'recipient'".
+    """
+    quoted = [f"'{name}'" for name in required]
+    if len(quoted) == 1:
+        return f"Missing required parameter {quoted[0]}"
+    return f"Missing required parameters {', '.join(quoted[:-1])} and {quoted[-1]}"
+
+
+# Python types of the scalar parameter types of function declarations
+ARGUMENT_TYPES = {"INTEGER": int, "NUMBER": float, "STRING": str}
+
+
+def coerce_arguments(tool: Tool, kwargs: Dict):
+    """
+    Converts the scalar arguments of a tool call to their declared types in
+    place, since models send e.g. "123" or 10.0 for an INTEGER, or 42 for a
+    STRING. Session arguments are store keys, which must be str or int.
+
+    Raises:
+        ValueError: When an argument is not a value of its declared type,
+            e.g. 10.5 for an INTEGER or a list for a STRING.
+    """
+    for name, kind in tool.types.items():
+        value = kwargs.get(name)
+        if value is None or type(value) is kind:
+            continue
+        if kind is str:
+            if isinstance(value, (bool, dict, list)):
+                raise ValueError(f"Parameter '{name}' must be a string, got {value!r}")
+            kwargs[name] = str(value)
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            number = None
+        if (
+            number is None
+            or isinstance(value, bool)
+            or (kind is int and not number.is_integer())
+        ):
+            expected = "an integer" if kind is int else "a number"
+            raise ValueError(f"Parameter '{name}' must be {expected}, got {value!r}")
+        kwargs[name] = kind(number)
+
+
+class ToolRegistry:
+    """
+    Maps the function declarations sent to the realtime model onto the Python
+    functions that implement them.
+
+    Both realtime providers are configured from `declarations` and every tool
+    call, whichever provider issued it, goes through `dispatch`.
+
+    Results of read-only tools are cached per session, the value of the
+    `session` argument (e.g. player_id), until a mutating tool runs for the
+    same session and invalidates it. Tools are mutating unless registered
+    with `read_only=True`. At most `max_sessions` sessions are cached, the
+    oldest are dropped first, and `invalidate` drops a session that ended.
+
+    With `compact` set, results are sent without redundant wrapper nesting
+    (see apps.shared.encoding.compact), saving the model tokens per call.
+
+    With a `store` set, sessions are entries of a store other processes may
+    write too, e.g. a SharedMemoryStore: mutating tools publish the session's
+    entry with `store.sync`, and cached reads are dropped when the entry's
+    `store.version` moves.
+    """
+
+    def __init__(
+        self,
+        session: Optional[str] = None,
+        compact: bool = False,
+        max_sessions: int = 10_000,
+    ):
+        self.tools: Dict[str, Tool] = {}
+        self.session = session
+        self.compact = compact
+        self.max_sessions = max_sessions
+        self._results: Dict[Hashable, Dict[Hashable, Any]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.invalidations = 0
+        self.hits_by_tool: Dict[str, int] = {}
+        self.store: Optional[MemoryStore] = None
+        self._store_versions: Dict[Hashable, Hashable] = {}
+
+    def register(
+        self,
+        declaration: Dict,
+        handler: Callable[..., Any],
+        required: Optional[Sequence[str]] = None,
+        bound: Sequence[str] = (),
+        read_only: bool = False,
+    ) -> Tool:
+        """
+        Registers a handler for a function declaration.
+
+        Args:
+            declaration (dict): The function declaration in the Gemini dict format.
+            handler (callable): Called with the declared arguments as keywords,
+                returns the result sent back to the model.
+            required (list): Overrides the declaration's required parameters.
+            bound (list): Keyword arguments supplied by the agent at dispatch
+                time rather than by the model, e.g. the room's table_id.
+            read_only (bool): Whether the handler only reads session state,
+                making its results cacheable until the session changes.
+
+        Returns:
+            Tool: The registered tool.
+        """
+        parameters = declaration.get("parameters", {})
+        properties = parameters.get("properties", {})
+        tool = Tool(
+            name=declaration["name"],
+            declaration=declaration,
+            handler=handler,
+            required=tuple(
+                required if required is not None else parameters.get("required", [])
+            ),
+            parameters=tuple(properties),
+            bound=tuple(bound),
+            read_only=read_only,
+            types={
+                name: ARGUMENT_TYPES[schema["type"]]
+                for name, schema in properties.items()
+                if schema.get("type") in ARGUMENT_TYPES
+            },
+            calls=tool_calls.labels(declaration["name"]),
+            errors=tool_errors.labels(declaration["name"]),
+        )
+        self.tools[tool.name] = tool
+        return tool
+
+    def tool(
+        self,
+        declaration: Dict,
+        required: Optional[Sequence[str]] = None,
+        bound: Sequence[str] = (),
+        read_only: bool = False,
+    ):
+        """
+        Decorator form of `register`.
+        """
+
+        def decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
+            self.register(declaration, handler, required, bound, read_only)
+            return handler
+
+        return decorator
+
+    @property
+    def declarations(self) -> List[Dict]:
+        return [tool.declaration for tool in self.tools.values()]
+
+    def argument(self, name: str, args: Optional[Dict], parameter: str) -> Any:
+        """
+        Returns an argument of a tool call as `dispatch` passes it to the
+        handler, e.g. the player_id 2 for the "2" the model sent, so callers
+        keep the same session keys as the tools.
+
+        Returns:
+            The coerced argument, or None when it is missing, the tool is
+            unknown or the argument is not a value of its declared type.
+        """
+        tool = self.tools.get(name)
+        if tool is None or not args or args.get(parameter) is None:
+            return None
+        kwargs = {parameter: args[parameter]}
+        try:
+            coerce_arguments(tool, kwargs)
+        except ValueError:
+            return None
+        return kwargs[parameter]
+
+    def dispatch(self, name: str, args: Optional[Dict], **context) -> Any:
+        """
+        Validates the arguments of a tool call and runs its handler.
+
+        Args:
+            name (str): The function name the model called.
+            args (dict): The arguments the model supplied.
+            context: Values for the tool's bound arguments.
+
+        Returns:
+            The handler result, or a dict with an "error" key the model can act on.
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            logger.error(f"Unknown function name: {name}")
+            tool_errors.labels("unknown").inc()
+            return {"error": f"Unknown function name: {name}"}
+
+        tool.calls.inc()
+        args = args or {}
+        if any(parameter not in args for parameter in tool.required):
+            message = missing_parameters_message(tool.required)
+            logger.error(message)
+            tool.errors.inc()
+            return {"error": message}
+
+        kwargs = {key: value for key, value in args.items() if key in tool.parameters}
+        try:
+            # Before the session is looked up or any state changes
+            coerce_arguments(tool, kwargs)
+        except ValueError as e:
+            logger.error(f"Tool {name} failed: {e}")
+            tool.errors.inc()
+            return {"error": str(e)}
+        for key in tool.bound:
+            kwargs[key] = context[key]
+
+        session = kwargs.get(self.session) if self.session else None
+        if not tool.read_only:
+            try:
+                return self._run(tool, kwargs)
+            finally:
+                # Even a failed call may have changed the session
+                self.invalidate(session)
+                if self.store is not None and session is not None:
+                    self.store.sync(session)
+                    self._store_versions[session] = self.store.version(session)
+                    self._evict(self._store_versions)
+
+        if self.store is not None and session is not None:
+            # Written by another process since the results were cached
+            version = self.store.version(session)
+            if self._store_versions.get(session) != version:
+                self.invalidate(session)
+                self._store_versions[session] = version
+                self._evict(self._store_versions)
+
+        try:
+            call = (name, tuple(sorted(kwargs.items())))
+            results = self._results.get(session)
+            if results is None:
+                results = self._results[session] = {}
+                self._evict(self._results)
+            elif call in results:
+                self.cache_hits += 1
+                self.hits_by_tool[name] = self.hits_by_tool.get(name, 0) + 1
+                return results[call]
+        except TypeError:
+            # Unhashable arguments are never cached
+            return self._run(tool, kwargs)
+
+        self.cache_misses += 1
+        result = self._run(tool, kwargs)
+        if not (isinstance(result, dict) and "error" in result and len(result) == 1):
+            results[call] = result
+        return result
+
+    def _run(self, tool: Tool, kwargs: Dict) -> Any:
+        try:
+            result = tool.handler(**kwargs)
+        except (KeyError, ValueError, TypeError, struct.error) as e:
+            logger.error(f"Tool {tool.name} failed: {e}")
+            tool.errors.inc()
+            return {"error": str(e)}
+        return compact(result) if self.compact else result
+
+    def invalidate(self, session: Hashable = None):
+        """
+        Drops a session's cached read results and the store version they were
+        read at, after it changed or when it ends.
+        """
+        self._store_versions.pop(session, None)
+        if self._results.pop(session, None):
+            self.invalidations += 1
+
+    def _evict(self, sessions: Dict[Hashable, Any]):
+        # Dicts keep insertion order, and invalidated sessions are reinserted
+        if len(sessions) > self.max_sessions:
+            del sessions[next(iter(sessions))]
+
+    def cache_stats(self) -> Dict:
+        """
+        Returns the read cache counters, each hit being a handler call the
+        model's repeated call did not cost.
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "sessions": len(self._results),
+            "hits_by_tool": dict(self.hits_by_tool),
+        }
+
+    def collect(self) -> List[Family]:
+        """
+        Returns the read cache counters as metric families, for
+        `metrics.collector`.
+        """
+        return [
+            counter(
+                "agent_tool_cache_lookups_total",
+                "Read-only tool result cache lookups",
+                {"hit": self.cache_hits, "miss": self.cache_misses},
+                "result",
+            ),
+            Family(
+                "agent_tool_cache_invalidations_total",
+                "counter",
+                "Sessions whose cached tool results were dropped",
+                [Sample("", {}, self.invalidations)],
+            ),
+        ]
@@ -0,0 +1,100 @@
+import json
+import os
+import platform
+import random
+import tracemalloc
+from typing import Callable, Dict
+
+import pytest
+
+# Allocation baselines, per interpreter since object sizes differ between
+# versions
+ALLOCATIONS_PATH = os.path.join(
+    os.path.dirname(__file__), "benchmarks", "allocations.json"
+)
+
+# Bytes a measurement may exceed its baseline by regardless of the threshold,
+# so a small allocation growing by a few objects is not a regression
+ALLOCATIONS_SLACK = 1024
+
+
+def pytest_addoption(parser: pytest.Parser):
+    group = parser.getgroup("allocations")
+    group.addoption(
+        "--allocations-save",
+        action="store_true",
+        help="Store the measured allocations as the new baseline",
+    )
+    group.addoption(
+        "--allocations-threshold",
+        type=float,
+        default=0.10,
+        help="Fail when a peak allocation exceeds its baseline by this fraction",
+    )
+
+
+def _runtime() -> str:
+    major, minor, _ = platform.python_version_tuple()
+    return f"{platform.python_implementation()}-{major}.{minor}"
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    # Shuffles and dealer draws are the same on every run
+    random.seed(0)
+
+
+@pytest.fixture(scope="session")
+def allocation_baselines(pytestconfig: pytest.Config):
+    baselines: Dict[str, Dict[str, Dict[str, int]]] = {}
+    if os.path.exists(ALLOCATIONS_PATH):
+        with open(ALLOCATIONS_PATH) as f:
+            baselines = json.load(f)
+
+    measured: Dict[str, Dict[str, int]] = {}
+    yield baselines.get(_runtime(), {}), measured
+
+    if pytestconfig.getoption("allocations_save") and measured:
+        baselines.setdefault(_runtime(), {}).update(measured)
+        with open(ALLOCATIONS_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+@pytest.fixture
+def allocations(request: pytest.FixtureRequest, allocation_baselines) -> Callable:
+    """
+    Measures the peak memory one call of a function allocates, and fails
+    the test when it exceeds the stored baseline by more than the threshold.
+
+    The function is called once untraced first, so caches and interned
+    strings it fills on its first call are not counted.
+    """
+    baselines, measured = allocation_baselines
+    threshold = request.config.getoption("allocations_threshold")
+    name = request.node.name
+
+    def measure(function: Callable, *args, **kwargs) -> Dict[str, int]:
+        function(*args, **kwargs)
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function(*args, **kwargs)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = {"peak": peak - start, "retained": current - start}
+        measured[name] = result
+        baseline = baselines.get(name)
+        if baseline is not None:
+            limit = baseline["peak"] * (1 + threshold) + ALLOCATIONS_SLACK
+            if result["peak"] > limit:
+                pytest.fail(
+                    f"{name} allocates {result['peak']} bytes at peak, "
+                    f"over its baseline of {baseline['peak']} bytes"
+                )
+        return result
+
+    return measure
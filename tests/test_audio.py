@@ -0,0 +1,44 @@
+import numpy as np
+
+from apps.shared.audio import FRAME_SIZE, AudioMixer, RingBuffer
+
+SILENCE = np.zeros(FRAME_SIZE, dtype=np.int16)
+LOUD = np.full(FRAME_SIZE, 20000, dtype=np.int16)
+
+
+def test_silence_is_gated():
+    mixer = AudioMixer(hangover=2)
+    mixer.add_input("player")
+    assert not mixer.process("player", SILENCE)
+    assert mixer.mix() is None
+
+    assert mixer.process("player", LOUD)
+    # Speech carries over the hangover, then is gated again
+    assert mixer.process("player", SILENCE)
+    assert mixer.process("player", SILENCE)
+    assert not mixer.process("player", SILENCE)
+    assert mixer.frames_voiced == 3
+
+
+def test_speakers_are_mixed_and_saturated():
+    mixer = AudioMixer()
+    mixer.add_input("a")
+    mixer.add_input("b")
+    mixer.process("a", LOUD)
+    mixer.process("b", LOUD)
+    # Two speakers make one output frame, clipped to the int16 range
+    assert (mixer.mix() == 32767).all()
+    assert mixer.mix() is None
+    assert mixer.frames_out == 1
+
+
+def test_full_ring_drops_oldest():
+    ring = RingBuffer(frames=2, frame_size=4)
+    for value in (1, 2, 3):
+        ring.push(np.full(4, value, dtype=np.int16))
+    assert ring.dropped == 1
+
+    accumulator = np.zeros(4, dtype=np.int32)
+    ring.pop_into(accumulator)
+    assert (accumulator == 2).all()
+    assert len(ring) == 1
@@ -0,0 +1,122 @@
+import pytest
+
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import (
+    calculate_hand_value,
+    check_game_status,
+    create_deck,
+    dealer_turn,
+    game_state_map,
+    hand_value,
+)
+from apps.blackjack.tools import registry
+
+PLAYER_ID = 1
+
+# Cents a player is topped up to before each scripted hand
+BANKROLL = 100_000_00
+
+
+@pytest.fixture
+def game():
+    """
+    A hand in play: a soft 17 against a dealer's 6, the dealer to draw.
+    """
+    game_state_map[PLAYER_ID] = {
+        "deck": create_deck(),
+        "bet_amount": 10,
+        "player_hand": ["A of hearts", "6 of clubs"],
+        "dealer_hand": ["10 of spades", "6 of diamonds"],
+        "dealer_played": False,
+    }
+    yield game_state_map[PLAYER_ID]
+    game_state_map.clear()
+    registry.invalidate(PLAYER_ID)
+
+
+def test_create_deck(benchmark, allocations):
+    allocations(create_deck)
+    deck = benchmark(create_deck)
+    assert len(deck) == 52
+
+
+def test_hand_value(benchmark, allocations):
+    hand = ["A of hearts", "A of spades", "9 of clubs", "K of diamonds"]
+    allocations(hand_value, hand)
+    assert benchmark(hand_value, hand)["total"] == 21
+
+
+def test_calculate_hand_value(benchmark, allocations, game):
+    allocations(calculate_hand_value, PLAYER_ID, "player")
+    assert benchmark(calculate_hand_value, PLAYER_ID, "player")["total"] == 17
+
+
+def test_dealer_turn(benchmark, allocations, game):
+    def setup():
+        # Every round draws from the same 16 against a full deck
+        game["deck"] = create_deck()
+        game["dealer_hand"] = ["10 of spades", "6 of diamonds"]
+
+    def turn():
+        setup()
+        return dealer_turn(PLAYER_ID)
+
+    allocations(turn)
+    hand = benchmark.pedantic(
+        dealer_turn, args=(PLAYER_ID,), setup=setup, rounds=2000, warmup_rounds=10
+    )
+    assert hand_value(hand)["total"] >= 17
+
+
+def test_check_game_status(benchmark, allocations, game):
+    allocations(check_game_status, PLAYER_ID)
+    result = benchmark(check_game_status, PLAYER_ID)
+    assert result["game_state"] == "player_win"
+
+
+def play_hand() -> str:
+    """
+    A hand the way the model plays it: deal, read the hand, hit to 17, let
+    the dealer draw and settle, every step a dispatched tool call.
+    """
+    state = game_state_map.get(PLAYER_ID)
+    if state is not None and len(state["deck"]) < 15:
+        del game_state_map[PLAYER_ID]
+    registry.dispatch(
+        "create_game_session_and_deal_initial_cards",
+        {"player_id": PLAYER_ID, "bet_amount": 10},
+    )
+    value = registry.dispatch(
+        "calculate_hand_value", {"player_id": PLAYER_ID, "recipient": "player"}
+    )
+    while value["output"]["total"] < 17:
+        registry.dispatch("hit", {"player_id": PLAYER_ID, "recipient": "player"})
+        value = registry.dispatch(
+            "calculate_hand_value", {"player_id": PLAYER_ID, "recipient": "player"}
+        )
+    if value["output"]["total"] <= 21:
+        registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    status = registry.dispatch("check_game_status", {"player_id": PLAYER_ID})
+    return status["game_state"]["game_state"]
+
+
+def test_scripted_hand(benchmark, allocations):
+    def top_up():
+        ledger.restore(PLAYER_ID, BANKROLL, None)
+
+    def hand():
+        top_up()
+        return play_hand()
+
+    allocations(hand)
+    state = benchmark.pedantic(play_hand, setup=top_up, rounds=2000, warmup_rounds=10)
+    game_state_map.clear()
+    registry.invalidate(PLAYER_ID)
+    assert state in (
+        "player_bust",
+        "dealer_bust",
+        "player_blackjack",
+        "dealer_blackjack",
+        "player_win",
+        "dealer_win",
+    )
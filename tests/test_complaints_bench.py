@@ -0,0 +1,104 @@
+import itertools
+
+import pytest
+
+from apps.customer_service.functions.main import (
+    RESOLUTION_PERIODS,
+    add_complaint,
+    check_for_complaint,
+    complaint_book,
+    get_complaint_details,
+)
+from apps.customer_service.functions.triage import complaint_triage
+from apps.customer_service.tools import registry
+
+BOOK_SIZE = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def book():
+    """
+    The complaint book of a busy deployment, a million complaints.
+    """
+    entries = dict(complaint_book)
+    periods = itertools.cycle(RESOLUTION_PERIODS)
+    complaint_book.update(
+        (
+            f"customer-{i}",
+            {"complaint": "the app is not working", "resolution_period": next(periods)},
+        )
+        for i in range(BOOK_SIZE)
+    )
+    complaint_triage.rebuild(complaint_book)
+    yield complaint_book
+    complaint_book.clear()
+    complaint_book.update(entries)
+    complaint_triage.rebuild(complaint_book)
+
+
+@pytest.fixture
+def names(request: pytest.FixtureRequest):
+    """
+    Names never seen before, one per call.
+    """
+    return (f"{request.node.name}-{i}" for i in itertools.count())
+
+
+def test_check_for_complaint_hit(benchmark, allocations, book):
+    allocations(check_for_complaint, "customer-500000")
+    assert benchmark(check_for_complaint, "customer-500000")
+
+
+def test_check_for_complaint_miss(benchmark, allocations, book):
+    allocations(check_for_complaint, "nobody")
+    assert not benchmark(check_for_complaint, "nobody")
+
+
+def test_get_complaint_details(benchmark, allocations, book):
+    allocations(get_complaint_details, "customer-999999")
+    details = benchmark(get_complaint_details, "customer-999999")
+    assert details["complaint"] == "the app is not working"
+
+
+def test_add_complaint(benchmark, allocations, book, names, capsys):
+    allocations(lambda: add_complaint(next(names), "I am not able to login"))
+    benchmark(lambda: add_complaint(next(names), "I am not able to login"))
+    capsys.readouterr()
+    assert len(book) > BOOK_SIZE
+
+
+def test_add_complaint_duplicate(benchmark, allocations, book, names, capsys):
+    allocations(lambda: add_complaint(next(names), "The app is not working!"))
+    benchmark(lambda: add_complaint(next(names), "The app is not working!"))
+    capsys.readouterr()
+    name = next(names)
+    add_complaint(name, "The app is not working!")
+    # Linked to the incident the book already has, and resolved with it
+    assert book[name]["incident"] == book["customer-0"]["id"]
+    assert book[name]["resolution_period"] == book["customer-0"]["resolution_period"]
+
+
+def file_complaint(name: str) -> dict:
+    """
+    A call the way the model handles it: look the caller up, file their
+    complaint and read it back, every step a dispatched tool call.
+    """
+    if registry.dispatch("check_for_complaint", {"name": name})["exists"]:
+        return registry.dispatch("get_complaint_details", {"name": name})
+    registry.dispatch(
+        "add_complaint", {"name": name, "complaint": "chat in the app is not working"}
+    )
+    return registry.dispatch("get_complaint_details", {"name": name})
+
+
+def test_complaint_call(benchmark, allocations, book, names, capsys):
+    allocations(lambda: file_complaint(next(names)))
+    details = benchmark(lambda: file_complaint(next(names)))
+    capsys.readouterr()
+    assert details["complaint"] == "chat in the app is not working"
+
+
+def test_returning_caller(benchmark, allocations, book):
+    allocations(file_complaint, "customer-123456")
+    details = benchmark(file_complaint, "customer-123456")
+    assert details["complaint"] == "the app is not working"
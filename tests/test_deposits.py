@@ -0,0 +1,131 @@
+import asyncio
+
+from apps.blackjack.web3.deposits import DepositIndexer
+
+WALLET = "0xAbC0000000000000000000000000000000000001"
+
+
+class FakeBatch:
+    def __init__(self):
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def add(self, call):
+        self.calls.append(call)
+
+    async def async_execute(self):
+        return [await call for call in self.calls]
+
+
+class FakeEth:
+    def __init__(self):
+        self.blocks = {}
+        self.fetched = []
+
+    async def get_block(self, number, full_transactions=False):
+        self.fetched.append(number)
+        if number == "latest":
+            number = max(self.blocks)
+        return self.blocks[number]
+
+
+class FakeWeb3:
+    """
+    The part of AsyncWeb3 the indexer uses, over a chain built in the test.
+    """
+
+    def __init__(self):
+        self.eth = FakeEth()
+
+    def batch_requests(self):
+        return FakeBatch()
+
+    def mine(self, number, fork=b"", deposit=0):
+        """
+        Appends block `number` on top of the current one, with a deposit
+        to WALLET. A different `fork` makes a different block hash.
+        """
+        parent = self.eth.blocks.get(number - 1)
+        transactions = [{"to": WALLET, "value": deposit}] if deposit else []
+        self.eth.blocks[number] = {
+            "number": number,
+            "hash": f"block-{number}".encode() + fork,
+            "parentHash": parent["hash"] if parent else b"",
+            "transactions": transactions,
+        }
+        return self.eth.blocks[number]
+
+
+def chain(length):
+    w3 = FakeWeb3()
+    for number in range(length):
+        w3.mine(number)
+    return w3
+
+
+def test_deposit_credited_once_confirmed():
+    w3 = chain(10)
+    indexer = DepositIndexer(w3, confirmations=2)
+    indexer.watch(WALLET)
+    asyncio.run(indexer.start())
+
+    w3.mine(10, deposit=5)
+    asyncio.run(indexer.on_head(w3.eth.blocks[10]))
+    assert indexer.balance(WALLET) == 0
+
+    w3.mine(11)
+    w3.mine(12)
+    asyncio.run(indexer.on_head(w3.eth.blocks[12]))
+    assert indexer.balance(WALLET.lower()) == 5
+    assert indexer.block_number == 10
+
+
+def test_reorged_deposit_is_rolled_back():
+    w3 = chain(10)
+    indexer = DepositIndexer(w3, confirmations=1)
+    indexer.watch(WALLET)
+    asyncio.run(indexer.start())
+
+    w3.mine(10, deposit=5)
+    w3.mine(11)
+    asyncio.run(indexer.on_head(w3.eth.blocks[11]))
+    assert indexer.balance(WALLET) == 5
+
+    # Block 10 is replaced by one without the deposit
+    w3.mine(10, fork=b"-b")
+    w3.mine(11, fork=b"-b")
+    w3.mine(12, fork=b"-b")
+    asyncio.run(indexer.on_head(w3.eth.blocks[12]))
+
+    assert indexer.balance(WALLET) == 0
+    assert indexer.block_number == 11
+    assert indexer.recent[-1][1] == b"block-11-b".hex()
+
+
+def test_restart_resumes_from_checkpoint(tmp_path):
+    path = str(tmp_path / "deposits.pkl")
+    w3 = chain(10)
+    indexer = DepositIndexer(w3, path=path, confirmations=2)
+    indexer.watch(WALLET)
+    asyncio.run(indexer.start())
+    w3.mine(10, deposit=5)
+    for number in range(11, 13):
+        w3.mine(number)
+    asyncio.run(indexer.on_head(w3.eth.blocks[12]))
+    indexer.flush()
+
+    for number in range(13, 16):
+        w3.mine(number)
+    w3.eth.fetched.clear()
+    restarted = DepositIndexer(w3, path=path, confirmations=2)
+    asyncio.run(restarted.start())
+
+    assert restarted.balance(WALLET) == 5
+    # Only the blocks confirmed since the checkpoint are scanned
+    assert w3.eth.fetched == ["latest", 11, 12, 13]
+    assert restarted.block_number == 13
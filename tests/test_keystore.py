@@ -0,0 +1,84 @@
+import asyncio
+import types
+
+import pytest
+
+from apps.blackjack.web3 import keystore as keystore_module
+from apps.blackjack.web3.keystore import Keystore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replaces the keystore's monotonic clock with one the test advances.
+    """
+    clock = types.SimpleNamespace(now=0.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(keystore_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def keystore(tmp_path, clock):
+    # A cheap KDF, the cache behaves the same whatever the key derivation costs
+    keystore = Keystore(
+        str(tmp_path),
+        "password",
+        ttl=60,
+        max_unlocked=2,
+        workers=1,
+        kdf="pbkdf2",
+        iterations=2,
+    )
+    yield keystore
+    keystore.close()
+
+
+def create(keystore, count):
+    async def create():
+        return [await keystore.create() for _ in range(count)]
+
+    return asyncio.run(create())
+
+
+def test_unlock_derives_each_key_once(keystore):
+    (address,) = create(keystore, 1)
+    keystore.lock()
+
+    first = asyncio.run(keystore.unlock([address, address]))
+    second = asyncio.run(keystore.unlock([address]))
+
+    assert first[address].address == address
+    assert second[address] is first[address]
+    assert keystore.stats()["misses"] == 1
+    assert keystore.stats()["hits"] == 1
+
+
+def test_keys_expire_after_ttl(keystore, clock):
+    (address,) = create(keystore, 1)
+
+    clock.now += 59
+    asyncio.run(keystore.unlock([address]))
+    # The TTL runs from the last use
+    clock.now += 59
+    asyncio.run(keystore.unlock([address]))
+    assert keystore.stats()["misses"] == 0
+
+    clock.now += 61
+    account = asyncio.run(keystore.unlock([address]))[address]
+
+    assert account.address == address
+    assert keystore.stats()["misses"] == 1
+
+
+def test_least_recently_used_key_is_evicted(keystore):
+    first, second, third = create(keystore, 3)
+
+    assert list(keystore.unlocked) == [second.lower(), third.lower()]
+
+    # Using second makes third the least recently used
+    asyncio.run(keystore.unlock([second]))
+    asyncio.run(keystore.unlock([first]))
+
+    assert list(keystore.unlocked) == [second.lower(), first.lower()]
+    assert keystore.stats()["misses"] == 1
@@ -0,0 +1,53 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from apps.shared.loop import LoopOptions, loop_factory, run
+
+
+def test_unknown_loop_is_rejected():
+    with pytest.raises(ValueError):
+        loop_factory("trio")
+
+
+def test_uvloop_falls_back_to_asyncio(monkeypatch):
+    # A None entry makes the import fail as if uvloop were not installed
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+
+    assert loop_factory("uvloop") is asyncio.new_event_loop
+
+
+def test_executor_workers_size_the_default_executor():
+    def thread_name():
+        return threading.current_thread().name
+
+    async def main():
+        names = await asyncio.gather(
+            *(asyncio.to_thread(thread_name) for _ in range(8))
+        )
+        return set(names)
+
+    names = run(main(), LoopOptions(executor_workers=2))
+
+    assert 0 < len(names) <= 2
+    assert all(name.startswith("asyncio") for name in names)
+
+
+def test_eager_tasks_start_inside_create_task():
+    started = []
+
+    async def task():
+        started.append(True)
+
+    async def main():
+        started.clear()
+        asyncio.create_task(task())
+        return bool(started)
+
+    eager = run(main(), LoopOptions(eager_tasks=True))
+
+    # Python 3.11 has no eager task factory and starts tasks lazily
+    assert eager == (sys.version_info >= (3, 12))
+    assert run(main()) is False
@@ -0,0 +1,72 @@
+import pytest
+
+from apps.shared.metrics import MetricsRegistry, counter, merge, render
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_counter_renders_each_series(registry):
+    calls = registry.counter("test_calls_total", "Calls", ["tool"])
+    calls.labels("hit").inc()
+    calls.labels("hit").inc(2)
+    calls.labels('say "hi"\n').inc()
+
+    assert render(registry.collect()) == (
+        "# HELP test_calls_total Calls\n"
+        "# TYPE test_calls_total counter\n"
+        'test_calls_total{tool="hit"} 3\n'
+        'test_calls_total{tool="say \\"hi\\"\\n"} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    latency = registry.histogram("test_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value)
+
+    lines = render(registry.collect()).splitlines()
+
+    assert lines[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 2.65",
+        "test_seconds_count 4",
+    ]
+
+
+def test_registering_twice_returns_the_same_metric(registry):
+    first = registry.gauge("test_rooms", "Rooms")
+
+    assert registry.gauge("test_rooms", "Rooms") is first
+    with pytest.raises(ValueError):
+        registry.counter("test_rooms", "Rooms")
+    with pytest.raises(ValueError):
+        registry.counter("test_labelled", "Labelled", ["a"]).labels("x", "y")
+
+
+def test_failing_collector_is_skipped(registry):
+    def broken():
+        raise RuntimeError("gone")
+
+    registry.collector(broken)
+    registry.collector(lambda: [counter("test_hits_total", "Hits", {"a": 1}, "k")])
+
+    assert [family.name for family in registry.collect()] == ["test_hits_total"]
+
+
+def test_merge_labels_each_worker():
+    batches = [
+        merge([counter("test_hits_total", "Hits", {"a": value}, "k")], worker=name)
+        for name, value in (("0", 1), ("1", 2))
+    ]
+
+    (merged,) = merge(family for batch in batches for family in batch)
+
+    assert merged.samples == [
+        ("", {"worker": "0", "k": "a"}, 1),
+        ("", {"worker": "1", "k": "a"}, 2),
+    ]
@@ -0,0 +1,56 @@
+import tracemalloc
+
+import pytest
+
+from apps.shared.profiling import MemoryProfiler
+
+
+class Leaked:
+    pass
+
+
+def test_counts_show_growth_since_previous_report():
+    profiler = MemoryProfiler()
+    sessions = {"sessions": 2, "tracks": 1}
+    profiler.account("room A", lambda: dict(sessions))
+    profiler.account("room B", lambda: {}["sessions"])
+
+    profiler.counts()
+    sessions["sessions"] = 5
+    lines = profiler.counts()
+
+    assert lines[1] == "  room A: sessions 5 (+3), tracks 1 (+0)"
+    assert lines[2].startswith("  room B: ")
+
+    profiler.forget("room A")
+    assert [line for line in profiler.counts() if "room A" in line] == []
+
+
+def test_objects_show_leaked_types():
+    profiler = MemoryProfiler()
+    profiler.objects()
+
+    leaked = [Leaked() for _ in range(1000)]
+    lines = profiler.objects()
+
+    assert any(line.startswith("  Leaked: ") and "(+1000)" in line for line in lines)
+    assert len(leaked) == 1000
+
+
+def test_allocations_show_growing_lines():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc is already tracing")
+
+    profiler = MemoryProfiler()
+    profiler.start()
+    try:
+        profiler.allocations()
+        leaked = [bytes(1024) for _ in range(1000)]
+        lines = profiler.allocations()
+    finally:
+        profiler.stop()
+
+    assert lines[1] == "top growth since the previous report:"
+    assert __file__ in lines[2]
+    assert len(leaked) == 1000
+    assert profiler.allocations()[0].startswith("tracemalloc is off")
@@ -0,0 +1,55 @@
+import asyncio
+
+from apps.shared.ratelimit import ToolCallLimiter
+
+
+def test_full_queue_is_rejected():
+    async def run():
+        limiter = ToolCallLimiter(max_pending=1)
+        async with limiter.slot("room") as first:
+            assert first is None
+            waiting = asyncio.create_task(limiter.slot("room").__aenter__())
+            await asyncio.sleep(0)
+            async with limiter.slot("room") as rejected:
+                assert rejected["limit"] == "queue"
+        assert await waiting is None
+        assert limiter.rejected["queue"] == 1
+
+    asyncio.run(run())
+
+
+def test_rate_is_limited_per_tool():
+    limiter = ToolCallLimiter(rate=100, burst=100, tool_rate=1, tool_burst=2)
+    assert limiter.take("room", "hit") is None
+    assert limiter.take("room", "hit") is None
+    assert limiter.take("room", "hit")["limit"] == "tool"
+    assert limiter.take("room", "dealer_turn") is None
+
+
+def test_forget_keeps_held_turn():
+    async def run():
+        limiter = ToolCallLimiter()
+        order = []
+
+        async def call(name: str):
+            async with limiter.slot("room"):
+                order.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} end")
+
+        running = asyncio.create_task(call("first"))
+        await asyncio.sleep(0)
+        limiter.forget("room")
+        # A call arriving after the room was forgotten still waits its turn
+        await asyncio.gather(running, call("second"))
+        assert order == ["first start", "first end", "second start", "second end"]
+
+        # The last call out of a forgotten room drops its turn
+        running = asyncio.create_task(call("third"))
+        await asyncio.sleep(0)
+        limiter.forget("room")
+        assert "room" in limiter.locks
+        await running
+        assert "room" not in limiter.locks
+
+    asyncio.run(run())
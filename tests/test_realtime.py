@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from apps.blackjack.tools import registry
+from apps.shared.realtime import (
+    FakeBackend,
+    LatencySelector,
+    RealtimeBackend,
+    ResumableSession,
+)
+
+
+def test_backend_must_create():
+    with pytest.raises(TypeError):
+        RealtimeBackend()
+
+
+def test_failover_closes_failed_model():
+    selector = LatencySelector(
+        [FakeBackend("down", healthy=False), FakeBackend("up", setup_delay=0.01)]
+    )
+    failed = selector.create(None, "", registry)
+    failed.connected = True
+
+    llm = asyncio.run(selector.connect(failed, None, "", registry))
+    assert selector.current.name == "up"
+    assert llm.connected
+    assert not failed.connected
+
+
+def test_response_latency_scores_serving_provider():
+    selector = LatencySelector([FakeBackend("a"), FakeBackend("b")])
+    session = ResumableSession(selector, None, "", registry, track=None)
+    selector.current = selector.backends[0]
+
+    session.responded()
+    session.speaking()
+    assert selector.stats["a"].response is not None
+    assert selector.stats["b"].response is None
+    # A provider that has not served is not favoured for it
+    assert selector.score("b") == selector.score("a")
+
+    selector.observe_response("b", 1.0)
+    assert selector.best().name == "a"
+
+
+class StubTrack:
+    """
+    Records the hold and release calls of a HeldTrack.
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.held = 0
+        self.dropped = 0
+        self.holding = False
+
+    def hold(self):
+        self.holding = True
+
+    def release(self):
+        self.holding = False
+
+
+class RecordingBackend(FakeBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instructions = []
+
+    def create(self, agent, instructions, registry):
+        self.instructions.append(instructions)
+        return super().create(agent, instructions, registry)
+
+
+def resume(session):
+    async def run():
+        session.create()
+        await session.connect()
+        dropped = session.llm
+        session.dropped()
+        assert session.track.holding
+        await session._task
+        session.speaking()
+        return dropped
+
+    return asyncio.run(run())
+
+
+def test_resume_carries_game_summary():
+    backend = RecordingBackend("up")
+    session = ResumableSession(
+        LatencySelector([backend]),
+        None,
+        "Deal blackjack.",
+        registry,
+        StubTrack(),
+        summary=lambda: "player_id 2 holds 16",
+    )
+
+    dropped = resume(session)
+
+    assert not dropped.connected
+    assert session.llm.connected
+    assert session.llm.conversation.tracks["mixer"] is session.track
+    assert not session.track.holding
+    assert backend.instructions[-1].startswith("Deal blackjack.")
+    assert backend.instructions[-1].endswith("player_id 2 holds 16")
+    stats = session.stats()
+    assert stats["drops"] == 1
+    assert stats["attempts"] == 1
+    assert stats["first_audio_ms_avg"] > 0
+
+
+def test_resume_fails_over_with_backoff():
+    flaky = FakeBackend("flaky")
+    selector = LatencySelector([flaky, FakeBackend("up")])
+    session = ResumableSession(selector, None, "", registry, StubTrack(), backoff=0.001)
+
+    async def run():
+        session.create()
+        await session.connect()
+        # The provider serving the room, still scored best, goes down with
+        # the connection
+        selector.observe_setup("up", 1.0)
+        flaky.healthy = False
+        session.dropped()
+        await session._task
+
+    asyncio.run(run())
+
+    assert selector.current.name == "up"
+    assert session.llm.connected
+    assert session.stats()["attempts"] == 2
+    assert not selector.stats["flaky"].healthy
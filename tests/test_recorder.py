@@ -0,0 +1,72 @@
+import os
+
+from apps.shared.recorder import (
+    TraceRecorder,
+    read_segment,
+    read_traces,
+    segments,
+)
+
+
+def recorder(**kwargs):
+    # The writer thread only drains on stop, so batches are deterministic
+    return TraceRecorder(flush_interval=3600, **kwargs)
+
+
+def test_segments_rotate_by_size(tmp_path):
+    trace = recorder(segment_bytes=1, batch_size=2)
+    trace.start(str(tmp_path))
+    for hand in range(5):
+        trace.event("room", f"hand {hand}")
+    trace.stop()
+
+    (recording,) = segments(str(tmp_path))
+
+    assert len(recording) == 3
+    assert [len(list(read_segment(path))) for path in recording] == [2, 2, 1]
+    assert trace.stats()["written"] == 5
+
+
+def test_traces_merge_recordings_in_time_order(tmp_path):
+    first, second = recorder(), recorder()
+    first.start(str(tmp_path), prefix="worker-0")
+    second.start(str(tmp_path), prefix="worker-1")
+    for hand in range(4):
+        (first, second)[hand % 2].tool_call(
+            "room", "hit", {"player_id": hand}, {"card": object()}, 0.001
+        )
+    first.stop()
+    second.stop()
+
+    records = list(read_traces(str(tmp_path)))
+
+    assert len(segments(str(tmp_path))) == 2
+    assert [record["arguments"]["player_id"] for record in records] == [0, 1, 2, 3]
+    # Values JSON has no type for are recorded by their repr
+    assert records[0]["result"]["card"].startswith("<object object")
+
+
+def test_truncated_segment_reads_up_to_the_cut(tmp_path):
+    trace = recorder()
+    trace.start(str(tmp_path))
+    for hand in range(100):
+        trace.event("room", f"hand {hand}")
+    trace.stop()
+    ((path,),) = segments(str(tmp_path))
+
+    with open(path, "rb+") as f:
+        f.truncate(os.path.getsize(path) - 8)
+
+    assert len(list(read_segment(path))) == 100
+
+
+def test_records_beyond_max_pending_are_dropped(tmp_path):
+    trace = recorder(max_pending=2)
+    trace.event("room", "before start")
+    trace.start(str(tmp_path))
+    for hand in range(3):
+        trace.event("room", f"hand {hand}")
+    trace.stop()
+
+    assert trace.stats()["records"] == 2
+    assert trace.stats()["dropped"] == 1
@@ -0,0 +1,168 @@
+import os
+
+import pytest
+
+from apps.blackjack.functions.journal import (
+    OP_SETTLE,
+    JournalReader,
+    decode_snapshot,
+    encode_snapshot,
+    game_journal,
+)
+from apps.blackjack.functions.ledger import ledger
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.tools import registry
+from apps.shared.lifecycle import lifecycle
+
+PLAYER_ID = 2
+
+# Cents the player starts each hand with
+BANKROLL = 1000_00
+
+
+@pytest.fixture
+def deal():
+    """
+    Deals a hand of 10, then replaces its cards, the deck's last card being
+    the next one drawn.
+    """
+
+    def deal(player_hand, dealer_hand, deck=()):
+        ledger.restore(PLAYER_ID, BANKROLL, None)
+        registry.dispatch(
+            "create_game_session_and_deal_initial_cards",
+            {"player_id": PLAYER_ID, "bet_amount": 10},
+        )
+        game_state_map[PLAYER_ID].update(
+            player_hand=list(player_hand),
+            dealer_hand=list(dealer_hand),
+            deck=list(deck),
+        )
+
+    yield deal
+    game_state_map.clear()
+    registry.invalidate(PLAYER_ID)
+
+
+def status() -> dict:
+    return registry.dispatch("check_game_status", {"player_id": PLAYER_ID})
+
+
+def test_win(deal):
+    deal(["10 of hearts", "9 of hearts"], ["10 of clubs", "7 of clubs"])
+    assert ("hand", PLAYER_ID) in lifecycle.activities
+    registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    assert ("hand", PLAYER_ID) not in lifecycle.activities
+    result = status()
+    assert result["game_state"]["game_state"] == "player_win"
+    assert result["balance"] == 1010
+
+
+def test_loss(deal):
+    deal(["10 of hearts", "7 of hearts"], ["10 of clubs", "9 of clubs"])
+    registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    result = status()
+    assert result["game_state"]["amount"] == -10
+    assert result["balance"] == 990
+
+
+def test_push(deal):
+    deal(["10 of hearts", "8 of hearts"], ["10 of clubs", "8 of clubs"])
+    registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    result = status()
+    assert result["game_state"]["amount"] == 0
+    # The stake is returned
+    assert result["balance"] == 1000
+
+
+def test_bust(deal):
+    deal(
+        ["10 of hearts", "6 of hearts"], ["10 of clubs", "7 of clubs"], ["K of spades"]
+    )
+    registry.dispatch("hit", {"player_id": PLAYER_ID, "recipient": "player"})
+    # The bust ends the hand before the model asks for the status
+    assert ("hand", PLAYER_ID) not in lifecycle.activities
+    assert ledger.balance(PLAYER_ID) == 990
+    result = status()
+    assert result["game_state"]["game_state"] == "player_bust"
+    assert result["balance"] == 990
+
+
+def test_status_mid_hand(deal):
+    deal(
+        ["10 of hearts", "5 of hearts"], ["10 of clubs", "6 of clubs"], ["10 of spades"]
+    )
+    # Losing so far, but the hand is not over and nothing is paid out
+    assert status()["game_state"]["game_state"] == "dealer_win"
+    assert ledger.open_bets[PLAYER_ID] == 10_00
+    registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    result = status()
+    assert result["game_state"]["game_state"] == "dealer_bust"
+    assert result["balance"] == 1010
+    # Checking again does not pay out twice
+    assert status()["balance"] == 1010
+
+
+def test_argument_matches_session_key():
+    # A player_id the model sent as a string is the key the tools store
+    assert registry.argument("check_game_status", {"player_id": "2"}, "player_id") == 2
+    assert (
+        registry.argument("check_game_status", {"player_id": 2.5}, "player_id") is None
+    )
+    assert registry.argument("check_game_status", {}, "player_id") is None
+
+
+@pytest.fixture
+def journal(tmp_path):
+    path = str(tmp_path / "journal")
+    game_journal.open(path, game_state_map)
+    yield path
+    game_journal.close()
+    game_journal.path = game_journal.sessions = None
+
+
+def test_settlement_journaled_once(deal, journal):
+    deal(
+        ["10 of hearts", "5 of hearts"], ["10 of clubs", "6 of clubs"], ["10 of spades"]
+    )
+    status()
+    registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    status()
+    status()
+    game_journal.flush()
+    reader = JournalReader(journal)
+    try:
+        settled = reader.records[reader.records["op"] == OP_SETTLE]
+        assert len(settled) == 1
+        assert reader.audit(PLAYER_ID)["settled"]["game_state"] == "dealer_bust"
+    finally:
+        reader.close()
+
+
+def test_snapshot_keeps_dealer_played(deal):
+    deal(["10 of hearts", "9 of hearts"], ["10 of clubs", "7 of clubs"])
+    registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    _, sessions = decode_snapshot(encode_snapshot(game_state_map, 0))
+    assert sessions[PLAYER_ID]["dealer_played"] is True
+
+
+@pytest.fixture
+def shared():
+    game_state_map.share(f"bj-test-{os.getpid()}", slots=64)
+    yield
+    game_state_map.close(unlink=True)
+
+
+def test_bankroll_follows_shared_session(deal, shared):
+    deal(["10 of hearts", "9 of hearts"], ["10 of clubs", "7 of clubs"])
+    owner, balance, open_bet = game_state_map[PLAYER_ID]["bankroll"]
+    assert (owner, balance, open_bet) == (ledger.owner, 1000_00, 10_00)
+
+    # Another process's ledger moved the bankroll since
+    game_state_map[PLAYER_ID]["bankroll"] = ("other", 500_00, 10_00)
+    game_state_map.sync(PLAYER_ID)
+    registry.invalidate(PLAYER_ID)
+
+    registry.dispatch("dealer_turn", {"player_id": PLAYER_ID})
+    assert ledger.balance(PLAYER_ID) == 510
+    assert game_state_map[PLAYER_ID]["bankroll"] == (ledger.owner, 510_00, None)
@@ -0,0 +1,89 @@
+import os
+import struct
+import zlib
+
+import pytest
+
+from apps.shared import shm
+from apps.shared.shm import SharedMemoryStore, encode_key
+
+
+@pytest.fixture
+def stores():
+    """
+    Two stores attached to one segment, standing in for two agent processes.
+    """
+    name = f"shm-test-{os.getpid()}"
+    writer, reader = SharedMemoryStore(), SharedMemoryStore()
+    writer.share(name, slots=16, slot_size=256)
+    reader.share(name, create=False)
+    yield writer, reader
+    reader.close()
+    writer.close(unlink=True)
+
+
+def slot(store, key):
+    encoded = encode_key(key)
+    return store._find(encoded, zlib.crc32(encoded))[0]
+
+
+def test_writes_reach_other_processes(stores):
+    writer, reader = stores
+    position, _ = reader.changes()
+
+    writer[2] = {"bet_amount": 10}
+    assert reader[2] == {"bet_amount": 10}
+    version = reader.version(2)
+
+    # In-place changes are published by sync
+    writer[2]["bet_amount"] = 20
+    assert reader[2] == {"bet_amount": 10}
+    writer.sync(2)
+
+    assert reader[2] == {"bet_amount": 20}
+    assert reader.version(2) != version
+    assert reader.changes(position) == (position + 2, [2])
+
+
+class RacingSequence:
+    """
+    The slot sequence as seen by a reader while a writer rewrites the slot
+    once, between the reader's copy and its recheck.
+    """
+
+    def __init__(self):
+        self.raced = False
+
+    def unpack_from(self, buf, offset=0):
+        (sequence,) = struct.unpack_from("<I", buf, offset)
+        if not self.raced:
+            self.raced = True
+            return (sequence + 2,)
+        return (sequence,)
+
+
+def test_read_retries_a_slot_written_meanwhile(stores, monkeypatch):
+    writer, reader = stores
+    writer["player"] = [1, 2, 3]
+
+    monkeypatch.setattr(shm, "SEQUENCE", RacingSequence())
+
+    assert reader["player"] == [1, 2, 3]
+    assert reader.retries == 1
+
+
+def test_slot_torn_by_crashed_writer_is_repaired(stores, monkeypatch):
+    writer, reader = stores
+    writer["torn"] = "value"
+    writer["kept"] = "value"
+    monkeypatch.setattr(shm, "MAX_SPINS", 3)
+
+    # The writer died with the slot's sequence odd
+    offset = writer._offset(slot(writer, "torn"))
+    (sequence,) = shm.SEQUENCE.unpack_from(writer._buf, offset)
+    shm.SEQUENCE.pack_into(writer._buf, offset, sequence + 1)
+
+    assert "torn" not in reader
+    assert reader.retries == 3
+    assert reader["kept"] == "value"
+    assert len(writer) == 1
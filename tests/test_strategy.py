@@ -0,0 +1,83 @@
+import pytest
+
+from apps.blackjack.functions.main import game_state_map
+from apps.blackjack.functions.strategy import (
+    ACE,
+    BUST,
+    TEN,
+    VALUE_CLASSES,
+    basic_strategy,
+    dealer_upcard_outcomes,
+    ev_table,
+    shoe_composition,
+    suggest,
+    suggest_action,
+)
+
+PLAYER_ID = 33
+
+
+def tens(count):
+    counts = [0] * VALUE_CLASSES
+    counts[TEN] = count
+    return tuple(counts)
+
+
+def test_dealer_outcomes_are_a_distribution():
+    counts = shoe_composition(6)
+    for upcard in range(VALUE_CLASSES):
+        assert sum(dealer_upcard_outcomes(upcard, counts)) == pytest.approx(1.0)
+
+
+def test_dealer_outcomes_are_exact_for_the_composition():
+    # Only tens left: a ten upcard always makes 20, a six always busts
+    assert dealer_upcard_outcomes(TEN, tens(8)) == (0, 0, 0, 1.0, 0, 0, 0)
+    assert dealer_upcard_outcomes(5, tens(8))[BUST] == 1.0
+
+    table = ev_table(TEN, tens(8))
+    assert table[(20, False)] == (0.0, -1.0)
+    assert table[(21, False)][0] == 1.0
+
+
+@pytest.mark.parametrize(
+    "total, soft, upcard, action",
+    [
+        (16, False, TEN, "hit"),
+        (12, False, 1, "hit"),
+        (13, False, 1, "stand"),
+        (12, False, 3, "stand"),
+        (17, False, ACE, "stand"),
+        (17, True, 6, "hit"),
+        (18, True, 6, "stand"),
+        (18, True, TEN, "hit"),
+    ],
+)
+def test_basic_strategy(total, soft, upcard, action):
+    assert basic_strategy()[(total, soft, upcard)] == action
+
+
+def test_suggest_stands_on_a_tie():
+    result = suggest(["10 of spades", "6 of hearts"], "K of clubs", ["Q of clubs"] * 5)
+
+    assert result == {"action": "stand", "hit_ev": -1.0, "stand_ev": -1.0}
+
+
+def test_suggest_rejects_a_bust_hand():
+    with pytest.raises(ValueError):
+        suggest(["10 of spades", "6 of hearts", "K of clubs"], "2 of clubs", [])
+
+
+def test_suggest_action_counts_the_hole_card_as_unseen():
+    game_state_map[PLAYER_ID] = {
+        "player_hand": ["10 of spades", "4 of hearts"],
+        "dealer_hand": ["7 of clubs", "K of clubs"],
+        "deck": ["7 of hearts"] * 3,
+    }
+    try:
+        result = suggest_action(PLAYER_ID)
+    finally:
+        del game_state_map[PLAYER_ID]
+
+    # Only sevens are unseen: hitting makes 21 against the dealer's 17
+    assert result["action"] == "hit"
+    assert result["hit_ev"] == 1.0
@@ -0,0 +1,125 @@
+import pytest
+
+from apps.blackjack.functions.table import (
+    SHOE_DECKS,
+    check_table_status,
+    deal_round,
+    join_table,
+    leave_table,
+    table_dealer_turn,
+    table_hit,
+    table_map,
+    table_stand,
+)
+
+
+@pytest.fixture
+def table():
+    """
+    Seats players 1 and 2 at a fresh table, each betting 10.
+    """
+    table_id = "test-table"
+    join_table(table_id, 1, 10)
+    join_table(table_id, 2, 10)
+    yield table_id
+    table_map.pop(table_id, None)
+
+
+def test_round_deals_from_one_shoe(table):
+    deal_round(table)
+    state = table_map[table]
+
+    # Two cards per seat and two for the dealer, all from the table's shoe
+    assert len(state["shoe"]) == SHOE_DECKS * 52 - 6
+    assert [len(state["seats"][player_id]["hand"]) for player_id in (1, 2)] == [2, 2]
+    assert len(state["dealer_hand"]) == 2
+
+
+def test_seats_are_locked_while_a_round_is_open(table):
+    deal_round(table)
+
+    with pytest.raises(ValueError):
+        join_table(table, 3, 10)
+    with pytest.raises(ValueError):
+        join_table(table, 1, 20)
+    with pytest.raises(ValueError):
+        leave_table(table, 1)
+    with pytest.raises(ValueError):
+        deal_round(table)
+
+    # Keeping the same bet is not a change
+    join_table(table, 1, 10)
+
+
+def test_turns_follow_seat_order(table):
+    state = table_map[table]
+    deal_round(table)
+    # Take the naturals out of play so both seats have a turn
+    for player_id in (1, 2):
+        state["seats"][player_id].update(
+            hand=["10 of spades", "6 of hearts"], done=False
+        )
+    state["turn"] = 0
+
+    with pytest.raises(ValueError):
+        table_stand(table, 2)
+    assert table_stand(table, 1) == {"turn": 2}
+    with pytest.raises(ValueError):
+        table_dealer_turn(table)
+    assert table_stand(table, 2) == {"turn": None}
+
+
+def test_hit_passes_turn_on_bust(table):
+    state = table_map[table]
+    deal_round(table)
+    for player_id in (1, 2):
+        state["seats"][player_id].update(
+            hand=["10 of spades", "6 of hearts"], done=False
+        )
+    state["turn"] = 0
+    state["shoe"].append("K of diamonds")
+
+    result = table_hit(table, 1)
+
+    assert result["total"] == 26
+    assert result["turn"] == 2
+
+
+def test_dealer_plays_once_and_settles_every_seat(table):
+    state = table_map[table]
+    deal_round(table)
+    state["seats"][1].update(hand=["10 of spades", "9 of hearts"], done=True)
+    state["seats"][2].update(hand=["10 of clubs", "6 of diamonds"], done=True)
+    state["dealer_hand"] = ["10 of diamonds", "8 of clubs"]
+    state["turn"] = 2
+
+    dealer_hand = table_dealer_turn(table)
+    # A second call is a no-op, the dealer does not draw again
+    assert table_dealer_turn(table) == dealer_hand == ["10 of diamonds", "8 of clubs"]
+
+    results = check_table_status(table)
+
+    assert [result["player_id"] for result in results] == [1, 2]
+    assert [result["amount"] for result in results] == [20, -10]
+    assert not state["round_open"]
+
+
+def test_settling_needs_the_dealer_unless_everyone_busts(table):
+    state = table_map[table]
+    deal_round(table)
+    state["seats"][1].update(hand=["10 of spades", "9 of hearts"], done=True)
+    state["seats"][2].update(hand=["10 of clubs", "6 of diamonds"], done=True)
+    state["turn"] = 2
+
+    with pytest.raises(ValueError):
+        check_table_status(table)
+
+    for player_id in (1, 2):
+        state["seats"][player_id]["hand"] = [
+            "10 of spades",
+            "9 of hearts",
+            "5 of clubs",
+        ]
+    results = check_table_status(table)
+
+    assert all(result["amount"] == -10 for result in results)
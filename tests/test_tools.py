@@ -0,0 +1,90 @@
+import pytest
+
+from apps.shared.store import MemoryStore
+from apps.shared.tools import ToolRegistry
+
+PLAYER = {
+    "type": "OBJECT",
+    "properties": {"player_id": {"type": "INTEGER"}},
+    "required": ["player_id"],
+}
+
+
+@pytest.fixture
+def counts():
+    """
+    A registry with a read-only and a mutating tool over the same counter
+    per player, and the players the read handler ran for.
+    """
+    state = {}
+    reads = []
+
+    registry = ToolRegistry(session="player_id", max_sessions=2)
+
+    @registry.tool({"name": "test_read", "parameters": PLAYER}, read_only=True)
+    def read(player_id: int):
+        reads.append(player_id)
+        return {"count": state.get(player_id, 0)}
+
+    @registry.tool({"name": "test_write", "parameters": PLAYER})
+    def write(player_id: int):
+        state[player_id] = state.get(player_id, 0) + 1
+        return {"count": state[player_id]}
+
+    return registry, reads
+
+
+def test_repeated_reads_are_cached(counts):
+    registry, reads = counts
+
+    assert registry.dispatch("test_read", {"player_id": 1}) == {"count": 0}
+    # Coerced before the lookup, so "1" is the same call
+    assert registry.dispatch("test_read", {"player_id": "1"}) == {"count": 0}
+
+    assert reads == [1]
+    assert registry.cache_stats()["hits_by_tool"] == {"test_read": 1}
+
+
+def test_write_invalidates_only_its_session(counts):
+    registry, reads = counts
+    registry.dispatch("test_read", {"player_id": 1})
+    registry.dispatch("test_read", {"player_id": 2})
+
+    registry.dispatch("test_write", {"player_id": 1})
+
+    assert registry.dispatch("test_read", {"player_id": 1}) == {"count": 1}
+    assert registry.dispatch("test_read", {"player_id": 2}) == {"count": 0}
+    assert reads == [1, 2, 1]
+    assert registry.cache_stats()["invalidations"] == 1
+
+
+def test_errors_are_not_cached(counts):
+    registry, reads = counts
+
+    assert "error" in registry.dispatch("test_read", {"player_id": 1.5})
+    assert "error" in registry.dispatch("test_read", {})
+    assert registry.cache_stats()["sessions"] == 0
+
+
+def test_oldest_session_is_evicted(counts):
+    registry, reads = counts
+    for player_id in (1, 2, 3):
+        registry.dispatch("test_read", {"player_id": player_id})
+
+    registry.dispatch("test_read", {"player_id": 1})
+
+    assert reads == [1, 2, 3, 1]
+    assert registry.cache_stats()["sessions"] == 2
+
+
+def test_store_version_invalidates_reads(counts, monkeypatch):
+    registry, reads = counts
+    registry.store = MemoryStore()
+    registry.dispatch("test_read", {"player_id": 1})
+
+    # Another process wrote the entry
+    monkeypatch.setattr(registry.store, "version", lambda key: "moved")
+    registry.dispatch("test_read", {"player_id": 1})
+    registry.dispatch("test_read", {"player_id": 1})
+
+    assert reads == [1, 1]
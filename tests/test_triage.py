@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from apps.customer_service.functions.bulk import load
+from apps.customer_service.functions.main import complaint_book
+from apps.customer_service.functions.triage import TriageIndex, new_complaint_id
+from apps.harness.triage import complaints, purity
+from apps.shared.store import MemoryStore
+
+# Complaints about 533 incidents, reworded, some with typos
+COMPLAINTS = 5000
+
+
+def test_rebuild_groups_incidents():
+    texts, truth = complaints(random.Random(1), COMPLAINTS)
+    book = MemoryStore(
+        (f"customer-{i}", {"complaint": text, "resolution_period": "1 days"})
+        for i, text in enumerate(texts)
+    )
+    report = TriageIndex().rebuild(book)
+    labels = [book[f"customer-{i}"]["incident"] for i in range(COMPLAINTS)]
+    assert report["incidents"] < 1.5 * len(set(truth))
+    assert purity(labels, truth) > 0.95
+
+
+def test_triage_groups_incidents():
+    texts, truth = complaints(random.Random(1), COMPLAINTS)
+    index = TriageIndex()
+    labels = [
+        index.triage(f"customer-{i}", new_complaint_id(), text, "1 days")[0]
+        for i, text in enumerate(texts)
+    ]
+    assert len(index) < 1.5 * len(set(truth))
+    assert purity(labels, truth) > 0.95
+
+
+def test_second_complaint_keeps_incident():
+    index = TriageIndex()
+    first = new_complaint_id()
+    incident, period = index.triage("Om", first, "I am not able to login", "2 days")
+    assert (incident, period) == (first, "2 days")
+    # Om files about something else; others still join the first incident
+    index.triage("Om", new_complaint_id(), "the video call keeps crashing", "1 days")
+    incident, period = index.triage(
+        "Arush", new_complaint_id(), "I am not able to login!", "1 days"
+    )
+    assert (incident, period) == (first, "2 days")
+    assert len(index) == 2
+
+
+@pytest.fixture
+def book():
+    saved = dict(complaint_book)
+    complaint_book.clear()
+    yield complaint_book
+    complaint_book.clear()
+    complaint_book.update(saved)
+
+
+def test_load_files_incidents(book, tmp_path):
+    path = tmp_path / "tickets.csv"
+    path.write_text(
+        "name,complaint,resolution_period\n"
+        "Arush,chat in the app is not working,3 hours\n"
+        "Om,hi chat in the app is not working!,1 days\n"
+    )
+    assert load(str(path))["incidents"] == 1
+    assert book["Om"]["incident"] == book["Arush"]["id"]
@@ -0,0 +1,9 @@
+import pytest
+
+from apps.blackjack.web3.main import Web3WalletHandler
+
+
+def test_wallet_handler_needs_keystore_password(monkeypatch, tmp_path):
+    monkeypatch.delenv("KEYSTORE_PASSWORD", raising=False)
+    with pytest.raises(ValueError, match="KEYSTORE_PASSWORD"):
+        Web3WalletHandler(str(tmp_path / "keystore"))